@@ -0,0 +1,116 @@
+"""
+InteractionDomDistiller 基准：显式栈 + 显著性缓存 vs 最初的递归实现。
+
+用法:
+    python bench_dom_distiller.py                 # 合成的深层 / 宽树
+    python bench_dom_distiller.py page1.html ...  # 指定真实页面
+"""
+import sys
+import time
+from typing import Dict, List
+
+from bs4 import BeautifulSoup, Tag
+
+from script.scanner.dom_distiller import InteractionDomDistiller
+
+
+class LegacyRecursiveDistiller(InteractionDomDistiller):
+    """最初的递归实现（以 Tag 为 dict 键，每个节点判定两次显著性）。输出基准和性能对照。"""
+
+    def distill_html(self, html: str) -> str:
+        soup = BeautifulSoup(html, "html.parser")
+        root: Tag = soup.body or soup
+        salient_map: Dict[Tag, bool] = {}
+        self._legacy_mark(root, salient_map)
+        lines: List[str] = []
+        self._legacy_linearize(root, salient_map, 0, lines)
+        return "\n".join(lines)
+
+    def _legacy_mark(self, node: Tag, salient_map: Dict[Tag, bool]) -> bool:
+        if not isinstance(node, Tag):
+            return False
+        if node.name in self.TAGS_TO_DROP:
+            salient_map[node] = False
+            return False
+        is_salient_self = self._legacy_is_salient(node)
+        is_salient_child = False
+        for child in node.children:
+            if isinstance(child, Tag):
+                child_salient = self._legacy_mark(child, salient_map)
+                is_salient_child = is_salient_child or child_salient
+        is_salient = is_salient_self or is_salient_child
+        salient_map[node] = is_salient
+        return is_salient
+
+    def _legacy_is_salient(self, node: Tag) -> bool:
+        if node.name.lower() in self.INTERACTIVE_TAGS:
+            return True
+        for attr_name, attr_value in node.attrs.items():
+            attr_name_lower = attr_name.lower()
+            if attr_name_lower.startswith("data-"):
+                return True
+            for kw in self.DATA_ATTR_KEYWORDS:
+                if kw in attr_name_lower:
+                    return True
+                if isinstance(attr_value, str) and kw in attr_value.lower():
+                    return True
+        return False
+
+    def _legacy_linearize(self, node: Tag, salient_map: Dict[Tag, bool], depth: int, out_lines: List[str]) -> None:
+        if not isinstance(node, Tag):
+            return
+        if not salient_map.get(node, False):
+            return
+        is_self_salient = self._legacy_is_salient(node)
+        if is_self_salient:
+            line = self._render_node_as_dsl(node, depth)
+            if line:
+                out_lines.append(line)
+        for child in node.children:
+            if isinstance(child, Tag):
+                self._legacy_linearize(child, salient_map, depth + (1 if is_self_salient else 0), out_lines)
+
+
+def deep_tree(sections: int = 20, depth: int = 120) -> str:
+    """框架风格的深层嵌套：每条链的叶子是一个按钮，中间层带 class / aria 属性。"""
+    chain = ('<div class="wrapper" aria-label="layer">' * depth
+             + '<button id="b" onclick="go()">Go</button>' + "</div>" * depth)
+    return f"<html><body>{chain * sections}</body></html>"
+
+
+def wide_tree(rows: int = 5000) -> str:
+    """扁平的大列表：少量交互节点淹没在大量普通节点中。"""
+    items = []
+    for i in range(rows):
+        if i % 10 == 0:
+            items.append(f'<li data-id="{i}"><a href="/item/{i}">Item {i}</a></li>')
+        else:
+            items.append(f'<li class="row" title="row {i}"><span>Row {i}</span><em>note</em></li>')
+    return f"<html><body><ul>{''.join(items)}</ul></body></html>"
+
+
+def bench(name: str, html: str, rounds: int = 3) -> None:
+    print(f"\n=== {name} ({len(html) / 1024:.0f} KB) ===")
+    runners = [("legacy recursive", LegacyRecursiveDistiller()), ("iterative+cache", InteractionDomDistiller(use_memo=False))]
+    for label, distiller in runners:
+        best = float("inf")
+        try:
+            for _ in range(rounds):
+                start = time.perf_counter()
+                distiller.distill_html(html)
+                best = min(best, time.perf_counter() - start)
+        except RecursionError:
+            print(f"  {label:<18} RecursionError")
+            continue
+        print(f"  {label:<18} best of {rounds}: {best * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                bench(path, f.read())
+    else:
+        bench("deep 20x120", deep_tree())
+        bench("wide 5000 rows", wide_tree())
+        bench("very deep 1x1500", deep_tree(sections=1, depth=1500))
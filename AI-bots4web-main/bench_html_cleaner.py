@@ -0,0 +1,100 @@
+"""
+clean_html_for_llm 吞吐量基准。
+
+用法:
+    python bench_html_cleaner.py                 # 合成的大页面 (约 1MB / 4MB)
+    python bench_html_cleaner.py page1.html ...  # 指定真实页面
+"""
+import sys
+import time
+
+from bs4 import BeautifulSoup, NavigableString
+
+from script.scanner.utils.html_cleaner import clean_html_for_llm, _is_allowed_attribute, _truncate_script
+
+BACKENDS = ("html.parser", "lxml")
+
+
+def legacy_multipass_clean(raw_html: str) -> str:
+    """最初的多遍 find_all 实现（单次遍历版本的输出基准和性能对照）。"""
+    soup = BeautifulSoup(raw_html, "html.parser")
+    for tag in soup.find_all(["svg", "style", "noscript", "font"]):
+        tag.decompose()
+    for tag in soup.find_all("link"):
+        if tag.get("rel") == ["stylesheet"]:
+            tag.decompose()
+    for tag in soup.find_all(True):
+        for attr in list(tag.attrs.keys()):
+            if not _is_allowed_attribute(attr):
+                del tag[attr]
+        if tag.name == "img" and tag.get("src", "").startswith("data:image"):
+            tag["src"] = "[BASE64_IMAGE_REMOVED]"
+        if tag.name == "script" and not tag.get("src"):
+            if tag.string and len(tag.string) > 200:
+                tag.string = _truncate_script(tag.string)
+    for tag in soup.find_all(["div", "span", "section", "container"]):
+        if len(tag.attrs) == 0 and not tag.get_text(strip=True):
+            if not tag.contents or (
+                    len(tag.contents) == 1 and isinstance(tag.contents[0], NavigableString)
+                    and not tag.contents[0].strip()):
+                tag.decompose()
+    return str(soup)
+
+_BLOCK = """
+<div class="card shadow-sm mb-3" style="margin: 4px" aria-hidden="false">
+  <div class="card-body d-flex">
+    <svg class="icon" viewBox="0 0 24 24"><path d="M12 2L2 7l10 5 10-5-10-5zm0 13l-10-5v6l10 5 10-5v-6l-10 5z"/></svg>
+    <span class="badge"></span>
+    <img src="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk" class="thumb">
+    <a href="/item/{i}" class="stretched-link" data-id="{i}" onclick="track({i})">Item {i}</a>
+    <form action="/cart/add" method="POST" class="inline"><input type="hidden" name="item" value="{i}">
+      <input type="number" name="qty" class="form-control" value="1"><button type="submit" class="btn">Add</button></form>
+    <div class="spacer"></div><div class="spacer"> </div>
+    <!-- item {i} rendered by template v2 -->
+  </div>
+</div>
+"""
+
+
+def synthetic_page(target_bytes: int) -> str:
+    blocks = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        block = _BLOCK.replace("{i}", str(i))
+        blocks.append(block)
+        size += len(block)
+        i += 1
+    script = "<script>" + "var x = 1; " * 2000 + "</script>"
+    return f"<!DOCTYPE html><html><head><title>Bench</title>{script}</head><body>{''.join(blocks)}</body></html>"
+
+
+def deep_page(sections: int = 40, depth: int = 300) -> str:
+    """框架风格的深层嵌套 DOM：每层都是只剩空 class 的 div，叶子有少量文本。"""
+    nested = ('<div class="wrapper">' * depth) + "<span class='leaf'>text</span>" + ("</div>" * depth)
+    return f"<!DOCTYPE html><html><head><title>Deep</title></head><body>{nested * sections}</body></html>"
+
+
+def bench(name: str, html: str, rounds: int = 3) -> None:
+    size_mb = len(html.encode("utf-8")) / (1024 * 1024)
+    print(f"\n=== {name} ({size_mb:.2f} MB) ===")
+    runners = [("legacy multi-pass", legacy_multipass_clean)]
+    runners += [(backend, lambda h, b=backend: clean_html_for_llm(h, backend=b, use_memo=False)) for backend in BACKENDS]
+    for label, run in runners:
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter()
+            run(html)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {label:<18} best of {rounds}: {best * 1000:8.1f} ms  ({size_mb / best:6.2f} MB/s)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                bench(path, f.read())
+    else:
+        bench("synthetic 1MB", synthetic_page(1024 * 1024))
+        bench("synthetic 4MB", synthetic_page(4 * 1024 * 1024), rounds=2)
+        bench("deep nesting 40x300", deep_page())
@@ -0,0 +1,114 @@
+"""
+JsLinkExtractor 基准：分块扫描 + 原始匹配去重 + 内容哈希缓存 vs 最初的逐匹配实现。
+
+用法:
+    python bench_link_extractor.py                   # 合成的 webpack 风格 bundle
+    python bench_link_extractor.py app.min.js ...    # 指定真实的压缩 bundle
+"""
+import random
+import sys
+import time
+from typing import Set
+from urllib.parse import urljoin
+
+from script.scanner.link_extractor import JsLinkExtractor
+
+BASE_URL = "https://shop.example.com/account/"
+
+
+class LegacyJsLinkExtractor(JsLinkExtractor):
+    """最初的实现：每个匹配都先 urljoin / urlparse，前缀用 Python 循环判断。输出基准和性能对照。"""
+
+    @classmethod
+    def extract_links(cls, content: str, base_url: str) -> Set[str]:
+        found_links = set()
+        for match in cls.REGEX_URL.findall(content):
+            clean_url = match.strip("'\",;)")
+            if cls._is_valid_url(clean_url):
+                found_links.add(clean_url)
+        for path in cls.REGEX_PATH.findall(content):
+            if cls._legacy_is_noise(path):
+                continue
+            absolute_url = urljoin(base_url, path)
+            if cls._is_valid_url(absolute_url):
+                found_links.add(absolute_url)
+        return found_links
+
+    @classmethod
+    def _legacy_is_noise(cls, path: str) -> bool:
+        path = path.lower()
+        if len(path) < 2:
+            return True
+        for prefix in cls.IGNORED_PREFIXES:
+            if path.startswith(prefix):
+                return True
+        if '.' in path:
+            ext = path[path.rfind('.'):]
+            if ext in cls.IGNORED_EXTENSIONS:
+                return True
+        if '\n' in path or '<' in path or '>' in path or '{' in path:
+            return True
+        return False
+
+
+def synthetic_bundle(modules: int = 4000, seed: int = 7) -> str:
+    """webpack 风格的压缩 bundle：大量重复引用的 API 路径、CDN 地址、MIME 串和静态资源。"""
+    rng = random.Random(seed)
+    apis = [f"/api/v{v}/{name}" for v in (1, 2) for name in
+            ("user", "orders", "cart", "login", "logout", "search", "admin/users", "reports/export")]
+    parts = []
+    for i in range(modules):
+        api = rng.choice(apis)
+        parts.append(
+            f'{i}:function(e,t,n){{"use strict";var r=n({rng.randrange(modules)}),o="{api}";'
+            f'function a(e){{return r.get(o+"?page="+e,{{headers:{{"Content-Type":"application/json"}}}})}}'
+            f'var s="https://cdn.example.com/assets/chunk.{i % 50}.js",c=\'/static/img/icon-{i % 30}.png\';'
+            f'e.exports={{load:a,url:"{api}/{i % 97}",mime:"/text/plain",tpl:`/items/${{e}}`,ratio:e/t/2}}}}'
+        )
+    return "!function(){var modules={" + ",\n".join(parts) + "}}();"
+
+
+def bench(name: str, content: str, rounds: int = 3) -> None:
+    print(f"\n=== {name} ({len(content) / 1024:.0f} KB) ===")
+    expected = LegacyJsLinkExtractor.extract_links(content, BASE_URL)
+    got = None
+
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        LegacyJsLinkExtractor.extract_links(content, BASE_URL)
+        best = min(best, time.perf_counter() - start)
+    print(f"  {'legacy':<22} best of {rounds}: {best * 1000:8.1f} ms")
+
+    best = float("inf")
+    for _ in range(rounds):
+        JsLinkExtractor.clear_cache()
+        start = time.perf_counter()
+        got = JsLinkExtractor.extract_links(content, BASE_URL)
+        best = min(best, time.perf_counter() - start)
+    print(f"  {'chunked+dedup':<22} best of {rounds}: {best * 1000:8.1f} ms")
+
+    print(f"  links: {len(got)}  identical to legacy: {got == expected}")
+
+
+def bench_repeated_inline(pages: int = 50) -> None:
+    """同一份内联脚本出现在每个页面上：第二页起命中内容哈希缓存，只做 urljoin。"""
+    script = synthetic_bundle(modules=150)
+    print(f"\n=== inline script ({len(script) / 1024:.0f} KB) on {pages} pages ===")
+    for label, extractor in (("legacy", LegacyJsLinkExtractor), ("chunked+dedup+cache", JsLinkExtractor)):
+        JsLinkExtractor.clear_cache()
+        start = time.perf_counter()
+        for i in range(pages):
+            extractor.extract_links(script, f"{BASE_URL}page/{i}")
+        print(f"  {label:<22} total: {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                bench(path, f.read())
+    else:
+        bench("synthetic bundle 4000 modules", synthetic_bundle())
+        bench("synthetic bundle 20000 modules", synthetic_bundle(modules=20000))
+        bench_repeated_inline()
@@ -0,0 +1,325 @@
+# script/agent/phase_cache.py
+"""
+PTAgent 的分阶段缓存 (Phase Cache)。
+
+每个阶段 (auth_creds / scan_result / analysis_result) 的缓存文件名由两部分组成：
+    <目标哈希>_<阶段键哈希>_<阶段名>.pkl
+
+  - 目标哈希：只由 base_url 决定，方便按目标批量失效
+  - 阶段键：由调用方把“会影响该阶段结果的一切”哈希进去
+    （扫描配置、模型/后端、Prompt 版本、代码版本、目标指纹 ...）
+
+任何一个输入变化都会得到新的文件名，旧结果自然不会被误用。
+另外每个阶段带有 TTL，过期缓存视为不存在；上游阶段重新计算时，
+下游阶段（例如 scan_result -> analysis_result）会被级联清除。
+
+scan_result 引用的完整响应体在 <cache_dir>/bodies（ResponseBodyStore）中，按缓存条目名钉住；
+sweep_bodies() 回收不再被任何 scan_result 条目引用的响应体（invalidate / prune 命令之后自动执行）。
+
+命令行用法（在 ptagent_cache 所在目录执行）：
+    python -m agent.phase_cache list
+    python -m agent.phase_cache invalidate --phase scan_result --target http://localhost:3000
+    python -m agent.phase_cache prune
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.request import Request, urlopen
+
+
+PHASES = ("auth_creds", "scan_result", "analysis_result")
+
+# 各阶段默认有效期（秒）。None 或 <= 0 表示永不过期
+DEFAULT_TTLS: Dict[str, Optional[int]] = {
+    "auth_creds": 12 * 3600,          # 会话凭证通常半天内就会失效
+    "scan_result": 3 * 24 * 3600,
+    "analysis_result": 7 * 24 * 3600,
+}
+
+# 上游阶段 -> 依赖它的下游阶段
+PHASE_DEPENDENTS: Dict[str, List[str]] = {
+    "scan_result": ["analysis_result"],
+}
+
+# ResponseBodyStore 所在目录（相对 cache_dir）
+BODY_STORE_DIR = "bodies"
+
+
+# =================================================
+# 键构造辅助函数
+# =================================================
+def hash_parts(*parts: Any) -> str:
+    """把任意可 JSON 化的部件稳定地哈希成一个 hex 字符串。"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def source_fingerprint(*package_dirs: str) -> str:
+    """
+    计算一组源码目录的指纹（所有 .py 文件的内容哈希）。
+    代码一改，依赖它的阶段缓存就会自动失效。
+    """
+    digest = hashlib.sha256()
+    for package_dir in package_dirs:
+        for root, dirs, files in os.walk(package_dir):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, package_dir).encode("utf-8"))
+                try:
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+                except OSError:
+                    continue
+    return digest.hexdigest()
+
+
+def probe_target_fingerprint(base_url: str, timeout: float = 5.0) -> str:
+    """
+    对目标首页做一次轻量请求，用 ETag / Last-Modified 等响应头生成目标指纹。
+    目标重新部署后这些头通常会变化，从而让扫描缓存失效。
+
+    探测失败时返回空字符串（只靠其他部件区分缓存）。
+    """
+    try:
+        req = Request(base_url, method="HEAD", headers={"User-Agent": "PTAgent/1.0 (Automated Pentest Research)"})
+        with urlopen(req, timeout=timeout) as resp:
+            headers = resp.headers
+            parts = {
+                "status": resp.status,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "server": headers.get("Server"),
+            }
+    except Exception:
+        return ""
+
+    # 没有任何可用的版本信号时，不要让 status/server 单独构成“指纹”
+    if not parts["etag"] and not parts["last_modified"]:
+        return ""
+    return hash_parts(parts)
+
+
+# =================================================
+# 缓存本体
+# =================================================
+@dataclass
+class CacheEntry:
+    """磁盘上的一个缓存文件。"""
+    path: str
+    target_hash: str
+    key_hash: str
+    phase: str
+    mtime: float
+    size: int
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.mtime
+
+
+class PhaseCache:
+    """
+    分阶段 pickle 缓存，支持按阶段键命中、TTL 过期和选择性失效。
+    """
+
+    def __init__(
+            self,
+            cache_dir: str,
+            base_url: Optional[str] = None,
+            ttls: Optional[Dict[str, Optional[int]]] = None,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.ttls: Dict[str, Optional[int]] = {**DEFAULT_TTLS, **(ttls or {})}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # ---------- 命名 ----------
+    @staticmethod
+    def target_hash(base_url: str) -> str:
+        return hashlib.sha256(base_url.encode("utf-8")).hexdigest()[:16]
+
+    def _path(self, phase: str, key: str) -> str:
+        return os.path.join(self.cache_dir, self.entry_name(phase, key))
+
+    def entry_name(self, phase: str, key: str) -> str:
+        """缓存条目的文件名（也是 ResponseBodyStore 中钉住响应体的 owner）。"""
+        return f"{self.target_hash(self._require_base_url())}_{key[:16]}_{phase}.pkl"
+
+    def _require_base_url(self) -> str:
+        if not self.base_url:
+            raise ValueError("PhaseCache needs a base_url for load/save operations.")
+        return self.base_url
+
+    # ---------- 读写 ----------
+    def load(self, phase: str, key: str) -> Any | None:
+        """按阶段键加载缓存；不存在、过期或损坏都返回 None。"""
+        path = self._path(phase, key)
+        if not os.path.exists(path):
+            return None
+
+        ttl = self.ttls.get(phase)
+        age = time.time() - os.path.getmtime(path)
+        if ttl and ttl > 0 and age > ttl:
+            print(f"[*] 缓存 '{phase}' 已过期 ({age / 3600:.1f}h > {ttl / 3600:.1f}h)，将重新运行。")
+            self._remove(path)
+            return None
+
+        print(f"[*] 尝试加载缓存数据 for '{phase}'...")
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            print(f"[+] 成功加载缓存 for '{phase}'.")
+            return data
+        except Exception as e:
+            print(f"[WARN] 加载缓存失败 ({e})，文件可能已损坏，将重新运行。")
+            self._remove(path)
+            return None
+
+    def save(self, phase: str, key: str, data: Any) -> None:
+        """保存阶段结果，并级联清除依赖该阶段的下游缓存。"""
+        path = self._path(phase, key)
+        print(f"[*] 正在保存 '{phase}' 结果到缓存: {path}")
+        try:
+            with open(path, "wb") as f:
+                pickle.dump(data, f)
+        except Exception as e:
+            print(f"[WARN] 缓存保存失败: {e}")
+            return
+
+        # 上游结果已刷新，基于旧结果算出的下游缓存不再可信
+        for dependent in PHASE_DEPENDENTS.get(phase, []):
+            self.invalidate(phase=dependent, target=self.base_url)
+
+    # ---------- 查询与失效 ----------
+    def entries(self, phase: Optional[str] = None, target: Optional[str] = None) -> List[CacheEntry]:
+        """列出缓存目录中符合条件的条目（忽略旧格式的文件）。"""
+        wanted_target = self.target_hash(target) if target else None
+        result: List[CacheEntry] = []
+
+        for name in sorted(os.listdir(self.cache_dir)):
+            if not name.endswith(".pkl"):
+                continue
+            parts = name[:-len(".pkl")].split("_", 2)
+            if len(parts) != 3 or parts[2] not in PHASES:
+                continue
+            target_hash, key_hash, entry_phase = parts
+            if phase and entry_phase != phase:
+                continue
+            if wanted_target and target_hash != wanted_target:
+                continue
+
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            result.append(CacheEntry(
+                path=path,
+                target_hash=target_hash,
+                key_hash=key_hash,
+                phase=entry_phase,
+                mtime=stat.st_mtime,
+                size=stat.st_size,
+            ))
+        return result
+
+    def invalidate(self, phase: Optional[str] = None, target: Optional[str] = None, cascade: bool = True) -> int:
+        """
+        删除某个阶段（可限定目标）的全部缓存，返回删除的文件数。
+        cascade=True 时一并删除下游阶段。
+        """
+        phases: Iterable[str] = [phase] if phase else PHASES
+        removed = 0
+        for p in phases:
+            for entry in self.entries(phase=p, target=target):
+                removed += self._remove(entry.path)
+            if cascade and phase:
+                for dependent in PHASE_DEPENDENTS.get(p, []):
+                    removed += self.invalidate(phase=dependent, target=target, cascade=True)
+        return removed
+
+    def prune_expired(self) -> int:
+        """删除所有已超过 TTL 的缓存文件。"""
+        now = time.time()
+        removed = 0
+        for entry in self.entries():
+            ttl = self.ttls.get(entry.phase)
+            if ttl and ttl > 0 and entry.age(now) > ttl:
+                removed += self._remove(entry.path)
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+
+def sweep_bodies(cache: PhaseCache, store: Any = None) -> int:
+    """
+    回收不再被任何 scan_result 缓存条目引用的响应体，返回删除的文件数。
+    store: 正在使用的 ResponseBodyStore（保留其进程内引用）；None 时打开 <cache_dir>/bodies。
+    """
+    if store is None:
+        root = os.path.join(cache.cache_dir, BODY_STORE_DIR)
+        if not os.path.isdir(root):
+            return 0
+        from scanner.body_store import ResponseBodyStore
+        store = ResponseBodyStore(root)
+    live = [os.path.basename(entry.path) for entry in cache.entries(phase="scan_result")]
+    return store.sweep(live)
+
+
+# =================================================
+# 命令行入口
+# =================================================
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect and invalidate PTAgent phase caches.")
+    parser.add_argument("--cache-dir", default="ptagent_cache", help="缓存目录 (默认: ptagent_cache)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("list", help="列出缓存条目")
+    p_list.add_argument("--target", help="只列出该 base_url 的缓存")
+    p_list.add_argument("--phase", choices=PHASES)
+
+    p_inv = sub.add_parser("invalidate", help="删除指定阶段的缓存")
+    p_inv.add_argument("--target", help="只删除该 base_url 的缓存")
+    p_inv.add_argument("--phase", choices=PHASES, help="不指定则删除所有阶段")
+    p_inv.add_argument("--no-cascade", action="store_true", help="不级联删除下游阶段")
+
+    sub.add_parser("prune", help="删除所有已过期的缓存")
+
+    args = parser.parse_args(argv)
+    cache = PhaseCache(args.cache_dir)
+
+    if args.command == "list":
+        now = time.time()
+        entries = cache.entries(phase=args.phase, target=args.target)
+        for entry in entries:
+            ttl = cache.ttls.get(entry.phase)
+            expired = bool(ttl and ttl > 0 and entry.age(now) > ttl)
+            print(f"{entry.target_hash}  {entry.phase:<16} key={entry.key_hash}  "
+                  f"age={entry.age(now) / 3600:6.1f}h  size={entry.size:>9}B"
+                  f"{'  [EXPIRED]' if expired else ''}")
+        print(f"[*] {len(entries)} cache entries.")
+
+    elif args.command == "invalidate":
+        removed = cache.invalidate(phase=args.phase, target=args.target, cascade=not args.no_cascade)
+        print(f"[*] Removed {removed} cache files, {sweep_bodies(cache)} response bodies.")
+
+    elif args.command == "prune":
+        removed = cache.prune_expired()
+        print(f"[*] Removed {removed} expired cache files, {sweep_bodies(cache)} response bodies.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,96 @@
 from analysis.asset_triager import AssetTriager
 from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from analysis.priority_model import PriorityModel, append_samples, page_features, read_samples
+from analysis.prompt_packer import PromptPacker
+from analysis.streaming_pipeline import StreamingAnalysisPipeline
 from attacker.exploitation_engine import ExploitationEngine
 from attacker.xss_attacker import XSSAttacker
+from scanner.body_store import site_body_digests
 from scanner.page_asset import AuthCredentials
 from script.scanner.site_scanner import SiteScanner
 import os
-import pickle
-import hashlib # 用于生成基于 URL 的唯一文件名
-from typing import Any # 用于类型提示
+from typing import Any, Dict, Optional, Sequence # 用于类型提示
 
+from agent.phase_cache import (BODY_STORE_DIR, PhaseCache, hash_parts, probe_target_fingerprint,
+                               source_fingerprint, sweep_bodies)
 from utils.browser_manager import BrowserManager
+from scanner.utils.memo import configure_memos
+from utils.llm.cached_client import CachedLLMClient
+from utils.llm.pooled_client import PooledLLMClient
+from utils.llm.resilient_client import ResilientLLMClient
+
+# script/ 目录，用于计算扫描器 / 分析器代码版本
+_SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class PTAgent:
-    def __init__(self, base_url: str, llm_client):
+    def __init__(
+            self,
+            base_url: str,
+            llm_client,
+            max_depth: int = 2,  # 可以先从 1 或 2 开始试
+            cache_dir: str = "ptagent_cache",
+            cache_ttls: Optional[Dict[str, Optional[int]]] = None,
+            fingerprint_target: bool = True,
+            page_token_budget: Optional[int] = None,  # 单页 LLM payload 的 token 预算，None 用默认值，0 不限制
+            in_browser_distill: bool = False,  # 在页面内完成 HTML 清洗 / DOM 蒸馏，只传回精简结果
+            pipelined: bool = False,  # 边爬取边分诊 / 分析（见 analysis/streaming_pipeline.py）
+            analysis_workers: int = 2,  # 同时在途的 LLM 请求数（分阶段分析和流水线模式共用）
+            analysis_queue_size: int = 4,  # 流水线模式下待分析队列上限，满了爬虫等待
+            analysis_token_budget: Optional[int] = None,  # LLM 分析最多消耗的 token（估算），按页面优先级分配
+            analysis_time_budget: Optional[float] = None,  # LLM 分析最多耗时（秒）
+            llm_request_timeout: Optional[float] = None,  # 单个 LLM 请求的超时（秒），超时的条目记为无结果
+            pack_prompts: bool = True,  # 独立 API / 小页面打包进同一个 Prompt（仅分阶段分析）
+            llm_cache_max_mb: Optional[int] = 256,  # 分析阶段 LLM 响应的持久化缓存上限，None / 0 表示不缓存
+            stream_llm_output: bool = True,  # 流式读取 LLM 输出，issue 闭合即解析，JSON 结束即停止生成
+            llm_max_issues: Optional[int] = None,  # 单个页面 / 接口最多保留的 issue 数，达到后停止生成
+            llm_fallbacks: Sequence[Any] = (),  # 主客户端失败 / 熔断时依次尝试的备用客户端（其他后端或模型）
+            llm_max_attempts: int = 3,  # 每个后端的最多尝试次数，可重试错误之间抖动退避
+    ):
         self.base_url = base_url
+        self.llm_client = llm_client
+        self.page_token_budget = page_token_budget
+        self.pipelined = pipelined
+        self.analysis_workers = analysis_workers
+        self.analysis_queue_size = analysis_queue_size
+        self.analysis_token_budget = analysis_token_budget
+        self.analysis_time_budget = analysis_time_budget
+        self.pack_prompts = pack_prompts
+        self.llm_max_issues = llm_max_issues
+
+        # 页面优先级模型：每次运行后用攻击确认的结果重新拟合（见 analysis/priority_model.py）
+        self._priority_model_path = os.path.join(cache_dir, "priority_model.json")
+        self._priority_samples_path = os.path.join(cache_dir, "priority_samples.jsonl")
+        self.priority_model = PriorityModel.load(self._priority_model_path)
         self.scanner = SiteScanner(
             base_url=base_url,
-            max_depth=2,  # 可以先从 1 或 2 开始试
+            max_depth=max_depth,
             headless=True,
             same_origin_only=True,
+            body_store_dir=os.path.join(cache_dir, BODY_STORE_DIR),
+            in_browser_distill=in_browser_distill,
+            script_cache_dir=os.path.join(cache_dir, "scripts"),
+        )
+        # 分析阶段的 LLM 响应按 (模型配置, Prompt) 落盘：崩溃后重跑或 analysis_result 失效时只为新 Prompt 付费
+        # 重试 / 熔断 / 回退链（见 utils/llm/resilient_client.py），分析和攻击阶段共用
+        self.llm = ResilientLLMClient([llm_client, *llm_fallbacks], max_attempts=llm_max_attempts)
+        if llm_request_timeout:
+            # 同一个超时也作为 HTTP 超时：否则分析器放弃的请求仍在服务端推理、占着并发名额
+            self.llm.set_timeout(llm_request_timeout)
+        self.llm_cache = CachedLLMClient(
+            self.llm,
+            os.path.join(cache_dir, "llm_responses.sqlite3"),
+            max_bytes=llm_cache_max_mb * 1024 * 1024,
+        ) if llm_cache_max_mb else None
+        self.llm_analyzer = OwaspTop10LLMAnalyzer(
+            self.llm_cache or self.llm,
+            max_in_flight=analysis_workers,
+            request_timeout=llm_request_timeout,
+            packer=PromptPacker() if pack_prompts else None,
+            stream_output=stream_llm_output,
+            max_issues_per_item=llm_max_issues,
+            on_issue=self._on_issue,
         )
-        self.llm_analyzer = OwaspTop10LLMAnalyzer(llm_client)
         # self.browser = browser_manager
 
         # --- NEW: 实例化 ExploitationEngine ---
@@ -33,15 +102,18 @@ class PTAgent:
 
         # 2. 实例化攻击执行引擎
         self.exploitation_engine = ExploitationEngine(
-            llm_proxy=llm_client,
+            llm_proxy=self.llm,
             attacker_classes=attacker_classes
         )
 
         # --- NEW: 缓存配置 ---
-        self._cache_dir = "ptagent_cache"
-        os.makedirs(self._cache_dir, exist_ok=True)
-        # 使用 base_url 的哈希值作为缓存文件的唯一前缀
-        self._cache_key = self._get_cache_key(base_url)
+        # 每个阶段的缓存键覆盖影响该阶段结果的全部输入，TTL 见 phase_cache.DEFAULT_TTLS
+        self._cache = PhaseCache(cache_dir, base_url=base_url, ttls=cache_ttls)
+        # HTML 清洗 / DOM 蒸馏结果按内容哈希落盘，扫描缓存失效重跑时同样的 HTML 不再重复处理
+        configure_memos(persist_dir=os.path.join(cache_dir, "memo"))
+        # 缓存键在 run() 第一次查缓存时才计算：目标指纹要发 HEAD 请求，构造 PTAgent 本身不碰网络
+        self._fingerprint_target = fingerprint_target
+        self._cache_keys: Optional[Dict[str, str]] = None
 
     def run(self):
         print(f"[*] Initializing PTAgent for target: {self.base_url}")
@@ -65,8 +137,17 @@ class PTAgent:
         # Step 1: 游客视角扫描 (Guest Scan)
         # =================================================
         site_asset = self._load_cache("scan_result")
+        triaged_data = None
+        analysis_result = None
+
+        if site_asset is None and self.pipelined and self.llm_analyzer and self._load_cache("analysis_result") is None:
+            print("\n[Phase 1+3+4] Starting Guest Scan with streaming triage / LLM analysis...")
+            site_asset, triaged_data, analysis_result = self._scan_and_analyze_streaming()
 
-        if site_asset is None:
+            # 先存扫描结果（会级联清掉旧的分析缓存），再存分析结果
+            self._save_cache(site_asset, "scan_result")
+            self._save_analysis_result(analysis_result)
+        elif site_asset is None:
             print("\n[Phase 1] Starting Guest Scan...")
 
             # --- 执行扫描 ---
@@ -99,14 +180,19 @@ class PTAgent:
             print()
 
         # Step 3. 分诊 (Triage)
-        triager = AssetTriager(site_asset)
-        triaged_data = triager.triage()
+        if triaged_data is None:
+            triager = AssetTriager(site_asset, page_token_budget=self.page_token_budget,
+                                   priority_model=self.priority_model,
+                                   compact_context=self.llm_analyzer.compact_context)
+            triaged_data = triager.triage()
 
         print(f"分诊完成:")
         print(f"- 交互型页面: {len(triaged_data['interactive'])}")
         print(f"- 线索型页面: {len(triaged_data['clues'])}")
         print(f"- 纯文本、无交互页面: {len(triaged_data['static'])}")
         print(f"- 独立 API: {len(triaged_data['standalone_apis'])}")
+        print(f"- 公共布局块: {len(triaged_data['site_layout'])}")
+        print(f"- 近似重复页面(沿用代表页结论): {len(triaged_data.get('near_duplicates', []))}")
 
         # # Step 4. 智能分析 (LLM Analysis)
         # # 如果你初始化了 llm_analyzer
@@ -114,17 +200,26 @@ class PTAgent:
         #     print("\n[Phase 4] Starting LLM Vulnerability Analysis...")
         #     analysis_result = self.llm_analyzer.analyze(triaged_data)
         # Step 4. 智能分析 (LLM Analysis)
-        analysis_result = self._load_cache("analysis_result")
+        if analysis_result is None:
+            analysis_result = self._load_cache("analysis_result")
+            analysis_from_cache = analysis_result is not None
+        else:
+            analysis_from_cache = False
 
         if analysis_result is None:
             if self.llm_analyzer:
                 print("\n[Phase 4] Starting LLM Vulnerability Analysis...")
 
                 # --- 执行分析 ---
-                analysis_result = self.llm_analyzer.analyze(triaged_data)
+                analysis_result = self.llm_analyzer.analyze(
+                    triaged_data,
+                    token_budget=self.analysis_token_budget,
+                    time_budget=self.analysis_time_budget,
+                )
 
                 # --- 缓存分析结果 ---
-                self._save_cache(analysis_result, "analysis_result")
+                self._save_analysis_result(analysis_result)
+                self._print_llm_stats()
             else:
                 print("[FATAL] LLM Analyzer not initialized. Skipping Phase 4.")
                 return  # 无法继续
@@ -157,6 +252,7 @@ class PTAgent:
             return
 
         all_attack_results = []
+        confirmed_urls = set()
 
         # --- 遍历 LLM 发现的问题并执行攻击 ---
         for issue in analysis_result.issues:
@@ -182,6 +278,7 @@ class PTAgent:
                 all_attack_results.append(attack_result)
 
                 if attack_result.success:
+                    confirmed_urls.add(issue.propagated_from or issue.location)
                     print(f"[!!! XSS FOUND !!!] PoC: {attack_result.proof_of_concept[:50]}...")
                     print(f"  Details: {attack_result.details}")
                 else:
@@ -190,10 +287,80 @@ class PTAgent:
         print("-" * 50)
         print(f"--- Phase 5 Finished. Total attacks run: {len(all_attack_results)} ---")
 
+        if analysis_from_cache:
+            # 这些页面的样本在产生该分析结果的那次运行里已经记录过
+            print("[*] Analysis loaded from cache; priority model samples not recorded again")
+        else:
+            self._update_priority_model(site_asset, triaged_data, analysis_result, confirmed_urls)
+
         # --- 攻击全部结束后，关闭浏览器资源 ---
         self.scanner.close()
 
 
+    def _save_analysis_result(self, analysis_result) -> None:
+        """
+        有条目因 LLM 请求失败而没有结果时不缓存，下次运行重新分析（成功的响应仍在 LLM 响应缓存里）。
+        有条目由备用后端回答时同样不缓存：分析缓存键取的是主客户端的模型配置。
+        """
+        if analysis_result.failed:
+            print(f"[WARN] {len(analysis_result.failed)} items failed LLM analysis; analysis result not cached")
+            return
+        if self.llm.stats()["fallback_successes"]:
+            print("[WARN] Some items were answered by fallback LLM backends; analysis result not cached")
+            return
+        self._save_cache(analysis_result, "analysis_result")
+
+    def _print_llm_stats(self) -> None:
+        if self.llm_cache:
+            print(f"[*] LLM response cache: {self.llm_cache.stats()}")
+        print(f"[*] LLM backends: {self.llm.stats()}")
+        for backend in self.llm.backends:
+            if isinstance(backend.client, PooledLLMClient):
+                for endpoint in backend.client.stats():
+                    print(f"    - {endpoint}")
+
+    @staticmethod
+    def _on_issue(issue) -> None:
+        """LLM 输出中每解析出一个 issue 立即打印（分析可能还要持续很久）。"""
+        print(f"[+] Issue: [{issue.owasp_category}] {issue.location} (Confidence: {issue.confidence})")
+
+    def _update_priority_model(self, site_asset, triaged_data, analysis_result, confirmed_urls) -> None:
+        """
+        把本次分析过的交互型页面记为训练样本（攻击确认漏洞为 1，否则为 0），
+        用历次运行的全部样本重新拟合优先级模型并落盘。
+        因预算跳过（skipped）或 LLM 请求失败（failed）的页面没有被分析，不能当作负样本：
+        低优先级页面被跳过后再记为 0，模型只会强化自己的先验。
+        """
+        unanalyzed = set(analysis_result.skipped) | set(analysis_result.failed)
+        urls = [p["url"] for p in triaged_data.get("interactive", []) if p["url"] not in unanalyzed]
+        samples = [
+            (url, page_features(site_asset.pages[url], site_asset), url in confirmed_urls)
+            for url in urls if url in site_asset.pages
+        ]
+        if not samples:
+            return
+        append_samples(self._priority_samples_path, samples)
+        history = read_samples(self._priority_samples_path)
+        self.priority_model.fit(history).save(self._priority_model_path)
+        positives = sum(label for _, label in history)
+        print(f"[*] Priority model refit on {len(history)} pages ({positives} confirmed)")
+
+    def _scan_and_analyze_streaming(self):
+        """
+        流水线模式：页面在爬取过程中就进入分诊和 LLM 分析，返回 (site_asset, triaged_data, analysis_result)。
+        """
+        pipeline = StreamingAnalysisPipeline(
+            self.llm_analyzer,
+            workers=self.analysis_workers,
+            queue_size=self.analysis_queue_size,
+            page_token_budget=self.page_token_budget,
+            priority_model=self.priority_model,
+        )
+        site_asset = self.scanner.scan(on_page=pipeline.feed)
+        triaged_data, analysis_result = pipeline.finish(site_asset)
+        self._print_llm_stats()
+        return site_asset, triaged_data, analysis_result
+
     def _prompt_for_credentials(self) -> AuthCredentials | None:
         """
         在控制台提示用户输入凭证。
@@ -258,37 +425,73 @@ class PTAgent:
     # =================================================
     # 辅助方法：缓存管理
     # =================================================
-    def _get_cache_key(self, base_url: str) -> str:
-        """根据 base_url 生成一个一致且安全的缓存键。"""
-        # 使用 SHA256 确保 URL 中包含的特殊字符不会影响文件名
-        return hashlib.sha256(base_url.encode('utf-8')).hexdigest()
+    def _build_cache_keys(self, fingerprint_target: bool) -> Dict[str, str]:
+        """
+        为每个阶段生成缓存键：
+          - auth_creds: 只取决于目标
+          - scan_result: 扫描配置 + 扫描器代码版本 + 目标指纹
+          - analysis_result: 扫描键 + 模型/后端 + Prompt 版本 + 页面 token 预算 + 是否流水线 + 分析器代码版本
+        """
+        scanner_config = {
+            "base_url": self.scanner.base_url,
+            "max_depth": self.scanner.max_depth,
+            "same_origin_only": self.scanner.same_origin_only,
+            "in_browser_distill": self.scanner.in_browser_distill,
+        }
+        target_fp = probe_target_fingerprint(self.base_url) if fingerprint_target else ""
+        scan_key = hash_parts(
+            "scan_result",
+            scanner_config,
+            source_fingerprint(os.path.join(_SCRIPT_DIR, "scanner")),
+            target_fp,
+        )
 
-    def _get_cache_path(self, step: str) -> str:
-        """返回特定步骤的缓存文件完整路径。"""
-        # 文件名格式: <URL哈希>_<步骤名>.pkl
-        return os.path.join(self._cache_dir, f"{self._cache_key}_{step}.pkl")
+        llm_config = {
+            "client": type(self.llm_client).__name__,
+            "backend": getattr(self.llm_client, "backend", None),
+            "model": getattr(self.llm_client, "model", None),
+            "temperature": getattr(self.llm_client, "temperature", None),
+            "system_prompt": getattr(self.llm_client, "system_prompt", None),
+        }
+        analysis_key = hash_parts(
+            "analysis_result",
+            scan_key,
+            llm_config,
+            OwaspTop10LLMAnalyzer.PROMPT_VERSION,
+            self.page_token_budget,
+            self.pipelined,
+            self.pack_prompts,
+            self.llm_max_issues,
+            # 有预算时，模型权重决定哪些页面被分析
+            (self.analysis_token_budget, self.analysis_time_budget,
+             self.priority_model.to_dict() if (self.analysis_token_budget or self.analysis_time_budget) else None),
+            source_fingerprint(os.path.join(_SCRIPT_DIR, "analysis")),
+        )
+
+        return {
+            "auth_creds": hash_parts("auth_creds", self.base_url),
+            "scan_result": scan_key,
+            "analysis_result": analysis_key,
+        }
+
+    def _cache_key(self, step: str) -> str:
+        if self._cache_keys is None:
+            self._cache_keys = self._build_cache_keys(self._fingerprint_target)
+        return self._cache_keys[step]
 
     def _load_cache(self, step: str) -> Any | None:
-        """尝试加载缓存数据。"""
-        path = self._get_cache_path(step)
-        if os.path.exists(path):
-            print(f"[*] 尝试加载缓存数据 for '{step}'...")
-            try:
-                with open(path, 'rb') as f:
-                    data = pickle.load(f)
-                print(f"[+] 成功加载缓存 for '{step}'.")
-                return data
-            except Exception as e:
-                print(f"[WARN] 加载缓存失败 ({e})，文件可能已损坏，将重新运行。")
-                os.remove(path)  # 移除损坏的缓存文件
-        return None
+        """尝试加载缓存数据（键不匹配、过期或损坏时返回 None）。"""
+        return self._cache.load(step, self._cache_key(step))
 
     def _save_cache(self, data: Any, step: str):
-        """保存数据到缓存文件。"""
-        path = self._get_cache_path(step)
-        print(f"[*] 正在保存 '{step}' 结果到缓存: {path}")
-        try:
-            with open(path, 'wb') as f:
-                pickle.dump(data, f)
-        except Exception as e:
-            print(f"[WARN] 缓存保存失败: {e}")
\ No newline at end of file
+        """
+        保存数据到缓存文件，并级联清除下游阶段的旧缓存。
+        保存扫描结果时钉住它引用的响应体，并回收不再被任何扫描缓存引用的响应体（旧扫描、已失效 / 过期的条目）。
+        """
+        self._cache.save(step, self._cache_key(step), data)
+        if step == "scan_result":
+            store = self.scanner.body_store
+            store.pin(self._cache.entry_name(step, self._cache_key(step)), site_body_digests(data))
+            removed = sweep_bodies(self._cache, store)
+            if removed:
+                print(f"[*] Removed {removed} unreferenced response bodies")
@@ -1,11 +1,18 @@
 # script/processor/asset_triager.py
 
 from __future__ import annotations
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import asdict
+import json
+import logging
 
 # 假设你的 page_asset 定义在 script.scanner.page_asset
 from scanner.page_asset import SiteAsset, PageAsset, ApiCall
+from analysis.compact_encoder import encode_context
+from analysis.context_compressor import ContextCompressor, CompressionConfig, estimate_tokens
+from analysis.layout_dedup import LayoutDeduplicator
+from analysis.near_dup import NearDuplicateClusterer
+from analysis.priority_model import PriorityModel
 
 
 class AssetTriager:
@@ -16,17 +23,57 @@ class AssetTriager:
     1. 接收 Scanner 生成的 SiteAsset (Raw Data)。
     2. 基于启发式逻辑 (Heuristics) 对 PageAsset 进行分类 (Interactive / Clue / Static)。
     3. 对不同类别的资产进行序列化 (Serialization)，生成适合喂给 LLM 的精简 JSON 上下文。
+    4. 按 token 预算压缩交互型页面的 structure_snapshot，避免大页面撑爆模型上下文。
+    5. 把跨页面重复的公共布局（导航栏 / 页脚等）提取到站点级 site_layout，页面里只留占位符；
+       布局里的输入框随布局块分析，布局块按单页 token 预算分成多个 Prompt（site_layout_batches）。
+    6. 同一模板渲染的近似重复交互页（商品页、用户主页等）只保留一个代表页送去分析，
+       其余页面记入 near_duplicates，分析结论由 OwaspTop10LLMAnalyzer 复制过去。
+    7. 用 PriorityModel 给交互型页面打 priority 分，LLM 预算不足时分析器按分数从高到低处理。
     """
 
-    def __init__(self, site_asset: SiteAsset):
+    def __init__(self, site_asset: SiteAsset, page_token_budget: Optional[int] = None,
+                 compression_config: Optional[CompressionConfig] = None,
+                 dedupe_layout: bool = True,
+                 layout_deduplicator: Optional[LayoutDeduplicator] = None,
+                 dedupe_similar: bool = True,
+                 near_dup_max_distance: int = 6,
+                 priority_model: Optional[PriorityModel] = None,
+                 compact_context: bool = True):
         self.site_asset = site_asset
+        self.logger = logging.getLogger("AssetTriager")
+
+        # 交互型页面的优先级打分（默认使用人工先验权重）
+        self.priority_model = priority_model or PriorityModel()
+
+        # 近似重复页面聚类（在去掉公共布局后的 HTML 上计算 SimHash）
+        self.near_dup = NearDuplicateClusterer(max_distance=near_dup_max_distance) if dedupe_similar else None
+        # 代表页 URL -> 其输入框，用于把结论里的 related_input_id 映射到成员页
+        self._rep_inputs: Dict[str, List[Any]] = {}
+
+        # 公共布局去重；关闭时页面 payload 保留完整 cleaned_html
+        self.layout = (layout_deduplicator or LayoutDeduplicator()) if dedupe_layout else None
+        # fit 布局时的页面，布局块的输入框从其中的样本页取
+        self._layout_pages: Dict[str, PageAsset] = {}
+
+        # 单页 payload 的 token 预算；None 时使用 CompressionConfig 的默认值，<= 0 表示不限制
+        self.compression_config = compression_config or CompressionConfig()
+        if page_token_budget is not None:
+            self.compression_config.page_token_budget = page_token_budget
+        self.compressor = ContextCompressor(self.compression_config)
+        # 估算 payload 大小时按 Prompt 中实际的序列化方式（与 OwaspTop10LLMAnalyzer 的 compact_context 一致）
+        self.compact_context = compact_context
+        # 去掉快照后仍放不进预算的页面
+        self.over_budget_pages: List[str] = []
 
         # 分诊结果容器
         self.buckets = {
             "interactive": [],  # 交互型：表单、登录、功能页
             "clues": [],  # 线索型：报错、配置泄露、目录索引
             "static": [],  # 静态型：纯文本、无交互页面
-            "standalone_apis": []  # 纯 API：爬虫发现的独立接口
+            "standalone_apis": [],  # 纯 API：爬虫发现的独立接口
+            "site_layout": [],  # 公共布局：多个页面共享的子树，每个站点只分析一次
+            "site_layout_batches": [],  # site_layout 按单页 token 预算分成的 Prompt 批次
+            "near_duplicates": []  # 近似重复的交互页：不单独分析，沿用代表页的结论
         }
 
     def triage(self) -> Dict[str, List[Dict[str, Any]]]:
@@ -34,19 +81,42 @@ class AssetTriager:
         执行分诊逻辑的主入口。
         返回一个字典，包含分类且序列化后的数据，可直接作为 Prompt Context。
         """
+        # 0. 提取跨页面的公共布局
+        if self.layout:
+            self.layout.fit({url: page.cleaned_html for url, page in self.site_asset.pages.items()})
+            self._layout_pages = dict(self.site_asset.pages)
+            self._update_layout_buckets()
+
         # 1. 处理所有页面
-        for url, page in self.site_asset.pages.items():
-            category = self._classify_page(page)
-            serialized_data = self._serialize_page(page, category)
-            self.buckets[category].append(serialized_data)
+        for page in self.site_asset.pages.values():
+            self._triage_page(page)
 
         # 2. 处理独立发现的 API (discovered_apis)
         # 这些通常都是高价值的 API 端点
         for api in self.site_asset.discovered_apis:
-            self.buckets["standalone_apis"].append(self._serialize_api(api))
+            self._triage_api(api)
 
         return self.buckets
 
+    def _triage_page(self, page: PageAsset) -> Tuple[str, Dict[str, Any]]:
+        """分类 + 序列化单个页面并放入对应分桶，返回 (类别, payload)。"""
+        category = self._classify_page(page)
+        if category == "interactive" and self.near_dup:
+            representative = self.near_dup.add(page.url, self._page_html(page))
+            if representative is not None:
+                duplicate = self._serialize_duplicate(page, representative)
+                self.buckets["near_duplicates"].append(duplicate)
+                return "near_duplicates", duplicate
+            self._rep_inputs[page.url] = page.inputs
+        serialized_data = self._serialize_page(page, category)
+        self.buckets[category].append(serialized_data)
+        return category, serialized_data
+
+    def _triage_api(self, api: ApiCall) -> Tuple[str, Dict[str, Any]]:
+        serialized_data = self._serialize_api(api)
+        self.buckets["standalone_apis"].append(serialized_data)
+        return "standalone_apis", serialized_data
+
     # ==========================================
     # 核心逻辑：分类 (Classification)
     # ==========================================
@@ -132,13 +202,15 @@ class AssetTriager:
         # --- A. 交互型：提供全量上下文 ---
         if category == "interactive":
             is_login = self._is_login_page(page)
-            return {
+            payload = {
                 **base_info,
                 "is_login_page": is_login,
                 # 清洗后的 HTML 是理解页面结构的 best representation
-                "structure_snapshot": page.cleaned_html,
-                # 显式列出输入点，方便 LLM 引用 ID
-                "inputs": [asdict(i) for i in page.inputs],
+                # （公共布局已替换为 <!-- layout:Lx --> 占位符，超出预算时再压缩）
+                "structure_snapshot": self._page_html(page),
+                "layout_refs": self._layout_refs(page),
+                # 显式列出输入点，方便 LLM 引用 ID（布局块里的输入框在 site_layout 中分析）
+                "inputs": [asdict(i) for i in self._page_inputs(page)],
                 # 列出已触发的 API，作为因果关系参考
                 "observed_traffic": [
                     {
@@ -149,15 +221,18 @@ class AssetTriager:
                     for api in page.api_calls
                 ],
                 # 提示：如果是登录页，LLM 应该重点关注
-                "analysis_goal": "Check for SQLi, XSS, and Authentication Bypass." if is_login else "Check for Input Validation flaws and Logic vulnerabilities."
+                "analysis_goal": "Check for SQLi, XSS, and Authentication Bypass." if is_login else "Check for Input Validation flaws and Logic vulnerabilities.",
+                # PriorityModel 打分，预算有限时分析器按它排序
+                "priority": round(self.priority_model.score_page(page, self.site_asset), 4),
             }
+            return self._fit_to_budget(payload, page)
 
         # --- B. 线索型：提供信息泄露证据 ---
         elif category == "clues":
             return {
                 **base_info,
                 # 报错页面通常包含 HTML 里的文字堆栈
-                "error_content_sample": page.cleaned_html[:2000] if page.cleaned_html else "",
+                "error_content_sample": (self._page_html(page) or "")[:2000],
                 "comments": page.comments,
                 # 这种页面通常没有 inputs，不需要传
                 "analysis_goal": "Identify Information Disclosure, Stack Traces, or Hidden Configs."
@@ -170,9 +245,96 @@ class AssetTriager:
                 "note": "Likely static content. Low priority."
             }
 
+    def _serialize_duplicate(self, page: PageAsset, representative: str) -> Dict[str, Any]:
+        """近似重复页：记录代表页，以及代表页输入框 ID -> 本页同名输入框 ID 的映射。"""
+        own_ids = {(i.tag, i.name): i.internal_id for i in page.inputs if i.name}
+        input_map = {}
+        for rep_input in self._rep_inputs.get(representative, []):
+            member_id = own_ids.get((rep_input.tag, rep_input.name))
+            if member_id is not None:
+                input_map[rep_input.internal_id] = member_id
+        return {
+            "url": page.url,
+            "title": page.title,
+            "representative": representative,
+            "distance": self.near_dup.distance_to_representative(page.url),
+            "input_map": input_map,
+        }
+
+    def _page_html(self, page: PageAsset) -> Optional[str]:
+        """去掉公共布局后的页面 HTML（未开启去重时就是 cleaned_html）。"""
+        if not self.layout:
+            return page.cleaned_html
+        return self.layout.page_specific_html(page.url, page.cleaned_html)
+
+    def _layout_refs(self, page: PageAsset) -> List[str]:
+        return self.layout.page_block_ids(page.url) if self.layout else []
+
+    def _page_inputs(self, page: PageAsset) -> List[Any]:
+        """页面自己的输入框：去掉属于公共布局块的（如全局搜索框），它们随 site_layout 分析一次。"""
+        if not self.layout:
+            return page.inputs
+        return self._split_inputs(page)[0]
+
+    def _split_inputs(self, page: PageAsset) -> Tuple[List[Any], Dict[str, List[Any]]]:
+        """
+        按布局去重时记下的 DOM 位置拆分页面输入框，返回 (页面自己的, 块 ID -> 该块内的)。
+        页面表单里与布局输入框同名的控件不受影响。
+        """
+        positions = self.layout.layout_input_positions(page.url)
+        if not positions:
+            return page.inputs, {}
+        own: List[Any] = []
+        in_blocks: Dict[str, List[Any]] = {}
+        ordinals: Dict[Tuple[str, Optional[str], Optional[str]], int] = {}
+        for inp in page.inputs:
+            block_id = None
+            # 只有 DOM 控件参与编号（URL 参数等不在 HTML 里）
+            if inp.source == "dom":
+                key = (inp.tag, inp.name, inp.dom_id)
+                ordinal = ordinals.get(key, 0)
+                ordinals[key] = ordinal + 1
+                block_id = positions.get(key, {}).get(ordinal)
+            if block_id is None:
+                own.append(inp)
+            else:
+                in_blocks.setdefault(block_id, []).append(inp)
+        return own, in_blocks
+
+    def _update_layout_buckets(self) -> None:
+        """
+        生成 site_layout / site_layout_batches：
+        每个块带上首个样本页上属于它的输入框（LLM 用 related_input_id 引用，分析器据此换成该页 URL），
+        再按 page_token_budget 分批，单个块超出预算时压缩它的 html。
+        """
+        budget = self.compression_config.page_token_budget
+        batches: List[List[Dict[str, Any]]] = []
+        used = 0
+        for block in self.layout.blocks:
+            payload = block.to_dict()
+            sample = self._layout_pages.get(block.sample_pages[0]) if block.sample_pages else None
+            block_inputs = self._split_inputs(sample)[1].get(block.block_id, []) if sample else []
+            payload["inputs"] = [asdict(i) for i in block_inputs]
+
+            cost = self._payload_tokens(payload)
+            if budget and budget > 0 and cost > budget:
+                overhead = cost - estimate_tokens(payload["html"])
+                payload["html"], fmt = self.compressor.compress(payload["html"], budget - overhead)
+                if fmt != ContextCompressor.SNAPSHOT_FULL:
+                    payload["html_format"] = fmt
+                cost = self._payload_tokens(payload)
+            if batches and (not budget or budget <= 0 or used + cost <= budget):
+                batches[-1].append(payload)
+                used += cost
+            else:
+                batches.append([payload])
+                used = cost
+        self.buckets["site_layout"] = [payload for batch in batches for payload in batch]
+        self.buckets["site_layout_batches"] = batches
+
     def _serialize_api(self, api: ApiCall) -> Dict[str, Any]:
         """序列化独立 API"""
-        return {
+        data = {
             "type": "standalone_api_endpoint",
             "url": api.url,
             "method": api.method,
@@ -180,4 +342,136 @@ class AssetTriager:
             # 如果有响应体（比如报错信息），也是重要线索
             "response_snippet": api.response_body[:500] if api.response_body else None,
             "analysis_goal": "Infer API usage. Try to construct a valid request (e.g., convert GET to POST)."
-        }
\ No newline at end of file
+        }
+        # JS 调用点提取出的接口：调用方式已知，直接给出参数名
+        if api.meta.get("discovered_by") == "js_call_site":
+            data["source"] = f"js_call_site:{api.meta.get('client')}"
+            data["param_keys"] = api.meta.get("param_keys", [])
+            data["body_keys"] = api.meta.get("body_keys", [])
+        return data
+
+    # ==========================================
+    # Token 预算 (Context Budget)
+    # ==========================================
+    def _fit_to_budget(self, payload: Dict[str, Any], page: PageAsset) -> Dict[str, Any]:
+        """
+        让交互型页面的 payload 落在 page_token_budget 以内：
+        先算出除 snapshot 以外部分的开销，剩余预算交给 ContextCompressor 压缩 snapshot；
+        拼好后按 Prompt 的序列化方式复核（转义等会让 snapshot 变大），超出的部分从 snapshot 预算里扣掉重来。
+        其他字段本身就超预算时省略 snapshot 并告警。
+        """
+        budget = self.compression_config.page_token_budget
+        if not budget or budget <= 0:
+            return payload
+
+        snapshot = payload.pop("structure_snapshot") or ""
+        overhead = self._payload_tokens(payload)
+
+        # 其他字段本身就超预算时，优先丢弃靠后的流量样本，给 snapshot 留出最低预算
+        min_snapshot = self.compression_config.min_snapshot_tokens
+        traffic = payload["observed_traffic"]
+        while traffic and overhead > budget - min_snapshot:
+            traffic.pop()
+            payload["observed_traffic_truncated"] = True
+            overhead = self._payload_tokens(payload)
+
+        if overhead >= budget:
+            self.over_budget_pages.append(page.url)
+            self.logger.warning(f"{page.url}: payload without snapshot needs ~{overhead} tokens, "
+                                f"over page_token_budget={budget}; snapshot omitted")
+            return self._with_snapshot(payload, "", ContextCompressor.SNAPSHOT_OMITTED)
+        if overhead > budget - min_snapshot:
+            self.over_budget_pages.append(page.url)
+            self.logger.warning(f"{page.url}: only {budget - overhead} tokens left for the snapshot "
+                                f"(min_snapshot_tokens={min_snapshot}); payload may exceed page_token_budget={budget}")
+
+        snapshot_budget = budget - overhead
+        while True:
+            compressed, fmt = self.compressor.compress(
+                snapshot,
+                snapshot_budget,
+                distilled_dsl=getattr(page, "distilled_dsl", None),
+            )
+            fitted = self._with_snapshot(payload, compressed, fmt)
+            excess = self._payload_tokens(fitted) - budget
+            if excess <= 0 or snapshot_budget <= min_snapshot:
+                return fitted
+            snapshot_budget = max(min_snapshot, snapshot_budget - excess)
+
+    @staticmethod
+    def _with_snapshot(payload: Dict[str, Any], snapshot: str, fmt: str) -> Dict[str, Any]:
+        # 保持原有字段顺序：snapshot 仍紧跟在 is_login_page 之后
+        fitted: Dict[str, Any] = {}
+        for key, value in payload.items():
+            fitted[key] = value
+            if key == "is_login_page":
+                fitted["structure_snapshot"] = snapshot
+                if fmt != ContextCompressor.SNAPSHOT_FULL:
+                    fitted["snapshot_format"] = fmt
+        return fitted
+
+    def _payload_tokens(self, data: Any) -> int:
+        """按 OwaspTop10LLMAnalyzer._encode 的序列化方式（紧凑编码 + 图例 / 缩进 JSON）估算 token 数。"""
+        if self.compact_context:
+            text, legend = encode_context(data)
+            return estimate_tokens(text + legend)
+        return estimate_tokens(json.dumps(data, indent=2, ensure_ascii=False))
+
+
+class StreamingTriager(AssetTriager):
+    """
+    流式分诊：页面边爬边分诊（配合 SiteScanner.scan(on_page=...)），不必等整站爬完。
+
+    公共布局需要跨页面统计：先缓存前 layout_warmup_pages 个页面，用它们 fit 出布局块，
+    再把这批页面连同 site_layout 一起放出；之后的页面用 LayoutDeduplicator.apply 去掉已知布局块。
+    预热之后才出现的公共布局不会再单独成块（保留在各页面里）。
+
+    add_page / add_apis / finish 都返回本次新产生的 (类别, payload) 列表；
+    site_layout 的 payload 是一批布局块，与 triage()["site_layout_batches"] 中的一项一致。
+    """
+
+    def __init__(self, site_asset: SiteAsset, layout_warmup_pages: int = 5, **kwargs: Any):
+        super().__init__(site_asset, **kwargs)
+        self.layout_warmup_pages = max(1, layout_warmup_pages)
+        self._warmup: List[PageAsset] = []
+        self._layout_fitted = self.layout is None
+        self._api_cursor = 0
+
+    def add_page(self, page: PageAsset) -> List[Tuple[str, Any]]:
+        if not self._layout_fitted:
+            self._warmup.append(page)
+            if len(self._warmup) < self.layout_warmup_pages:
+                return []
+            return self._fit_layout()
+
+        if self.layout:
+            self.layout.apply(page.url, page.cleaned_html)
+        return [self._triage_page(page)]
+
+    def add_apis(self) -> List[Tuple[str, Any]]:
+        """site_asset.discovered_apis 中上次调用之后新增的接口。"""
+        apis = self.site_asset.discovered_apis
+        items = [self._triage_api(api) for api in apis[self._api_cursor:]]
+        self._api_cursor = len(apis)
+        return items
+
+    def finish(self) -> List[Tuple[str, Any]]:
+        """爬取结束：放出仍在预热缓存中的页面和剩余接口。"""
+        items = self._fit_layout() if not self._layout_fitted else []
+        items.extend(self.add_apis())
+        if self.layout:
+            # apply 之后 page_count / sample_pages 有更新
+            self._update_layout_buckets()
+        return items
+
+    def _fit_layout(self) -> List[Tuple[str, Any]]:
+        self._layout_fitted = True
+        pages, self._warmup = self._warmup, []
+        items: List[Tuple[str, Any]] = []
+        if self.layout:
+            self.layout.fit({page.url: page.cleaned_html for page in pages})
+            self._layout_pages = {page.url: page for page in pages}
+            self._update_layout_buckets()
+            items.extend(("site_layout", batch) for batch in self.buckets["site_layout_batches"])
+        items.extend(self._triage_page(page) for page in pages)
+        return items
@@ -0,0 +1,95 @@
+# script/analysis/compact_encoder.py
+"""
+Prompt 上下文的紧凑编码 (Compact Context Encoder)
+
+问题：Prompt 里的上下文用 json.dumps(..., indent=2) 序列化，交互页的 inputs 又是 asdict(InputField) 的全部字段
+（dom_id / placeholder 为 null，meta 为 {} ...）。缩进、空字段和长键名占了相当一部分 prefill token。
+
+编码规则：
+  1. 去掉值为 None / "" / [] / {} 的键（False 和 0 有含义，保留），以及只供本地使用的键（priority）
+  2. 常见长键名换成短键名（structure_snapshot -> snap ...），Prompt 里附一行图例，只列出实际用到的缩写
+  3. 无缩进、无多余空格
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Set, Tuple
+
+
+# 完整键名 -> 短键名；短键名之间、以及与 payload 中其他键名都不能重复
+KEY_ABBREVIATIONS: Dict[str, str] = {
+    "structure_snapshot": "snap",
+    "snapshot_format": "snap_fmt",
+    "observed_traffic": "traffic",
+    "observed_traffic_truncated": "traffic_cut",
+    "body_sample": "body",
+    "is_login_page": "login",
+    "layout_refs": "layouts",
+    "analysis_goal": "goal",
+    "internal_id": "iid",
+    "input_type": "itype",
+    "placeholder": "ph",
+    "css_selector": "sel",
+    "page_url": "page",
+    "response_snippet": "resp",
+    "status_code": "status",
+    "param_keys": "params",
+    "body_keys": "body_fields",
+    "sample_pages": "samples",
+    "page_count": "pages",
+    "error_content_sample": "error_sample",
+}
+
+# 只供本地排序 / 调度使用、不需要发给模型的键
+INTERNAL_KEYS = frozenset({"priority"})
+
+
+def prune(data: Any) -> Any:
+    """递归去掉空值键和内部键。"""
+    if isinstance(data, dict):
+        pruned = {}
+        for key, value in data.items():
+            if key in INTERNAL_KEYS:
+                continue
+            value = prune(value)
+            if value is None or value == "" or value == [] or value == {}:
+                continue
+            pruned[key] = value
+        return pruned
+    if isinstance(data, list):
+        return [prune(item) for item in data]
+    return data
+
+
+def abbreviate(data: Any, used: Set[str]) -> Any:
+    """替换键名，把用到的完整键名记入 used。"""
+    if isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            short = KEY_ABBREVIATIONS.get(key)
+            if short is not None:
+                used.add(key)
+                key = short
+            result[key] = abbreviate(value, used)
+        return result
+    if isinstance(data, list):
+        return [abbreviate(item, used) for item in data]
+    return data
+
+
+def encode_context(data: Any, short_keys: bool = True) -> Tuple[str, str]:
+    """
+    返回 (紧凑 JSON, 图例)。图例形如 'Abbreviated keys: snap=structure_snapshot, iid=internal_id'，
+    没有用到缩写时为空字符串。
+    """
+    data = prune(data)
+    used: Set[str] = set()
+    if short_keys:
+        data = abbreviate(data, used)
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    legend = ""
+    if used:
+        pairs = [f"{KEY_ABBREVIATIONS[key]}={key}" for key in KEY_ABBREVIATIONS if key in used]
+        legend = "Abbreviated keys: " + ", ".join(pairs)
+    return text, legend
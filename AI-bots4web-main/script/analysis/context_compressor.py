@@ -0,0 +1,220 @@
+# script/analysis/context_compressor.py
+"""
+页面上下文压缩器 (Context Compressor)
+
+问题：cleaned_html 直接作为 structure_snapshot 喂给 LLM，大页面会撑爆本地模型的上下文，
+并且白白消耗 prefill 时间。
+
+策略（按顺序尝试）：
+  1. 本地估算 token，放得下就原样返回
+  2. 把 DOM 切成若干“区域”（表单、游离输入点、事件句柄、注释、iframe/meta 等），
+     按安全相关性打分，贪心装入预算，并按文档顺序输出
+  3. 装不下任何有效区域时，退回 InteractionDomDistiller 的 DSL，并按行截断到预算
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Comment, Tag
+
+from scanner.dom_distiller import InteractionDomDistiller
+
+try:  # 有 lxml 时用更快的解析器
+    import lxml  # noqa: F401
+    _BS4_PARSER = "lxml"
+except ImportError:  # pragma: no cover - 取决于运行环境
+    _BS4_PARSER = "html.parser"
+
+
+_NON_ASCII_PATTERN = re.compile(r"[^\x00-\x7f]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    本地粗略估算 token 数（不依赖具体模型的 tokenizer）。
+    经验值：ASCII 文本约 4 个字符 1 个 token；中日韩等非 ASCII 字符约 1 个字符 1 个 token。
+    """
+    if not text:
+        return 0
+    non_ascii = len(_NON_ASCII_PATTERN.findall(text))
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+@dataclass
+class CompressionConfig:
+    """
+    配置项：单页 payload 的 token 预算及各区域的权重。
+    """
+    page_token_budget: int = 6000     # 单个页面 payload（JSON）的总预算
+    min_snapshot_tokens: int = 256    # 留给 structure_snapshot 的最低预算
+    max_region_share: float = 0.5     # 单个区域最多占 snapshot 预算的比例
+
+    # 区域打分（越高越先保留）
+    score_form: int = 100
+    score_input: int = 60
+    score_event_handler: int = 50
+    score_comment: int = 40
+    score_sensitive_data_attr: int = 35
+    score_security_tag: int = 30
+    score_heading: int = 10
+
+
+@dataclass
+class _Region:
+    score: float
+    order: int
+    text: str
+    tokens: int
+
+
+class ContextCompressor:
+    """
+    把页面的 cleaned_html 压缩到给定的 token 预算内。
+    """
+
+    SNAPSHOT_FULL = "html"
+    SNAPSHOT_REGIONS = "html_regions"
+    SNAPSHOT_DSL = "interaction_dsl"
+    # 除快照以外的字段本身就超出预算时，快照整个省略（AssetTriager 决定，compress 不会返回）
+    SNAPSHOT_OMITTED = "omitted"
+
+    INPUT_TAGS = {"input", "textarea", "select", "button"}
+    SECURITY_TAGS = {"iframe", "meta", "base", "object", "embed", "script"}
+    HEADING_TAGS = {"title", "h1", "h2"}
+    EVENT_HANDLER_PATTERN = re.compile(r"^on[a-z]+$")
+    SENSITIVE_PATTERN = re.compile(r"token|jwt|auth|key|secret|passw|admin|debug|todo|api", re.IGNORECASE)
+
+    def __init__(self, config: Optional[CompressionConfig] = None,
+                 distiller: Optional[InteractionDomDistiller] = None) -> None:
+        self.config = config or CompressionConfig()
+        self.distiller = distiller or InteractionDomDistiller()
+
+    # ===========================
+    # 对外主入口
+    # ===========================
+    def compress(self, cleaned_html: Optional[str], budget_tokens: int,
+                 distilled_dsl: Optional[str] = None) -> Tuple[str, str]:
+        """
+        返回 (压缩后的文本, 格式)。格式为 SNAPSHOT_FULL / SNAPSHOT_REGIONS / SNAPSHOT_DSL 之一。
+        distilled_dsl: 如果扫描阶段已经产出过 DSL，可直接传入，省去再次蒸馏。
+        """
+        if not cleaned_html:
+            return "", self.SNAPSHOT_FULL
+
+        budget_tokens = max(budget_tokens, self.config.min_snapshot_tokens)
+        if estimate_tokens(cleaned_html) <= budget_tokens:
+            return cleaned_html, self.SNAPSHOT_FULL
+
+        regions_text = self._pack_regions(cleaned_html, budget_tokens)
+        if regions_text:
+            return regions_text, self.SNAPSHOT_REGIONS
+
+        dsl = distilled_dsl if distilled_dsl is not None else self.distiller.distill_html(cleaned_html)
+        return self._truncate_lines(dsl, budget_tokens), self.SNAPSHOT_DSL
+
+    # ===========================
+    # 区域切分与打分
+    # ===========================
+    def _pack_regions(self, cleaned_html: str, budget_tokens: int) -> str:
+        regions = self._extract_regions(cleaned_html, budget_tokens)
+        if not regions:
+            return ""
+
+        # 贪心：按分数从高到低装箱，分数相同时优先文档靠前的区域
+        chosen: List[_Region] = []
+        used = 0
+        for region in sorted(regions, key=lambda r: (-r.score, r.order)):
+            if used + region.tokens > budget_tokens:
+                continue
+            chosen.append(region)
+            used += region.tokens
+
+        # 至少要装进一个高价值区域（表单 / 输入点 / 事件句柄），否则 DSL 更划算
+        if not any(r.score >= self.config.score_event_handler for r in chosen):
+            return ""
+
+        chosen.sort(key=lambda r: r.order)
+        header = f"<!-- compressed: kept {len(chosen)} of {len(regions)} security-relevant regions -->"
+        return "\n".join([header] + [r.text for r in chosen])
+
+    def _extract_regions(self, cleaned_html: str, budget_tokens: int) -> List[_Region]:
+        soup = BeautifulSoup(cleaned_html, _BS4_PARSER)
+        max_region_tokens = max(int(budget_tokens * self.config.max_region_share), 1)
+        regions: List[_Region] = []
+
+        def add(score: float, order: int, text: str) -> None:
+            text = self._truncate_text(text, max_region_tokens)
+            regions.append(_Region(score=score, order=order, text=text, tokens=estimate_tokens(text) + 1))
+
+        # 栈元素: (节点, 是否已被某个祖先区域整体覆盖)。例如表单内的 input 不再单独成区
+        stack = [(soup, False)]
+        order = 0
+        while stack:
+            node, covered = stack.pop()
+            order += 1
+
+            if isinstance(node, Comment):
+                text = str(node).strip()
+                if text and not covered:
+                    bonus = 20 if self.SENSITIVE_PATTERN.search(text) else 0
+                    add(self.config.score_comment + bonus, order, f"<!-- {text} -->")
+                continue
+            if not isinstance(node, Tag):
+                continue
+
+            if not covered and node is not soup:
+                score = self._score_tag(node)
+                if score:
+                    add(score, order, str(node))
+                    covered = True
+
+            for child in reversed(node.contents):
+                if isinstance(child, (Tag, Comment)):
+                    stack.append((child, covered))
+
+        return regions
+
+    def _score_tag(self, node: Tag) -> float:
+        name = node.name
+        if name == "form":
+            return self.config.score_form + len(node.find_all(list(self.INPUT_TAGS)))
+        if name in self.INPUT_TAGS:
+            return self.config.score_input
+        if any(self.EVENT_HANDLER_PATTERN.match(a) for a in node.attrs):
+            return self.config.score_event_handler
+        if any(a.startswith("data-") and self.SENSITIVE_PATTERN.search(a) for a in node.attrs):
+            return self.config.score_sensitive_data_attr
+        if name in self.SECURITY_TAGS:
+            return self.config.score_security_tag
+        if name in self.HEADING_TAGS:
+            return self.config.score_heading
+        return 0
+
+    # ===========================
+    # 截断辅助
+    # ===========================
+    @staticmethod
+    def _truncate_text(text: str, max_tokens: int) -> str:
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        # 按 ASCII 估算反推字符数，留出截断标记的位置
+        cut = max(max_tokens * 4 - 32, 0)
+        while cut > 0 and estimate_tokens(text[:cut]) > max_tokens - 8:
+            cut = int(cut * 0.8)
+        return text[:cut] + " ... [TRUNCATED_REGION]"
+
+    @staticmethod
+    def _truncate_lines(text: str, max_tokens: int) -> str:
+        lines: List[str] = []
+        used = 0
+        for line in text.splitlines():
+            cost = estimate_tokens(line) + 1
+            if used + cost > max_tokens:
+                lines.append("... [TRUNCATED_DSL]")
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(lines)
@@ -0,0 +1,125 @@
+# script/analysis/issue_stream.py
+"""
+LLM 输出的增量 issue 解析 (Issue Stream Parser)
+
+问题：_parse_llm_json 要等完整响应才 json.loads，一处语法错误（漏逗号、输出被 max_tokens 截断）
+整份结果全部丢弃；模型写完 JSON 后还可能继续输出解释文字，白白占用生成时间。
+
+IssueStreamParser 逐块接收模型输出，只跟踪 JSON 的结构（字符串 / 转义 / 括号深度）：
+  - 顶层对象的 "issues" 数组中，每个元素对象一闭合就单独 json.loads 并产出，
+    某个元素解析失败只丢这一个（计入 errors）
+  - 顶层对象闭合，或产出的 issue 达到 max_issues 时 done=True，调用方可以立即停止生成
+  - 顶层对象之前的内容（```json 围栏、前言）被忽略
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IssueStreamParser:
+
+    def __init__(self, max_issues: Optional[int] = None, array_key: str = "issues") -> None:
+        """
+        max_issues: 产出这么多 issue 后即视为结束，None 不限制
+        array_key: 顶层对象中 issue 数组的键名
+        """
+        self.max_issues = max_issues
+        self.array_key = array_key
+
+        self.text = ""            # 到目前为止收到的全部输出
+        self.issues: List[Dict[str, Any]] = []
+        self.errors = 0           # 无法解析而被丢弃的 issue 对象数
+        self.done = False
+
+        self._pos = 0             # 下一个待扫描字符在 text 中的位置
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False  # 顶层对象中，下一个字符串是键
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None   # issue 数组打开后的栈深度
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """追加一段输出，返回这段输出中新闭合的 issue 对象。"""
+        if self.done or not chunk:
+            return []
+        self.text += chunk
+        emitted: List[Dict[str, Any]] = []
+        text = self.text
+
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+            pos = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._expect_key and len(self._stack) == 1:
+                        self._last_key = text[self._string_start + 1:pos]
+                        self._expect_key = False
+                continue
+
+            if not self._stack and ch != "{":
+                # 顶层对象之前的围栏 / 前言
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch in "{[":
+                self._stack.append(ch)
+                depth = len(self._stack)
+                if depth == 1:
+                    self._expect_key = True
+                elif ch == "[" and depth == 2 and self._last_key == self.array_key:
+                    self._array_depth = depth
+                elif ch == "{" and self._array_depth is not None and depth == self._array_depth + 1:
+                    self._item_start = pos
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                depth = len(self._stack)
+                self._stack.pop()
+                if ch == "}" and self._item_start is not None and depth == (self._array_depth or 0) + 1:
+                    issue = self._load_item(text[self._item_start:pos + 1])
+                    self._item_start = None
+                    if issue is not None:
+                        emitted.append(issue)
+                        self.issues.append(issue)
+                        if self.max_issues is not None and len(self.issues) >= self.max_issues:
+                            self.done = True
+                elif ch == "]" and depth == self._array_depth:
+                    self._array_depth = None
+                if not self._stack:
+                    self.done = True
+            elif ch == "," and len(self._stack) == 1:
+                self._expect_key = True
+
+        return emitted
+
+    def _load_item(self, fragment: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(fragment)
+        except ValueError:
+            self.errors += 1
+            return None
+        if not isinstance(item, dict):
+            self.errors += 1
+            return None
+        return item
+
+
+def parse_issues(raw_text: str, max_issues: Optional[int] = None) -> IssueStreamParser:
+    """一次性解析完整（或被截断的）输出，返回解析器以便读取 issues / errors / done。"""
+    parser = IssueStreamParser(max_issues=max_issues)
+    parser.feed(raw_text)
+    return parser
@@ -0,0 +1,281 @@
+# script/analysis/layout_dedup.py
+"""
+站点级公共布局去重 (Layout Deduplicator)
+
+问题：每个页面的 cleaned_html 都重复带着同一套导航栏 / 页脚 / Cookie 横幅 / 侧边栏，
+逐页喂给 LLM 时这些重复内容占掉大量 token。
+
+做法：
+  1. 对每个页面的 DOM 自底向上计算子树哈希（标签名 + 属性 + 子节点哈希 / 归一化文本）
+  2. 统计每个哈希出现在多少个页面中；出现在足够多页面、且体积足够大的子树视为“布局块”
+  3. 自顶向下替换：命中的最大子树整体换成占位注释 <!-- layout:L1 -->，不再深入
+布局块每个站点只保留一份，交给分析器单独分析一次；块内的输入控件（如全局搜索框）
+随布局块分析，页面 payload 中不再重复列出（见 layout_input_positions）。
+页面自己的表单里可能有与布局里同名的输入框，所以按替换时的 DOM 位置认定，而不是按 name / id。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 输入控件的标签，与 InputField.tag 对应
+INPUT_TAGS = ("input", "textarea", "select")
+
+# 输入控件的匹配键：(标签, name, id)
+InputKey = Tuple[str, Optional[str], Optional[str]]
+# 一个页面上位于布局块内的输入控件：匹配键 -> {同键控件按文档顺序的序号: 块 ID}
+InputPositions = Dict[InputKey, Dict[int, str]]
+
+
+@dataclass
+class LayoutBlock:
+    """一个跨页面重复出现的布局子树。"""
+    block_id: str           # 占位符中引用的 ID，如 "L1"
+    html: str               # 首次出现时的 HTML
+    page_count: int         # 出现在多少个页面中
+    sample_pages: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "block_id": self.block_id,
+            "html": self.html,
+            "page_count": self.page_count,
+            "sample_pages": self.sample_pages,
+        }
+
+
+class LayoutDeduplicator:
+    """
+    用法：
+        dedup = LayoutDeduplicator()
+        dedup.fit({url: page.cleaned_html for url, page in site_asset.pages.items()})
+        page_html = dedup.page_specific_html(url)   # 去掉公共布局后的页面 HTML
+        dedup.blocks                                 # 站点级布局块
+
+    流式场景（页面边爬边分析）下先用前几个页面 fit，之后到来的页面用 apply 去掉已知布局块。
+    """
+
+    # 这些结构标签本身不当作布局块（否则整页相同时会把整个 body 换掉）
+    STRUCTURAL_TAGS = {"[document]", "html", "head", "body"}
+
+    PLACEHOLDER = " layout:{} "
+    MAX_SAMPLE_PAGES = 5
+
+    def __init__(self, min_page_share: float = 0.5, min_pages: int = 2, min_block_chars: int = 80) -> None:
+        """
+        min_page_share: 子树至少出现在多少比例的页面中才算布局（与 min_pages 取较大者）
+        min_block_chars: 子树序列化后的最小长度，太小的重复（如 <br>）不值得替换
+        """
+        self.min_page_share = min_page_share
+        self.min_pages = min_pages
+        self.min_block_chars = min_block_chars
+
+        self.blocks: List[LayoutBlock] = []
+        self._page_html: Dict[str, str] = {}
+        self._page_blocks: Dict[str, List[str]] = {}
+        self._page_layout_inputs: Dict[str, InputPositions] = {}
+        # fit 得到的布局哈希和对应块，供 apply 复用
+        self._layout_hashes: Set[str] = set()
+        self._block_ids: Dict[str, LayoutBlock] = {}
+
+    # ===========================
+    # 对外接口
+    # ===========================
+    def fit(self, pages_html: Dict[str, Optional[str]]) -> "LayoutDeduplicator":
+        """分析整个站点的页面 HTML，找出布局块并生成每页去重后的 HTML。"""
+        self.blocks = []
+        self._page_html = {}
+        self._page_blocks = {}
+        self._page_layout_inputs = {}
+        self._layout_hashes = set()
+        self._block_ids = {}
+
+        parsed: Dict[str, Tuple[BeautifulSoup, Dict[int, Tuple[str, int]]]] = {}
+        page_counter: Counter = Counter()
+        for url, html in pages_html.items():
+            if not html:
+                continue
+            soup = BeautifulSoup(html, "html.parser")
+            hashes = self._hash_subtrees(soup)
+            parsed[url] = (soup, hashes)
+            page_counter.update({digest for digest, size in hashes.values() if size >= self.min_block_chars})
+
+        threshold = max(self.min_pages, math.ceil(self.min_page_share * len(parsed)))
+        layout_hashes = {digest for digest, count in page_counter.items() if count >= threshold}
+        if len(parsed) < self.min_pages or not layout_hashes:
+            self._page_html = {url: html for url, html in pages_html.items() if html}
+            return self
+
+        block_ids: Dict[str, LayoutBlock] = {}
+        for url, (soup, hashes) in parsed.items():
+            used = self._replace_layout(url, soup, hashes, layout_hashes, block_ids, page_counter)
+            self._page_blocks[url] = used
+            self._page_html[url] = str(soup) if used else pages_html[url]
+
+        self.blocks = list(block_ids.values())
+        self._layout_hashes = layout_hashes
+        self._block_ids = block_ids
+        return self
+
+    def apply(self, url: str, html: Optional[str]) -> Optional[str]:
+        """
+        fit 之后到来的页面：只替换 fit 时已确定的布局块（不产生新块），返回去重后的 HTML，
+        同时更新块的 page_count / sample_pages，之后可用 page_specific_html / page_block_ids 查询。
+        """
+        if not html:
+            return html
+        if not self._block_ids:
+            self._page_html[url] = html
+            return html
+
+        soup = BeautifulSoup(html, "html.parser")
+        hashes = self._hash_subtrees(soup)
+        used = self._replace_layout(url, soup, hashes, self._layout_hashes, self._block_ids, None)
+        self._page_blocks[url] = used
+        self._page_html[url] = str(soup) if used else html
+        return self._page_html[url]
+
+    def page_specific_html(self, url: str, default: Optional[str] = None) -> Optional[str]:
+        return self._page_html.get(url, default)
+
+    def page_block_ids(self, url: str) -> List[str]:
+        return self._page_blocks.get(url, [])
+
+    def layout_input_positions(self, url: str) -> InputPositions:
+        """
+        该页面被替换掉的布局块里的输入控件：(标签, name, id) -> {序号: 块 ID}。
+        序号是同一匹配键的控件在页面中按文档顺序的第几个（从 0 开始），与 PageAsset.inputs 的顺序一致。
+        """
+        return self._page_layout_inputs.get(url, {})
+
+    def stats(self) -> Dict[str, int]:
+        before = sum(len(b.html) * b.page_count for b in self.blocks)
+        return {
+            "blocks": len(self.blocks),
+            "pages": len(self._page_html),
+            "chars_saved": before - sum(len(b.html) for b in self.blocks),
+        }
+
+    # ===========================
+    # 子树哈希
+    # ===========================
+    def _hash_subtrees(self, soup: BeautifulSoup) -> Dict[int, Tuple[str, int]]:
+        """
+        后序遍历，返回 id(tag) -> (子树哈希, 近似序列化长度)。
+        文本做空白归一化，属性按名字排序，避免格式差异影响命中。
+        """
+        result: Dict[int, Tuple[str, int]] = {}
+        stack: List[Tuple[Tag, bool]] = [(soup, False)]
+
+        while stack:
+            tag, expanded = stack.pop()
+            if not expanded:
+                stack.append((tag, True))
+                for child in reversed(tag.contents):
+                    if isinstance(child, Tag):
+                        stack.append((child, False))
+                continue
+
+            digest = hashlib.sha1()
+            attrs = sorted((k, " ".join(v) if isinstance(v, list) else str(v)) for k, v in tag.attrs.items())
+            header = f"<{tag.name} {attrs!r}>"
+            digest.update(header.encode("utf-8"))
+            size = len(header)
+
+            for child in tag.contents:
+                if isinstance(child, Tag):
+                    child_digest, child_size = result[id(child)]
+                    digest.update(child_digest.encode("ascii"))
+                    size += child_size
+                elif isinstance(child, NavigableString):
+                    text = _WHITESPACE_PATTERN.sub(" ", str(child)).strip()
+                    if text:
+                        kind = "c" if isinstance(child, Comment) else "t"
+                        digest.update(f"{kind}:{text}\x00".encode("utf-8"))
+                        size += len(text)
+
+            result[id(tag)] = (digest.hexdigest(), size)
+        return result
+
+    # ===========================
+    # 替换为占位符
+    # ===========================
+    def _replace_layout(
+            self,
+            url: str,
+            soup: BeautifulSoup,
+            hashes: Dict[int, Tuple[str, int]],
+            layout_hashes: Set[str],
+            block_ids: Dict[str, LayoutBlock],
+            page_counter: Optional[Counter],
+    ) -> List[str]:
+        """page_counter 为 None 时（apply）只替换已有的块，并给用到的块累加 page_count。"""
+        used: List[str] = []
+        stack: List[Tag] = [soup]
+        replacements: List[Tuple[Tag, str]] = []
+
+        while stack:
+            tag = stack.pop()
+            digest, size = hashes[id(tag)]
+            if tag.name not in self.STRUCTURAL_TAGS and size >= self.min_block_chars and digest in layout_hashes:
+                block = block_ids.get(digest)
+                if block is None and page_counter is None:
+                    # 该哈希在 fit 时嵌套在更大的块里，没有单独成块：继续往下找
+                    for child in reversed(tag.contents):
+                        if isinstance(child, Tag):
+                            stack.append(child)
+                    continue
+                if block is None:
+                    block = LayoutBlock(
+                        block_id=f"L{len(block_ids) + 1}",
+                        html=str(tag),
+                        page_count=page_counter[digest],
+                    )
+                    block_ids[digest] = block
+                if url not in block.sample_pages and len(block.sample_pages) < self.MAX_SAMPLE_PAGES:
+                    block.sample_pages.append(url)
+                if block.block_id not in used:
+                    used.append(block.block_id)
+                    if page_counter is None:
+                        block.page_count += 1
+                replacements.append((tag, block.block_id))
+                continue
+            for child in reversed(tag.contents):
+                if isinstance(child, Tag):
+                    stack.append(child)
+
+        self._page_layout_inputs[url] = self._locate_layout_inputs(soup, replacements)
+
+        # 遍历结束后再替换，避免边遍历边修改树
+        for tag, block_id in replacements:
+            tag.replace_with(Comment(self.PLACEHOLDER.format(block_id)))
+        return used
+
+    @staticmethod
+    def _locate_layout_inputs(soup: BeautifulSoup, replacements: List[Tuple[Tag, str]]) -> InputPositions:
+        """按文档顺序给输入控件编号（同一匹配键内计数），记下位于被替换子树内的那些。"""
+        replaced = {id(tag): block_id for tag, block_id in replacements}
+        if not replaced:
+            return {}
+        ordinals: Counter = Counter()
+        positions: InputPositions = {}
+        for el in soup.find_all(INPUT_TAGS):
+            key = (el.name, el.get("name"), el.get("id"))
+            ordinal = ordinals[key]
+            ordinals[key] += 1
+            node = el
+            while node is not None and id(node) not in replaced:
+                node = node.parent
+            if node is not None:
+                positions.setdefault(key, {})[ordinal] = replaced[id(node)]
+        return positions
@@ -0,0 +1,254 @@
+# script/analysis/near_dup.py
+"""
+近似重复页面聚类 (Near-Duplicate Page Clustering)
+
+问题：商品页 / 用户主页 / 列表分页这类由同一模板渲染的页面，交互结构几乎一样，
+却被逐个当作 interactive 页面发给 LLM，分析结论也几乎一样。
+
+做法：
+  1. 对（去掉公共布局后的）cleaned DOM 提取特征，计算 64 位 SimHash：
+     - 结构：标签 + 关键属性（name / type / action ...）序列上连续 3 个 token 的 shingle，权重 1
+     - 文本：归一化后的词（小写，数字统一为 0），权重很低，只起微调作用；
+       否则同一模板的商品页会因为描述文字不同而相距 20 多位，和不相关页面分不开
+  2. 按到达顺序做 leader 聚类：与已有代表页的 Hamming 距离 <= max_distance 即归入该簇，否则自成代表页
+     - 装了 numpy 时，一次 XOR + popcount 算出新页面到所有代表页的距离
+     - 否则把签名切成 max_distance + 1 段做 LSH 分桶（鸽巢原理：距离 <= k 的两个签名至少有一段完全相同），
+       只对同桶的代表页用 int.bit_count 计算距离
+  3. 只分析代表页，结论按输入框 (tag, name) 映射后复制到同簇的其他页面
+增量聚类，批量分诊和流式分诊共用。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+try:  # 可选依赖：有 numpy 时向量化计算 Hamming 距离
+    import numpy as np
+except ImportError:  # pragma: no cover - 取决于运行环境
+    np = None
+
+
+SIGNATURE_BITS = 64
+
+_TOKEN_PATTERN = re.compile(r"<!--.*?-->|<\s*(/?)\s*([a-zA-Z][\w\-]*)([^>]*)>|([^<]+)", re.S)
+_ATTR_PATTERN = re.compile(r"([\w\-:]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))")
+_WORD_PATTERN = re.compile(r"\w+")
+_DIGITS_PATTERN = re.compile(r"\d+")
+
+# 这些属性的取值参与特征（决定页面的交互结构）；其余属性只记名字
+_VALUE_ATTRS = frozenset({"name", "type", "method", "action", "role"})
+
+# 单个文本词相对于一个结构 shingle 的权重
+TEXT_WEIGHT = 0.05
+
+
+@dataclass
+class PageCluster:
+    """一组近似重复的页面，只有代表页会被分析。"""
+    cluster_id: str                 # 如 "C1"
+    representative: str             # 代表页 URL（簇内最先到达的页面）
+    members: List[str] = field(default_factory=list)   # 其余页面 URL
+    distances: Dict[str, int] = field(default_factory=dict)  # 成员 -> 与代表页的 Hamming 距离
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "cluster_id": self.cluster_id,
+            "representative": self.representative,
+            "members": self.members,
+            "distances": self.distances,
+        }
+
+
+def _normalize(text: str) -> str:
+    return _DIGITS_PATTERN.sub("0", text.lower())
+
+
+def page_features(html: str) -> Tuple[List[str], List[str]]:
+    """cleaned HTML -> (标签 token 序列（开闭标签 + 关键属性）, 文本词)。"""
+    tags: List[str] = []
+    words: List[str] = []
+    for m in _TOKEN_PATTERN.finditer(html):
+        closing, tag, attrs, text = m.groups()
+        if tag:
+            if closing:
+                tags.append(f"</{tag.lower()}>")
+                continue
+            parts = [tag.lower()]
+            for am in _ATTR_PATTERN.finditer(attrs):
+                name = am.group(1).lower()
+                if name in _VALUE_ATTRS:
+                    value = am.group(2) or am.group(3) or am.group(4) or ""
+                    parts.append(f"{name}={_normalize(value)}")
+                else:
+                    parts.append(name)
+            tags.append("<" + " ".join(parts) + ">")
+        elif text:
+            words.extend(_normalize(w) for w in _WORD_PATTERN.findall(text))
+    return tags, words
+
+
+def simhash(weights: Dict[str, float]) -> int:
+    """对带权特征计算 64 位 SimHash。"""
+    votes = [0.0] * SIGNATURE_BITS
+    for feature, weight in weights.items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        # 逐位投票：该位为 1 加权重，为 0 减权重
+        for bit in range(SIGNATURE_BITS):
+            if (h >> bit) & 1:
+                votes[bit] += weight
+            else:
+                votes[bit] -= weight
+    signature = 0
+    for bit, vote in enumerate(votes):
+        if vote > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def page_signature(html: str, shingle_size: int = 3, text_weight: float = TEXT_WEIGHT) -> int:
+    tags, words = page_features(html)
+    weights: Dict[str, float] = {}
+    for i in range(max(1, len(tags) - shingle_size + 1)):
+        feature = "s:" + "\x1f".join(tags[i:i + shingle_size])
+        weights[feature] = weights.get(feature, 0.0) + 1.0
+    for word in words:
+        feature = "t:" + word
+        weights[feature] = weights.get(feature, 0.0) + text_weight
+    return simhash(weights)
+
+
+class NearDuplicateClusterer:
+    """
+    用法：
+        clusterer = NearDuplicateClusterer()
+        rep = clusterer.add(url, html)   # None 表示 url 成为新的代表页，否则返回它所属簇的代表页
+        clusterer.clusters               # 全部簇（含只有代表页的）
+    """
+
+    def __init__(self, max_distance: int = 6, shingle_size: int = 3, use_numpy: Optional[bool] = None) -> None:
+        """
+        max_distance: 与代表页的 Hamming 距离（64 位中不同的位数）不超过该值即视为近似重复
+        use_numpy: None 表示装了 numpy 就用
+        """
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+
+        self.clusters: List[PageCluster] = []
+        self._cluster_of: Dict[str, PageCluster] = {}
+        self._signatures: Dict[str, int] = {}
+
+        # 代表页签名（与 self.clusters 下标一一对应）
+        self._rep_signatures: List[int] = []
+        self._rep_array = np.zeros(0, dtype=np.uint64) if self.use_numpy else None
+
+        # LSH：max_distance + 1 段，每段 (段序号, 段值) -> 代表页下标
+        self._band_bits = self._band_layout(max_distance + 1)
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    # ===========================
+    # 对外接口
+    # ===========================
+    def signature(self, html: Optional[str]) -> int:
+        return page_signature(html or "", self.shingle_size)
+
+    def add(self, url: str, html: Optional[str]) -> Optional[str]:
+        """加入一个页面；近似重复时返回代表页 URL，否则该页面成为新簇的代表页并返回 None。"""
+        existing = self._cluster_of.get(url)
+        if existing is not None:
+            return existing.representative if existing.representative != url else None
+
+        sig = self.signature(html)
+        self._signatures[url] = sig
+        match = self._nearest_representative(sig)
+        if match is not None:
+            index, distance = match
+            cluster = self.clusters[index]
+            cluster.members.append(url)
+            cluster.distances[url] = distance
+            self._cluster_of[url] = cluster
+            return cluster.representative
+
+        cluster = PageCluster(cluster_id=f"C{len(self.clusters) + 1}", representative=url)
+        self._add_representative(cluster, sig)
+        self._cluster_of[url] = cluster
+        return None
+
+    def fit(self, pages_html: Dict[str, Optional[str]]) -> "NearDuplicateClusterer":
+        for url, html in pages_html.items():
+            self.add(url, html)
+        return self
+
+    def representative_of(self, url: str) -> Optional[str]:
+        cluster = self._cluster_of.get(url)
+        return cluster.representative if cluster else None
+
+    def distance_to_representative(self, url: str) -> int:
+        cluster = self._cluster_of.get(url)
+        return cluster.distances.get(url, 0) if cluster else 0
+
+    def duplicate_clusters(self) -> List[PageCluster]:
+        """至少有一个成员的簇。"""
+        return [c for c in self.clusters if c.members]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pages": len(self._cluster_of),
+            "clusters": len(self.clusters),
+            "suppressed": sum(len(c.members) for c in self.clusters),
+        }
+
+    # ===========================
+    # 距离计算
+    # ===========================
+    @staticmethod
+    def distance(a: int, b: int) -> int:
+        return (a ^ b).bit_count()
+
+    def _nearest_representative(self, sig: int) -> Optional[Tuple[int, int]]:
+        if not self.clusters:
+            return None
+        if self.use_numpy:
+            distances = np.bitwise_count(self._rep_array ^ np.uint64(sig)) if hasattr(np, "bitwise_count") \
+                else np.unpackbits((self._rep_array ^ np.uint64(sig)).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+            index = int(np.argmin(distances))
+            distance = int(distances[index])
+            return (index, distance) if distance <= self.max_distance else None
+
+        candidates = set()
+        for key in self._band_keys(sig):
+            candidates.update(self._buckets.get(key, ()))
+        best: Optional[Tuple[int, int]] = None
+        for index in sorted(candidates):
+            distance = self.distance(sig, self._rep_signatures[index])
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (index, distance)
+        return best
+
+    def _add_representative(self, cluster: PageCluster, sig: int) -> None:
+        index = len(self.clusters)
+        self.clusters.append(cluster)
+        self._rep_signatures.append(sig)
+        if self.use_numpy:
+            self._rep_array = np.append(self._rep_array, np.uint64(sig))
+        else:
+            for key in self._band_keys(sig):
+                self._buckets.setdefault(key, []).append(index)
+
+    @staticmethod
+    def _band_layout(bands: int) -> List[Tuple[int, int]]:
+        """把 64 位切成 bands 段，返回每段 (起始位, 位数)。"""
+        bands = max(1, min(bands, SIGNATURE_BITS))
+        base, extra = divmod(SIGNATURE_BITS, bands)
+        layout, start = [], 0
+        for i in range(bands):
+            width = base + (1 if i < extra else 0)
+            layout.append((start, width))
+            start += width
+        return layout
+
+    def _band_keys(self, sig: int) -> List[Tuple[int, int]]:
+        return [(i, (sig >> start) & ((1 << width) - 1)) for i, (start, width) in enumerate(self._band_bits)]
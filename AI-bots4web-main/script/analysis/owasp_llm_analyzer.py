@@ -1,12 +1,20 @@
 # script/analysis/owasp_llm_analyzer.py
 
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass, asdict, field, replace
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import asyncio
 import json
 import logging
+import threading
+import time
 
 # 假设你的 LLM 客户端接口定义在这里
 from utils.llm.base import LLMClient
+from analysis.compact_encoder import encode_context
+from analysis.context_compressor import estimate_tokens
+from analysis.issue_stream import IssueStreamParser, parse_issues
+from analysis.prompt_packer import PackedItem, PromptPacker
 
 
 @dataclass
@@ -32,14 +40,35 @@ class PotentialIssue:
     # 漏洞置信度 (LLM 评估)
     confidence: str = "Medium"  # High, Medium, Low
 
+    # 近似重复页面沿用代表页的结论时，记录代表页 URL（LLM 并未单独分析该页面）
+    propagated_from: Optional[str] = None
+
+
+@dataclass
+class LLMCallUsage:
+    """一次 LLM 调用的 token 用量。"""
+    label: str                  # 分析的条目（页面 / 接口 URL，site_layout，打包时为多个 URL）
+    prompt_tokens: int
+    completion_tokens: int
+    estimated: bool = False     # 服务端没有返回 usage，按本地估算
+    cached: bool = False        # 来自响应缓存，没有真正调用模型
+    seconds: float = 0.0
+
 
 @dataclass
 class OwaspAnalysisResult:
     # 所有的潜在漏洞列表
     issues: List[PotentialIssue]
+    # 超出 token / 时间预算而未分析的条目（页面 / 接口 URL，公共布局记为 "site_layout"）
+    skipped: List[str] = field(default_factory=list)
+    # 本次分析的 token 用量汇总（见 OwaspTop10LLMAnalyzer.usage_summary）
+    usage: Dict[str, Any] = field(default_factory=dict)
+    # LLM 请求失败（重试 / 回退后仍失败、超时）而没有结果的条目，不能当作"没有发现问题"
+    failed: List[str] = field(default_factory=list)
 
     def to_dict(self) -> Dict[str, Any]:
-        return {"issues": [asdict(i) for i in self.issues]}
+        return {"issues": [asdict(i) for i in self.issues], "skipped": self.skipped, "usage": self.usage,
+                "failed": self.failed}
 
 
 class OwaspTop10LLMAnalyzer:
@@ -49,84 +78,645 @@ class OwaspTop10LLMAnalyzer:
     对 'interactive' 页面和 'standalone_apis' 进行逐个深度分析。
     """
 
-    def __init__(self, llm_client: LLMClient):
+    # 修改 Prompt 模板或解析格式时递增，使旧的 analysis_result 缓存失效
+    PROMPT_VERSION = "6"
+
+    # 需要调用 LLM 的分诊类别（clues / static 不分析）
+    ANALYZED_CATEGORIES = ("interactive", "site_layout", "standalone_apis")
+
+    # 单条 Prompt 的输出结构，传给支持约束输出（JSON mode / json_schema）的客户端
+    ISSUES_JSON_SCHEMA: Dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "issues": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "location": {"type": "string"},
+                        "url": {"type": "string"},
+                        "owasp_category": {"type": "string"},
+                        "risk_reason": {"type": "string"},
+                        "suggested_tests": {"type": "array", "items": {"type": "string"}},
+                        "related_input_id": {"type": ["integer", "null"]},
+                        "related_api_url": {"type": ["string", "null"]},
+                        "confidence": {"type": "string", "enum": ["High", "Medium", "Low"]},
+                    },
+                    "required": ["location", "owasp_category", "risk_reason", "confidence"],
+                },
+            },
+        },
+        "required": ["issues"],
+    }
+
+    def __init__(self, llm_client: LLMClient, max_in_flight: int = 1,
+                 request_timeout: Optional[float] = None,
+                 packer: Optional[PromptPacker] = None,
+                 compact_context: bool = True,
+                 stream_output: bool = True,
+                 max_issues_per_item: Optional[int] = None,
+                 on_issue: Optional[Callable[[PotentialIssue], None]] = None):
+        """
+        max_in_flight: 同时向 LLM 发出的请求数上限。LM Studio / Ollama / vLLM 等本地服务端
+            可以把并发请求合批推理，>1 时吞吐量明显更高
+        request_timeout: 单个请求的最长等待秒数；超时的请求被放弃（结果记为空）。被放弃的请求仍在服务端
+            推理，直到它的线程结束前继续占用并发名额；真正取消 HTTP 请求要把同样的超时传给客户端
+            （PTAgent 的 llm_request_timeout 会这样做）
+        packer: 把独立 API / 小页面打包进同一个 Prompt（见 analysis/prompt_packer.py），None 表示逐条分析
+        compact_context: Prompt 中的上下文用紧凑编码（无缩进、去空字段、短键名 + 图例，见 analysis/compact_encoder.py）
+        stream_output: 客户端实现了 stream_complete 时流式读取单条 Prompt 的输出，边生成边解析 issue
+            （见 analysis/issue_stream.py），JSON 闭合后立即停止生成
+        max_issues_per_item: 单个条目最多保留的 issue 数，流式时达到后停止生成；None 不限制
+        on_issue: 每解析出一个 issue 就回调一次（并发分析时在工作线程中调用，需线程安全）
+        """
         self.llm_client = llm_client
         self.logger = logging.getLogger("LLM_Analyzer")
-
-    def analyze(self, triaged_data: Dict[str, List[Dict[str, Any]]]) -> OwaspAnalysisResult:
+        self.max_in_flight = max(1, max_in_flight)
+        self.request_timeout = request_timeout
+        self.packer = packer
+        self.compact_context = compact_context
+        self.stream_output = stream_output
+        self.max_issues_per_item = max_issues_per_item
+        self.on_issue = on_issue
+
+        # 打包 Prompt 的结果缺失 / 无法解析、回退到单条 Prompt 的条目数
+        self.pack_fallbacks = 0
+
+        # 累计消耗的 token（prompt + 响应，不含缓存命中），流水线模式下多个线程共用
+        self.tokens_used = 0
+        # 每次 LLM 调用的用量明细
+        self.usage: List[LLMCallUsage] = []
+        self.timeouts = 0
+        # 输出中无法解析、被丢弃的 issue 对象数
+        self.parse_errors = 0
+        # LLM 请求失败 / 超时的条目
+        self.failed: List[str] = []
+        self._usage_lock = threading.Lock()
+        # 超时被放弃、但线程还没结束的请求：_run_items 把它们计入 max_in_flight
+        self._abandoned: List[Future] = []
+        # run_item 在每个调用线程上放弃的请求，下一次调用前先等它结束
+        self._thread_state = threading.local()
+
+    def analyze(self, triaged_data: Dict[str, List[Dict[str, Any]]],
+                token_budget: Optional[int] = None,
+                time_budget: Optional[float] = None) -> OwaspAnalysisResult:
         """
         主入口。
         triaged_data: AssetTriager.triage() 的返回值
+        token_budget / time_budget: 本次分析最多消耗的 token 数 / 秒数；用完后剩余条目记入 skipped。
+            交互型页面按分诊给出的 priority 从高到低处理，预算先花在最可能有漏洞的页面上。
+        最多 max_in_flight 个请求并发执行，结果按条目顺序合并，与串行执行时一致。
+        """
+        items = self._collect_items(triaged_data)
+        budget_start = (self.tokens_used, time.perf_counter())
+        usage_start, failed_start = len(self.usage), len(self.failed)
+        results, skipped = self._run_items(items, budget_start, token_budget, time_budget)
+        return self._finish(triaged_data, results, skipped, budget_start, usage_start, failed_start)
+
+    async def aanalyze(self, triaged_data: Dict[str, List[Dict[str, Any]]],
+                       token_budget: Optional[int] = None,
+                       time_budget: Optional[float] = None) -> OwaspAnalysisResult:
+        """
+        analyze 的异步版本：在调用方的事件循环上并发最多 max_in_flight 个请求，
+        可以和同一循环上的其他工作（浏览器操作等）交错执行。
+        客户端实现了 acomplete / astream（AsyncLLMClient）时直接 await，否则在线程中调用同步接口。
         """
-        all_issues: List[PotentialIssue] = []
+        items = self._collect_items(triaged_data)
+        budget_start = (self.tokens_used, time.perf_counter())
+        usage_start, failed_start = len(self.usage), len(self.failed)
+        results, skipped = await self._arun_items(items, budget_start, token_budget, time_budget)
+        return self._finish(triaged_data, results, skipped, budget_start, usage_start, failed_start)
+
+    def _collect_items(self, triaged_data: Dict[str, List[Dict[str, Any]]]) -> List[tuple]:
+        """分诊结果 -> 按分析顺序排列的 (类别, payload) 列表（配置了 packer 时已打包）。"""
+        items: List[tuple] = []
 
         # 1. 分析交互型页面 (Interactive Pages) - 重中之重
-        interactive_pages = triaged_data.get("interactive", [])
+        # 稳定排序：priority 相同的页面保持爬取顺序
+        interactive_pages = sorted(triaged_data.get("interactive", []),
+                                   key=lambda p: -p.get("priority", 0.0))
         print(f"[*] Analyzing {len(interactive_pages)} interactive pages with LLM...")
+        items.extend(("interactive", page_data) for page_data in interactive_pages)
 
-        for page_data in interactive_pages:
-            try:
-                page_issues = self._analyze_single_page(page_data)
-                for issue in page_issues:
-                    issue.location = page_data['url']
-                all_issues.extend(page_issues)
-            except Exception as e:
-                self.logger.error(f"Error analyzing page {page_data.get('url')}: {e}")
+        # 1.5 分析站点公共布局 (Site Layout) - 每个站点只分析一次，页面 payload 中只保留占位符
+        #     按单页 token 预算分批（AssetTriager 生成 site_layout_batches），每批一个 Prompt
+        layout_blocks = triaged_data.get("site_layout", [])
+        if layout_blocks:
+            batches = triaged_data.get("site_layout_batches") or [layout_blocks]
+            print(f"[*] Analyzing {len(layout_blocks)} shared layout blocks in {len(batches)} prompts with LLM...")
+            items.extend(("site_layout", batch) for batch in batches)
 
         # 2. 分析独立 API (Standalone APIs)
         standalone_apis = triaged_data.get("standalone_apis", [])
         if standalone_apis:
             print(f"[*] Analyzing {len(standalone_apis)} standalone APIs with LLM...")
-            # 为了节省 Token，API 可以尝试 5 个一组批量分析，或者逐个分析
-            # 这里演示逐个分析，准确率最高
-            for api_data in standalone_apis:
-                try:
-                    api_issues = self._analyze_single_api(api_data)
-                    all_issues.extend(api_issues)
-                except Exception as e:
-                    self.logger.error(f"Error analyzing API {api_data.get('url')}: {e}")
+            # 配置了 packer 时，独立 API 和小页面会按 token 预算打包进同一个 Prompt
+            items.extend(("standalone_apis", api_data) for api_data in standalone_apis)
 
         # 3. (可选) 分析线索页面 (Clues) - 通常用于提取信息，而非直接找漏洞
         # 这里暂时跳过，或者可以写一个专门的 InfoExtractor
 
-        return OwaspAnalysisResult(issues=all_issues)
+        if self.packer:
+            items = self.packer.group(items)
+        return items
+
+    def _finish(self, triaged_data: Dict[str, List[Dict[str, Any]]], results: List[List[PotentialIssue]],
+                skipped: List[str], budget_start, usage_start: int, failed_start: int) -> OwaspAnalysisResult:
+        all_issues = [issue for issues in results for issue in issues]
+
+        # 4. 近似重复页面沿用代表页的结论
+        all_issues = self.propagate_to_duplicates(all_issues, triaged_data.get("near_duplicates", []))
+
+        if skipped:
+            print(f"[WARN] Analysis budget exhausted after {self.tokens_used - budget_start[0]} tokens / "
+                  f"{time.perf_counter() - budget_start[1]:.1f}s, skipped {len(skipped)} items")
+        with self._usage_lock:
+            failed = self.failed[failed_start:]
+        if failed:
+            print(f"[WARN] LLM requests failed for {len(failed)} items, no results for: {', '.join(failed[:5])}"
+                  f"{' ...' if len(failed) > 5 else ''}")
+        usage = self.usage_summary(usage_start)
+        print(f"[*] LLM usage: {usage['calls']} calls, {usage['prompt_tokens']} prompt + "
+              f"{usage['completion_tokens']} completion tokens ({usage['cached_calls']} cached)")
+        return OwaspAnalysisResult(issues=all_issues, skipped=skipped, usage=usage, failed=failed)
+
+    def usage_summary(self, start: int = 0) -> Dict[str, Any]:
+        """self.usage[start:] 的汇总。"""
+        with self._usage_lock:
+            calls = self.usage[start:]
+        return {
+            "calls": len(calls),
+            "prompt_tokens": sum(c.prompt_tokens for c in calls),
+            "completion_tokens": sum(c.completion_tokens for c in calls),
+            "cached_calls": sum(1 for c in calls if c.cached),
+            "estimated_calls": sum(1 for c in calls if c.estimated),
+            "max_prompt_tokens": max((c.prompt_tokens for c in calls), default=0),
+        }
+
+    def run_item(self, category: str, payload: Any) -> List[PotentialIssue]:
+        """
+        带 request_timeout 的 analyze_item；超时抛出 concurrent.futures.TimeoutError。
+        超时的请求仍占着调用线程的名额：同一线程下一次调用前先等它结束，
+        所以 N 个工作线程在服务端最多有 N 个在途请求。
+        """
+        previous = getattr(self._thread_state, "abandoned", None)
+        if previous is not None:
+            wait([previous])
+            self._thread_state.abandoned = None
+        if not self.request_timeout:
+            return self.analyze_item(category, payload)
+        future = self._submit(category, payload)
+        try:
+            return future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            with self._usage_lock:
+                self.timeouts += 1
+            self._thread_state.abandoned = future
+            raise
+
+    # ==============================
+    # 并发执行
+    # ==============================
+    def _run_items(self, items: List[tuple], budget_start, token_budget: Optional[int],
+                   time_budget: Optional[float]) -> Tuple[List[List[PotentialIssue]], List[str]]:
+        """
+        按顺序提交条目，同时在途的请求（含超时被放弃、仍在运行的）不超过 max_in_flight；
+        返回 (与 items 对齐的结果, 跳过的条目)。
+        预算在提交前检查，所以在途请求完成后才会判断下一条是否还能提交。
+        """
+        results: List[List[PotentialIssue]] = [[] for _ in items]
+        skipped: List[str] = []
+        # Future -> (条目下标, 提交时间)
+        pending: Dict[Future, Tuple[int, float]] = {}
+
+        for index, (category, payload) in enumerate(items):
+            while len(pending) + self._live_abandoned() >= self.max_in_flight:
+                self._collect(pending, items, results)
+            if self._budget_exhausted(budget_start, token_budget, time_budget):
+                if category == "packed":
+                    skipped.extend(self._item_label(item.category, item.payload) for item in payload)
+                else:
+                    skipped.append(self._item_label(category, payload))
+                continue
+            pending[self._submit(category, payload)] = (index, time.perf_counter())
+        while pending:
+            self._collect(pending, items, results)
+        return results, skipped
+
+    def _submit(self, category: str, payload: Any) -> Future:
+        """
+        每个请求一个守护线程（而不是线程池）：超时被放弃的请求不会占住池中的线程，
+        LLM 调用耗时远大于建线程的开销。
+        """
+        future: Future = Future()
+
+        def run() -> None:
+            try:
+                future.set_result(self.analyze_item(category, payload))
+            except BaseException as e:
+                future.set_exception(e)
 
-    def _analyze_single_page(self, page_data: Dict[str, Any]) -> List[PotentialIssue]:
+        threading.Thread(target=run, name="llm-request", daemon=True).start()
+        return future
+
+    def _collect(self, pending: Dict[Future, Tuple[int, float]], items: List[tuple],
+                 results: List[List[PotentialIssue]]) -> None:
         """
-        针对单个页面构建 Prompt 并请求 LLM
+        等待至少一个在途请求完成或超时，并把结果写回对应下标。
+        被放弃的请求结束时只释放名额，结果丢弃。
         """
-        prompt = self._build_page_prompt(page_data)
+        timeout = None
+        if self.request_timeout and pending:
+            oldest = min(submitted for _, submitted in pending.values())
+            timeout = max(0.0, oldest + self.request_timeout - time.perf_counter())
+        done, _ = wait(list(pending) + self._abandoned, timeout=timeout, return_when=FIRST_COMPLETED)
+        self._live_abandoned()
+
+        for future in done:
+            if future not in pending:
+                continue
+            index, _ = pending.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                category, payload = items[index]
+                self.record_failure(category, payload)
+                self.logger.error(f"Error analyzing {category} {self._item_label(category, payload)}: {e}")
+
+        if self.request_timeout:
+            now = time.perf_counter()
+            for future, (index, submitted) in list(pending.items()):
+                if now - submitted >= self.request_timeout:
+                    del pending[future]
+                    self._abandoned.append(future)
+                    category, payload = items[index]
+                    with self._usage_lock:
+                        self.timeouts += 1
+                    self.record_failure(category, payload)
+                    self.logger.error(f"Timed out after {self.request_timeout}s analyzing {category} "
+                                      f"{self._item_label(category, payload)}")
+
+    def _live_abandoned(self) -> int:
+        """去掉已经结束的被放弃请求，返回仍在运行的个数。"""
+        self._abandoned = [future for future in self._abandoned if not future.done()]
+        return len(self._abandoned)
+
+    async def _arun_items(self, items: List[tuple], budget_start, token_budget: Optional[int],
+                          time_budget: Optional[float]) -> Tuple[List[List[PotentialIssue]], List[str]]:
+        """_run_items 的异步版本：信号量限制在途请求数，asyncio.wait_for 实现 request_timeout。"""
+        results: List[List[PotentialIssue]] = [[] for _ in items]
+        skipped: List[str] = []
+        slots = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(index: int, category: str, payload: Any) -> None:
+            try:
+                work = self.aanalyze_item(category, payload)
+                results[index] = await (asyncio.wait_for(work, self.request_timeout)
+                                        if self.request_timeout else work)
+            except asyncio.TimeoutError:
+                with self._usage_lock:
+                    self.timeouts += 1
+                self.record_failure(category, payload)
+                self.logger.error(f"Timed out after {self.request_timeout}s analyzing {category} "
+                                  f"{self._item_label(category, payload)}")
+            except Exception as e:
+                self.record_failure(category, payload)
+                self.logger.error(f"Error analyzing {category} {self._item_label(category, payload)}: {e}")
+            finally:
+                slots.release()
+
+        tasks = []
+        for index, (category, payload) in enumerate(items):
+            await slots.acquire()
+            if self._budget_exhausted(budget_start, token_budget, time_budget):
+                slots.release()
+                if category == "packed":
+                    skipped.extend(self._item_label(item.category, item.payload) for item in payload)
+                else:
+                    skipped.append(self._item_label(category, payload))
+                continue
+            tasks.append(asyncio.ensure_future(run(index, category, payload)))
+        if tasks:
+            await asyncio.gather(*tasks)
+        return results, skipped
+
+    def record_failure(self, category: str, payload: Any) -> None:
+        """记下没有拿到 LLM 结果的条目（打包条目展开成各自的标签）。"""
+        if category == "packed":
+            labels = [self._item_label(item.category, item.payload) for item in payload]
+        else:
+            labels = [self._item_label(category, payload)]
+        with self._usage_lock:
+            self.failed.extend(labels)
+
+    @staticmethod
+    def _item_label(category: str, payload: Any) -> str:
+        if category == "site_layout":
+            return "site_layout"
+        if category == "packed":
+            return ", ".join(OwaspTop10LLMAnalyzer._item_label(item.category, item.payload) for item in payload)
+        return payload.get("url") if isinstance(payload, dict) else category
+
+    def _budget_exhausted(self, budget_start, token_budget: Optional[int], time_budget: Optional[float]) -> bool:
+        tokens_at_start, started_at = budget_start
+        if token_budget and self.tokens_used - tokens_at_start >= token_budget:
+            return True
+        return bool(time_budget and time.perf_counter() - started_at >= time_budget)
+
+    @staticmethod
+    def propagate_to_duplicates(issues: List[PotentialIssue],
+                                near_duplicates: List[Dict[str, Any]]) -> List[PotentialIssue]:
+        """
+        把代表页的 issue 复制到同簇的近似重复页面：
+        location / url 改为成员页，related_input_id 按 input_map 换成成员页上的同名输入框。
+        复制出的 issue 紧跟在代表页的 issue 之后。
+        """
+        if not near_duplicates:
+            return issues
+        members: Dict[str, List[Dict[str, Any]]] = {}
+        for dup in near_duplicates:
+            members.setdefault(dup["representative"], []).append(dup)
+
+        result: List[PotentialIssue] = []
+        propagated: List[PotentialIssue] = []
+        last_location = None
+        for issue in issues:
+            # 代表页的 issue 是连续的，在换到下一个 location 时放出复制品
+            if issue.location != last_location:
+                result.extend(propagated)
+                propagated = []
+                last_location = issue.location
+            result.append(issue)
+            for dup in members.get(issue.location, []):
+                input_map = {int(k): v for k, v in dup.get("input_map", {}).items()}
+                propagated.append(replace(
+                    issue,
+                    location=dup["url"],
+                    url=dup["url"] if issue.url == issue.location else issue.url,
+                    related_input_id=input_map.get(issue.related_input_id) if issue.related_input_id is not None else None,
+                    suggested_tests=list(issue.suggested_tests),
+                    propagated_from=issue.location,
+                ))
+        result.extend(propagated)
+        return result
+
+    def analyze_item(self, category: str, payload: Any) -> List[PotentialIssue]:
+        """
+        分析单个分诊条目（流式流水线逐条调用）：
+        interactive 为页面 payload，site_layout 为布局块列表，standalone_apis 为接口 payload。
+        """
+        if category == "packed":
+            return self._analyze_packed(payload)
+        request = self._single_request(category, payload)
+        if request is None:
+            return []
+        return self._request_issues(*request)
+
+    async def aanalyze_item(self, category: str, payload: Any) -> List[PotentialIssue]:
+        """analyze_item 的异步版本。"""
+        if not hasattr(self.llm_client, "acomplete"):
+            return await asyncio.to_thread(self.analyze_item, category, payload)
+        if category == "packed":
+            return await self._aanalyze_packed(payload)
+        request = self._single_request(category, payload)
+        if request is None:
+            return []
+        return await self._arequest_issues(*request)
+
+    def _complete(self, prompt: str, label: str) -> str:
+        """
+        调用 LLM 并记录用量：客户端实现了 complete_with_usage 时用服务端返回的 token 数，否则本地估算。
+        """
+        started = time.perf_counter()
+        prompt_tokens = completion_tokens = None
+        cached = False
+        if hasattr(self.llm_client, "complete_with_usage"):
+            response = self.llm_client.complete_with_usage(prompt)
+            raw_response = response.text
+            prompt_tokens, completion_tokens = response.prompt_tokens, response.completion_tokens
+            cached = getattr(response, "cached", False)
+        else:
+            raw_response = self.llm_client.complete(prompt)
+
+        self._record_usage(label, prompt, raw_response, started, prompt_tokens, completion_tokens, cached)
+        return raw_response
+
+    def _complete_streaming(self, prompt: str, label: str,
+                            accept: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        流式调用 LLM：每个 issue 对象闭合就交给 accept；顶层 JSON 闭合或达到 max_issues_per_item 时
+        关闭流（本地服务端随连接断开停止生成）。流式输出没有 usage，token 按本地估算。
+        """
+        started = time.perf_counter()
+        parser = IssueStreamParser(max_issues=self.max_issues_per_item)
+        stream = self.llm_client.stream_complete(prompt, json_schema=self.ISSUES_JSON_SCHEMA)
+        try:
+            for chunk in stream:
+                for item in parser.feed(chunk):
+                    accept(item)
+                if parser.done:
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        if parser.errors:
+            with self._usage_lock:
+                self.parse_errors += parser.errors
+        if not parser.issues and not parser.done:
+            self.logger.warning(f"Incomplete LLM response for {label}: {parser.text[:100]}...")
+        self._record_usage(label, prompt, parser.text, started, cached=getattr(stream, "cached", False))
+
+    async def _acomplete(self, prompt: str, label: str) -> str:
+        """_complete 的异步版本（acomplete_with_usage / acomplete）。"""
+        started = time.perf_counter()
+        prompt_tokens = completion_tokens = None
+        if hasattr(self.llm_client, "acomplete_with_usage"):
+            response = await self.llm_client.acomplete_with_usage(prompt)
+            raw_response = response.text
+            prompt_tokens, completion_tokens = response.prompt_tokens, response.completion_tokens
+        else:
+            raw_response = await self.llm_client.acomplete(prompt)
+        self._record_usage(label, prompt, raw_response, started, prompt_tokens, completion_tokens)
+        return raw_response
+
+    async def _acomplete_streaming(self, prompt: str, label: str,
+                                   accept: Callable[[Dict[str, Any]], None]) -> None:
+        """_complete_streaming 的异步版本（astream），提前结束时 aclose() 关闭流。"""
+        started = time.perf_counter()
+        parser = IssueStreamParser(max_issues=self.max_issues_per_item)
+        stream = self.llm_client.astream(prompt, json_schema=self.ISSUES_JSON_SCHEMA)
+        try:
+            async for chunk in stream:
+                for item in parser.feed(chunk):
+                    accept(item)
+                if parser.done:
+                    break
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        if parser.errors:
+            with self._usage_lock:
+                self.parse_errors += parser.errors
+        if not parser.issues and not parser.done:
+            self.logger.warning(f"Incomplete LLM response for {label}: {parser.text[:100]}...")
+        self._record_usage(label, prompt, parser.text, started)
+
+    def _record_usage(self, label: str, prompt: str, raw_response: str, started: float,
+                      prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+                      cached: bool = False) -> None:
+        usage = LLMCallUsage(
+            label=label,
+            prompt_tokens=prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt),
+            completion_tokens=completion_tokens if completion_tokens is not None else estimate_tokens(raw_response),
+            estimated=prompt_tokens is None or completion_tokens is None,
+            cached=cached,
+            seconds=time.perf_counter() - started,
+        )
+        with self._usage_lock:
+            self.usage.append(usage)
+            if not cached:
+                self.tokens_used += usage.prompt_tokens + usage.completion_tokens
+
+    def _request_issues(self, prompt: str, label: str,
+                        fixup: Optional[Callable[[PotentialIssue], None]] = None) -> List[PotentialIssue]:
+        """
+        发送单条 Prompt 并解析 issue：能流式时边生成边解析，否则等完整响应。
+        每个 issue 经 fixup 修正位置后回调 on_issue。
+        """
+        issues: List[PotentialIssue] = []
+        accept = self._issue_acceptor(issues, fixup)
+        if self.stream_output and hasattr(self.llm_client, "stream_complete"):
+            self._complete_streaming(prompt, label, accept)
+        else:
+            for item in self._parse_issue_dicts(self._complete(prompt, label)):
+                accept(item)
+        return issues
+
+    async def _arequest_issues(self, prompt: str, label: str,
+                               fixup: Optional[Callable[[PotentialIssue], None]] = None) -> List[PotentialIssue]:
+        """_request_issues 的异步版本。"""
+        issues: List[PotentialIssue] = []
+        accept = self._issue_acceptor(issues, fixup)
+        if self.stream_output and hasattr(self.llm_client, "astream"):
+            await self._acomplete_streaming(prompt, label, accept)
+        else:
+            for item in self._parse_issue_dicts(await self._acomplete(prompt, label)):
+                accept(item)
+        return issues
+
+    def _issue_acceptor(self, issues: List[PotentialIssue],
+                        fixup: Optional[Callable[[PotentialIssue], None]]) -> Callable[[Dict[str, Any]], None]:
+        """issue 字典 -> PotentialIssue：经 fixup 修正后追加到 issues 并回调 on_issue。"""
+        def accept(item: Dict[str, Any]) -> None:
+            issue = self._issues_from_dicts([item])[0]
+            if fixup is not None:
+                fixup(issue)
+            issues.append(issue)
+            if self.on_issue is not None:
+                self.on_issue(issue)
+        return accept
+
+    def _encode(self, data: Any) -> Tuple[str, str]:
+        """Prompt 上下文序列化，返回 (JSON, 键名图例)。"""
+        if self.compact_context:
+            return encode_context(data)
+        return json.dumps(data, indent=2, ensure_ascii=False), ""
+
+    def _single_request(self, category: str, payload: Any) -> Optional[tuple]:
+        """
+        单条 Prompt 的 (prompt, 用量标签, issue 位置修正)；不需要分析的类别返回 None。
+        interactive 为页面 payload，site_layout 为布局块列表，standalone_apis 为接口 payload。
+        """
+        if category == "interactive":
+            def fixup(issue: PotentialIssue) -> None:
+                issue.location = payload['url']
+
+            return self._build_page_prompt(payload), payload.get('url'), fixup
 
-        # 调用 LLM
-        raw_response = self.llm_client.complete(prompt)
+        if category == "site_layout":
+            # 对站点公共布局（导航栏 / 页脚 / 横幅等）单独分析一次
+            # 块内输入框来自各块的首个样本页：引用了输入框的 issue 的 url 换成该页，其余 ID 无效
+            input_pages = {i["internal_id"]: i["page_url"] for block in payload for i in block.get("inputs", [])}
 
-        # 解析结果
-        return self._parse_llm_json(raw_response)
+            def fixup(issue: PotentialIssue) -> None:
+                if not issue.location or issue.location == "Unknown":
+                    issue.location = "Site Layout (shared by multiple pages)"
+                if issue.related_input_id in input_pages:
+                    issue.url = input_pages[issue.related_input_id]
+                else:
+                    issue.related_input_id = None
 
-    def _analyze_single_api(self, api_data: Dict[str, Any]) -> List[PotentialIssue]:
+            return self._build_layout_prompt(payload), "site_layout", fixup
+
+        if category == "standalone_apis":
+            return self._build_api_prompt(payload), payload.get('url'), None
+        return None
+
+    def _analyze_packed(self, batch: List[PackedItem]) -> List[PotentialIssue]:
         """
-        针对单个 API 构建 Prompt 并请求 LLM
+        一个 Prompt 分析一箱同类条目，按编号拆回各条目；
+        缺少编号或整体解析失败的条目回退到单条 Prompt。
         """
-        prompt = self._build_api_prompt(api_data)
-        raw_response = self.llm_client.complete(prompt)
-        return self._parse_llm_json(raw_response)
+        raw_response = self._complete(self._build_packed_prompt(batch[0].category, batch),
+                                      self._item_label("packed", batch))
+        per_item = self._unpack(batch, raw_response)
+        issues: List[PotentialIssue] = []
+        for item in batch:
+            issues.extend(per_item[item.item_id] if item.item_id in per_item
+                          else self.analyze_item(item.category, item.payload))
+        return issues
+
+    async def _aanalyze_packed(self, batch: List[PackedItem]) -> List[PotentialIssue]:
+        """_analyze_packed 的异步版本，回退的条目并发发出单条 Prompt。"""
+        raw_response = await self._acomplete(self._build_packed_prompt(batch[0].category, batch),
+                                             self._item_label("packed", batch))
+        per_item = self._unpack(batch, raw_response)
+        fallbacks = [self.aanalyze_item(item.category, item.payload) for item in batch if item.item_id not in per_item]
+        fallback_results = iter(await asyncio.gather(*fallbacks))
+        issues: List[PotentialIssue] = []
+        for item in batch:
+            issues.extend(per_item[item.item_id] if item.item_id in per_item else next(fallback_results))
+        return issues
+
+    def _unpack(self, batch: List[PackedItem], raw_response: str) -> Dict[str, List[PotentialIssue]]:
+        """按编号拆回各条目的 issue（已回调 on_issue）；缺失的编号计入 pack_fallbacks，不出现在结果中。"""
+        per_item = PromptPacker.split_response(raw_response, [item.item_id for item in batch])
+        unpacked: Dict[str, List[PotentialIssue]] = {}
+        for item in batch:
+            if item.item_id not in per_item:
+                with self._usage_lock:
+                    self.pack_fallbacks += 1
+                continue
+            item_issues = self._issues_from_dicts(per_item[item.item_id][:self.max_issues_per_item])
+            for issue in item_issues:
+                if item.category == "interactive":
+                    issue.location = item.payload['url']
+                if self.on_issue is not None:
+                    self.on_issue(issue)
+            unpacked[item.item_id] = item_issues
+        return unpacked
 
     def _build_page_prompt(self, page_data: Dict[str, Any]) -> str:
         """
         构建页面分析 Prompt
         """
         # 将字典转为 JSON 字符串，作为 Context
-        context_json = json.dumps(page_data, indent=2, ensure_ascii=False)
+        context_json, legend = self._encode(page_data)
 
         return f"""
         You are a Web Security Expert specializing in automated vulnerability detection.
 
         ### TARGET CONTEXT (JSON)
         {context_json}
+        {legend}
 
         ### TASK
         Analyze the "structure_snapshot" (HTML), "inputs", and "observed_traffic".
         Identify potential security risks. You MUST distinguish between different types of injection.
+        Comments like <!-- layout:L1 --> mark shared site layout (nav bar, footer, ...) that is analyzed
+        separately; only report issues in the page-specific parts.
 
         Focus on these specific categories:
         1. **SQL Injection (SQLi)**: Look for inputs that interact with databases (e.g., search, login, id parameters).
@@ -174,17 +764,59 @@ class OwaspTop10LLMAnalyzer:
         If no obvious risks are found, return {{ "issues": [] }}.
         """
 
+    def _build_layout_prompt(self, layout_blocks: List[Dict[str, Any]]) -> str:
+        """
+        构建公共布局分析 Prompt
+        """
+        context_json, legend = self._encode(layout_blocks)
+
+        return f"""
+You are a Web Security Expert. Analyze the shared layout of this website.
+
+### SHARED LAYOUT BLOCKS (JSON)
+{context_json}
+{legend}
+
+### TASK
+Each block is an HTML fragment (nav bar, footer, cookie banner, sidebar, ...) that appears on
+"page_count" pages; "sample_pages" lists some of them. Any issue here affects every such page.
+"inputs" lists the block's input fields; reference them by "internal_id" in "related_input_id".
+Focus on:
+1. **Cross-Site Scripting (XSS)**: global search boxes, inline event handlers, reflected values.
+2. **Sensitive Data Exposure**: secrets or internal paths in comments, meta tags, data-* attributes.
+3. **Broken Access Control**: links to admin / debug / internal endpoints.
+
+### OUTPUT REQUIREMENT
+Return a STRICT JSON object. Use one of the "sample_pages" as "url".
+{{
+  "issues": [
+    {{
+      "location": "Layout L1 -> Input: q",
+      "url": "copy one of the sample_pages",
+      "owasp_category": "A03: Cross-Site Scripting (XSS)",
+      "risk_reason": "The global search box is rendered on every page...",
+      "suggested_tests": ["Try <script>alert(1)</script> in the search box"],
+      "related_input_id": 7,
+      "related_api_url": null,
+      "confidence": "Medium"
+    }}
+  ]
+}}
+If no obvious risks are found, return {{ "issues": [] }}.
+"""
+
     def _build_api_prompt(self, api_data: Dict[str, Any]) -> str:
         """
         构建 API 分析 Prompt
         """
-        context_json = json.dumps(api_data, indent=2, ensure_ascii=False)
+        context_json, legend = self._encode(api_data)
 
         return f"""
 You are a Web Security Expert. Analyze this discovered API endpoint.
 
 ### API CONTEXT (JSON)
 {context_json}
+{legend}
 
 ### TASK
 This is a standalone API endpoint discovered via JavaScript or fuzzing.
@@ -209,12 +841,69 @@ Return a STRICT JSON object.
     }}
   ]
 }}
+"""
+
+    def _build_packed_prompt(self, category: str, batch: List[PackedItem]) -> str:
+        """
+        构建打包 Prompt：任务说明只出现一次，条目带 "id"，输出按 id 分组
+        """
+        context_json, legend = self._encode([{"id": item.item_id, **item.payload} for item in batch])
+        if category == "interactive":
+            task = """Each item is a web page. Analyze its "structure_snapshot" (HTML), "inputs" and "observed_traffic".
+Comments like <!-- layout:L1 --> mark shared site layout that is analyzed separately; ignore it.
+Focus on SQL Injection, Cross-Site Scripting (XSS), Broken Access Control (IDOR) and Sensitive Data Exposure.
+"related_input_id" must be an "internal_id" from the same item's "inputs"."""
+        else:
+            task = """Each item is a standalone API endpoint discovered via JavaScript or fuzzing.
+Determine how to abuse it: method tampering (can GET be POST?), missing auth (IDOR / admin endpoint),
+and which parameters it likely accepts. Set "related_api_url" to the item's url."""
+
+        return f"""
+You are a Web Security Expert. Analyze each of the following items independently.
+
+### ITEMS (JSON)
+{context_json}
+{legend}
+
+### TASK
+{task}
+
+### OUTPUT REQUIREMENT
+Return a STRICT JSON object keyed by item "id", with an entry for EVERY id (empty list if no risks).
+No markdown formatting. Use specific categories such as "A03: SQL Injection", "A03: Cross-Site Scripting (XSS)",
+"A03: Command Injection", "A01: Broken Access Control", "A07: Identification and Authentication Failures"
+(never the generic "A03: Injection").
+{{
+  "results": {{
+    "{batch[0].item_id}": {{
+      "issues": [
+        {{
+          "location": "API: /api/user -> Param: id",
+          "url": "copy the item's url",
+          "owasp_category": "A01: Broken Access Control",
+          "risk_reason": "Numeric id parameter without visible authorization...",
+          "suggested_tests": ["Change id to another user's id"],
+          "related_input_id": null,
+          "related_api_url": "/api/user",
+          "confidence": "Medium"
+        }}
+      ]
+    }},
+    "{batch[-1].item_id}": {{ "issues": [] }}
+  }}
+}}
 """
 
     def _parse_llm_json(self, raw_text: str) -> List[PotentialIssue]:
         """
         鲁棒的 JSON 解析器
         """
+        return self._issues_from_dicts(self._parse_issue_dicts(raw_text))
+
+    def _parse_issue_dicts(self, raw_text: str) -> List[Dict[str, Any]]:
+        """
+        完整响应先整体 json.loads；失败时（语法错误、输出被截断）用增量解析器逐个抢救已闭合的 issue 对象。
+        """
         try:
             # 有时候 LLM 会返回 ```json ... ```，需要清洗
             clean_text = raw_text.strip()
@@ -225,24 +914,32 @@ Return a STRICT JSON object.
                     clean_text = clean_text[4:].strip()
 
             data = json.loads(clean_text)
-
-            issues = []
-            for item in data.get("issues", []):
-                issues.append(PotentialIssue(
-                    location=item.get("location", "Unknown"),
-                    url=item.get("url", "Unknown"),
-                    owasp_category=item.get("owasp_category", "Unknown"),
-                    risk_reason=item.get("risk_reason", ""),
-                    suggested_tests=item.get("suggested_tests", []),
-                    related_input_id=item.get("related_input_id"),
-                    related_api_url=item.get("related_api_url"),
-                    confidence=item.get("confidence", "Medium")
-                ))
-            return issues
+            items = data.get("issues", [])
+            return [item for item in items if isinstance(item, dict)][:self.max_issues_per_item]
 
         except json.JSONDecodeError:
-            self.logger.warning(f"Failed to parse LLM response as JSON: {raw_text[:100]}...")
-            return []
+            parser = parse_issues(raw_text, max_issues=self.max_issues_per_item)
+            with self._usage_lock:
+                self.parse_errors += parser.errors
+            self.logger.warning(f"Failed to parse LLM response as JSON, recovered {len(parser.issues)} issues: "
+                                f"{raw_text[:100]}...")
+            return parser.issues
         except Exception as e:
             self.logger.error(f"Error parsing issues: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    @staticmethod
+    def _issues_from_dicts(items: List[Dict[str, Any]]) -> List[PotentialIssue]:
+        return [
+            PotentialIssue(
+                location=item.get("location", "Unknown"),
+                url=item.get("url", "Unknown"),
+                owasp_category=item.get("owasp_category", "Unknown"),
+                risk_reason=item.get("risk_reason", ""),
+                suggested_tests=item.get("suggested_tests", []),
+                related_input_id=item.get("related_input_id"),
+                related_api_url=item.get("related_api_url"),
+                confidence=item.get("confidence", "Medium")
+            )
+            for item in items
+        ]
\ No newline at end of file
@@ -0,0 +1,230 @@
+# script/analysis/priority_model.py
+"""
+页面优先级模型 (Page Priority Model)
+
+问题：分诊只把页面分成 interactive / clues / static 几个桶，每个交互页分到的 LLM 时间相同；
+LLM 预算有限时，登录表单、带反射参数的搜索页和只有一个数量输入框的商品页排在同一位置。
+
+做法：
+  1. 从 PageAsset 提取固定顺序的数值特征（输入框类型、密码框、状态变更类 API、反射的 URL 参数、
+     报错关键字、是否需要登录 ...），大多取 log1p 压缩量纲
+  2. 逻辑回归给出 0~1 的优先级；默认权重是人工先验，不训练也能用
+  3. 每次运行结束后把 (特征, 是否被攻击确认) 追加到样本文件，用全部样本重新拟合（梯度下降 + L2，
+     从当前权重出发），权重以 JSON 落盘，下次运行加载
+分析器按优先级从高到低处理页面，超出 token / 时间预算后跳过剩余页面。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from scanner.page_asset import PageAsset, SiteAsset
+
+
+FEATURE_NAMES: Tuple[str, ...] = (
+    "inputs",               # log1p(输入框数)
+    "password_inputs",      # 有密码框
+    "text_inputs",          # log1p(可自由输入文本的输入框数：text / search / email / textarea ...)
+    "hidden_inputs",        # log1p(隐藏字段数)
+    "file_inputs",          # 有文件上传
+    "url_params",           # log1p(URL 查询参数个数)
+    "reflected_params",     # log1p(取值原样出现在页面里的 URL 参数个数)
+    "id_params",            # 有 id / uid / user_id 一类参数（IDOR 线索）
+    "state_changing_apis",  # log1p(POST / PUT / PATCH / DELETE 调用数)
+    "read_apis",            # log1p(GET 等其他调用数)
+    "error_keywords",       # log1p(报错 / 堆栈关键字命中数)
+    "auth_required",        # 游客访问时被拦截、登录后才扫到的页面
+    "login_like",           # URL 像登录 / 管理入口
+)
+
+# 人工先验：未训练时的默认权重
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "inputs": 0.3,
+    "password_inputs": 1.2,
+    "text_inputs": 0.6,
+    "hidden_inputs": 0.1,
+    "file_inputs": 0.8,
+    "url_params": 0.3,
+    "reflected_params": 1.5,
+    "id_params": 0.6,
+    "state_changing_apis": 0.8,
+    "read_apis": 0.2,
+    "error_keywords": 0.7,
+    "auth_required": 0.5,
+    "login_like": 0.6,
+}
+DEFAULT_BIAS = -2.0
+
+_TEXT_INPUT_TYPES = frozenset({None, "", "text", "search", "email", "url", "tel", "number"})
+_STATE_CHANGING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+_ID_PARAM_NAMES = frozenset({"id", "uid", "user", "userid", "user_id", "account", "order", "order_id", "file", "doc"})
+_LOGIN_URL_KEYWORDS = ("login", "signin", "auth", "admin", "register", "reset")
+_ERROR_KEYWORDS = (
+    "stacktrace", "traceback", "syntaxerror", "exception at", "internal server error",
+    "sql syntax", "sqlstate", "odbc", "unexpected path", "node_modules", "warning:",
+)
+
+
+def page_features(page: PageAsset, site_asset: Optional[SiteAsset] = None) -> Dict[str, float]:
+    """PageAsset -> {特征名: 取值}，键与 FEATURE_NAMES 一致。"""
+    types = [(i.input_type or "").lower() if i.tag == "input" else i.tag for i in page.inputs]
+    params = parse_qsl(urlsplit(page.url).query, keep_blank_values=True)
+    html = page.html or page.cleaned_html or ""
+    lower_html = (page.cleaned_html or html).lower()
+
+    reflected = sum(1 for _, value in params if len(value) >= 3 and value in html)
+    methods = [(api.method or "GET").upper() for api in page.api_calls]
+    state_changing = sum(1 for m in methods if m in _STATE_CHANGING_METHODS)
+    url = page.url.lower()
+
+    return {
+        "inputs": math.log1p(len(page.inputs)),
+        "password_inputs": float("password" in types),
+        "text_inputs": math.log1p(sum(1 for t in types if t in _TEXT_INPUT_TYPES or t == "textarea")),
+        "hidden_inputs": math.log1p(types.count("hidden")),
+        "file_inputs": float("file" in types),
+        "url_params": math.log1p(len(params)),
+        "reflected_params": math.log1p(reflected),
+        "id_params": float(any(name.lower() in _ID_PARAM_NAMES for name, _ in params)),
+        "state_changing_apis": math.log1p(state_changing),
+        "read_apis": math.log1p(len(methods) - state_changing),
+        "error_keywords": math.log1p(sum(1 for kw in _ERROR_KEYWORDS if kw in lower_html)),
+        "auth_required": float(site_asset is not None and page.url in site_asset.auth_required_urls),
+        "login_like": float(any(kw in url for kw in _LOGIN_URL_KEYWORDS)),
+    }
+
+
+def vectorize(features: Dict[str, float]) -> List[float]:
+    """按 FEATURE_NAMES 顺序展开；缺失的特征（旧样本）记 0。"""
+    return [float(features.get(name, 0.0)) for name in FEATURE_NAMES]
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+class PriorityModel:
+    """
+    用法：
+        model = PriorityModel.load(path)           # 文件不存在时使用默认先验
+        score = model.score_page(page, site_asset)
+        model.fit(samples); model.save(path)       # samples: [(特征 dict, 0/1), ...]
+    """
+
+    VERSION = 1
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = DEFAULT_BIAS,
+                 trained_on: int = 0) -> None:
+        merged = dict(DEFAULT_WEIGHTS)
+        merged.update(weights or {})
+        self.weights = [merged[name] for name in FEATURE_NAMES]
+        self.bias = bias
+        self.trained_on = trained_on   # 最近一次拟合使用的样本数
+
+    # ===========================
+    # 打分
+    # ===========================
+    def score(self, features: Dict[str, float]) -> float:
+        return _sigmoid(self.bias + sum(w * x for w, x in zip(self.weights, vectorize(features))))
+
+    def score_page(self, page: PageAsset, site_asset: Optional[SiteAsset] = None) -> float:
+        return self.score(page_features(page, site_asset))
+
+    # ===========================
+    # 训练
+    # ===========================
+    def fit(self, samples: Sequence[Tuple[Dict[str, float], int]], epochs: int = 300,
+            learning_rate: float = 0.5, l2: float = 0.01) -> "PriorityModel":
+        """
+        全量梯度下降拟合逻辑回归，从当前权重出发。
+        L2 把权重拉向默认先验而不是 0：样本少的时候模型不会偏离人工先验太远。
+        """
+        if not samples:
+            return self
+        rows = [vectorize(features) for features, _ in samples]
+        labels = [1.0 if label else 0.0 for _, label in samples]
+        prior = [DEFAULT_WEIGHTS[name] for name in FEATURE_NAMES]
+        n = len(rows)
+
+        for _ in range(epochs):
+            grad = [0.0] * len(FEATURE_NAMES)
+            grad_bias = 0.0
+            for row, label in zip(rows, labels):
+                error = _sigmoid(self.bias + sum(w * x for w, x in zip(self.weights, row))) - label
+                grad_bias += error
+                for j, x in enumerate(row):
+                    grad[j] += error * x
+            for j in range(len(self.weights)):
+                step = grad[j] / n + l2 * (self.weights[j] - prior[j])
+                self.weights[j] -= learning_rate * step
+            self.bias -= learning_rate * grad_bias / n
+
+        self.trained_on = n
+        return self
+
+    # ===========================
+    # 持久化
+    # ===========================
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "version": self.VERSION,
+            "weights": dict(zip(FEATURE_NAMES, (round(w, 6) for w in self.weights))),
+            "bias": round(self.bias, 6),
+            "trained_on": self.trained_on,
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "PriorityModel":
+        """读取落盘的权重；文件不存在或损坏时返回默认先验。未知特征忽略，新增特征取默认权重。"""
+        if not path or not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            weights = {k: float(v) for k, v in data.get("weights", {}).items() if k in DEFAULT_WEIGHTS}
+            return cls(weights, float(data.get("bias", DEFAULT_BIAS)), int(data.get("trained_on", 0)))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"[WARN] Failed to load priority model {path}: {e}")
+            return cls()
+
+
+# ===========================
+# 训练样本（JSON Lines，每行一个页面）
+# ===========================
+def append_samples(path: str, samples: Iterable[Tuple[str, Dict[str, float], int]]) -> int:
+    """追加 (url, 特征, 是否确认漏洞) 样本，返回写入条数。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    count = 0
+    with open(path, "a", encoding="utf-8") as f:
+        for url, features, label in samples:
+            f.write(json.dumps({"url": url, "features": features, "label": int(bool(label))}) + "\n")
+            count += 1
+    return count
+
+
+def read_samples(path: str) -> List[Tuple[Dict[str, float], int]]:
+    if not os.path.exists(path):
+        return []
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                samples.append((row["features"], int(row["label"])))
+            except (ValueError, KeyError, TypeError):
+                continue  # 写到一半中断的行
+    return samples
@@ -0,0 +1,126 @@
+# script/analysis/prompt_packer.py
+"""
+批量 Prompt 打包 (Prompt Packer)
+
+问题：每个独立 API、每个很小的交互页都单独发一次 Prompt，几百 token 的上下文前面
+重复着上千 token 的任务说明和输出格式，prefill 大部分花在说明上。
+
+做法：
+  1. 同类条目（standalone_apis / 小的 interactive 页面）按顺序贪心装箱，每箱内容不超过 token_budget、
+     条目数不超过 max_items；超过 small_page_tokens 的页面仍单独分析
+  2. 箱内条目编号 I1, I2 ...，Prompt 只带一份任务说明，要求模型按编号返回：
+         {"results": {"I1": {"issues": [...]}, "I2": {"issues": []}}}
+  3. split_response 按编号拆回每个条目的 issue；整体解析失败或缺少某个编号时，
+     分析器对这些条目回退到单条 Prompt
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from analysis.context_compressor import estimate_tokens
+
+
+@dataclass
+class PackedItem:
+    item_id: str            # 箱内编号，如 "I1"
+    category: str           # interactive / standalone_apis
+    payload: Dict[str, Any]
+    tokens: int             # payload 序列化后的估算 token 数
+
+
+class PromptPacker:
+
+    # 可以打包的分诊类别
+    PACKABLE_CATEGORIES = ("interactive", "standalone_apis")
+
+    def __init__(self, token_budget: int = 3000, max_items: int = 8, small_page_tokens: int = 600) -> None:
+        """
+        token_budget: 一箱内所有条目 payload 的估算 token 上限（不含任务说明）
+        max_items: 一箱最多条目数，太多时小模型容易漏掉编号
+        small_page_tokens: interactive 页面 payload 不超过该值才参与打包
+        """
+        self.token_budget = token_budget
+        self.max_items = max(1, max_items)
+        self.small_page_tokens = small_page_tokens
+
+    # ===========================
+    # 装箱
+    # ===========================
+    def group(self, items: Sequence[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+        """
+        把 (类别, payload) 列表中可打包的条目换成 ("packed", [PackedItem, ...])，
+        每箱放在其第一个条目原来的位置；只有一个条目的箱还原成普通条目。
+        """
+        units: List[Tuple[str, Any]] = []
+        # 类别 -> (该类别当前箱在 units 中的位置, 箱内条目, 已用 token)
+        open_boxes: Dict[str, Tuple[int, List[PackedItem], int]] = {}
+
+        for category, payload in items:
+            tokens = self._payload_tokens(category, payload)
+            if tokens is None:
+                units.append((category, payload))
+                continue
+
+            box = open_boxes.get(category)
+            if box is not None and (len(box[1]) >= self.max_items or box[2] + tokens > self.token_budget):
+                box = None
+            if box is None:
+                box = (len(units), [], 0)
+                units.append(("packed", box[1]))
+            position, members, used = box
+            members.append(PackedItem(f"I{len(members) + 1}", category, payload, tokens))
+            open_boxes[category] = (position, members, used + tokens)
+
+        return [
+            (unit[1][0].category, unit[1][0].payload) if unit[0] == "packed" and len(unit[1]) == 1 else unit
+            for unit in units
+        ]
+
+    def _payload_tokens(self, category: str, payload: Any) -> Optional[int]:
+        """可打包时返回 payload 的估算 token 数，否则返回 None。"""
+        if category not in self.PACKABLE_CATEGORIES or not isinstance(payload, dict):
+            return None
+        tokens = estimate_tokens(json.dumps(payload, ensure_ascii=False))
+        if category == "interactive" and tokens > self.small_page_tokens:
+            return None
+        if tokens > self.token_budget:
+            return None
+        return tokens
+
+    # ===========================
+    # 输出拆分
+    # ===========================
+    @staticmethod
+    def split_response(raw_text: str, item_ids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        解析 {"results": {编号: {"issues": [...]}}}，返回 编号 -> issue 字典列表。
+        也接受 {编号: [...]} 和 {"results": [{"id": 编号, "issues": [...]}]}。
+        解析失败时返回空字典；缺失的编号不出现在结果中（由调用方回退到单条 Prompt）。
+        """
+        text = raw_text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0].strip()
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        results = data.get("results", data)
+        if isinstance(results, list):
+            results = {entry.get("id"): entry for entry in results if isinstance(entry, dict)}
+        if not isinstance(results, dict):
+            return {}
+
+        split: Dict[str, List[Dict[str, Any]]] = {}
+        for item_id in item_ids:
+            entry = results.get(item_id)
+            issues = entry.get("issues") if isinstance(entry, dict) else entry
+            if isinstance(issues, list):
+                split[item_id] = [issue for issue in issues if isinstance(issue, dict)]
+        return split
@@ -0,0 +1,148 @@
+# script/analysis/streaming_pipeline.py
+"""
+流式 爬取 → 分诊 → 分析 流水线 (Streaming Pipeline)
+
+分阶段执行时，整站爬完才分诊、分诊完才第一次调用 LLM，爬取期间 LLM 一直空闲，
+总耗时约等于 爬取 + 分析。
+
+这里让每个 PageAsset 在爬到时就经过 StreamingTriager 分诊，需要分析的条目进入有界队列，
+由后台线程调用 LLM；爬取（Playwright 同步 API，只能在主线程）同时继续。
+队列满时 feed() 阻塞爬虫线程（背压），避免 LLM 跟不上时内存里堆积大量 payload。
+总耗时趋近 max(爬取, 分析)。
+
+用法（PTAgent 中）：
+    pipeline = StreamingAnalysisPipeline(analyzer, page_token_budget=...)
+    site_asset = scanner.scan(on_page=pipeline.feed)
+    triaged_data, analysis_result = pipeline.finish(site_asset)
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from scanner.page_asset import PageAsset, SiteAsset
+from analysis.asset_triager import StreamingTriager
+from analysis.owasp_llm_analyzer import OwaspAnalysisResult, OwaspTop10LLMAnalyzer, PotentialIssue
+
+
+# 队列中的结束标记
+_STOP = object()
+
+
+class StreamingAnalysisPipeline:
+
+    def __init__(
+            self,
+            analyzer: OwaspTop10LLMAnalyzer,
+            workers: int = 2,
+            queue_size: int = 4,
+            layout_warmup_pages: int = 5,
+            **triager_kwargs: Any,
+    ) -> None:
+        """
+        workers: 并发调用 LLM 的线程数
+        queue_size: 待分析条目的队列上限（背压阈值）
+        layout_warmup_pages / triager_kwargs: 传给 StreamingTriager
+        """
+        self.analyzer = analyzer
+        self.workers = max(1, workers)
+        self.layout_warmup_pages = layout_warmup_pages
+        self.triager_kwargs = triager_kwargs
+
+        self.triager: Optional[StreamingTriager] = None
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # 序号 -> 该条目的分析结果；finish 时按入队顺序合并
+        self._results: Dict[int, List[PotentialIssue]] = {}
+        self._next_seq = 0
+
+        # 统计信息
+        self.items_queued = 0
+        self.items_failed = 0
+        self.blocked_seconds = 0.0     # 爬虫线程因队列已满而等待的时间
+        self.analysis_seconds = 0.0    # 各工作线程调用 LLM 的累计时间
+        self._started_at: Optional[float] = None
+
+    # ==============================
+    # 爬虫线程调用
+    # ==============================
+    def feed(self, page: PageAsset, site_asset: SiteAsset) -> None:
+        """SiteScanner.scan(on_page=...) 的回调：分诊新页面及新发现的接口，需要分析的条目入队。"""
+        if self.triager is None:
+            self._start(site_asset)
+        items = self.triager.add_page(page)
+        items.extend(self.triager.add_apis())
+        self._enqueue(items)
+
+    def finish(self, site_asset: SiteAsset) -> Tuple[Dict[str, List[Dict[str, Any]]], OwaspAnalysisResult]:
+        """爬取结束后调用：放出剩余条目，等待分析完成，返回 (分诊结果, 分析结果)。"""
+        if self.triager is None:
+            # 一个页面都没爬到（例如首页就是 API）：仍需处理独立接口
+            self._start(site_asset)
+
+        self._enqueue(self.triager.finish())
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+        with self._lock:
+            issues = [issue for seq in sorted(self._results) for issue in self._results[seq]]
+        issues = self.analyzer.propagate_to_duplicates(issues, self.triager.buckets["near_duplicates"])
+        elapsed = time.perf_counter() - self._started_at
+        print(f"[*] Streaming analysis: {self.items_queued} items, {len(issues)} issues, "
+              f"{self.items_failed} failed | wall {elapsed:.1f}s, LLM {self.analysis_seconds:.1f}s, "
+              f"crawler blocked {self.blocked_seconds:.1f}s")
+        return self.triager.buckets, OwaspAnalysisResult(issues=issues, usage=self.analyzer.usage_summary(),
+                                                   failed=list(self.analyzer.failed))
+
+    # ==============================
+    # 内部
+    # ==============================
+    def _start(self, site_asset: SiteAsset) -> None:
+        self.triager = StreamingTriager(site_asset, layout_warmup_pages=self.layout_warmup_pages,
+                                        **{"compact_context": self.analyzer.compact_context, **self.triager_kwargs})
+        self._started_at = time.perf_counter()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"llm-analyzer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _enqueue(self, items: List[Tuple[str, Any]]) -> None:
+        for category, payload in items:
+            if category not in self.analyzer.ANALYZED_CATEGORIES:
+                continue
+            seq = self._next_seq
+            self._next_seq += 1
+            self.items_queued += 1
+            try:
+                self._queue.put_nowait((seq, category, payload))
+            except queue.Full:
+                start = time.perf_counter()
+                self._queue.put((seq, category, payload))
+                self.blocked_seconds += time.perf_counter() - start
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            seq, category, payload = item
+            start = time.perf_counter()
+            try:
+                issues = self.analyzer.run_item(category, payload)
+            except Exception as e:
+                label = payload.get("url") if isinstance(payload, dict) else category
+                self.analyzer.logger.error(f"Error analyzing {category} {label}: {e}")
+                self.analyzer.record_failure(category, payload)
+                issues = []
+                with self._lock:
+                    self.items_failed += 1
+            with self._lock:
+                self._results[seq] = issues
+                self.analysis_seconds += time.perf_counter() - start
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 # 如果报错找不到模块，可能需要调整 import 路径，例如: from script.utils.local_llm_client ...
 from script.agent.pt_agent import PTAgent
 from script.utils.llm.local_llm_client import LocalLLMClient
+from script.utils.llm.pooled_client import PooledLLMClient
 
 
 def main():
@@ -16,15 +17,25 @@ def main():
     target_url = os.getenv("TARGET_URL", "http://localhost:3000")
     backend = os.getenv("LOCAL_BACKEND_TYPE")
     model = os.getenv("LOCAL_MODEL_NAME")
+    # 多台推理服务：逗号分隔的 OpenAI 兼容 base_url 列表，例如 http://gpu1:11434/v1,http://gpu2:11434/v1
+    llm_urls = [url.strip() for url in os.getenv("LOCAL_LLM_URLS", "").split(",") if url.strip()]
+    # 单个 LLM 请求的超时（秒），同时作为 HTTP 超时；不设置则不限制
+    llm_request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "0")) or None
 
     # 3. 初始化 LLM 客户端
     # 这里不需要传参，因为它会自动去读取 .env 中的 LOCAL_BACKEND_TYPE 和 LOCAL_MODEL_NAME
     print("[*] Initializing Local LLM Client...")
-    llm_client = LocalLLMClient(backend, model)
+    if len(llm_urls) > 1:
+        # 重试 / 换端点由 PTAgent 的 ResilientLLMClient 负责，关掉 SDK 自带的重试
+        llm_client = PooledLLMClient.from_urls(llm_urls, backend=backend, model=model, max_retries=0)
+    else:
+        llm_client = LocalLLMClient(backend, model, base_url=llm_urls[0] if llm_urls else None)
 
     # 4. 初始化并运行渗透测试 Agent
     print(f"[*] Starting PTAgent targeting: {target_url}")
-    agent = PTAgent(base_url=target_url, llm_client=llm_client)
+    # 每个推理服务保持两个在途请求
+    agent = PTAgent(base_url=target_url, llm_client=llm_client, analysis_workers=2 * max(1, len(llm_urls)),
+                    llm_request_timeout=llm_request_timeout)
 
     try:
         agent.run()
@@ -0,0 +1,235 @@
+# script/scanner/body_store.py
+"""
+响应体存储 (Response Body Store)。
+
+扫描时捕获的响应体不再截断后直接塞进 ApiCall，而是：
+  - 按内容 SHA-256 去重（同一个 JSON 在多个页面出现只存一份）
+  - 压缩落盘（优先 zstd，未安装 zstandard 时退回 gzip）
+  - 本进程内的引用计数：每个持有该哈希的 ApiCall 算一个引用，扫描中丢弃的 ApiCall 释放引用，
+    归零且没有被持久化对象钉住时删除文件
+  - 跨运行的存活由 pin / sweep（标记-清除）决定：保存扫描缓存时把该缓存条目引用的哈希钉住
+    （pins.json: 条目名 -> 哈希列表），sweep(存活条目) 删除不再被任何存活条目引用的响应体。
+    扫描缓存失效 / 过期 / 被新扫描替换后，对应的响应体在下一次 sweep 时回收。
+
+ApiCall 里只保留 response_body_hash 和一段短预览 (response_body)。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set, TYPE_CHECKING
+
+try:  # 可选依赖：zstd 压缩率和速度都明显优于 gzip
+    import zstandard as zstd
+except ImportError:  # pragma: no cover - 取决于运行环境
+    zstd = None
+
+if TYPE_CHECKING:
+    from .page_asset import SiteAsset
+
+
+class ResponseBodyStore:
+    """
+    基于内容哈希的压缩响应体仓库。
+    文件布局: <root_dir>/<hash[:2]>/<hash>.zst|.gz，钉住关系保存在 <root_dir>/pins.json
+    """
+
+    # ApiCall.response_body 中保留的预览长度（字符）
+    PREVIEW_CHARS = 1024
+
+    _EXTENSIONS = {"zstd": ".zst", "gzip": ".gz"}
+
+    def __init__(self, root_dir: str, codec: Optional[str] = None, level: Optional[int] = None) -> None:
+        self.root_dir = root_dir
+        self.codec = codec or ("zstd" if zstd is not None else "gzip")
+        if self.codec == "zstd" and zstd is None:
+            raise ValueError("codec='zstd' requires the 'zstandard' package.")
+        if self.codec not in self._EXTENSIONS:
+            raise ValueError(f"Unsupported codec: {self.codec}")
+        self.level = level if level is not None else (3 if self.codec == "zstd" else 6)
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._pins_path = os.path.join(self.root_dir, "pins.json")
+        self._pins: Dict[str, List[str]] = self._load_pins()
+        self._refs: Dict[str, int] = {}     # 本进程内的引用计数
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.bytes_in = 0          # put() 收到的原始字节数
+        self.bytes_written = 0     # 实际落盘的压缩字节数
+        self.dedup_hits = 0        # 命中已有内容的次数
+
+    # ==============================
+    # 写入 / 读取
+    # ==============================
+    def put(self, body: bytes) -> str:
+        """存入一个响应体，返回其内容哈希，并把引用计数 +1。"""
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self.bytes_in += len(body)
+            if self._find_path(digest):
+                self.dedup_hits += 1
+            else:
+                path = self._path_for(digest, self.codec)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                data = self._compress(body)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.bytes_written += len(data)
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """按哈希取回原始字节，不存在返回 None。"""
+        path = self._find_path(digest)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(self._EXTENSIONS["zstd"]):
+            if zstd is None:
+                raise RuntimeError(f"Body {digest} is zstd-compressed but 'zstandard' is not installed.")
+            return zstd.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def get_text(self, digest: str, encoding: str = "utf-8") -> Optional[str]:
+        body = self.get(digest)
+        if body is None:
+            return None
+        return body.decode(encoding, errors="replace")
+
+    # ==============================
+    # 引用计数
+    # ==============================
+    def refcount(self, digest: str) -> int:
+        return self._refs.get(digest, 0)
+
+    def release(self, digest: Optional[str]) -> None:
+        """释放一个引用，引用归零且没有被钉住时删除对应文件。"""
+        if not digest:
+            return
+        with self._lock:
+            count = self._refs.get(digest, 0) - 1
+            if count > 0:
+                self._refs[digest] = count
+                return
+            self._refs.pop(digest, None)
+            if digest not in self._pinned():
+                self._remove(digest)
+
+    # ==============================
+    # 跨运行的存活：pin / sweep
+    # ==============================
+    def pin(self, owner: str, digests: Iterable[str]) -> None:
+        """记录持久化对象 owner（例如扫描缓存条目）引用了这些响应体，替换 owner 之前的记录。"""
+        with self._lock:
+            self._pins[owner] = sorted(set(d for d in digests if d))
+            self._write_pins()
+
+    def sweep(self, live_owners: Iterable[str]) -> int:
+        """
+        标记-清除：丢弃不在 live_owners 中的钉住记录，删除既没被钉住、本进程也没有引用的响应体。
+        返回删除的文件数。
+        """
+        live = set(live_owners)
+        removed = 0
+        with self._lock:
+            self._pins = {owner: digests for owner, digests in self._pins.items() if owner in live}
+            self._write_pins()
+            keep = self._pinned() | set(self._refs)
+            for digest in self._stored_digests():
+                if digest not in keep:
+                    removed += self._remove(digest)
+        return removed
+
+    def flush(self) -> None:
+        """把钉住关系写回磁盘。"""
+        with self._lock:
+            self._write_pins()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "objects": len(self._refs),
+            "bytes_in": self.bytes_in,
+            "bytes_written": self.bytes_written,
+            "dedup_hits": self.dedup_hits,
+            "compression_ratio": (self.bytes_in / self.bytes_written) if self.bytes_written else 0.0,
+        }
+
+    # ==============================
+    # 辅助
+    # ==============================
+    @classmethod
+    def preview(cls, body: bytes) -> str:
+        """生成 ApiCall.response_body 里的短预览。"""
+        # 多解码一点字节，避免在多字节字符中间截断后产生替换符
+        text = body[: cls.PREVIEW_CHARS * 4].decode("utf-8", errors="replace")
+        if len(text) > cls.PREVIEW_CHARS or len(body) > cls.PREVIEW_CHARS * 4:
+            return text[: cls.PREVIEW_CHARS] + "\n<!-- preview truncated -->"
+        return text
+
+    def _compress(self, body: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstd.ZstdCompressor(level=self.level).compress(body)
+        return gzip.compress(body, compresslevel=self.level)
+
+    def _path_for(self, digest: str, codec: str) -> str:
+        return os.path.join(self.root_dir, digest[:2], digest + self._EXTENSIONS[codec])
+
+    def _find_path(self, digest: str) -> Optional[str]:
+        for codec in self._EXTENSIONS:
+            path = self._path_for(digest, codec)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _remove(self, digest: str) -> int:
+        path = self._find_path(digest)
+        if not path:
+            return 0
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def _pinned(self) -> Set[str]:
+        return {digest for digests in self._pins.values() for digest in digests}
+
+    def _stored_digests(self) -> List[str]:
+        digests = []
+        for shard in os.listdir(self.root_dir):
+            shard_dir = os.path.join(self.root_dir, shard)
+            if len(shard) != 2 or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                digest, ext = os.path.splitext(name)
+                if ext in self._EXTENSIONS.values():
+                    digests.append(digest)
+        return digests
+
+    def _write_pins(self) -> None:
+        tmp_path = self._pins_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._pins, f)
+        os.replace(tmp_path, self._pins_path)
+
+    def _load_pins(self) -> Dict[str, List[str]]:
+        try:
+            with open(self._pins_path, "r", encoding="utf-8") as f:
+                return {owner: list(digests) for owner, digests in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+
+def site_body_digests(site_asset: "SiteAsset") -> Set[str]:
+    """SiteAsset 中所有 ApiCall（页面捕获 + 独立发现）引用的响应体哈希。"""
+    apis = [api for page in site_asset.pages.values() for api in page.api_calls]
+    apis.extend(site_asset.discovered_apis)
+    return {api.response_body_hash for api in apis if api.response_body_hash}
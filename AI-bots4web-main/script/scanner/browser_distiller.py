@@ -0,0 +1,227 @@
+# script/scanner/browser_distiller.py
+"""
+浏览器内蒸馏 (In-Browser Distillation)
+
+默认流程里每个页面都要把 page.content() 和 body.inner_html() 整段传过 Playwright 管道，
+再在 Python 里用 BeautifulSoup 重新解析一遍做 clean_html_for_llm / distill_html。
+
+这里把同样的规则（html_cleaner 的清洗规则 + InteractionDomDistiller 的白名单规则）
+翻译成一段页面内 JavaScript，直接对活动 DOM 执行，只把精简后的结果传回 Python：
+  - cleaned_html : 在 DOM 克隆上执行清洗后的序列化结果（不改动活动页面）
+  - distilled_dsl: 对活动 DOM 只读遍历得到的交互 DSL
+
+规则常量全部在运行时从 Python 侧传入，两边不会各改各的。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from bs4.builder import HTMLTreeBuilder
+
+from .dom_distiller import InteractionDomDistiller
+from .utils.html_cleaner import (
+    ALLOWED_ATTRIBUTES,
+    EMPTY_CONTAINER_TAGS,
+    NOISE_TAGS,
+    SCRIPT_KEEP_CHARS,
+    SCRIPT_TRUNCATE_THRESHOLD,
+)
+
+
+# 页面内执行的脚本：(rules) => {cleaned_html, distilled_dsl}
+# 两次遍历都用显式栈，超深 DOM 也不会爆调用栈
+_DISTILL_JS = r"""
+(rules) => {
+  const ELEMENT = 1, TEXT = 3, COMMENT = 8;
+  const asSet = (xs) => new Set(xs);
+
+  // ---------- 1. 清洗（在克隆上执行，对应 html_cleaner._clean_with_bs4） ----------
+  const noiseTags = asSet(rules.noise_tags);
+  const allowedAttrs = asSet(rules.allowed_attributes);
+  const emptyContainers = asSet(rules.empty_container_tags);
+  const eventHandler = /^on[a-z]+$/;
+  const isAllowed = (a) => allowedAttrs.has(a) || a.startsWith("data-") || eventHandler.test(a);
+  const childrenOf = (n) => (n.localName === "template" && n.content) ? n.content.childNodes : n.childNodes;
+
+  const cloneRoot = document.documentElement.cloneNode(true);
+  const stack = [[cloneRoot, false]];
+  const prunedChild = new Set();
+  while (stack.length) {
+    const [el, expanded] = stack.pop();
+    if (expanded) {
+      const pruned = prunedChild.has(el);
+      prunedChild.delete(el);
+      if (emptyContainers.has(el.localName) && el.attributes.length === 0 && !pruned && el !== cloneRoot) {
+        const kids = el.childNodes;
+        if (kids.length === 0 || (kids.length === 1 &&
+            (kids[0].nodeType === TEXT || kids[0].nodeType === COMMENT) && !kids[0].data.trim())) {
+          if (el.parentNode) prunedChild.add(el.parentNode);
+          el.remove();
+        }
+      }
+      continue;
+    }
+
+    const name = el.localName;
+    if (el !== cloneRoot) {
+      const rel = (el.getAttribute("rel") || "").trim().split(/\s+/);
+      if (noiseTags.has(name) || (name === "link" && rel.length === 1 && rel[0] === "stylesheet")) {
+        el.remove();
+        continue;
+      }
+    }
+    for (const attr of Array.from(el.attributes)) {
+      if (!isAllowed(attr.name)) el.removeAttribute(attr.name);
+    }
+    if (name === "img") {
+      if ((el.getAttribute("src") || "").startsWith("data:image")) el.setAttribute("src", "[BASE64_IMAGE_REMOVED]");
+    } else if (name === "script" && !el.getAttribute("src")) {
+      const kids = el.childNodes;
+      if (kids.length === 1 && kids[0].nodeType === TEXT && kids[0].data.length > rules.script_threshold) {
+        const code = kids[0].data, keep = rules.script_keep;
+        kids[0].data = code.slice(0, keep) + " ... [TRUNCATED_JS_LOGIC] ... " + code.slice(-keep);
+      }
+    }
+
+    stack.push([el, true]);
+    const kids = childrenOf(el);
+    for (let i = kids.length - 1; i >= 0; i--) {
+      if (kids[i].nodeType === ELEMENT) stack.push([kids[i], false]);
+    }
+  }
+
+  const dt = document.doctype;
+  const doctype = dt ? "<!DOCTYPE " + dt.name +
+      (dt.publicId ? ' PUBLIC "' + dt.publicId + '"' : "") +
+      (dt.systemId ? (dt.publicId ? "" : " SYSTEM") + ' "' + dt.systemId + '"' : "") + ">" : "";
+  const cleanedHtml = doctype + cloneRoot.outerHTML;
+
+  // ---------- 2. 交互 DSL（只读遍历活动 DOM，对应 InteractionDomDistiller） ----------
+  const interactive = asSet(rules.interactive_tags);
+  const dropTags = asSet(rules.tags_to_drop);
+  const keyword = new RegExp(rules.data_attr_pattern);
+  const whitelist = asSet(rules.attr_whitelist);
+  const eventAttrs = rules.event_attrs;           // 已按名字排序，与 Python 侧一致
+  const eventSet = asSet(eventAttrs);
+  const textTags = asSet(["button", "a", "option", "label"]);
+  const listAttrsAll = asSet(rules.list_attributes["*"] || []);
+  const marker = rules.truncate_marker;
+
+  // bs4 把 class/rel 等多值属性解析成列表，原实现不对列表值做关键词匹配
+  const isListAttr = (tag, attr) => listAttrsAll.has(attr) || (rules.list_attributes[tag] || []).includes(attr);
+  const shorten = (s, n) => s.length <= n ? s : s.slice(0, n - marker.length) + marker;
+  const tagsOf = (n) => Array.from(childrenOf(n)).filter((c) => c.nodeType === ELEMENT);
+
+  const selfSalient = new Map();
+  const isSalient = (el) => {
+    let v = selfSalient.get(el);
+    if (v !== undefined) return v;
+    v = interactive.has(el.localName);
+    if (!v) {
+      for (const attr of el.attributes) {
+        const n = attr.name.toLowerCase();
+        if (n.startsWith("data-") || keyword.test(n) ||
+            (!isListAttr(el.localName, attr.name) && keyword.test(attr.value.toLowerCase()))) {
+          v = true;
+          break;
+        }
+      }
+    }
+    selfSalient.set(el, v);
+    return v;
+  };
+
+  const visibleText = (el) => {
+    let out = "";
+    const walk = [el];
+    while (walk.length) {
+      const n = walk.pop();
+      if (n.nodeType === TEXT) { out += n.data.trim(); continue; }
+      if (n.nodeType !== ELEMENT || (n !== el && (n.localName === "script" || n.localName === "style"))) continue;
+      const kids = childrenOf(n);
+      for (let i = kids.length - 1; i >= 0; i--) walk.push(kids[i]);
+    }
+    return out;
+  };
+
+  const render = (el, depth) => {
+    const tag = el.localName;
+    const id = el.getAttribute("id"), name = el.getAttribute("name");
+    const parts = [id ? tag + "#" + id : (name ? tag + "[name=" + name + "]" : tag)];
+    for (const attr of el.attributes) {
+      const n = attr.name.toLowerCase();
+      if (eventSet.has(n) || !whitelist.has(n)) continue;
+      parts.push(n + '="' + shorten(attr.value, rules.max_text_len) + '"');
+    }
+    for (const evt of eventAttrs) {
+      if (el.hasAttribute(evt)) parts.push(evt + '="' + shorten(el.getAttribute(evt), rules.max_event_code_len) + '"');
+    }
+    if (textTags.has(tag)) {
+      const text = visibleText(el);
+      if (text) parts.push('text="' + shorten(text, rules.max_text_len) + '"');
+    }
+    return "  ".repeat(depth) + parts.join(" ");
+  };
+
+  const root = document.body || document.documentElement;
+  const subtree = new Map();
+  const post = [[root, false]];
+  while (post.length) {
+    const [el, expanded] = post.pop();
+    if (!expanded) {
+      if (dropTags.has(el.localName)) { subtree.set(el, false); continue; }
+      post.push([el, true]);
+      const kids = tagsOf(el);
+      for (let i = kids.length - 1; i >= 0; i--) post.push([kids[i], false]);
+      continue;
+    }
+    subtree.set(el, isSalient(el) || tagsOf(el).some((c) => subtree.get(c) === true));
+  }
+
+  const lines = [];
+  const pre = [[root, 0]];
+  while (pre.length) {
+    const [el, depth] = pre.pop();
+    if (!subtree.get(el)) continue;
+    const self = isSalient(el);
+    if (self) lines.push(render(el, depth));
+    const kids = tagsOf(el);
+    for (let i = kids.length - 1; i >= 0; i--) pre.push([kids[i], depth + (self ? 1 : 0)]);
+  }
+
+  return {cleaned_html: cleanedHtml, distilled_dsl: lines.join("\n")};
+}
+"""
+
+
+def build_rules(distiller: Optional[InteractionDomDistiller] = None) -> Dict[str, Any]:
+    """把 Python 侧的清洗 / 蒸馏规则打包成传给页面脚本的参数。"""
+    distiller = distiller or InteractionDomDistiller()
+    config = distiller.config
+    return {
+        "noise_tags": list(NOISE_TAGS),
+        "allowed_attributes": sorted(ALLOWED_ATTRIBUTES),
+        "empty_container_tags": list(EMPTY_CONTAINER_TAGS),
+        "script_threshold": SCRIPT_TRUNCATE_THRESHOLD,
+        "script_keep": SCRIPT_KEEP_CHARS,
+        "interactive_tags": sorted(distiller.INTERACTIVE_TAGS),
+        "tags_to_drop": sorted(distiller.TAGS_TO_DROP),
+        "data_attr_pattern": distiller._DATA_ATTR_PATTERN.pattern,
+        "attr_whitelist": sorted(distiller.ATTR_WHITELIST),
+        # 与 Python 版一致：事件属性按名字排序输出
+        "event_attrs": sorted(distiller.EVENT_ATTRS),
+        "list_attributes": {tag: sorted(attrs) for tag, attrs in HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES.items()},
+        "max_text_len": config.max_text_len,
+        "max_event_code_len": config.max_event_code_len,
+        "truncate_marker": config.truncate_marker,
+    }
+
+
+def distill_in_browser(page, distiller: Optional[InteractionDomDistiller] = None,
+                       rules: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """
+    在页面内执行清洗与蒸馏，返回 {"cleaned_html": ..., "distilled_dsl": ...}。
+    page: Playwright 的 Page（同步 API）。异常由调用方决定是否回退到 Python 路径。
+    """
+    return page.evaluate(_DISTILL_JS, rules or build_rules(distiller))
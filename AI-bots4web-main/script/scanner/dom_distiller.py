@@ -3,11 +3,17 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Dict, Set, Optional
+import re
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Set, Optional, Tuple
 
 from bs4 import BeautifulSoup, Tag, NavigableString  # 需要安装 beautifulsoup4
 
+from .utils.memo import get_memo, source_digest
+
+# 蒸馏规则和实现都在本文件里：文件内容一变，memo 键随之变化
+_DISTILLER_FINGERPRINT = source_digest(__file__)
+
 
 @dataclass
 class DistillConfig:
@@ -36,6 +42,8 @@ class InteractionDomDistiller:
     DATA_ATTR_KEYWORDS: Set[str] = {
         "token", "jwt", "auth", "key", "secret",
     }
+    # 预编译的关键词匹配器（对小写后的属性名 / 属性值做 search）
+    _DATA_ATTR_PATTERN = re.compile("|".join(sorted(map(re.escape, DATA_ATTR_KEYWORDS))))
 
     # 白名单属性：对渗透上下文有用的
     ATTR_WHITELIST: Set[str] = {
@@ -53,8 +61,10 @@ class InteractionDomDistiller:
         "style", "script", "svg",
     }
 
-    def __init__(self, config: Optional[DistillConfig] = None) -> None:
+    def __init__(self, config: Optional[DistillConfig] = None, use_memo: bool = True) -> None:
         self.config = config or DistillConfig()
+        # 按 (HTML, 配置, 规则, 代码版本) 的哈希缓存结果，同一份 HTML 只蒸馏一次
+        self.use_memo = use_memo
 
     # ===========================
     # 对外主入口
@@ -67,52 +77,85 @@ class InteractionDomDistiller:
             distiller = InteractionDomDistiller()
             dsl_text = distiller.distill_html(page_asset.dom_snapshot or page_asset.html)
         """
+        if not self.use_memo:
+            return self._distill(html)
+        memo = get_memo("distill_html")
+        key = memo.make_key(_DISTILLER_FINGERPRINT, self._rules_fingerprint(), html)
+        return memo.get_or_compute(key, lambda: self._distill(html))
+
+    def _rules_fingerprint(self) -> str:
+        # 子类可能改写规则常量，这里把实际生效的规则和类名都算进键里
+        cls = type(self)
+        return repr((
+            f"{cls.__module__}.{cls.__qualname__}",
+            sorted(asdict(self.config).items()),
+            sorted(self.INTERACTIVE_TAGS), sorted(self.DATA_ATTR_KEYWORDS), sorted(self.ATTR_WHITELIST),
+            sorted(self.EVENT_ATTRS), sorted(self.TAGS_TO_DROP),
+        ))
+
+    def _distill(self, html: str) -> str:
         soup = BeautifulSoup(html, "html.parser")
 
         # 通常只关心 <body> 以内的内容
         root: Tag = soup.body or soup
 
+        # 节点自身显著性缓存，按 id(node) 索引：
+        # bs4 的 Tag.__hash__ 会序列化整棵子树，不能直接当 dict 键
+        self_salience: Dict[int, bool] = {}
+
         # step 1: 底向上标记“显著节点”
-        salient_map: Dict[Tag, bool] = {}
-        self._mark_salient_nodes(root, salient_map)
+        salient_map = self._mark_salient_nodes(root, self_salience)
 
         # step 2: 自顶向下线性化为 DSL 行
-        lines: List[str] = []
-        self._linearize(root, salient_map, depth=0, out_lines=lines)
+        lines = self._linearize(root, salient_map, self_salience)
 
         return "\n".join(lines)
 
     # ===========================
     # Step 1: 显著性标记
     # ===========================
-    def _mark_salient_nodes(self, node: Tag, salient_map: Dict[Tag, bool]) -> bool:
+    def _mark_salient_nodes(self, root: Tag, self_salience: Dict[int, bool]) -> Dict[int, bool]:
         """
-        返回：该节点子树中是否存在“显著节点”。
+        返回：id(node) -> 该节点子树中是否存在“显著节点”。
         逻辑：
           - 自身是交互节点 / 数据节点 ⇒ 显著
           - 子节点有显著 ⇒ 自身也保留（当作结构节点）
-        """
-        if not isinstance(node, Tag):
-            return False
 
-        # 某些标签直接丢弃整个子树
-        if node.name in self.TAGS_TO_DROP:
-            salient_map[node] = False
-            return False
+        用显式栈做后序遍历，框架生成的超深 DOM 也不会触发递归上限。
+        """
+        salient_map: Dict[int, bool] = {}
+        stack: List[Tuple[Tag, bool]] = [(root, False)]
+
+        while stack:
+            node, expanded = stack.pop()
+
+            if not expanded:
+                # 某些标签直接丢弃整个子树
+                if node.name in self.TAGS_TO_DROP:
+                    salient_map[id(node)] = False
+                    continue
+                stack.append((node, True))
+                for child in reversed(node.contents):
+                    if isinstance(child, Tag):
+                        stack.append((child, False))
+                continue
 
-        # 自身是否显著
-        is_salient_self = self._is_salient_node(node)
+            # 子节点都已处理完毕：自身显著 或 任一子节点显著
+            is_salient = self._is_salient_cached(node, self_salience) or any(
+                salient_map.get(id(child), False)
+                for child in node.contents
+                if isinstance(child, Tag)
+            )
+            salient_map[id(node)] = is_salient
 
-        # 子树是否显著
-        is_salient_child = False
-        for child in node.children:
-            if isinstance(child, Tag):
-                child_salient = self._mark_salient_nodes(child, salient_map)
-                is_salient_child = is_salient_child or child_salient
+        return salient_map
 
-        is_salient = is_salient_self or is_salient_child
-        salient_map[node] = is_salient
-        return is_salient
+    def _is_salient_cached(self, node: Tag, self_salience: Dict[int, bool]) -> bool:
+        key = id(node)
+        cached = self_salience.get(key)
+        if cached is None:
+            cached = self_salience[key] = self._is_salient_node(node)
+        return cached
 
     def _is_salient_node(self, node: Tag) -> bool:
         """
@@ -120,22 +163,18 @@ class InteractionDomDistiller:
           - 交互节点：input / textarea / select / button / a / form
           - 含 data-* 或 token/jwt 等关键属性
         """
-        tag_name = node.name.lower()
-
         # 交互节点
-        if tag_name in self.INTERACTIVE_TAGS:
+        if node.name.lower() in self.INTERACTIVE_TAGS:
             return True
 
         # data-* 或包含敏感关键字的属性
+        matcher = self._DATA_ATTR_PATTERN
         for attr_name, attr_value in node.attrs.items():
             attr_name_lower = attr_name.lower()
-            if attr_name_lower.startswith("data-"):
+            if attr_name_lower.startswith("data-") or matcher.search(attr_name_lower):
+                return True
+            if isinstance(attr_value, str) and matcher.search(attr_value.lower()):
                 return True
-            for kw in self.DATA_ATTR_KEYWORDS:
-                if kw in attr_name_lower:
-                    return True
-                if isinstance(attr_value, str) and kw in attr_value.lower():
-                    return True
 
         return False
 
@@ -144,33 +183,38 @@ class InteractionDomDistiller:
     # ===========================
     def _linearize(
         self,
-        node: Tag,
-        salient_map: Dict[Tag, bool],
-        depth: int,
-        out_lines: List[str],
-    ) -> None:
+        root: Tag,
+        salient_map: Dict[int, bool],
+        self_salience: Dict[int, bool],
+    ) -> List[str]:
         """
-        深度优先遍历显著子树，并输出紧凑的 DSL 行。
+        深度优先（先序）遍历显著子树，并输出紧凑的 DSL 行。
         """
-        if not isinstance(node, Tag):
-            return
+        out_lines: List[str] = []
+        stack: List[Tuple[Tag, int]] = [(root, 0)]
+
+        while stack:
+            node, depth = stack.pop()
+
+            # 如果这个节点子树完全不显著，直接跳过
+            if not salient_map.get(id(node), False):
+                continue
 
-        # 如果这个节点子树完全不显著，直接跳过
-        if not salient_map.get(node, False):
-            return
+            # 自身是不是显著节点（而不是仅仅撑结构）；第一步已算过，直接查缓存
+            is_self_salient = self._is_salient_cached(node, self_salience)
 
-        # 自身是不是显著节点（而不是仅仅撑结构）
-        is_self_salient = self._is_salient_node(node)
+            if is_self_salient:
+                line = self._render_node_as_dsl(node, depth)
+                if line:
+                    out_lines.append(line)
 
-        if is_self_salient:
-            line = self._render_node_as_dsl(node, depth)
-            if line:
-                out_lines.append(line)
+            # 继续处理子节点（逆序入栈以保持文档顺序）
+            child_depth = depth + (1 if is_self_salient else 0)
+            for child in reversed(node.contents):
+                if isinstance(child, Tag):
+                    stack.append((child, child_depth))
 
-        # 继续处理子节点
-        for child in node.children:
-            if isinstance(child, Tag):
-                self._linearize(child, salient_map, depth + (1 if is_self_salient else 0), out_lines)
+        return out_lines
 
     def _render_node_as_dsl(self, node: Tag, depth: int) -> str:
         """
@@ -206,9 +250,9 @@ class InteractionDomDistiller:
                 val_str = self._shorten_str(str(attr_value), self.config.max_text_len)
                 attrs_parts.append(f'{attr_name_lower}="{val_str}"')
 
-        # 3) 事件属性
+        # 3) 事件属性（排序，保证不同进程的输出一致）
         event_parts: List[str] = []
-        for evt in self.EVENT_ATTRS:
+        for evt in sorted(self.EVENT_ATTRS):
             if evt in node.attrs:
                 code = str(node.attrs[evt])
                 code_short = self._shorten_str(code, self.config.max_event_code_len)
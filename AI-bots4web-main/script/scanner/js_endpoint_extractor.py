@@ -0,0 +1,579 @@
+# script/scanner/js_endpoint_extractor.py
+"""
+基于调用点的 JS 接口提取 (JS Endpoint Extractor)
+
+JsLinkExtractor 用正则“广撒网”，引号里以 / 开头的字符串都算链接：
+误报多（爬虫要为每个 404 付出一次探测），也不知道接口是怎么被调用的。
+
+这里只看真正发请求的调用点：
+  - fetch(url, {method, body})
+  - axios.get/post/...(url, data, config) / axios(config) / axios.request(config)
+  - xhr.open("POST", url)
+  - AngularJS $http.get/post/...(...) / $http(config)
+  - Angular HttpClient: this.http.get<T>(url, {params}) / this.http.post(url, body)
+先用正则定位调用点（落在注释 / 字符串 / 正则字面量里的丢掉），再用轻量级 tokenizer
+只解析该调用的参数列表，得到：
+  URL（动态部分记作 {name} 占位符）、HTTP 方法、query 参数名、请求体字段名。
+方法不是字面量（fetch(url, {method: m})）或 URL 拼接里有条件 / 逻辑表达式的调用点不输出：
+静态猜出来的方法 / 地址只会制造误报（URL 本身仍会被 JsLinkExtractor 当作链接收集）。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+
+HTTP_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+
+# 这些客户端方法的第二个参数是请求体：(url, data, config)
+_DATA_VERBS = {"post", "put", "patch"}
+
+
+@dataclass
+class JsEndpoint:
+    """一个从 JS 调用点静态提取出的接口。"""
+    url: str
+    method: str
+    source: str                                  # fetch / axios / xhr / $http / HttpClient
+    param_keys: List[str] = field(default_factory=list)   # query 参数名
+    body_keys: List[str] = field(default_factory=list)    # 请求体字段名
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "method": self.method,
+            "source": self.source,
+            "param_keys": self.param_keys,
+            "body_keys": self.body_keys,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JsEndpoint":
+        return cls(**data)
+
+
+# =================================================
+# Tokenizer
+# =================================================
+# token: (kind, value)
+#   kind: "str"（字面量字符串，已去引号）/ "tpl"（模板字符串，${...} 已换成 {name}）
+#         "ident" / "num" / "punct"
+Token = Tuple[str, str]
+
+
+class JsTokenizer:
+    """
+    够用就好的 JS 词法分析：只服务于解析调用参数，不处理正则字面量和 ASI。
+    从给定位置开始按需产出 token，调用方读到参数列表结束就停下。
+    """
+
+    _SKIP = re.compile(r"(?:\s+|//[^\n]*|/\*.*?\*/)+", re.S)
+    _STRING = re.compile(r"\"(?:[^\"\\\n]|\\.)*\"|'(?:[^'\\\n]|\\.)*'", re.S)
+    _IDENT = re.compile(r"[A-Za-z_$][\w$]*")
+    _NUMBER = re.compile(r"\d[\w.]*")
+    _PUNCT = re.compile(r"=>|\.\.\.|\?\.|[{}()\[\];,<>+\-*/%=!&|?:.~^@#]")
+    _ESCAPE = re.compile(r"\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)", re.S)
+    _SIMPLE_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "v": "\v", "0": "\0"}
+
+    # literal_spans：可能开始注释 / 字符串 / 模板 / 正则字面量的字符
+    _LITERAL_START = re.compile(r"[/\"'`]")
+    _REGEX = re.compile(r"/(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*")
+    # "/" 出现在这些字符 / 关键字之后时是正则字面量，否则是除号
+    _REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+    _REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "yield", "await",
+                       "delete", "instanceof", "new", "throw"}
+    _TRAILING_WORD = re.compile(r"[\w$]+$")
+
+    def __init__(self, content: str, pos: int = 0, max_tokens: int = 4000) -> None:
+        self.content = content
+        self.pos = pos
+        self.max_tokens = max_tokens
+
+    def __iter__(self) -> Iterator[Token]:
+        content = self.content
+        emitted = 0
+        while emitted < self.max_tokens:
+            skip = self._SKIP.match(content, self.pos)
+            if skip:
+                self.pos = skip.end()
+            if self.pos >= len(content):
+                return
+            ch = content[self.pos]
+
+            if ch in "\"'":
+                m = self._STRING.match(content, self.pos)
+                if not m:
+                    return          # 未闭合的字符串：放弃
+                self.pos = m.end()
+                token: Token = ("str", self._unescape(m.group()[1:-1]))
+            elif ch == "`":
+                value = self._template()
+                if value is None:
+                    return
+                token = ("tpl", value)
+            else:
+                for kind, pattern in (("ident", self._IDENT), ("num", self._NUMBER), ("punct", self._PUNCT)):
+                    m = pattern.match(content, self.pos)
+                    if m:
+                        break
+                else:
+                    return          # 无法识别的字符（多半已经走出 JS 语法范围）
+                self.pos = m.end()
+                token = (kind, m.group())
+
+            emitted += 1
+            yield token
+
+    def _template(self) -> Optional[str]:
+        """读取模板字符串，${expr} 替换为 {expr 中最后一个标识符}。"""
+        content = self.content
+        i = self.pos + 1
+        out: List[str] = []
+        while i < len(content):
+            ch = content[i]
+            if ch == "\\":
+                out.append(content[i:i + 2])
+                i += 2
+            elif ch == "`":
+                self.pos = i + 1
+                return self._unescape("".join(out))
+            elif ch == "$" and content.startswith("${", i):
+                inner = JsTokenizer(content, i + 2, max_tokens=self.max_tokens)
+                depth, name = 0, "param"
+                for kind, value in inner:
+                    if kind == "punct" and value in "({[":
+                        depth += 1
+                    elif kind == "punct" and value in ")}]":
+                        if depth == 0:
+                            break
+                        depth -= 1
+                    elif kind == "ident":
+                        name = value
+                else:
+                    return None
+                out.append("{" + name + "}")
+                i = inner.pos
+            else:
+                out.append(ch)
+                i += 1
+        return None
+
+    @classmethod
+    def literal_spans(cls, content: str) -> Iterator[Tuple[int, int]]:
+        """
+        从前往后产出注释 / 字符串 / 模板字符串 / 正则字面量的 [start, end) 区间，
+        调用方据此跳过其中形似调用点的文本。正则字面量按前一个有效字符 / 关键字判断。
+        """
+        pos = 0
+        n = len(content)
+        while True:
+            m = cls._LITERAL_START.search(content, pos)
+            if m is None:
+                return
+            start = m.start()
+            ch = content[start]
+            if content.startswith("//", start):
+                end = content.find("\n", start)
+                end = n if end < 0 else end
+            elif content.startswith("/*", start):
+                end = content.find("*/", start + 2)
+                end = n if end < 0 else end + 2
+            elif ch == "/":
+                regex = cls._REGEX.match(content, start) if cls._regex_allowed(content, start) else None
+                if regex is None:
+                    pos = start + 1         # 除号
+                    continue
+                end = regex.end()
+            elif ch == "`":
+                tokenizer = cls(content, start)
+                if tokenizer._template() is None:
+                    pos = start + 1
+                    continue
+                end = tokenizer.pos
+            else:
+                string = cls._STRING.match(content, start)
+                if string is None:
+                    pos = start + 1         # 不配对的引号
+                    continue
+                end = string.end()
+            yield start, end
+            pos = end
+
+    @classmethod
+    def _regex_allowed(cls, content: str, pos: int) -> bool:
+        i = pos - 1
+        while i >= 0 and content[i].isspace():
+            i -= 1
+        if i < 0 or content[i] in cls._REGEX_PRECEDERS:
+            return True
+        word = cls._TRAILING_WORD.search(content, max(0, i - 15), i + 1)
+        return word is not None and word.group() in cls._REGEX_KEYWORDS
+
+    @classmethod
+    def _unescape(cls, raw: str) -> str:
+        if "\\" not in raw:
+            return raw
+
+        def repl(m: "re.Match[str]") -> str:
+            esc = m.group(1)
+            if esc[0] == "u" or esc[0] == "x":
+                try:
+                    return chr(int(esc.strip("u{}x"), 16))
+                except ValueError:
+                    return esc
+            return cls._SIMPLE_ESCAPES.get(esc, esc)
+
+        return cls._ESCAPE.sub(repl, raw)
+
+
+# =================================================
+# 调用点提取
+# =================================================
+class JsEndpointExtractor:
+    """
+    用法：
+        endpoints = JsEndpointExtractor.extract(script_text, base_url=page_url)
+        for ep in endpoints: ep.method, ep.url, ep.param_keys, ep.body_keys
+    """
+
+    # 调用点定位：每种调用一个以字面量开头的正则（sre 可以走字面量快速查找，
+    # 合成一个带后顾断言的大正则在 MB 级 bundle 上要慢 20 倍以上），匹配到 "(" 为止，参数交给 tokenizer。
+    # 标识符边界在 _callee_ok 中检查。
+    _VERB = r"\s*\.\s*(?P<verb>get|post|put|patch|delete|head|options|request)\s*"
+    _CALL_SITES = (
+        ("fetch", re.compile(r"fetch\s*\(")),
+        ("axios", re.compile(r"axios(?:" + _VERB + r")?\(")),
+        ("$http", re.compile(r"\$http(?:" + _VERB + r")?\(")),
+        ("HttpClient", re.compile(r"ttp(?:[cC]lient)?" + _VERB + r"(?:<[^()]{0,200}?>\s*)?\(")),
+        ("xhr", re.compile(r"open\s*\(\s*(?=[\"'`](?i:GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS)[\"'`])")),
+    )
+    _IDENT_CHARS = re.compile(r"[\w$]*$")
+    _HTTP_CLIENT_NAME = re.compile(r"_?[hH]ttp(?:[cC]lient)?")
+
+    # 开头的 {变量}/...：变量通常是 API 根地址
+    _BASE_PLACEHOLDER = re.compile(r"^\{[^/{}]*\}(?=/)")
+    _URL_LIKE = re.compile(r"^(?:https?://|/(?!/)|[\w\-.~{}]+(?:/|\?|$))[^\s<>\"'`]*$")
+
+    # 与 JsLinkExtractor 一样，同一份内联脚本的结果按内容哈希缓存（与 base_url 无关的相对结果）
+    RAW_CACHE_SIZE = 512
+    RAW_CACHE_MAX_CHARS = 256 * 1024
+    _raw_cache: "OrderedDict[bytes, Tuple[JsEndpoint, ...]]" = OrderedDict()
+    _raw_cache_lock = threading.Lock()
+
+    @classmethod
+    def extract(cls, content: str, base_url: Optional[str] = None) -> List[JsEndpoint]:
+        """提取接口；给出 base_url 时把相对地址拼成绝对地址。按 (method, url) 去重，保持出现顺序。"""
+        return cls.resolve(cls.extract_raw(content), base_url)
+
+    @classmethod
+    def resolve(cls, raw_endpoints: Iterable[JsEndpoint], base_url: Optional[str] = None) -> List[JsEndpoint]:
+        """把 extract_raw 的结果落到具体页面上。"""
+        endpoints: List[JsEndpoint] = []
+        seen = set()
+        for raw in raw_endpoints:
+            url = urljoin(base_url, raw.url) if base_url else raw.url
+            key = (raw.method, url)
+            if key in seen:
+                continue
+            seen.add(key)
+            endpoints.append(JsEndpoint(url, raw.method, raw.source, list(raw.param_keys), list(raw.body_keys)))
+        return endpoints
+
+    @classmethod
+    def extract_raw(cls, content: str) -> Tuple[JsEndpoint, ...]:
+        key = None
+        if len(content) <= cls.RAW_CACHE_MAX_CHARS:
+            key = hashlib.sha1(content.encode("utf-8", errors="surrogatepass")).digest()
+            with cls._raw_cache_lock:
+                cached = cls._raw_cache.get(key)
+                if cached is not None:
+                    cls._raw_cache.move_to_end(key)
+                    return cached
+
+        calls = sorted(
+            ((m.start(), source, m) for source, pattern in cls._CALL_SITES for m in pattern.finditer(content)
+             if cls._callee_ok(content, source, m)),
+            key=lambda item: item[0],
+        )
+        found: List[JsEndpoint] = []
+        for source, m in cls._outside_literals(content, calls):
+            try:
+                endpoint = cls._parse_call(content, source, m)
+            except (IndexError, ValueError):
+                endpoint = None
+            if endpoint is not None:
+                found.append(endpoint)
+
+        result = tuple(found)
+        if key is None:
+            return result
+        with cls._raw_cache_lock:
+            cls._raw_cache[key] = result
+            while len(cls._raw_cache) > cls.RAW_CACHE_SIZE:
+                cls._raw_cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _outside_literals(content: str, calls: List[Tuple[int, str, "re.Match[str]"]]
+                          ) -> Iterator[Tuple[str, "re.Match[str]"]]:
+        """丢掉落在注释 / 字符串 / 正则字面量里的调用点（calls 已按位置排序；只扫描到最后一个调用点）。"""
+        spans = JsTokenizer.literal_spans(content) if calls else iter(())
+        span_start = span_end = -1
+        for start, source, m in calls:
+            while span_end <= start:
+                span_start, span_end = next(spans, (len(content), len(content) + 1))
+            if not span_start <= start < span_end:
+                yield source, m
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        with cls._raw_cache_lock:
+            cls._raw_cache.clear()
+
+    # ==============================
+    # 各类调用的参数语义
+    # ==============================
+    @classmethod
+    def _callee_ok(cls, content: str, source: str, m: "re.Match[str]") -> bool:
+        """检查匹配前面的标识符：fetch / axios 不能是别的标识符的后缀，HttpClient 要是 http / _http / httpClient。"""
+        start = m.start()
+        if source == "xhr":
+            # xhr.open(...)：前面必须是成员访问
+            i = start - 1
+            while i >= 0 and content[i].isspace():
+                i -= 1
+            return i >= 0 and content[i] == "."
+        if source == "HttpClient":
+            start -= 1          # 正则从 "ttp" 开始，把 h/H 包含进来
+            if start < 0:
+                return False
+        head = cls._IDENT_CHARS.search(content, max(0, start - 64), start).group()
+        if source == "HttpClient":
+            name = head + content[start:m.end()].split(".", 1)[0].strip()
+            return bool(cls._HTTP_CLIENT_NAME.fullmatch(name))
+        return head == ""
+
+    # ==============================
+    # 各类调用的参数语义
+    # ==============================
+    @classmethod
+    def _parse_call(cls, content: str, source: str, m: "re.Match[str]") -> Optional[JsEndpoint]:
+        args = cls._read_args(content, m.end())
+        if source == "xhr":
+            # open( 之后的位置：方法字面量已由正则的前瞻保证
+            if len(args) < 2:
+                return None
+            return cls._build("xhr", cls._string_value(args[0]), args[1], None, None)
+        if not args:
+            return None
+
+        if source == "fetch":
+            init = cls._object_entries(args[1]) if len(args) > 1 else {}
+            return cls._build("fetch", cls._method_value(init), args[0], init.get("body"), None)
+
+        verb = m.group("verb")
+        if verb is None or verb == "request":
+            # axios(config) / $http(config) / axios.request(config) / axios(url, config)
+            if args[0] and args[0][0] == ("punct", "{"):
+                config = cls._object_entries(args[0])
+                url_tokens = config.get("url", [])
+            else:
+                config = cls._object_entries(args[1]) if len(args) > 1 else {}
+                url_tokens = args[0]
+            return cls._build(source, cls._method_value(config), url_tokens, config.get("data") or config.get("body"), config.get("params"))
+
+        if verb in _DATA_VERBS:
+            data = args[1] if len(args) > 1 else None
+            config = cls._object_entries(args[2]) if len(args) > 2 else {}
+        else:
+            data = None
+            config = cls._object_entries(args[1]) if len(args) > 1 else {}
+        return cls._build(source, verb.upper(), args[0], data, config.get("params"))
+
+    @classmethod
+    def _build(cls, source: str, method: Optional[str], url_tokens: List[Token],
+               body_tokens: Optional[List[Token]], params_tokens: Optional[List[Token]]) -> Optional[JsEndpoint]:
+        method = (method or "").upper()
+        if method not in HTTP_METHODS:
+            return None
+        url = cls._url_value(url_tokens)
+        if not url:
+            return None
+
+        param_keys: List[str] = []
+        if "?" in url:
+            url, query = url.split("?", 1)
+            for pair in query.split("&"):
+                name = pair.split("=", 1)[0]
+                if name and not name.startswith("{"):
+                    param_keys.append(name)
+        if params_tokens:
+            param_keys.extend(cls._payload_keys(params_tokens))
+
+        body_keys = cls._payload_keys(body_tokens) if body_tokens else []
+        return JsEndpoint(url=url or "/", method=method, source=source,
+                          param_keys=_unique(param_keys), body_keys=_unique(body_keys))
+
+    # ==============================
+    # 参数解析
+    # ==============================
+    @staticmethod
+    def _read_args(content: str, pos: int) -> List[List[Token]]:
+        """从 "(" 之后读取参数列表，按顶层逗号切分。括号不配平时返回空列表。"""
+        args: List[List[Token]] = [[]]
+        depth = 0
+        for token in JsTokenizer(content, pos):
+            kind, value = token
+            if kind == "punct":
+                if value in "([{":
+                    depth += 1
+                elif value in ")]}":
+                    if depth == 0:
+                        return [arg for arg in args if arg]
+                    depth -= 1
+                elif value == "," and depth == 0:
+                    args.append([])
+                    continue
+            args[-1].append(token)
+        return []
+
+    @staticmethod
+    def _split_top_level(tokens: List[Token], sep: str) -> List[List[Token]]:
+        parts: List[List[Token]] = [[]]
+        depth = 0
+        for token in tokens:
+            kind, value = token
+            if kind == "punct":
+                if value in "([{":
+                    depth += 1
+                elif value in ")]}":
+                    depth -= 1
+                elif value == sep and depth == 0:
+                    parts.append([])
+                    continue
+            parts[-1].append(token)
+        return parts
+
+    @classmethod
+    def _object_entries(cls, tokens: List[Token]) -> Dict[str, List[Token]]:
+        """对象字面量 {k: v, 'k2': v2, k3} 的顶层键 -> 值 token。不是对象字面量时返回空 dict。"""
+        if len(tokens) < 2 or tokens[0] != ("punct", "{") or tokens[-1] != ("punct", "}"):
+            return {}
+        entries: Dict[str, List[Token]] = {}
+        for entry in cls._split_top_level(tokens[1:-1], ","):
+            if not entry or entry[0] == ("punct", "..."):
+                continue
+            kind, value = entry[0]
+            if kind not in ("ident", "str", "num"):
+                continue        # [computed]: v 之类
+            if len(entry) == 1:
+                entries[value] = [entry[0]]           # 简写属性 {username}
+            elif entry[1] == ("punct", ":"):
+                entries[value] = entry[2:]
+            # 方法简写 k() {...} 不是数据字段，忽略
+        return entries
+
+    @classmethod
+    def _payload_keys(cls, tokens: List[Token]) -> List[str]:
+        """
+        请求体 / 参数中的字段名：
+          {a, b: 1}                       对象字面量
+          JSON.stringify({...}) / new URLSearchParams({...})  取内部对象
+          new HttpParams().set('a', x).append('b', y)         链式 set/append 的键
+        """
+        entries = cls._object_entries(tokens)
+        if entries:
+            return list(entries)
+
+        keys: List[str] = []
+        for i, token in enumerate(tokens):
+            if token == ("punct", "{"):
+                # 第一个内嵌对象字面量：找到配对的 "}"
+                depth = 0
+                for j in range(i, len(tokens)):
+                    if tokens[j][0] == "punct" and tokens[j][1] in "([{":
+                        depth += 1
+                    elif tokens[j][0] == "punct" and tokens[j][1] in ")]}":
+                        depth -= 1
+                        if depth == 0:
+                            return list(cls._object_entries(tokens[i:j + 1]))
+                break
+            if (token[0] == "ident" and token[1] in ("set", "append") and i > 0 and tokens[i - 1] == ("punct", ".")
+                    and i + 2 < len(tokens) and tokens[i + 1] == ("punct", "(") and tokens[i + 2][0] == "str"):
+                keys.append(tokens[i + 2][1])
+        return keys
+
+    @classmethod
+    def _method_value(cls, config: Dict[str, List[Token]]) -> Optional[str]:
+        """配置对象里的 method：没写是 GET；不是字面量（变量、三元表达式）时未知，返回 None。"""
+        if "method" not in config:
+            return "GET"
+        return cls._string_value(config["method"])
+
+    @staticmethod
+    def _string_value(tokens: List[Token]) -> Optional[str]:
+        if len(tokens) == 1 and tokens[0][0] in ("str", "tpl"):
+            return tokens[0][1]
+        return None
+
+    @classmethod
+    def _url_value(cls, tokens: List[Token]) -> Optional[str]:
+        """
+        字符串拼接求值：字面量原样保留，变量 / 成员访问 / 调用记作 {最后一个标识符}。
+        以变量开头、紧跟 "/..." 的（如 baseUrl + '/users'、`${env.api}/users`）去掉前缀，只保留路径。
+        操作数是条件 / 逻辑 / 括号表达式时（"/a" + (x ? "/b" : "/c")）没法静态确定，返回 None。
+        """
+        parts: List[Tuple[bool, str]] = []
+        for operand in cls._split_top_level(tokens, "+"):
+            if not operand:
+                return None
+            if len(operand) == 1 and operand[0][0] in ("str", "tpl"):
+                parts.append((True, operand[0][1]))
+            elif len(operand) == 1 and operand[0][0] == "num" or cls._is_reference(operand):
+                names = [value for kind, value in operand if kind == "ident"]
+                parts.append((False, "{" + (names[-1] if names else "param") + "}"))
+            else:
+                return None
+
+        if not any(is_literal for is_literal, _ in parts):
+            return None
+        url = cls._BASE_PLACEHOLDER.sub("", "".join(text for _, text in parts))
+        if url.startswith("{") and url.endswith("}") and "/" not in url:
+            return None
+        return url if cls._URL_LIKE.match(url) else None
+
+    @staticmethod
+    def _is_reference(tokens: List[Token]) -> bool:
+        """a / a.b?.c / a[i] / f(x).y 这类取值链（拼接 URL 时可以记作一个占位符）。"""
+        if not tokens or tokens[0][0] != "ident":
+            return False
+        i = 1
+        while i < len(tokens):
+            kind, value = tokens[i]
+            if kind == "punct" and value in (".", "?.") and i + 1 < len(tokens) and tokens[i + 1][0] == "ident":
+                i += 2
+            elif kind == "punct" and value in "([":
+                depth = 0
+                for j in range(i, len(tokens)):
+                    if tokens[j][0] == "punct" and tokens[j][1] in "([{":
+                        depth += 1
+                    elif tokens[j][0] == "punct" and tokens[j][1] in ")]}":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                else:
+                    return False
+                i = j + 1
+            else:
+                return False
+        return True
+
+
+def _unique(items: List[str]) -> List[str]:
+    return list(dict.fromkeys(items))
@@ -1,5 +1,8 @@
+import hashlib
 import re
-from typing import Set, List
+import threading
+from collections import OrderedDict
+from typing import Set, List, Tuple, FrozenSet, Iterable
 from urllib.parse import urljoin, urlparse
 
 
@@ -7,6 +10,12 @@ class JsLinkExtractor:
     """
     专门用于从 JS 文本中提取 URL 和路径的提取器。
     采用“广撒网”策略，宁可错杀（404），不可放过（漏掉隐藏 API）。
+
+    大体积 bundle 的处理流程：
+      1. 按安全切分点分块扫描（pos/endpos，不复制子串），原始匹配直接进集合去重
+      2. 噪音过滤只对去重后的原始字符串做一次（前缀 / 后缀用预计算的元组）
+      3. urljoin / urlparse 只作用于去重后的幸存者
+      4. 同一份脚本内容（每个页面都带的内联脚本）的原始结果按内容哈希缓存
     """
 
     # 1. 完整 URL 正则 (http://...)
@@ -31,35 +40,108 @@ class JsLinkExtractor:
         '//',  # 注释
     }
 
+    # 预计算的元组，供 str.startswith / str.endswith 一次性判断
+    # （后缀都只含一个 '.'，endswith 与“取最后一个 '.' 之后的扩展名”等价）
+    _NOISE_PREFIXES: Tuple[str, ...] = tuple(sorted(IGNORED_PREFIXES))
+    _NOISE_SUFFIXES: Tuple[str, ...] = tuple(sorted(IGNORED_EXTENSIONS))
+
+    # 分块扫描：块大小，以及切分点必须落在的字符（不属于 URL 字符集、也不是引号，
+    # 任何一次匹配都不可能跨过这种字符，所以分块结果与整段扫描完全一致）
+    CHUNK_SIZE = 1024 * 1024
+    _SPLIT_POINT = re.compile(r"[^a-zA-Z0-9\-\._~:/?#\[\]@!$&'()*+,;=%\"`]")
+
+    # 外链脚本最多扫描的字节数（超出部分截断）
+    MAX_SCAN_BYTES = 8 * 1024 * 1024
+
+    # 原始结果缓存：内容哈希 -> (合法的完整 URL, 过滤后的路径)
+    # 只缓存较小的内容（每页重复的内联脚本）；外链大 bundle 已按 URL 去重，不值得再算哈希
+    RAW_CACHE_SIZE = 512
+    RAW_CACHE_MAX_CHARS = 256 * 1024
+    _raw_cache: "OrderedDict[bytes, Tuple[FrozenSet[str], FrozenSet[str]]]" = OrderedDict()
+    _raw_cache_lock = threading.Lock()
+
     @classmethod
     def extract_links(cls, content: str, base_url: str) -> Set[str]:
         """
         从任意文本（JS/HTML）中提取潜在的链接
         """
-        found_links = set()
-
-        # A. 提取完整 URL
-        for match in cls.REGEX_URL.findall(content):
-            # 简单清理：有时候正则会匹配到末尾的引号或分号
-            clean_url = match.strip("'\",;)")
-            if cls._is_valid_url(clean_url):
-                found_links.add(clean_url)
+        urls, paths = cls.extract_raw(content)
+        return cls.resolve(urls, paths, base_url)
 
-        # B. 提取相对路径
-        for match in cls.REGEX_PATH.findall(content):
-            path = match  # findall 返回的是括号内的内容，即不含引号的 path
-
-            # 过滤噪音
-            if cls._is_noise(path):
-                continue
-
-            # 拼接为绝对路径
+    @classmethod
+    def resolve(cls, urls: Iterable[str], paths: Iterable[str], base_url: str) -> Set[str]:
+        """把 extract_raw 的结果落到具体页面上。"""
+        # 完整 URL 在缓存前已校验过；相对路径拼接为绝对路径
+        found_links = set(urls)
+        for path in paths:
             absolute_url = urljoin(base_url, path)
             if cls._is_valid_url(absolute_url):
                 found_links.add(absolute_url)
 
         return found_links
 
+    @classmethod
+    def extract_raw(cls, content: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """
+        返回与 base_url 无关的中间结果：(合法的完整 URL, 去噪后的相对路径)。
+        较小的内容按内容哈希缓存。
+        """
+        key = None
+        if len(content) <= cls.RAW_CACHE_MAX_CHARS:
+            key = hashlib.sha1(content.encode("utf-8", errors="surrogatepass")).digest()
+            with cls._raw_cache_lock:
+                cached = cls._raw_cache.get(key)
+                if cached is not None:
+                    cls._raw_cache.move_to_end(key)
+                    return cached
+
+        raw_urls, raw_paths = cls._scan(content)
+
+        # 简单清理：有时候正则会匹配到末尾的引号或分号
+        urls = frozenset(url for url in {match.strip("'\",;)") for match in raw_urls} if cls._is_valid_url(url))
+        paths = frozenset(path for path in raw_paths if not cls._is_noise(path))
+
+        result = (urls, paths)
+        if key is None:
+            return result
+        with cls._raw_cache_lock:
+            cls._raw_cache[key] = result
+            while len(cls._raw_cache) > cls.RAW_CACHE_SIZE:
+                cls._raw_cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        with cls._raw_cache_lock:
+            cls._raw_cache.clear()
+
+    @classmethod
+    def _scan(cls, content: str) -> Tuple[Set[str], Set[str]]:
+        """分块执行两个正则，原始匹配直接去重。"""
+        raw_urls: Set[str] = set()
+        raw_paths: Set[str] = set()
+        for start, end in cls._chunks(content):
+            raw_urls.update(cls.REGEX_URL.findall(content, start, end))
+            # findall 返回的是括号内的内容，即不含引号的 path
+            raw_paths.update(cls.REGEX_PATH.findall(content, start, end))
+        return raw_urls, raw_paths
+
+    @classmethod
+    def _chunks(cls, content: str) -> List[Tuple[int, int]]:
+        """按 CHUNK_SIZE 切分，切分点向后挪到最近的安全字符处。"""
+        chunks: List[Tuple[int, int]] = []
+        start, total = 0, len(content)
+        while start < total:
+            end = start + cls.CHUNK_SIZE
+            if end >= total:
+                end = total
+            else:
+                split = cls._SPLIT_POINT.search(content, end)
+                end = split.start() if split else total
+            chunks.append((start, end))
+            start = end
+        return chunks
+
     @classmethod
     def _is_noise(cls, path: str) -> bool:
         """判断提取出的 path 是否是噪音"""
@@ -70,16 +152,9 @@ class JsLinkExtractor:
             return True
 
         # 2. 前缀过滤 (过滤 MIME types 等)
-        for prefix in cls.IGNORED_PREFIXES:
-            if path.startswith(prefix):
-                return True
-
         # 3. 后缀过滤 (过滤静态资源)
-        # 简单的 split 判断
-        if '.' in path:
-            ext = path[path.rfind('.'):]
-            if ext in cls.IGNORED_EXTENSIONS:
-                return True
+        if path.startswith(cls._NOISE_PREFIXES) or path.endswith(cls._NOISE_SUFFIXES):
+            return True
 
         # 4. 特殊字符过滤 (防止匹配到正则源码或 weird strings)
         # 如果包含换行符、不合法的 URL 字符，视为噪音
@@ -95,4 +170,4 @@ class JsLinkExtractor:
             parsed = urlparse(url)
             return bool(parsed.scheme and parsed.netloc)
         except:
-            return False
\ No newline at end of file
+            return False
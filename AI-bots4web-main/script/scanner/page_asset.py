@@ -77,7 +77,10 @@ class ApiCall:
     
     response_status: Optional[int] = None
     response_headers: Dict[str, str] = field(default_factory=dict)
-    response_body: Optional[str] = None  # 文本形式的响应体（如有）
+    # 响应体的短预览（完整内容在 ResponseBodyStore 中，用 response_body_hash 取回）
+    response_body: Optional[str] = None
+    response_body_hash: Optional[str] = None  # 内容 SHA-256，对应 ResponseBodyStore 中的对象
+    response_body_size: Optional[int] = None  # 原始响应体字节数
 
     # 以后可以扩展：响应体摘要 / 更多元信息
     meta: Dict[str, Any] = field(default_factory=dict)
@@ -202,6 +205,9 @@ class PageAsset:
     # 或者存一个简化后的 body.outerHTML 片段
     dom_snapshot: Optional[str] = None
 
+    # InteractionDomDistiller 输出的交互 DSL（开启浏览器内蒸馏时由页面脚本直接产出）
+    distilled_dsl: Optional[str] = None
+
     # 关联的 JS 脚本资产（外链 + 内联）
     scripts: List[ScriptAsset] = field(default_factory=list)
 
@@ -243,6 +249,7 @@ class PageAsset:
             "html": self.html,
             "cleaned_html": self.cleaned_html,
             "dom_snapshot": self.dom_snapshot,
+            "distilled_dsl": self.distilled_dsl,
             "scripts": [asdict(s) for s in self.scripts],
             "inputs": [asdict(i) for i in self.inputs],
             "clickables": [asdict(c) for c in self.clickables],
@@ -256,6 +263,25 @@ class PageAsset:
         }
 
 
+@dataclass
+class SecretFinding:
+    """
+    SecretHunter 发现的一条疑似硬编码凭证。
+    同一 (rule, value) 在整个站点只记一条，source_* 为首次发现的位置。
+    命中结果跨运行复用时磁盘上只有取值哈希和打码预览：304 回放且本次没见过原文时，value / context 是打码后的。
+    """
+    rule: str                         # 规则名，如 aws_access_key_id / generic_api_key
+    value: str                        # 命中的取值
+    severity: str                     # critical / high / medium / low
+    source_url: str                   # 页面 / 脚本 / 接口 URL
+    source_type: str                  # html / inline_script / script / comment / storage / cookie / response
+    offset: int = 0                   # 在来源内容中的偏移
+    context: str = ""                 # 取值前后的片段
+    entropy: float = 0.0              # 取值的香农熵（bit/字符）
+    occurrences: int = 1              # 在多少个来源中出现过
+    value_hash: str = ""              # 取值的 SHA-256
+
+
 @dataclass  # <--- 必须加上这个装饰器
 class AuthCredentials:
     """
@@ -291,17 +317,26 @@ class SiteAsset:
     # 来源：
     # 1. 爬虫 Probe 阶段发现是 JSON 响应的 URL
     # 2. 从 JS 字符串提取出的 API 路径 (JsLinkExtractor)
+    # 3. JS 调用点 (fetch / axios / XHR ...) 静态提取出的接口 (JsEndpointExtractor)，
+    #    meta 中带 param_keys / body_keys
     discovered_apis: List[ApiCall] = field(default_factory=list)
 
     # [新增] 需要鉴权的页面队列
     # 这里的 URL 在未登录扫描时被拦截了，需要在登录成功后进行 "Re-scan"
     auth_required_urls: Set[str] = field(default_factory=set)
 
+    # SecretHunter 在爬取内容中发现的疑似硬编码凭证（见 scanner/secret_hunter.py）
+    secrets: List[SecretFinding] = field(default_factory=list)
+
+    # 完整响应体所在的 ResponseBodyStore 目录（见 scanner/body_store.py）
+    body_store_dir: Optional[str] = None
+
     meta: Dict[str, Any] = field(default_factory=dict)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "base_url": self.base_url,
             "pages": {url: p.to_dict() for url, p in self.pages.items()},
+            "secrets": [asdict(s) for s in self.secrets],
             "meta": self.meta,
         }
\ No newline at end of file
@@ -0,0 +1,290 @@
+# script/scanner/script_cache.py
+"""
+跨运行的 JS 分析缓存 (Script Analysis Cache)
+
+目标站点一周发布几次，两次扫描之间 main.<hash>.js 大多没变，
+但每次扫描都要重新下载、重新跑 JsLinkExtractor / JsEndpointExtractor。
+
+这里把与页面无关的提取结果持久化：
+  - 按脚本内容哈希：<root>/analysis/<hash[:2]>/<hash>.json
+      {"extractor": 提取器代码版本, "urls": [...], "paths": [...], "endpoints": [...]}
+    同一内容换了 URL（如 ?v= 缓存破坏参数）也能直接复用
+  - 按 URL：<root>/url_index.json 记录 ETag / Last-Modified / 内容哈希，
+    下次请求带上 If-None-Match / If-Modified-Since，304 时连下载都省掉
+提取器代码一改（源码哈希变化），旧的分析结果自动作废。
+
+内联脚本常带 CSRF token / nonce 等每页不同的内容，只用一次：同一内容在本次运行中
+出现第二次才落盘，否则只做提取不写磁盘。
+分析结果目录按总字节数限制（读取时刷新 mtime，超出后最久没用的先删到上限的 90%），
+URL 索引按条目数限制（按最近使用时间淘汰，分析结果已被删掉的条目一并去掉）。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .js_endpoint_extractor import JsEndpoint, JsEndpointExtractor
+from .link_extractor import JsLinkExtractor
+from .utils.memo import source_digest
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_EXTRACTOR_FINGERPRINT = hashlib.sha256(
+    (source_digest(os.path.join(_HERE, "link_extractor.py"))
+     + source_digest(os.path.join(_HERE, "js_endpoint_extractor.py"))).encode("ascii")
+).hexdigest()
+
+
+@dataclass
+class ScriptAnalysis:
+    """一个脚本与页面无关的提取结果（相对路径、相对接口），用 links / endpoints_for 落到具体页面。"""
+    content_hash: str
+    urls: List[str] = field(default_factory=list)
+    paths: List[str] = field(default_factory=list)
+    endpoints: List[JsEndpoint] = field(default_factory=list)
+
+    def links(self, base_url: str) -> Set[str]:
+        return JsLinkExtractor.resolve(self.urls, self.paths, base_url)
+
+    def endpoints_for(self, base_url: str) -> List[JsEndpoint]:
+        return JsEndpointExtractor.resolve(self.endpoints, base_url)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "extractor": _EXTRACTOR_FINGERPRINT,
+            "urls": self.urls,
+            "paths": self.paths,
+            "endpoints": [ep.to_dict() for ep in self.endpoints],
+        }
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def analyze_script(content: str, digest: Optional[str] = None) -> ScriptAnalysis:
+    """对脚本内容执行两种提取（不经过磁盘缓存）。"""
+    urls, paths = JsLinkExtractor.extract_raw(content)
+    return ScriptAnalysis(
+        content_hash=digest or content_hash(content),
+        urls=sorted(urls),
+        paths=sorted(paths),
+        endpoints=list(JsEndpointExtractor.extract_raw(content)),
+    )
+
+
+class ScriptAnalysisCache:
+    """
+    用法（SiteScanner 中）：
+        headers = cache.conditional_headers(url)         # 有可复用结果时才带条件头
+        resp = page.request.get(url, headers=headers)
+        if resp.status == 304:
+            analysis = cache.analysis_for_url(url)
+        else:
+            analysis = cache.analyze(resp.text())
+            cache.remember_url(url, resp.headers, analysis)
+        ...
+        cache.flush()                                    # 扫描结束时写回 URL 索引
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 64 * 1024 * 1024, max_urls: int = 20000) -> None:
+        """
+        max_bytes: 分析结果目录的总字节数上限
+        max_urls: URL 索引的条目数上限
+        """
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.max_urls = max_urls
+        self._analysis_dir = os.path.join(root_dir, "analysis")
+        self._index_path = os.path.join(root_dir, "url_index.json")
+        os.makedirs(self._analysis_dir, exist_ok=True)
+
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._lock = threading.Lock()
+        # 本次运行见过一次的内联脚本内容哈希，第二次出现才落盘
+        self._inline_seen: Set[str] = set()
+        # 分析结果目录的总字节数，第一次写入时扫描目录得到
+        self._stored_bytes: Optional[int] = None
+
+        # 统计信息
+        self.hits = 0              # 内容哈希命中，跳过提取
+        self.misses = 0
+        self.not_modified = 0      # 304，连下载都跳过
+        self.evictions = 0         # 因容量上限删除的分析结果
+
+    # ==============================
+    # 按 URL：条件请求
+    # ==============================
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """URL 有校验器且对应的分析结果仍然可用时，返回条件请求头。"""
+        entry = self._index.get(url)
+        if not entry or self._load(entry["content_hash"]) is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def analysis_for_url(self, url: str) -> Optional[ScriptAnalysis]:
+        """收到 304 时取回上次的分析结果。"""
+        entry = self._index.get(url)
+        analysis = self._load(entry["content_hash"]) if entry else None
+        if analysis is not None:
+            with self._lock:
+                self.not_modified += 1
+                entry["last_used"] = time.time()
+        return analysis
+
+    def remember_url(self, url: str, response_headers: Dict[str, str], analysis: ScriptAnalysis) -> None:
+        headers = {k.lower(): v for k, v in (response_headers or {}).items()}
+        etag, last_modified = headers.get("etag"), headers.get("last-modified")
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._index[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_hash": analysis.content_hash,
+                "last_used": time.time(),
+            }
+
+    # ==============================
+    # 按内容哈希：提取结果
+    # ==============================
+    def analyze(self, content: str, inline: bool = False) -> ScriptAnalysis:
+        """inline=True 的内容在本次运行中第二次出现时才落盘。"""
+        digest = content_hash(content)
+        analysis = self._load(digest)
+        if analysis is not None:
+            with self._lock:
+                self.hits += 1
+            return analysis
+
+        analysis = analyze_script(content, digest)
+        with self._lock:
+            self.misses += 1
+            persist = not inline or digest in self._inline_seen
+            self._inline_seen.add(digest)
+        if persist:
+            self._store(analysis)
+        return analysis
+
+    def flush(self) -> None:
+        """把 URL 索引写回磁盘（先去掉分析结果已不存在的条目，再按最近使用时间截到 max_urls）。"""
+        with self._lock:
+            live = {url: entry for url, entry in self._index.items()
+                    if os.path.exists(self._path(entry["content_hash"]))}
+            if len(live) > self.max_urls:
+                newest = sorted(live, key=lambda url: live[url].get("last_used", 0), reverse=True)
+                live = {url: live[url] for url in newest[:self.max_urls]}
+            self._index = live
+            tmp_path = f"{self._index_path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._index, f)
+                os.replace(tmp_path, self._index_path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "urls": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+        }
+
+    # ==============================
+    # 辅助
+    # ==============================
+    def _path(self, digest: str) -> str:
+        return os.path.join(self._analysis_dir, digest[:2], digest + ".json")
+
+    def _load(self, digest: str) -> Optional[ScriptAnalysis]:
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("extractor") != _EXTRACTOR_FINGERPRINT:
+            return None
+        try:
+            # mtime 作为最近使用时间，淘汰时先删最久没用过的
+            os.utime(self._path(digest))
+        except OSError:
+            pass
+        try:
+            endpoints = [JsEndpoint.from_dict(ep) for ep in data["endpoints"]]
+            return ScriptAnalysis(digest, list(data["urls"]), list(data["paths"]), endpoints)
+        except (KeyError, TypeError):
+            return None
+
+    def _store(self, analysis: ScriptAnalysis) -> None:
+        path = self._path(analysis.content_hash)
+        data = json.dumps(analysis.to_dict(), ensure_ascii=False).encode("utf-8", errors="surrogatepass")
+        if len(data) > self.max_bytes:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._stored_bytes is None:
+                self._stored_bytes = sum(size for _, size, _ in self._stored_files())
+            else:
+                self._stored_bytes += len(data) - replaced
+            if self._stored_bytes > self.max_bytes:
+                self._evict()
+
+    def _stored_files(self) -> List[Tuple[float, int, str]]:
+        """分析结果目录里的所有条目：(mtime, 字节数, 路径)。"""
+        files = []
+        for root, _, names in os.walk(self._analysis_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict(self) -> None:
+        """超出 max_bytes 时按 mtime 从旧到新删除，直到不超过上限的 90%（调用方持有锁）。"""
+        files = sorted(self._stored_files())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._stored_bytes = total
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
@@ -2,13 +2,21 @@
 
 from __future__ import annotations
 
-from typing import Dict, Set, List, Optional, Any
+from typing import Callable, Dict, Set, List, Optional, Any
 from urllib.parse import urlparse, urljoin
 import json
+import re
 from .page_asset import SubmissionUnit
 from urllib.parse import parse_qs
 from scanner.utils.html_cleaner import clean_html_for_llm
+from scanner.utils.memo import format_memo_stats
 from .link_extractor import JsLinkExtractor
+from .js_endpoint_extractor import JsEndpoint
+from .script_cache import ScriptAnalysis, ScriptAnalysisCache, analyze_script
+from .vendor_fingerprint import HEAD_BYTES as VENDOR_HEAD_BYTES, identify_vendor
+from .body_store import ResponseBodyStore
+from .secret_hunter import SecretHunter
+from .browser_distiller import build_rules, distill_in_browser
 from .page_asset import (
     SiteAsset,
     PageAsset,
@@ -23,23 +31,52 @@ from playwright.sync_api import sync_playwright, Page, Request, Browser, Browser
 
 class SiteScanner:
 
+    # 常见无关脚本的文件名关键词
+    IGNORED_SCRIPT_KEYWORDS = frozenset({
+        "runtime",
+        "polyfills",
+        "vendor",
+        "vendors",
+        "jquery",
+        "bootstrap",
+        "popper",
+        "react",
+        "vue",
+        "angular",
+        "lodash",
+        "moment",
+        "axios",
+        "cookieconsent",  # 用户截图中出现的
+    })
+    _PATH_TOKEN_SPLIT = re.compile(r"[^a-z0-9]+")
+
     def __init__(
             self,
             base_url: str,
             max_depth: int = 2,
             headless: bool = True,
             same_origin_only: bool = True,
+            body_store_dir: str = "ptagent_cache/bodies",
+            in_browser_distill: bool = False,
+            script_cache_dir: Optional[str] = None,
+            hunt_secrets: bool = True,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.max_depth = max_depth
         self.headless = headless
         self.same_origin_only = same_origin_only
 
+        # 在页面内执行清洗 / 蒸馏，只把精简结果传回 Python（不再保存原始 html / dom_snapshot）
+        self.in_browser_distill = in_browser_distill
+        self._distill_rules = build_rules() if in_browser_distill else None
+
         parsed = urlparse(self.base_url)
         self._base_origin = (parsed.scheme, parsed.netloc)
 
         # 站点资产 (保持不变)
-        self._site_asset = SiteAsset(base_url=self.base_url)
+        self._site_asset = SiteAsset(base_url=self.base_url, body_store_dir=body_store_dir)
+        # 完整响应体按内容哈希压缩存储，ApiCall 中只保留哈希和预览
+        self._body_store = ResponseBodyStore(body_store_dir)
         self._visited: Set[str] = set()
         self._next_input_id = 1
         self._next_clickable_id = 1
@@ -47,7 +84,15 @@ class SiteScanner:
         self._next_submission_id = 1
         self._captured_apis: List[ApiCall] = []
         self._processed_script_urls: Set[str] = set()
+        # 跨运行的 JS 分析缓存（None 表示不落盘）：未变化的 bundle 不再下载 / 提取
+        self._script_cache = ScriptAnalysisCache(script_cache_dir) if script_cache_dir else None
+        # JS 调用点提取出的接口：url -> 已记录的方法
+        self._js_endpoint_methods: Dict[str, Set[str]] = {}
+        # 敏感信息扫描：内容到手即提交给后台线程池，扫描结束时汇总到 SiteAsset.secrets
+        self._secret_hunter = SecretHunter() if hunt_secrets else None
         self._auth_headers = {}
+        # scan(on_page=...) 的回调：每个页面资产生成后立即交给调用方（流式分诊 / 分析）
+        self._on_page: Optional[Callable[[PageAsset, SiteAsset], None]] = None
 
         # --- Playwright 核心对象初始化 ---
         self._playwright: Optional[Playwright] = None
@@ -96,6 +141,8 @@ class SiteScanner:
         """
         显式关闭 Playwright 资源，在 PTAgent 退出时调用。
         """
+        if self._secret_hunter:
+            self._secret_hunter.close()
         if self._browser:
             print("[*] Closing Browser...")
             self._browser.close()
@@ -109,7 +156,11 @@ class SiteScanner:
     # ==============================
     # 对外入口：扫描整个站点
     # ==============================
-    def scan(self) -> SiteAsset:
+    def scan(self, on_page: Optional[Callable[[PageAsset, SiteAsset], None]] = None) -> SiteAsset:
+        """
+        on_page: 每个 PageAsset 生成后（继续爬下一层之前）在爬虫线程里调用 on_page(page, site_asset)。
+                 回调阻塞时爬取随之暂停（流式流水线借此实现背压）；回调异常只打印，不中断扫描。
+        """
         # **重要修正：移除 Playwright 局部初始化块**
 
         # 确保 Page 存在
@@ -119,6 +170,7 @@ class SiteScanner:
             if not self._page:
                 raise RuntimeError("Failed to initialize Playwright resources.")
 
+        self._on_page = on_page
         try:
             # 清空之前的 API 捕获 buffer
             self._api_calls_buffer = {}
@@ -131,7 +183,16 @@ class SiteScanner:
 
         finally:
             # 扫描主循环结束，不需要在这里关闭浏览器，因为它要留给攻击阶段用
-            pass
+            self._on_page = None
+            self._release_captured_apis()
+            self._body_store.flush()
+            if self._script_cache:
+                self._script_cache.flush()
+                print(f"[*] Script cache: {self._script_cache.stats()}")
+            self._collect_secrets()
+            memo_summary = format_memo_stats()
+            if memo_summary:
+                print(f"[*] Memo stats:\n{memo_summary}")
 
         return self._site_asset
     # ==============================
@@ -239,7 +300,8 @@ class SiteScanner:
         # -------------------------------------------------
         try:
             # 清空上一页的捕获记录 (仅用于 page.goto 触发的被动流量)
-            self._captured_apis.clear()
+            # 未归属到任何 PageAsset 的捕获（上一页中途退出）需要释放响应体引用
+            self._release_captured_apis()
 
             response = page.goto(url, wait_until="networkidle", timeout=15000)
             if not response:  # 加载失败
@@ -271,14 +333,7 @@ class SiteScanner:
 
         current_url = page.url  # 可能存在重定向
         title = page.title()
-        html = page.content()
-
-        dom_snapshot = None
-        body = page.query_selector("body")
-        if body:
-            dom_snapshot = body.inner_html()
-
-        cleaned_html = clean_html_for_llm(html)
+        html, dom_snapshot, cleaned_html, distilled_dsl = self._extract_page_html(page, url)
 
         # 1) 收集脚本
         scripts = self._extract_scripts(page)
@@ -379,6 +434,7 @@ class SiteScanner:
             html=html,
             cleaned_html=cleaned_html,
             dom_snapshot=dom_snapshot,
+            distilled_dsl=distilled_dsl,
             scripts=scripts,
             inputs=inputs,
             clickables=clickables,
@@ -392,6 +448,14 @@ class SiteScanner:
         )
 
         self._site_asset.pages[url] = pa
+        self._hunt_page_secrets(pa)
+        if self._on_page:
+            try:
+                self._on_page(pa, self._site_asset)
+            except Exception as e:
+                print(f"[WARN] on_page callback failed for {url}: {e}")
+        # 这些 ApiCall 已归属 PageAsset，不能再被 _release_captured_apis 释放
+        self._captured_apis = []
 
         # 6) 找出本页中的下一层链接，继续爬
         links = self._collect_links(page, current_url, scripts)
@@ -400,6 +464,27 @@ class SiteScanner:
 
         # 在 SiteScanner 类中添加
 
+    def _extract_page_html(self, page: Page, url: str) -> tuple:
+        """
+        返回 (html, dom_snapshot, cleaned_html, distilled_dsl)。
+        开启 in_browser_distill 时在页面内完成清洗和蒸馏，只传回精简结果；失败则回退到 Python 路径。
+        """
+        if self.in_browser_distill:
+            try:
+                result = distill_in_browser(page, rules=self._distill_rules)
+                return None, None, result["cleaned_html"], result["distilled_dsl"]
+            except Exception as e:
+                print(f"[WARN] In-browser distillation failed for {url}: {e}. Falling back to Python.")
+
+        html = page.content()
+
+        dom_snapshot = None
+        body = page.query_selector("body")
+        if body:
+            dom_snapshot = body.inner_html()
+
+        return html, dom_snapshot, clean_html_for_llm(html), None
+
     # ==============================
     # 授权扫描模式 (scan_authenticated)
     # ==============================
@@ -466,6 +551,9 @@ class SiteScanner:
 
             # --- 移除 browser.close() ---
 
+        self._release_captured_apis()
+        self._body_store.flush()
+        self._collect_secrets()
         return self._site_asset
 
     # 为了复用，建议把之前 scan() 里的内部函数 on_request_finished 提取为类方法
@@ -488,17 +576,19 @@ class SiteScanner:
             resp_status = None
             resp_headers = {}
             resp_body = None
+            resp_body_hash = None
+            resp_body_size = None
 
             if resp:
                 resp_status = resp.status
                 resp_headers = resp.all_headers()
                 try:
-                    # 限制响应体大小，避免过大
+                    # 完整响应体进仓库（去重 + 压缩），这里只留预览
                     body_bytes = resp.body()
-                    if len(body_bytes) > 10000:
-                        resp_body = body_bytes[:10000].decode("utf-8", errors="replace") + "\n<!-- truncated -->"
-                    else:
-                        resp_body = body_bytes.decode("utf-8", errors="replace")
+                    resp_body_hash = self._body_store.put(body_bytes)
+                    resp_body_size = len(body_bytes)
+                    resp_body = ResponseBodyStore.preview(body_bytes)
+                    self._hunt_response_secrets(req.url, resp_headers, body_bytes)
                 except Exception:
                     pass
 
@@ -515,6 +605,8 @@ class SiteScanner:
                 response_status=resp_status,
                 response_headers=resp_headers,
                 response_body=resp_body,
+                response_body_hash=resp_body_hash,
+                response_body_size=resp_body_size,
             )
             self._next_api_id += 1
 
@@ -528,6 +620,17 @@ class SiteScanner:
             # 不要让监听器异常中断整个扫描，最多打印一行日志
             print(f"[WARN] on_request_finished error for {req.url}: {e}")
 
+    @property
+    def body_store(self) -> ResponseBodyStore:
+        """响应体仓库（调用方保存扫描结果后用它钉住 / 回收响应体）。"""
+        return self._body_store
+
+    def _release_captured_apis(self) -> None:
+        """丢弃尚未归属任何 PageAsset 的捕获记录，并释放其响应体引用。"""
+        for api in self._captured_apis:
+            self._body_store.release(api.response_body_hash)
+        self._captured_apis = []
+
     # ==============================
     # URL 访问控制
     # ==============================
@@ -544,18 +647,68 @@ class SiteScanner:
 
         return True
 
+    # ==============================
+    # 敏感信息扫描 (SecretHunter)
+    # ==============================
+    # 这些 Content-Type 的响应体才值得扫描（图片 / 字体等二进制跳过）
+    _TEXTUAL_CONTENT_TYPES = ("json", "javascript", "ecmascript", "text/", "xml", "x-www-form-urlencoded")
+
+    def _hunt_page_secrets(self, pa: PageAsset) -> None:
+        """把页面上的 HTML / 脚本 / 注释 / Storage / Cookie 提交给 SecretHunter（后台扫描，立即返回）。"""
+        hunter = self._secret_hunter
+        if not hunter:
+            return
+        page_url = pa.final_url or pa.url
+        if pa.html:
+            # 原始 HTML 已包含内联脚本和注释
+            hunter.submit(page_url, pa.html, "html")
+        else:
+            # 浏览器内蒸馏只传回清洗结果（已去掉脚本 / 注释），需要单独提交
+            hunter.submit(page_url, pa.cleaned_html, "html")
+            for script in pa.scripts:
+                if script.is_inline:
+                    hunter.submit(page_url, script.content, "inline_script")
+            if pa.comments:
+                hunter.submit(page_url, "\n".join(f"<!--{c}-->" for c in pa.comments), "comment")
+
+        # 序列化成 JSON，"key": "value" 的形式正好能被通用规则识别
+        storage = {item.key: item.value for item in pa.local_storage + pa.session_storage}
+        cookies = {c.name: c.value for c in pa.cookies}
+        for source_type, pairs in (("storage", storage), ("cookie", cookies)):
+            if pairs:
+                hunter.submit(page_url, json.dumps(pairs, ensure_ascii=False, indent=0), source_type)
+
+    def _hunt_response_secrets(self, url: str, headers: Dict[str, str], body: bytes) -> None:
+        if not self._secret_hunter or not body:
+            return
+        content_type = next((v for k, v in (headers or {}).items() if k.lower() == "content-type"), "").lower()
+        if content_type and not any(t in content_type for t in self._TEXTUAL_CONTENT_TYPES):
+            return
+        self._secret_hunter.submit(url, body, "response")
+
+    def _collect_secrets(self) -> None:
+        """等待后台扫描完成，把站点级结果写入 SiteAsset。"""
+        if not self._secret_hunter:
+            return
+        self._site_asset.secrets = self._secret_hunter.drain()
+        if self._site_asset.secrets:
+            print(f"[*] SecretHunter: {len(self._site_asset.secrets)} potential secrets "
+                  f"({self._secret_hunter.stats()})")
+
     def _record_standalone_api(self, url: str, response) -> None:
         """
         将主动发现的 API 端点记录到 SiteAsset 中。
         response: 是 APIResponse 对象 (来自 page.request.get)
         """
+        resp_body_hash = None
+        resp_body_size = None
         try:
-            # 尝试获取 Body (截断以防过大)
+            # 完整 Body 进仓库，ApiCall 中只保留预览
             body_bytes = response.body()
-            if len(body_bytes) > 10000:
-                resp_body = body_bytes[:10000].decode("utf-8", errors="replace") + "\n"
-            else:
-                resp_body = body_bytes.decode("utf-8", errors="replace")
+            resp_body_hash = self._body_store.put(body_bytes)
+            resp_body_size = len(body_bytes)
+            resp_body = ResponseBodyStore.preview(body_bytes)
+            self._hunt_response_secrets(url, response.headers, body_bytes)
         except:
             resp_body = None
 
@@ -570,11 +723,42 @@ class SiteScanner:
             request_headers={},  # 主动请求的 headers 较难获取完全，留空或填默认
             response_status=response.status,
             response_headers=response.headers,
-            response_body=resp_body
+            response_body=resp_body,
+            response_body_hash=resp_body_hash,
+            response_body_size=resp_body_size,
         )
         self._next_api_id += 1
         self._site_asset.discovered_apis.append(api_entry)
 
+    def _record_js_endpoints(self, endpoints: List[JsEndpoint], page_url: str, script_src: str) -> None:
+        """
+        将 JS 调用点中静态提取的接口记录到 SiteAsset 中（未发请求，没有响应信息）。
+        同一 (method, url) 只记录一次。
+        """
+        for ep in endpoints:
+            if not self._should_visit(ep.url):
+                continue
+            methods = self._js_endpoint_methods.setdefault(ep.url, set())
+            if ep.method in methods:
+                continue
+            methods.add(ep.method)
+
+            self._site_asset.discovered_apis.append(ApiCall(
+                id=self._next_api_id,
+                url=ep.url,
+                method=ep.method,
+                resource_type="xhr" if ep.source == "xhr" else "fetch",
+                page_url=page_url,
+                meta={
+                    "discovered_by": "js_call_site",
+                    "client": ep.source,
+                    "param_keys": ep.param_keys,
+                    "body_keys": ep.body_keys,
+                    "script": script_src,
+                },
+            ))
+            self._next_api_id += 1
+
     def _collect_links(self, page: Page, current_url: str, scripts: List[ScriptAsset]) -> List[str]:
         """
         收集链接：
@@ -602,9 +786,12 @@ class SiteScanner:
 
         for script in scripts:
             content_to_scan = ""
+            analysis: Optional[ScriptAnalysis] = None
 
             # --- 情况 A: 内联脚本 (直接有代码) ---
             if script.is_inline and script.content:
+                if identify_vendor(script.content):
+                    continue
                 content_to_scan = script.content
 
             # --- 情况 B: 外链脚本 (需要下载) ---
@@ -625,19 +812,51 @@ class SiteScanner:
 
                 # [Step 3] 下载内容
                 #    使用 page.request (APIRequestContext) 可以复用当前页面的 Cookies
+                #    上次扫描有 ETag / Last-Modified 时发条件请求，304 直接复用上次的分析结果
                 try:
-                    resp = page.request.get(absolute_src, timeout=3000)
-                    if resp.ok:
+                    headers = self._script_cache.conditional_headers(absolute_src) if self._script_cache else {}
+                    if headers:
+                        resp = page.request.get(absolute_src, timeout=3000, headers=headers)
+                        if resp.status == 304:
+                            analysis = self._script_cache.analysis_for_url(absolute_src)
+                            # 内容没有重新下载：敏感信息扫描取回上次的结果，取不到就重新下载
+                            if analysis is not None and self._secret_hunter and \
+                                    not self._secret_hunter.replay(absolute_src, analysis.content_hash):
+                                analysis = None
+                            if analysis is None:
+                                resp = page.request.get(absolute_src, timeout=3000)
+                    else:
+                        # 先只取前 1KB 做库指纹识别，第三方代码不整段下载
+                        resp = page.request.get(absolute_src, timeout=3000,
+                                                headers={"Range": f"bytes=0-{VENDOR_HEAD_BYTES - 1}"})
+                        if resp.status == 206:
+                            vendor = identify_vendor(resp.body())
+                            if vendor:
+                                print(f"[DEBUG] Skipping vendor script ({vendor}): {absolute_src}")
+                                self._processed_script_urls.add(absolute_src)
+                                continue
+                            resp = page.request.get(absolute_src, timeout=3000)
+
+                    if analysis is not None:
+                        self._processed_script_urls.add(absolute_src)
+                    elif resp.ok:
                         self._processed_script_urls.add(absolute_src)  # <--- 下载成功后，加入已处理集合
 
                         body_bytes = resp.body()
-                        # 大小限制
-                        if len(body_bytes) < 1024 * 1024 * 2:
-                            content_to_scan = body_bytes.decode("utf-8", errors="replace")
-                            # [可选] 如果你想在 PageAsset 里保留内容，可以在这里赋值
-                            # script.content = content_to_scan
-                        else:
-                            content_to_scan = body_bytes[:512000].decode("utf-8", errors="replace")
+                        # 服务器不支持 Range 时拿到的是整段内容，同样先看头部指纹
+                        vendor = identify_vendor(body_bytes)
+                        if vendor:
+                            print(f"[DEBUG] Skipping vendor script ({vendor}): {absolute_src}")
+                            continue
+                        # 大小限制：提取器分块扫描，大 bundle 也能整段处理，只截掉超出上限的部分
+                        content_to_scan = body_bytes[:JsLinkExtractor.MAX_SCAN_BYTES].decode("utf-8", errors="replace")
+                        if self._secret_hunter:
+                            self._secret_hunter.submit(absolute_src, content_to_scan, "script")
+                        # [可选] 如果你想在 PageAsset 里保留内容，可以在这里赋值
+                        # script.content = content_to_scan
+                        if self._script_cache:
+                            analysis = self._script_cache.analyze(content_to_scan)
+                            self._script_cache.remember_url(absolute_src, resp.headers, analysis)
                     else:
                         print(f"[WARN] Failed to fetch script {absolute_src}: {resp.status}")
                         # 失败了是否要标记为已处理？
@@ -648,12 +867,24 @@ class SiteScanner:
                     print(f"[DEBUG] Fetch script error {absolute_src}: {e}")
                     continue
 
-            # --- 执行正则提取 ---
-            if content_to_scan:
+            # --- 执行提取（优先复用缓存的分析结果） ---
+            if analysis is None and content_to_scan:
+                # 内联脚本（可能带每页不同的 token / nonce）重复出现才落盘
+                analysis = self._script_cache.analyze(content_to_scan, inline=script.is_inline) \
+                    if self._script_cache else analyze_script(content_to_scan)
+
+            if analysis is not None:
+                # 调用点提取：带方法 / 参数名的接口直接记入 discovered_apis
+                self._record_js_endpoints(analysis.endpoints_for(current_url), current_url, script.src or "inline")
+
                 # 传入 current_url 作为 base，用于把 JS 里提取到的相对路径 '/api/v1' 转为绝对路径
-                js_links = JsLinkExtractor.extract_links(content_to_scan, current_url)
+                js_links = analysis.links(current_url)
 
                 for link in js_links:
+                    # 只以非 GET 方式调用的接口不用再 GET 探测（只会得到 404/405）
+                    methods = self._js_endpoint_methods.get(link)
+                    if methods and "GET" not in methods:
+                        continue
                     if self._should_visit(link):
                         found_links.add(link)
 
@@ -749,29 +980,14 @@ class SiteScanner:
             return False
 
         # 2. 关键词过滤
-        lower_src = src.lower()
-        
-        # 常见无关文件名关键词
-        ignore_keywords = [
-            "runtime",
-            "polyfills",
-            "vendor",
-            "jquery",
-            "bootstrap",
-            "popper",
-            "react",
-            "vue",
-            "angular",
-            "lodash",
-            "moment",
-            "axios",
-            "cookieconsent", # 用户截图中出现的
-        ]
-        
-        for kw in ignore_keywords:
-            if kw in lower_src:
+        #    按路径中的词（字母数字片段）整词匹配：chunk-vendors.js 仍命中 vendors，
+        #    而 reactions.js / revue-widget.js 这类业务文件不会因为包含子串被误跳过。
+        #    内容层面的识别（改名 / 打包后的库）见 vendor_fingerprint.identify_vendor
+        path = urlparse(src).path.lower()
+        for token in self._PATH_TOKEN_SPLIT.split(path):
+            if token in self.IGNORED_SCRIPT_KEYWORDS:
                 return False
-                
+
         return True
 
     # ==============================
@@ -1,117 +1,288 @@
 from bs4 import BeautifulSoup, Comment, Tag, NavigableString
+from typing import Set
 import re
+import threading
 
+from .memo import get_memo, source_digest
 
-def clean_html_for_llm(raw_html: str) -> str:
+try:  # lxml 在 requirements.txt 中，但仍按可选依赖处理，缺失时退回 html.parser
+    import lxml.html as lxml_html
+    from lxml import etree
+except ImportError:  # pragma: no cover - 取决于运行环境
+    lxml_html = None
+    etree = None
+
+
+# ============================
+# 清洗规则（两种后端共用）
+# ============================
+
+# svg/path: 图标数据，占用大量 Token 且无逻辑价值
+# style: CSS 样式表，对逻辑分析无用
+# noscript: 通常包含重复内容
+NOISE_TAGS = ("svg", "style", "noscript", "font")
+
+# 这些属性对 OWASP Top 10 分析至关重要
+ALLOWED_ATTRIBUTES = {
+    # 基础标识
+    "id", "name", "type", "value", "placeholder", "title", "alt",
+    # 表单与数据
+    "action", "method", "enctype", "autocomplete", "href", "src", "target",
+    # 逻辑控制
+    "disabled", "readonly", "required", "checked", "selected", "multiple",
+    # 安全相关
+    "sandbox", "integrity", "crossorigin", "nonce", "http-equiv", "content",
+    # 框架特性 (Vue/React/Angular/HTMX 等常使用 data-*)
+    # (代码逻辑中会单独处理 data-*)
+}
+
+# 危险的事件句柄 (Event Handlers) - 必须保留，XSS 的温床
+# 匹配 on开头的属性，如 onclick, onload, onmouseover
+EVENT_HANDLER_PATTERN = re.compile(r"^on[a-z]+$")
+
+# 清洗后没有属性、没有内容时会被移除的布局容器
+EMPTY_CONTAINER_TAGS = ("div", "span", "section", "container")
+
+# 内联脚本超过该长度时截断，只保留首尾
+SCRIPT_TRUNCATE_THRESHOLD = 200
+SCRIPT_KEEP_CHARS = 50
+
+# libxml2 即使开启 huge_tree 也只保留 2047 层嵌套，更深的内容会被静默丢弃；
+# 清洗时一旦碰到这个深度就退回 html.parser，保证不丢内容
+_LXML_MAX_DEPTH = 2047
+_lxml_local = threading.local()
+
+_DOCTYPE_PATTERN = re.compile(r"<!doctype\s+([^>]*)>", re.IGNORECASE)
+_DOCUMENT_PATTERN = re.compile(r"<(?:!doctype|html|head|body)[\s>]", re.IGNORECASE)
+
+# 清洗规则和实现都在本文件里：文件内容一变，memo 键随之变化
+_CLEANER_FINGERPRINT = source_digest(__file__)
+
+
+def clean_html_for_llm(raw_html: str, backend: str = "auto", use_memo: bool = True) -> str:
     """
     对 HTML 进行语义降噪，专为 LLM 安全分析设计。
     保留：DOM 结构、输入点、关键属性 (ID, Name, Event Handlers)、注释、安全相关标签 (Meta, Iframe)。
     移除：CSS 类名、Style 属性、SVG、图片内容、无关的布局嵌套。
+
+    backend:
+      - "auto": 安装了 lxml 时走 lxml 快速路径，否则使用 html.parser
+      - "lxml": 基于 lxml 树直接清洗（快很多，输出与 html.parser 版本语义等价）
+      - "html.parser": BeautifulSoup + html.parser（最初的实现）
+    use_memo: 按 (原始 HTML, 后端, 本模块代码) 的哈希缓存结果，同一份 HTML 只清洗一次
     """
     if not raw_html:
         return ""
 
+    if backend == "auto":
+        backend = "lxml" if lxml_html is not None else "html.parser"
+    if backend not in ("lxml", "html.parser"):
+        raise ValueError(f"Unknown HTML cleaner backend: {backend}")
+    if backend == "lxml" and lxml_html is None:
+        raise RuntimeError("backend='lxml' requires the 'lxml' package.")
+
+    if not use_memo:
+        return _clean(raw_html, backend)
+    memo = get_memo("clean_html_for_llm")
+    key = memo.make_key(_CLEANER_FINGERPRINT, backend, raw_html)
+    return memo.get_or_compute(key, lambda: _clean(raw_html, backend))
+
+
+def _clean(raw_html: str, backend: str) -> str:
+    if backend == "lxml":
+        return _clean_with_lxml(raw_html)
+    return _clean_with_bs4(raw_html)
+
+
+def _is_allowed_attribute(attr: str) -> bool:
+    # 1. 白名单属性 2. data-* 属性 (现代前端逻辑常驻于此) 3. 事件句柄 (onclick 等)
+    return attr in ALLOWED_ATTRIBUTES or attr.startswith("data-") or bool(EVENT_HANDLER_PATTERN.match(attr))
+
+
+def _truncate_script(code: str) -> str:
+    # 保留前 50 和后 50 个字符，中间省略
+    # 这里的目的是让 LLM 知道这里有一段代码，以及大概是做什么的
+    # 具体的代码审计应在 ScriptAsset 环节进行
+    return f"{code[:SCRIPT_KEEP_CHARS]} ... [TRUNCATED_JS_LOGIC] ... {code[-SCRIPT_KEEP_CHARS:]}"
+
+
+def _is_stylesheet_link(rel_tokens) -> bool:
+    # 只移除样式表，保留可能是 prefetch/manifest 等有安全意义的链接
+    return rel_tokens == ["stylesheet"]
+
+
+# ============================
+# 后端 A: BeautifulSoup + html.parser
+# ============================
+def _clean_with_bs4(raw_html: str) -> str:
+    """
+    单次后序遍历完成全部清洗：
+      - 进入节点时：移除噪音标签 / 样式表 link（整棵子树不再访问），清洗属性，处理 img / script
+      - 离开节点时：子节点都已处理完，判断自身是否为可移除的空布局容器
+    """
     soup = BeautifulSoup(raw_html, "html.parser")
 
-    # ============================
-    # 1. 移除纯噪音标签
-    # ============================
-    # svg/path: 图标数据，占用大量 Token 且无逻辑价值
-    # style: CSS 样式表，对逻辑分析无用
-    # link[rel=stylesheet]: 外部 CSS
-    # noscript: 通常包含重复内容
-    for tag in soup.find_all(["svg", "style", "noscript", "font"]):
-        tag.decompose()
-
-    # 处理 link 标签，只移除样式表，保留可能是 prefetch/manifest 等有安全意义的链接
-    for tag in soup.find_all("link"):
-        if tag.get("rel") == ["stylesheet"]:
-            tag.decompose()
-
-    # ============================
-    # 2. 定义属性保留白名单
-    # ============================
-    # 这些属性对 OWASP Top 10 分析至关重要
-    ALLOWED_ATTRIBUTES = {
-        # 基础标识
-        "id", "name", "type", "value", "placeholder", "title", "alt",
-        # 表单与数据
-        "action", "method", "enctype", "autocomplete", "href", "src", "target",
-        # 逻辑控制
-        "disabled", "readonly", "required", "checked", "selected", "multiple",
-        # 安全相关
-        "sandbox", "integrity", "crossorigin", "nonce", "http-equiv", "content",
-        # 框架特性 (Vue/React/Angular/HTMX 等常使用 data-*)
-        # (代码逻辑中会单独处理 data-*)
-    }
-
-    # 危险的事件句柄 (Event Handlers) - 必须保留，XSS 的温床
-    # 匹配 on开头的属性，如 onclick, onload, onmouseover
-    EVENT_HANDLER_PATTERN = re.compile(r"^on[a-z]+$")
-
-    # ============================
-    # 3. 遍历并清洗所有标签
-    # ============================
-    for tag in soup.find_all(True):
-        # --- A. 处理属性 ---
-        attrs = list(tag.attrs.keys())
-        for attr in attrs:
-            # 1. 保留白名单属性
-            if attr in ALLOWED_ATTRIBUTES:
-                continue
+    # 栈元素: (节点, 是否已展开子节点)
+    stack = [(soup, False)]
+    # 有子容器被移除的节点：它们在清洗前“有子标签”，按原有语义不能再被当作空容器
+    has_pruned_child: Set[int] = set()
 
-            # 2. 保留 data-* 属性 (现代前端逻辑常驻于此)
-            if attr.startswith("data-"):
-                continue
+    while stack:
+        tag, expanded = stack.pop()
 
-            # 3. 保留事件句柄 (onclick 等)
-            if EVENT_HANDLER_PATTERN.match(attr):
-                continue
+        if expanded:
+            # --- 离开节点：空布局容器判断 ---
+            # 只有当 div/span 没有属性（ID/Name被保留了，Class被删了）且没有内容时才移除
+            # 这能极大减少 <div class="..."></div> 留下的 <div></div> 噪音
+            # （离开时顺便清掉标记：节点对象回收后 id 可能被复用）
+            pruned_child = id(tag) in has_pruned_child
+            has_pruned_child.discard(id(tag))
+            if tag.name in EMPTY_CONTAINER_TAGS and not tag.attrs and not pruned_child:
+                contents = tag.contents
+                # 只有当它不包含重要的子节点（如 input）时才移除
+                # 简单判断：如果它全是空白字符（单个空白文本 / 空白注释）
+                if not contents or (
+                        len(contents) == 1 and isinstance(contents[0], NavigableString) and not contents[0].strip()):
+                    has_pruned_child.add(id(tag.parent))
+                    tag.decompose()
+            continue
 
-            # 4. 其他属性 (class, style, width, height, aria-*, etc.) 全部移除
-            del tag[attr]
-
-        # --- B. 特殊标签处理 ---
-
-        # [Images]: 移除 src 中的 Base64，防止 Token 爆炸
-        if tag.name == "img":
-            src = tag.get("src", "")
-            if src.startswith("data:image"):
-                tag["src"] = "[BASE64_IMAGE_REMOVED]"
-
-        # [Scripts]: 内联脚本处理
-        # 策略：如果太长，进行截断，提示 LLM 去看专门的 Scripts 分析部分
-        if tag.name == "script" and not tag.get("src"):
-            if tag.string and len(tag.string) > 200:
-                # 保留前 50 和后 50 个字符，中间省略
-                # 这里的目的是让 LLM 知道这里有一段代码，以及大概是做什么的
-                # 具体的代码审计应在 ScriptAsset 环节进行
-                tag.string = f"{tag.string[:50]} ... [TRUNCATED_JS_LOGIC] ... {tag.string[-50:]}"
-
-    # ============================
-    # 4. 移除空的布局容器 (可选，但建议慎重)
-    # ============================
-    # 只有当 div/span 没有属性（ID/Name被保留了，Class被删了）且没有内容时才移除
-    # 这能极大减少 <div class="..."></div> 留下的 <div></div> 噪音
-    for tag in soup.find_all(["div", "span", "section", "container"]):
-        if len(tag.attrs) == 0 and not tag.get_text(strip=True):
-            # 只有当它不包含重要的子节点（如 input）时才移除
-            # 简单判断：如果它全是空白字符
-            if not tag.contents or (
-                    len(tag.contents) == 1 and isinstance(tag.contents[0], NavigableString) and not tag.contents[
-                0].strip()):
+        # --- 进入节点 ---
+        if tag is not soup:
+            # 1. 纯噪音标签连同子树移除
+            if tag.name in NOISE_TAGS or (tag.name == "link" and _is_stylesheet_link(tag.get("rel"))):
                 tag.decompose()
+                continue
 
-    # ============================
-    # 5. 保留注释
-    # ============================
-    # BeautifulSoup 默认保留注释，这里不需要额外操作。
-    # 如果想过滤掉条件注释 (IE hacks)，可以在这里加逻辑。
-    # 这里的关键是：开发者留下的 TODO 或 敏感路径 往往在注释里。
+            # 2. 白名单 / data-* / 事件句柄之外的属性 (class, style, width, height, aria-*, etc.) 全部移除
+            for attr in [a for a in tag.attrs if not _is_allowed_attribute(a)]:
+                del tag[attr]
+
+            # 3. 特殊标签处理
+            # [Images]: 移除 src 中的 Base64，防止 Token 爆炸
+            if tag.name == "img":
+                if tag.get("src", "").startswith("data:image"):
+                    tag["src"] = "[BASE64_IMAGE_REMOVED]"
 
+            # [Scripts]: 内联脚本处理
+            # 策略：如果太长，进行截断，提示 LLM 去看专门的 Scripts 分析部分
+            elif tag.name == "script" and not tag.get("src"):
+                if tag.string and len(tag.string) > SCRIPT_TRUNCATE_THRESHOLD:
+                    tag.string = _truncate_script(tag.string)
+
+        stack.append((tag, True))
+        for child in reversed(tag.contents):
+            if isinstance(child, Tag):
+                stack.append((child, False))
+
+    # 注释：BeautifulSoup 默认保留注释，这里不需要额外操作。
+    # 这里的关键是：开发者留下的 TODO 或 敏感路径 往往在注释里。
     return str(soup)
 
 
+# ============================
+# 后端 B: lxml 快速路径
+# ============================
+def _clean_with_lxml(raw_html: str) -> str:
+    """
+    与 _clean_with_bs4 相同的规则，直接在 lxml 树上执行。
+    注意 lxml 中文本挂在元素的 text/tail 上，删除元素用 drop_tree() 以保留其后的 tail 文本。
+    """
+    if _DOCUMENT_PATTERN.search(raw_html):
+        try:
+            root = lxml_html.document_fromstring(raw_html, parser=_lxml_parser())
+        except etree.ParserError:
+            return _clean_with_bs4(raw_html)
+        if not _clean_lxml_tree(root):
+            return _clean_with_bs4(raw_html)
+
+        # lxml 会给没有 doctype 的文档补一个 HTML 4.0 doctype，这里只保留原文中的 doctype
+        doctype_match = _DOCTYPE_PATTERN.search(raw_html, 0, 2048)
+        doctype = f"<!DOCTYPE {doctype_match.group(1).strip()}>" if doctype_match else ""
+        html = etree.tostring(root.getroottree(), method="html", encoding="unicode", doctype=doctype)
+        return html if doctype else html.lstrip("\n")
+
+    # HTML 片段：套一个临时容器清洗，再只输出容器内部
+    try:
+        container = lxml_html.fragment_fromstring(raw_html, create_parent="div", parser=_lxml_parser())
+    except etree.ParserError:
+        return _clean_with_bs4(raw_html)
+    if not _clean_lxml_tree(container, keep_root=True):
+        return _clean_with_bs4(raw_html)
+    return (container.text or "") + "".join(
+        etree.tostring(child, method="html", encoding="unicode") for child in container
+    )
+
+
+def _lxml_parser():
+    # lxml 的 parser 对象不能跨线程共享
+    parser = getattr(_lxml_local, "parser", None)
+    if parser is None:
+        parser = _lxml_local.parser = lxml_html.HTMLParser(huge_tree=True)
+    return parser
+
+
+def _clean_lxml_tree(root, keep_root: bool = False) -> bool:
+    """
+    与 _clean_with_bs4 相同的单次后序遍历，作用在 lxml 元素树上。
+    返回 False 表示树达到了 libxml2 的嵌套上限（内容可能已被截断），调用方应改用 html.parser。
+    """
+    stack = [(root, False, 0)]
+    has_pruned_child: Set[int] = set()
+
+    while stack:
+        el, expanded, depth = stack.pop()
+        if depth >= _LXML_MAX_DEPTH:
+            return False
+
+        if expanded:
+            # 空布局容器：无属性、没有被移除过子容器，且内容为空 / 单段空白文本 / 单个空白注释
+            # lxml 的元素代理对象会被回收重建，离开时必须清掉标记，避免 id 复用造成误判
+            pruned_child = id(el) in has_pruned_child
+            has_pruned_child.discard(id(el))
+            if el.tag in EMPTY_CONTAINER_TAGS and not el.attrib and not pruned_child \
+                    and not (keep_root and el is root):
+                text = el.text or ""
+                if len(el) == 0:
+                    removable = not text.strip()
+                else:
+                    only = el[0]
+                    # bs4 中 Comment 也是 NavigableString
+                    removable = (len(el) == 1 and not text and only.tag is etree.Comment
+                                 and not only.tail and not (only.text or "").strip())
+                if removable:
+                    has_pruned_child.add(id(el.getparent()))
+                    el.drop_tree()
+            continue
+
+        tag = el.tag
+
+        # 1. 噪音标签 / 样式表 link：连同子树删除
+        if tag in NOISE_TAGS or (tag == "link" and _is_stylesheet_link((el.get("rel") or "").split())):
+            el.drop_tree()
+            continue
+
+        # 2. 属性白名单
+        for attr in [a for a in el.attrib if not _is_allowed_attribute(a)]:
+            del el.attrib[attr]
+
+        # 3. 特殊标签
+        if tag == "img":
+            if (el.get("src") or "").startswith("data:image"):
+                el.set("src", "[BASE64_IMAGE_REMOVED]")
+        elif tag == "script" and not el.get("src"):
+            # 与 bs4 的 tag.string 对齐：只有“单一文本子节点”的脚本才截断
+            if len(el) == 0 and el.text and len(el.text) > SCRIPT_TRUNCATE_THRESHOLD:
+                el.text = _truncate_script(el.text)
+
+        stack.append((el, True, depth))
+        for child in reversed(el):
+            if isinstance(child.tag, str):
+                stack.append((child, False, depth + 1))
+
+    return True
+
+
 # --- 测试用例 ---
 if __name__ == "__main__":
     test_html = """
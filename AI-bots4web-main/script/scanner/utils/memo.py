@@ -0,0 +1,301 @@
+# script/scanner/utils/memo.py
+"""
+基于内容哈希的结果缓存 (Content Memo)。
+
+SPA 外壳、统一报错页、catch-all 路由等会让大量 URL 返回同一份 HTML，
+clean_html_for_llm / distill_html 对同样的输入反复做同样的计算。
+
+ContentMemo 以“输入内容 + 处理配置 + 处理代码版本”的哈希为键：
+  - 内存层：按条目数和总字符数双重限制的 LRU
+  - 磁盘层（可选）：gzip 文本文件，<persist_dir>/<名称>/<hash[:2]>/<hash>.gz，跨运行复用；
+    按文件总字节数限制，超出后按最近使用时间（读取时刷新 mtime）淘汰到上限的 90%
+并统计命中率，供扫描结束时输出。
+
+仓库里 `scanner.*` 和 `script.scanner.*` 两种导入写法并存，本文件可能以两个模块名各加载一次；
+memo 注册表挂在 sys.modules 里一个固定名字下，两份副本共用它（configure_memos 对所有调用方生效）。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import sys
+import threading
+import types
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def source_digest(path: str) -> str:
+    """处理函数所在源文件的哈希：代码一改，旧的 memo 自然失效。"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+class ContentMemo:
+    """
+    线程安全的 内存 LRU + 可选磁盘持久化 的字符串结果缓存。
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, max_chars: int = 64 * 1024 * 1024,
+                 persist_dir: Optional[str] = None, max_disk_bytes: int = 256 * 1024 * 1024) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.max_disk_bytes = max_disk_bytes
+        self.persist_dir: Optional[str] = None
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        # 磁盘层的总字节数，第一次写入时扫描目录得到（None 表示还没扫描）
+        self._disk_bytes: Optional[int] = None
+        self._disk_lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0            # 内存命中
+        self.disk_hits = 0       # 磁盘命中
+        self.misses = 0
+        self.disk_evictions = 0
+
+        self.set_persist_dir(persist_dir)
+
+    # ==============================
+    # 配置
+    # ==============================
+    def set_persist_dir(self, persist_dir: Optional[str]) -> None:
+        """开启 / 关闭磁盘层（None 表示只用内存）。"""
+        self.persist_dir = os.path.join(persist_dir, self.name) if persist_dir else None
+        with self._disk_lock:
+            self._disk_bytes = None
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8", errors="surrogatepass")
+            # 长度前缀，避免 ("ab", "c") 和 ("a", "bc") 撞键
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    # ==============================
+    # 读写
+    # ==============================
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = self._load(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._remember(key, value)
+            return value
+
+        # 计算放在锁外，不同输入可以并行处理
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._remember(key, value)
+        self._store(key, value)
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        """只查不算：内存层或磁盘层都没有时返回 None（不计入统计）。"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        value = self._load(key)
+        if value is not None:
+            with self._lock:
+                self._remember(key, value)
+        return value
+
+    def clear(self) -> None:
+        """清空内存层和统计（不删除磁盘文件）。"""
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.hits + self.disk_hits) / lookups) if lookups else 0.0,
+            "disk_bytes": self._disk_bytes or 0,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    # ==============================
+    # 辅助
+    # ==============================
+    def _remember(self, key: str, value: str) -> None:
+        # 调用方持有锁
+        if len(value) > self.max_chars:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._chars -= len(old)
+        self._entries[key] = value
+        self._chars += len(value)
+        while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+            _, evicted = self._entries.popitem(last=False)
+            self._chars -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.persist_dir, key[:2], key + ".gz")
+
+    def _load(self, key: str) -> Optional[str]:
+        if not self.persist_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = gzip.decompress(f.read()).decode("utf-8", errors="surrogatepass")
+        except (OSError, EOFError, UnicodeDecodeError):
+            return None
+        try:
+            # mtime 作为最近使用时间，淘汰时先删最久没用过的
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _store(self, key: str, value: str) -> None:
+        if not self.persist_dir:
+            return
+        path = self._path(key)
+        data = gzip.compress(value.encode("utf-8", errors="surrogatepass"), compresslevel=6)
+        if len(data) > self.max_disk_bytes:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += len(data) - replaced
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _disk_files(self) -> List[Tuple[float, int, str]]:
+        """磁盘层的所有条目：(mtime, 字节数, 路径)。"""
+        files = []
+        for root, _, names in os.walk(self.persist_dir):
+            for name in names:
+                if not name.endswith(".gz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict_disk(self) -> None:
+        """超出 max_disk_bytes 时按 mtime 从旧到新删除，直到不超过上限的 90%（调用方持有 _disk_lock）。"""
+        # 重新扫描：其他进程可能共用同一个目录
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+
+# =================================================
+# 进程内共享的 memo 实例
+# =================================================
+def _shared_registry() -> types.ModuleType:
+    """两种导入路径共用的注册表：先加载的副本创建，后加载的副本取到同一个对象。"""
+    registry = types.ModuleType("_ptagent_memo_registry")
+    registry.memos = {}
+    registry.lock = threading.Lock()
+    registry.config = {"persist_dir": None}
+    return sys.modules.setdefault(registry.__name__, registry)
+
+
+_REGISTRY = _shared_registry()
+_MEMOS: Dict[str, ContentMemo] = _REGISTRY.memos
+_MEMOS_LOCK: threading.Lock = _REGISTRY.lock
+_MEMO_CONFIG: Dict[str, Any] = _REGISTRY.config
+
+
+def get_memo(name: str) -> ContentMemo:
+    """按名称获取（必要时创建）共享的 ContentMemo。"""
+    with _MEMOS_LOCK:
+        memo = _MEMOS.get(name)
+        if memo is None:
+            memo = _MEMOS[name] = ContentMemo(name, **_MEMO_CONFIG)
+        return memo
+
+
+def configure_memos(persist_dir: Optional[str] = None, max_entries: Optional[int] = None,
+                    max_chars: Optional[int] = None, max_disk_bytes: Optional[int] = None) -> None:
+    """
+    统一设置所有 memo 的磁盘目录和容量（已创建的和之后创建的都生效）。
+    例如 PTAgent 把磁盘层放在 <cache_dir>/memo 下，重跑时直接复用清洗结果。
+    """
+    with _MEMOS_LOCK:
+        _MEMO_CONFIG["persist_dir"] = persist_dir
+        if max_entries is not None:
+            _MEMO_CONFIG["max_entries"] = max_entries
+        if max_chars is not None:
+            _MEMO_CONFIG["max_chars"] = max_chars
+        if max_disk_bytes is not None:
+            _MEMO_CONFIG["max_disk_bytes"] = max_disk_bytes
+        for memo in _MEMOS.values():
+            memo.set_persist_dir(persist_dir)
+            if max_entries is not None:
+                memo.max_entries = max_entries
+            if max_chars is not None:
+                memo.max_chars = max_chars
+            if max_disk_bytes is not None:
+                memo.max_disk_bytes = max_disk_bytes
+
+
+def memo_stats() -> Dict[str, Dict[str, Any]]:
+    with _MEMOS_LOCK:
+        return {name: memo.stats() for name, memo in _MEMOS.items()}
+
+
+def format_memo_stats() -> str:
+    """一行一个 memo 的命中率摘要。"""
+    lines = []
+    for name, s in memo_stats().items():
+        lines.append(f"{name}: hit rate {s['hit_rate'] * 100:.1f}% "
+                     f"(mem {s['hits']}, disk {s['disk_hits']}, miss {s['misses']}, entries {s['entries']})")
+    return "\n".join(lines)
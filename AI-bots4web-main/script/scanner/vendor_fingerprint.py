@@ -0,0 +1,102 @@
+# script/scanner/vendor_fingerprint.py
+"""
+第三方库指纹 (Vendor Fingerprint)
+
+_is_relevant_script 原先只看文件名关键词：打包 / 改名后的第三方 chunk 会被整段下载、整段正则扫描，
+而文件名恰好包含 "react"、"vue" 等子串的业务脚本又会被误跳过。
+
+这里只看脚本的前 1KB（外链脚本用 Range 请求获取）：
+  1. 头部哈希：已知库构建的前 1KB 的 SHA-256（可通过 register_vendor_sample / load_vendor_hashes 扩充）
+  2. 签名串：各库构建产物头部的版权 / 版本横幅，以及 webpack 为 vendor chunk 生成的 LICENSE 注释
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+
+# 指纹只看脚本开头这么多字节
+HEAD_BYTES = 1024
+
+# 头部哈希 -> 库名
+# 初始样本取自发行版打包的构建（Debian libjs-jquery 3.6.1 / libjs-jquery-ui 1.13.2 / libjs-underscore 1.13.4）
+KNOWN_HEAD_HASHES: Dict[str, str] = {
+    "3978169574a0e90ee5dcf433491fe43fa9b0629105c7e9f058006ee1ec90e1d1": "jquery",      # jquery.min.js
+    "841cc2fb54f08cd06841cea07feda82104c6ead43f915b56b171213f2c913932": "jquery",      # jquery.js
+    "09fa894fbd3a4b4e035e78610b2808b68b1a6a253edc1b770a5097187104af37": "jquery-ui",   # jquery-ui.min.js
+    "b1cf574021516a37b282ff17feb0f87ff65d370f6d7514866ae58785809aac3c": "jquery-ui",   # jquery-ui.js
+    "eaec6a4b22536d9ee23082782744f7552a45303b48311402c1180889beff0c21": "underscore",  # underscore.min.js
+    "60e54471a6016d784141cf5ff8ad73d44a208ef0f709b9ad7fb3f921d91b4d5e": "underscore",  # underscore.js
+}
+
+# (库名, 头部签名)：按出现频率排序，命中即停
+VENDOR_SIGNATURES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("jquery", re.compile(r"jQuery v\d|jQuery JavaScript Library v\d|jquery\.org/license")),
+    ("jquery-ui", re.compile(r"jQuery UI - v\d|\$\.ui\.version\s*=")),
+    ("react", re.compile(r"@license React\b|\breact(?:-dom)?\.(?:production|development)(?:\.min)?\.js")),
+    ("vue", re.compile(r"Vue\.js v\d|\(c\) 20\d\d-20\d\d Evan You")),
+    ("angular", re.compile(r"@license Angular v\d|AngularJS v\d")),
+    ("lodash", re.compile(r"\bLodash <https://lodash\.com/>|lodash\.com/license")),
+    ("underscore", re.compile(r"Underscore\.js \d|define\(\s*[\"']underscore[\"']")),
+    # 只认构建横幅里的 "//! " 行：业务代码里的 moment.locale(...) / 文档链接不算
+    ("moment", re.compile(r"//! (?:moment\.js\b|momentjs\.com\b|authors : .{0,60}Moment\.js contributors)")),
+    ("bootstrap", re.compile(r"\bBootstrap v\d")),
+    ("popper", re.compile(r"@popperjs/core|Popper\.js v\d|@license Popper")),
+    ("axios", re.compile(r"\b[Aa]xios v\d")),
+    ("core-js", re.compile(r"\bcore-js\b.{0,80}(?:Denis Pushkarev|zloirock)", re.S)),
+    # 同样只认横幅 / 许可证注释：站点自己的 window.cookieconsent.initialise({...}) 配置脚本不算
+    ("cookieconsent", re.compile(r"\bCookieConsent v\d|github\.com/(?:orestbida|osano)/cookieconsent\b")),
+    ("google-analytics", re.compile(r"GoogleAnalyticsObject|googletagmanager\.com/gt(?:ag|m)")),
+    # webpack / terser 给第三方 chunk 生成的许可证注释
+    ("webpack-vendor-chunk", re.compile(
+        r"For license information please see (?:[\w\-]*?[~.\-])?(?:vendors?|chunk-vendors|framework|polyfills)"
+        r"[\w~.\-]*\.LICENSE\.txt")),
+]
+
+
+def _head_bytes(content: Union[str, bytes]) -> bytes:
+    if isinstance(content, str):
+        # 只编码开头一段：UTF-8 每个字符最多 4 字节
+        content = content[:HEAD_BYTES].encode("utf-8", errors="surrogatepass")
+    return content[:HEAD_BYTES]
+
+
+def identify_vendor(content: Union[str, bytes]) -> Optional[str]:
+    """
+    根据脚本开头（传整段或只传前 1KB 均可）识别第三方库，返回库名；识别不出返回 None。
+    """
+    head = _head_bytes(content)
+    vendor = KNOWN_HEAD_HASHES.get(hashlib.sha256(head).hexdigest())
+    if vendor:
+        return vendor
+
+    text = head.decode("utf-8", errors="replace")
+    for name, pattern in VENDOR_SIGNATURES:
+        if pattern.search(text):
+            return name
+    return None
+
+
+def register_vendor_sample(content: Union[str, bytes], library: str) -> str:
+    """把一份已知库构建加入头部哈希库，返回其头部哈希。"""
+    digest = hashlib.sha256(_head_bytes(content)).hexdigest()
+    KNOWN_HEAD_HASHES[digest] = library
+    return digest
+
+
+def load_vendor_hashes(path: str) -> int:
+    """从 JSON 文件 {头部哈希: 库名} 扩充哈希库，返回新增条目数。文件不存在时返回 0。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    added = 0
+    for digest, library in data.items():
+        if digest not in KNOWN_HEAD_HASHES:
+            KNOWN_HEAD_HASHES[digest] = library
+            added += 1
+    return added
@@ -0,0 +1,65 @@
+# script/utils/llm/async_pool.py
+"""
+共享的异步 HTTP 连接池 (Async Connection Pool)
+
+每个同步客户端各自创建 OpenAI 实例、各自维护连接；异步调用如果也每个客户端一个 AsyncOpenAI，
+几十个并发请求会各开各的连接。这里按事件循环共享一个 httpx.AsyncClient（连接池、keep-alive），
+并按 (base_url, api_key, timeout, max_retries) 复用 AsyncOpenAI 实例：
+指向同一台推理服务的 LocalLLMClient / LMStudioClient 共用连接。
+
+httpx.AsyncClient 绑定创建它的事件循环，所以缓存以事件循环为键（弱引用，循环结束后自动释放）；
+在循环结束前调用 aclose_shared_clients() 可以主动关闭连接。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+
+# 整个进程的异步连接上限（所有推理服务合计）以及保持的空闲连接数
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 32
+
+
+class _LoopPool:
+    def __init__(self) -> None:
+        self.http = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+        )
+        self.clients: Dict[Tuple[Any, ...], AsyncOpenAI] = {}
+
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPool]" = weakref.WeakKeyDictionary()
+
+
+def shared_async_openai(base_url: str, api_key: str, timeout: Optional[float] = None,
+                        max_retries: Optional[int] = None) -> AsyncOpenAI:
+    """返回当前事件循环上、使用共享连接池的 AsyncOpenAI（必须在协程中调用）。"""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None or pool.http.is_closed:
+        pool = _pools[loop] = _LoopPool()
+    key = (base_url, api_key, timeout, max_retries)
+    client = pool.clients.get(key)
+    if client is None:
+        client = pool.clients[key] = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=pool.http,
+            **({"timeout": timeout} if timeout is not None else {}),
+            **({"max_retries": max_retries} if max_retries is not None else {}),
+        )
+    return client
+
+
+async def aclose_shared_clients() -> None:
+    """关闭当前事件循环上的共享连接池。"""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.http.aclose()
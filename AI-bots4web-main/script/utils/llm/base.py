@@ -1,10 +1,55 @@
 # script/utils/base.py
 from __future__ import annotations
 
-from typing import Protocol
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import AsyncIterator, Protocol
+from typing import List, Dict, Optional
 # from script.datatypes import Endpoint, Action
 
+@dataclass
+class LLMResponse:
+    """
+    一次补全的结果及 token 用量。
+    prompt_tokens / completion_tokens 取自服务端返回的 usage；服务端没有返回时为 None。
+    """
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached: bool = False   # 来自本地响应缓存，没有真正调用模型
+    fallback: bool = False  # 由回退链中的非首选后端给出（和主模型的缓存键不对应，不应缓存）
+
+
+class LLMError(Exception):
+    """
+    LLM 调用失败（连接失败、超时、服务端错误、响应格式错误等）。
+    retryable: 重试同一端点可能成功（连接 / 超时 / 429 / 5xx）；否则应换下一个后端或模型
+    endpoint: 出错的端点（base_url / 模型），便于定位
+    """
+
+    def __init__(self, message: str, retryable: bool = True, endpoint: Optional[str] = None) -> None:
+        super().__init__(message)
+        self.retryable = retryable
+        self.endpoint = endpoint
+
+
+def llm_error_from(exc: BaseException, endpoint: Optional[str] = None) -> LLMError:
+    """
+    把 SDK / 网络异常转成 LLMError。带 HTTP 状态码时 408 / 409 / 429 / 5xx 可重试；
+    没有状态码时，连接失败和超时可重试，其他异常（参数错误等）不可重试。
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        retryable = status in (408, 409, 429) or status >= 500
+    else:
+        retryable = isinstance(exc, (ConnectionError, TimeoutError)) or \
+            type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+    error = LLMError(f"{type(exc).__name__}: {exc}", retryable=retryable, endpoint=endpoint)
+    error.__cause__ = exc
+    return error
+
+
 class LLMClient(Protocol):
     """
     所有大模型客户端的统一接口。
@@ -16,6 +61,14 @@ class LLMClient(Protocol):
         - 返回的是一个“JSON 字符串”
         - 这个 JSON 必须符合 OwaspTop10LLMAnalyzer 里期望的格式：
           {"issues": [ ... ]}
+
+    可选实现 complete_with_usage(prompt) -> LLMResponse，额外返回 token 用量；
+    没有实现时，分析器在本地估算 token。
+
+    调用失败时抛出 LLMError，不要把错误信息当作补全文本返回。
+
+    可选实现 stream_complete(prompt, json_schema=None) -> Iterator[str]，逐块产出文本；
+    调用方提前 close() 时应停止生成。json_schema 不为空时，后端支持的话用它约束输出（JSON mode）。
     """
 
     def complete(self, prompt: str) -> str:
@@ -31,4 +84,25 @@ class LLMClient(Protocol):
         ...
 
     def analyze_response(self, response_text: str) -> bool:
+        ...
+
+
+# 异步接口的方法名。缓存 / 重试 / 负载均衡等包装层只实现了同步接口，
+# 不能把这些方法透传给被包装的客户端（否则会绕过包装层）
+ASYNC_METHODS = frozenset({"acomplete", "acomplete_with_usage", "astream"})
+
+
+class AsyncLLMClient(Protocol):
+    """
+    异步大模型客户端接口（LocalLLMClient / LMStudioClient 实现）：
+        acomplete(prompt) -> str
+        astream(prompt, json_schema=None) -> AsyncIterator[str]，调用方提前 aclose() 时应停止生成
+    可选实现 acomplete_with_usage(prompt) -> LLMResponse。失败时同样抛出 LLMError。
+    同一事件循环上的客户端共享连接池（见 async_pool.py），可以在一个事件循环里并发大量请求。
+    """
+
+    async def acomplete(self, prompt: str) -> str:
+        ...
+
+    def astream(self, prompt: str, json_schema: Optional[Dict] = None) -> AsyncIterator[str]:
         ...
\ No newline at end of file
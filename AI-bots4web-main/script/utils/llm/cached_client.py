@@ -0,0 +1,224 @@
+# script/utils/llm/cached_client.py
+"""
+持久化的 LLM 响应缓存 (Cached LLM Client)
+
+问题：分析中途崩溃、或者改了和 Prompt 无关的代码后重跑，analysis_result 整体失效，
+每个 LLM 调用都要重新付一遍；本地大模型一次调用几秒到几十秒。
+
+CachedLLMClient 包装任意 LLMClient，在 complete() 下面加一层 SQLite 缓存：
+  - 键：backend / model / temperature / max_tokens / system_prompt + Prompt 的 SHA-256
+    （从被包装的客户端上读取属性，没有的记为 None）
+  - 容量：按响应总字节数限制，超出后按最近使用时间淘汰到上限的 90%
+  - 统计命中 / 未命中 / 淘汰次数
+被包装客户端抛出的 LLMError 原样向上传递，不写缓存；以 "Error:" 开头的响应
+（一些客户端把异常转成的字符串）同样不缓存。
+由回退后端给出的响应（LLMResponse.fallback / 流的 fallback 属性，见 ResilientLLMClient）不缓存：
+缓存键取自主客户端的属性，存进去下次主模型正常时会把备用模型的回答当作命中返回。
+stream_complete() 与 complete() 共用缓存：命中时一次产出整段响应；未命中时透传流，
+流被调用方提前关闭时只有已收到的文本是完整 JSON 才缓存。
+其他属性和方法透传给被包装的客户端。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from .base import ASYNC_METHODS, LLMResponse
+
+
+# 参与缓存键的客户端属性
+_KEY_ATTRS = ("backend", "model", "temperature", "max_tokens", "system_prompt")
+
+
+class CachedLLMClient:
+
+    def __init__(self, client: Any, path: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        """
+        client: 被包装的 LLMClient
+        path: SQLite 文件路径
+        max_bytes: 缓存的响应总字节数上限
+        """
+        self.client = client
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有本类没有的属性才会走到这里（model / backend / infer_api_schema ...）
+        if name in ASYNC_METHODS:
+            # 本层只包装了同步接口，异步调用透传会绕过它
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    # ===========================
+    # LLMClient 接口
+    # ===========================
+    def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt).text
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
+        """命中时 cached=True、不带 token 用量；未命中时返回被包装客户端的结果（有用量就带上）。"""
+        key = self.cache_key(prompt)
+        cached = self._lookup(key)
+        if cached is not None:
+            return LLMResponse(cached, cached=True)
+
+        if hasattr(self.client, "complete_with_usage"):
+            response = self.client.complete_with_usage(prompt)
+        else:
+            response = LLMResponse(self.client.complete(prompt))
+        if response.text and not response.text.startswith("Error:") and not response.fallback:
+            self._store(key, response.text)
+        return response
+
+    def stream_complete(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        key = self.cache_key(prompt)
+        cached = self._lookup(key)
+        if cached is not None:
+            return _ReplayStream(cached)
+        return self._stream_and_store(key, prompt, json_schema)
+
+    def _stream_and_store(self, key: str, prompt: str, json_schema: Optional[Dict[str, Any]]) -> Iterator[str]:
+        if hasattr(self.client, "stream_complete"):
+            stream = self.client.stream_complete(prompt, json_schema=json_schema)
+        else:
+            stream = iter([self.client.complete(prompt)])
+        chunks = []
+        finished = False
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+            finished = True
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            text = "".join(chunks)
+            if text and not text.startswith("Error:") and not getattr(stream, "fallback", False) \
+                    and (finished or _is_complete_json(text)):
+                self._store(key, text)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def cache_key(self, prompt: str) -> str:
+        config = {attr: getattr(self.client, attr, None) for attr in _KEY_ATTRS}
+        config["client"] = type(self.client).__name__
+        h = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8", errors="surrogatepass"))
+        return h.hexdigest()
+
+    # ===========================
+    # 维护
+    # ===========================
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _store(self, key: str, response: str) -> None:
+        size = len(response.encode("utf-8", errors="surrogatepass"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        """超出 max_bytes 时按 last_used 从旧到新删除，直到不超过上限的 90%（调用方持有锁）。"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used, created"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+
+class _ReplayStream:
+    """缓存命中时的"流"：一次产出整段响应，cached=True 供调用方区分。"""
+
+    cached = True
+
+    def __init__(self, text: str) -> None:
+        self._chunks = iter([text])
+
+    def __iter__(self) -> "_ReplayStream":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        pass
+
+
+def _is_complete_json(text: str) -> bool:
+    """提前关闭的流：去掉 ```json 围栏后能整体解析才算完整响应。"""
+    clean = text.strip()
+    if clean.startswith("```"):
+        clean = clean.split("\n", 1)[1] if "\n" in clean else ""
+        clean = clean.rsplit("```", 1)[0]
+    try:
+        json.loads(clean)
+    except ValueError:
+        return False
+    return True
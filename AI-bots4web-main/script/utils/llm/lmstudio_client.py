@@ -1,11 +1,14 @@
 # script/utils/lmstudio_client.py
 from __future__ import annotations
 
-from typing import Optional, List
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, List
 import json
 
 from openai import OpenAI
 
+from .async_pool import shared_async_openai
+from .base import LLMResponse, llm_error_from
+
 
 class LMStudioClient:
     """
@@ -19,35 +22,163 @@ class LMStudioClient:
         base_url: str = "http://localhost:1234/v1",  # LMStudio 默认 API
         temperature: float = 0.4,
         max_tokens: int = 2048,
-        system_prompt: str = "You are a security analysis assistant."
+        system_prompt: str = "You are a security analysis assistant.",
+        timeout: Optional[float] = None,  # 单次 HTTP 请求超时（秒），None 使用 SDK 默认值
+        json_mode: bool = True,  # stream_complete 带 json_schema 时用 LMStudio 的结构化输出
+        max_retries: Optional[int] = None,  # OpenAI SDK 自带的重试次数，None 使用 SDK 默认值
     ):
         self.model = model
         self.base_url = base_url
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.system_prompt = system_prompt
+        self.timeout = timeout
+        self.json_mode = json_mode
+        self.max_retries = max_retries
 
         # 创建客户端（兼容 LMStudio / LocalAI / Ollama）
         self.client = OpenAI(
             base_url=self.base_url,
             api_key="dummy",      # 必填但 LMStudio / LocalAI / Ollama 会忽略
+            **({"timeout": timeout} if timeout is not None else {}),
+            **({"max_retries": max_retries} if max_retries is not None else {}),
+        )
+
+    def set_timeout(self, timeout: float) -> None:
+        """调整单次 HTTP 请求超时（同步 / 异步调用都生效），超时的请求在客户端侧真正断开。"""
+        self.timeout = timeout
+        self.client = self.client.with_options(timeout=timeout)
+
+    # ===========================
+    # 异步接口（AsyncOpenAI，共享连接池，见 async_pool.py）
+    # ===========================
+    async def acomplete(self, prompt: str) -> str:
+        return (await self.acomplete_with_usage(prompt)).text
+
+    async def acomplete_with_usage(self, prompt: str) -> LLMResponse:
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        try:
+            resp = await self._async_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        usage = getattr(resp, "usage", None)
+        return LLMResponse(
+            text=resp.choices[0].message.content or "",
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
         )
 
+    async def astream(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """stream_complete 的异步版本；调用方提前 aclose() 时关闭 HTTP 流。"""
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        extra: Dict[str, Any] = {}
+        if json_schema is not None and self.json_mode:
+            extra["response_format"] = {"type": "json_schema", "json_schema": {"name": "result", "schema": json_schema}}
+
+        try:
+            stream = await self._async_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+                **extra,
+            )
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        finally:
+            await stream.close()
+
+    def _async_client(self):
+        return shared_async_openai(self.base_url, "dummy", self.timeout, self.max_retries)
+
+    def health_check(self, timeout: float = 5.0) -> bool:
+        """GET /models 探测服务是否可用（PooledLLMClient 用它恢复不健康的端点）。"""
+        try:
+            self.client.with_options(timeout=timeout, max_retries=0).models.list()
+            return True
+        except Exception:
+            return False
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.base_url} ({self.model})"
+
     def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt).text
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
         messages = [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": prompt},
         ]
 
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-        )
+        try:
+            resp = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
 
         # LMStudio / LocalAI / Ollama-compatible OpenAI API 返回格式一致
         text = resp.choices[0].message.content
+        usage = getattr(resp, "usage", None)
 
         # 统一返回 JSON（交给 analyzer 用 json.loads() 解析）
-        return text or ""
\ No newline at end of file
+        return LLMResponse(
+            text=text or "",
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+    def stream_complete(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        流式补全，逐块产出文本；调用方提前 close() 生成器时关闭 HTTP 流，LMStudio 随之停止生成。
+        """
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        extra: Dict[str, Any] = {}
+        if json_schema is not None and self.json_mode:
+            extra["response_format"] = {"type": "json_schema", "json_schema": {"name": "result", "schema": json_schema}}
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+                **extra,
+            )
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        finally:
+            stream.close()
@@ -1,10 +1,13 @@
 # script/utils/local_llm_client.py
 from __future__ import annotations
 
-from typing import Literal, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, Literal, Optional
 import os
 from openai import OpenAI, APIConnectionError
 
+from .async_pool import shared_async_openai
+from .base import LLMError, LLMResponse, llm_error_from
+
 
 class LocalLLMClient:
     """
@@ -25,13 +28,19 @@ class LocalLLMClient:
         base_url: Optional[str] = None,  # 可选：如果端口改了，可以手动覆盖
         temperature: float = 0.1,  # 渗透测试通常需要低温以保证确定性
         max_tokens: int = 4096,
-        system_prompt: str = "You are a security analysis assistant. Output in JSON format."
+        system_prompt: str = "You are a security analysis assistant. Output in JSON format.",
+        timeout: Optional[float] = None,  # 单次 HTTP 请求超时（秒），None 使用 SDK 默认值
+        json_mode: bool = True,  # stream_complete 带 json_schema 时约束输出格式
+        max_retries: Optional[int] = None,  # OpenAI SDK 自带的重试次数，None 使用 SDK 默认值；外层有 ResilientLLMClient 时设为 0
     ):
         self.backend = backend
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.system_prompt = system_prompt
+        self.timeout = timeout
+        self.json_mode = json_mode
+        self.max_retries = max_retries
 
         # 1. 确定 Base URL
         # 如果用户手动传了 base_url，就用用户的；否则根据 backend 自动选择
@@ -45,11 +54,21 @@ class LocalLLMClient:
         self.client = OpenAI(
             base_url=self.api_base,
             api_key=f"dummy-{backend}",
+            **({"timeout": timeout} if timeout is not None else {}),
+            **({"max_retries": max_retries} if max_retries is not None else {}),
         )
 
         print(f"[*] LocalLLMClient initialized: Backend={backend}, Model={model}, URL={self.api_base}")
 
+    def set_timeout(self, timeout: float) -> None:
+        """调整单次 HTTP 请求超时（同步 / 异步调用都生效），超时的请求在客户端侧真正断开。"""
+        self.timeout = timeout
+        self.client = self.client.with_options(timeout=timeout)
+
     def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt).text
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
         messages = [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": prompt},
@@ -62,9 +81,137 @@ class LocalLLMClient:
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
             )
-            return resp.choices[0].message.content or ""
+            usage = getattr(resp, "usage", None)
+            return LLMResponse(
+                text=resp.choices[0].message.content or "",
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                completion_tokens=getattr(usage, "completion_tokens", None),
+            )
+
+        except APIConnectionError as e:
+            raise LLMError(f"Could not connect to {self.backend} at {self.api_base}. Is the service running?",
+                           endpoint=self.endpoint) from e
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+
+    def stream_complete(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        流式补全，逐块产出文本。调用方提前 close() 生成器时关闭 HTTP 流，服务端随之停止生成。
+        json_schema 不为空且 json_mode 开启时约束输出：LM Studio 支持 json_schema，Ollama 使用 JSON mode。
+        失败时与 complete() 一样抛出 LLMError（已产出部分文本后出错同样抛出）。
+        """
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        extra: Dict[str, Any] = {}
+        if json_schema is not None and self.json_mode:
+            extra["response_format"] = self._response_format(json_schema)
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+                **extra,
+            )
+        except APIConnectionError as e:
+            raise LLMError(f"Could not connect to {self.backend} at {self.api_base}. Is the service running?",
+                           endpoint=self.endpoint) from e
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
 
-        except APIConnectionError:
-            return f"Error: Could not connect to {self.backend} at {self.api_base}. Is the service running?"
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
         except Exception as e:
-            return f"Error: {str(e)}"
\ No newline at end of file
+            raise llm_error_from(e, self.endpoint) from e
+        finally:
+            stream.close()
+
+    # ===========================
+    # 异步接口（AsyncOpenAI，共享连接池，见 async_pool.py）
+    # ===========================
+    async def acomplete(self, prompt: str) -> str:
+        return (await self.acomplete_with_usage(prompt)).text
+
+    async def acomplete_with_usage(self, prompt: str) -> LLMResponse:
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        try:
+            resp = await self._async_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+        except APIConnectionError as e:
+            raise LLMError(f"Could not connect to {self.backend} at {self.api_base}. Is the service running?",
+                           endpoint=self.endpoint) from e
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        usage = getattr(resp, "usage", None)
+        return LLMResponse(
+            text=resp.choices[0].message.content or "",
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+    async def astream(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """stream_complete 的异步版本；调用方提前 aclose() 时关闭 HTTP 流。"""
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        extra: Dict[str, Any] = {}
+        if json_schema is not None and self.json_mode:
+            extra["response_format"] = self._response_format(json_schema)
+
+        try:
+            stream = await self._async_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+                **extra,
+            )
+        except APIConnectionError as e:
+            raise LLMError(f"Could not connect to {self.backend} at {self.api_base}. Is the service running?",
+                           endpoint=self.endpoint) from e
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise llm_error_from(e, self.endpoint) from e
+        finally:
+            await stream.close()
+
+    def _async_client(self):
+        return shared_async_openai(self.api_base, f"dummy-{self.backend}", self.timeout, self.max_retries)
+
+    def health_check(self, timeout: float = 5.0) -> bool:
+        """GET /models 探测服务是否可用（PooledLLMClient 用它恢复不健康的端点）。"""
+        try:
+            self.client.with_options(timeout=timeout, max_retries=0).models.list()
+            return True
+        except Exception:
+            return False
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.api_base} ({self.model})"
+
+    def _response_format(self, json_schema: Dict[str, Any]) -> Dict[str, Any]:
+        if self.backend == "lmstudio":
+            return {"type": "json_schema", "json_schema": {"name": "result", "schema": json_schema}}
+        return {"type": "json_object"}
@@ -0,0 +1,231 @@
+# script/utils/llm/pooled_client.py
+"""
+多推理服务的负载均衡客户端 (Pooled LLM Client)
+
+问题：Ollama / LM Studio 实例分布在几台机器上，LocalLLMClient 只绑定一个 api_base，
+分析阶段并发再高也只压在一台机器上。
+
+PooledLLMClient 把 N 个 OpenAI 兼容端点（每个端点一个 LLMClient）组成一个池：
+  - 每次调用选 健康 且 在途请求最少 的端点；在途数相同时选延迟（EWMA）更低的，再相同时轮询
+  - 请求失败且错误可重试（连接 / 超时 / 5xx，见 LLMError.retryable）时把端点标记为不健康，
+    不再分配请求；原错误照常抛出（重试 / 回退由外层的 ResilientLLMClient 负责，重试时会选到别的端点）
+  - 不健康的端点由健康探测恢复：probe_interval 秒一次的后台线程调用各客户端的 health_check()；
+    所有端点都不健康时，调用方线程先同步探测一次，仍然没有可用端点才抛出 LLMError
+  - 每个端点记录请求数、失败数、在途数、平均 / EWMA 延迟和输出 token 吞吐
+其他属性和方法透传给第一个客户端（model / backend 等用于缓存键）。
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .base import ASYNC_METHODS, LLMError, LLMResponse, llm_error_from
+
+
+class _Endpoint:
+    """池中的一个端点及其统计。"""
+
+    # 延迟 EWMA 的平滑系数
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.name = getattr(client, "endpoint", None) or \
+            f"{type(client).__name__} ({getattr(client, 'model', None)})"
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.ewma_seconds: Optional[float] = None
+        self.completion_tokens = 0
+        self.token_seconds = 0.0    # 有 completion_tokens 的请求的累计耗时，用于计算吞吐
+
+    def record(self, seconds: float, completion_tokens: Optional[int]) -> None:
+        self.requests += 1
+        self.total_seconds += seconds
+        self.ewma_seconds = seconds if self.ewma_seconds is None else \
+            self.EWMA_ALPHA * seconds + (1 - self.EWMA_ALPHA) * self.ewma_seconds
+        if completion_tokens:
+            self.completion_tokens += completion_tokens
+            self.token_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.name,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "avg_seconds": round(self.total_seconds / self.requests, 3) if self.requests else None,
+            "ewma_seconds": round(self.ewma_seconds, 3) if self.ewma_seconds is not None else None,
+            "tokens_per_second": round(self.completion_tokens / self.token_seconds, 1) if self.token_seconds else None,
+        }
+
+
+class PooledLLMClient:
+
+    def __init__(self, clients: Sequence[Any], probe_interval: Optional[float] = 30.0,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        """
+        clients: 每个推理服务一个 LLMClient（通常是 base_url 不同的 LocalLLMClient）
+        probe_interval: 后台健康探测的间隔（秒），None 表示不启动后台线程（只在没有可用端点时同步探测）
+        """
+        if not clients:
+            raise ValueError("PooledLLMClient needs at least one client")
+        self.endpoints = [_Endpoint(c) for c in clients]
+        self.probe_interval = probe_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self.logger = logging.getLogger("LLM_Pool")
+
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        if probe_interval:
+            self._prober = threading.Thread(target=self._probe_loop, name="llm-pool-probe", daemon=True)
+            self._prober.start()
+
+    @classmethod
+    def from_urls(cls, urls: Sequence[str], probe_interval: Optional[float] = 30.0,
+                  **client_kwargs: Any) -> "PooledLLMClient":
+        """每个 base_url 建一个 LocalLLMClient（client_kwargs 传给它：backend / model / timeout ...）。"""
+        from .local_llm_client import LocalLLMClient
+        return cls([LocalLLMClient(base_url=url, **client_kwargs) for url in urls], probe_interval=probe_interval)
+
+    @property
+    def endpoint(self) -> str:
+        return "pool[" + ", ".join(e.name for e in self.endpoints) + "]"
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有本类没有的属性才会走到这里（model / backend / infer_api_schema ...）
+        if name in ASYNC_METHODS:
+            # 本层只包装了同步接口，异步调用透传会绕过它
+            raise AttributeError(name)
+        return getattr(self.endpoints[0].client, name)
+
+    # ===========================
+    # LLMClient 接口
+    # ===========================
+    def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt).text
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
+        endpoint = self._acquire()
+        started = self._clock()
+        try:
+            if hasattr(endpoint.client, "complete_with_usage"):
+                response = endpoint.client.complete_with_usage(prompt)
+            else:
+                response = LLMResponse(endpoint.client.complete(prompt))
+        except Exception as e:
+            raise self._failed(endpoint, e) from e
+        self._release(endpoint, started, response.completion_tokens)
+        return response
+
+    def stream_complete(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        endpoint = self._acquire()
+        started = self._clock()
+        stream: Any = None
+        failed = False
+        chars = 0
+        try:
+            if hasattr(endpoint.client, "stream_complete"):
+                stream = endpoint.client.stream_complete(prompt, json_schema=json_schema)
+            else:
+                stream = iter([endpoint.client.complete(prompt)])
+            for chunk in stream:
+                chars += len(chunk)
+                yield chunk
+        except Exception as e:
+            failed = True
+            raise self._failed(endpoint, e) from e
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            if not failed:
+                # 正常结束或调用方提前关闭；流式输出没有 usage，吞吐按约 4 字符 / token 估算
+                self._release(endpoint, started, chars // 4)
+
+    # ===========================
+    # 健康探测 / 统计
+    # ===========================
+    def probe(self) -> int:
+        """探测所有不健康的端点，恢复探测成功的；返回健康端点数。"""
+        for endpoint in self.endpoints:
+            if endpoint.healthy:
+                continue
+            check = getattr(endpoint.client, "health_check", None)
+            if check is not None and check():
+                with self._lock:
+                    endpoint.healthy = True
+                self.logger.info(f"LLM endpoint {endpoint.name} is healthy again")
+        with self._lock:
+            return sum(1 for endpoint in self.endpoints if endpoint.healthy)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def set_timeout(self, timeout: float) -> None:
+        """把 HTTP 请求超时下传给每个端点（__getattr__ 只会转给第一个）。"""
+        for endpoint in self.endpoints:
+            setter = getattr(endpoint.client, "set_timeout", None)
+            if setter is not None:
+                setter(timeout)
+
+    def close(self) -> None:
+        """停止后台健康探测。"""
+        self._stop.set()
+
+    # ===========================
+    # 内部
+    # ===========================
+    def _acquire(self) -> _Endpoint:
+        endpoint = self._pick()
+        if endpoint is None and self.probe():
+            endpoint = self._pick()
+        if endpoint is None:
+            raise LLMError(f"No healthy LLM endpoint in pool ({len(self.endpoints)} endpoints)")
+        return endpoint
+
+    def _pick(self) -> Optional[_Endpoint]:
+        """健康端点中选在途最少、EWMA 延迟最低的；都相同时轮询。选中即计入在途。"""
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            if not healthy:
+                return None
+            offset = next(self._round_robin)
+            n = len(healthy)
+            rotated = [healthy[(offset + i) % n] for i in range(n)]
+            endpoint = min(rotated, key=lambda e: (e.in_flight, e.ewma_seconds or 0.0))
+            endpoint.in_flight += 1
+            return endpoint
+
+    def _release(self, endpoint: _Endpoint, started: float, completion_tokens: Optional[int]) -> None:
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.record(self._clock() - started, completion_tokens)
+
+    def _failed(self, endpoint: _Endpoint, exc: BaseException) -> LLMError:
+        error = llm_error_from(exc, endpoint.name)
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.failures += 1
+            if error.retryable:
+                endpoint.healthy = False
+        if error.retryable:
+            self.logger.warning(f"LLM endpoint {endpoint.name} marked unhealthy: {error}")
+        return error
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception as e:  # 探测线程不能因为单次异常退出
+                self.logger.error(f"LLM pool health probe failed: {e}")
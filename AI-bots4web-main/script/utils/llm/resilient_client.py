@@ -0,0 +1,299 @@
+# script/utils/llm/resilient_client.py
+"""
+带重试 / 熔断 / 回退链的 LLM 客户端 (Resilient LLM Client)
+
+问题：本地推理服务偶尔断连、超时或返回 5xx，单次失败就让一个页面的分析结果变成空列表，
+而且没有任何统计，看不出是"页面没问题"还是"模型没回答"。
+
+ResilientLLMClient 包装一组按优先级排列的客户端（例如 主模型 -> 同机小模型 -> 另一台机器）：
+  - 每个后端最多尝试 max_attempts 次，可重试错误（连接 / 超时 / 429 / 5xx，见 LLMError.retryable）
+    之间按 full jitter 指数退避等待：uniform(0, min(backoff_max, backoff_base * 2^(n-1)))
+  - 不可重试的错误（模型不存在、请求参数错误）直接换下一个后端
+  - 每个后端一个熔断器：连续失败 failure_threshold 次后熔断 reset_timeout 秒，期间直接跳过；
+    到期后放行一个探测请求，成功则恢复，失败则继续熔断
+  - 全部后端失败时抛出 LLMError，由调用方计入失败，不再当作"没有发现问题"
+stream_complete 只在还没产出任何文本时重试 / 回退；产出一部分后出错直接抛出。
+由非首选后端给出的结果带 fallback=True（LLMResponse.fallback / 流的 fallback 属性），
+缓存层据此跳过写入：缓存键取的是主客户端的 model / backend。
+其他属性和方法透传给第一个（主）客户端。
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .base import ASYNC_METHODS, LLMError, LLMResponse, llm_error_from
+
+
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0          # 连续失败次数
+        self._opened_at = 0.0
+        self._probing = False       # 半开状态下是否已有探测请求在途
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """当前是否可以向该端点发请求；半开状态下只放行一个探测请求。"""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class _Backend:
+    """回退链中的一个后端及其统计。"""
+
+    def __init__(self, client: Any, breaker: CircuitBreaker) -> None:
+        self.client = client
+        self.breaker = breaker
+        self.name = getattr(client, "endpoint", None) or \
+            f"{type(client).__name__} ({getattr(client, 'model', None)})"
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.short_circuited = 0    # 因熔断被跳过的次数
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.name,
+            "circuit": self.breaker.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class ResilientLLMClient:
+
+    def __init__(
+            self,
+            clients: Sequence[Any],
+            max_attempts: int = 3,
+            backoff_base: float = 0.5,
+            backoff_max: float = 8.0,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            sleep: Callable[[float], None] = time.sleep,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        clients: 按优先级排列的 LLMClient，第一个是主客户端
+        max_attempts: 每个后端的最多尝试次数（含第一次）
+        backoff_base / backoff_max: 重试退避的基数和上限（秒）
+        failure_threshold / reset_timeout: 熔断阈值（连续失败次数）和熔断时长（秒）
+        """
+        if not clients:
+            raise ValueError("ResilientLLMClient needs at least one client")
+        self.backends = [_Backend(c, CircuitBreaker(failure_threshold, reset_timeout, clock)) for c in clients]
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("LLM_Resilient")
+
+        # 由回退链中非首选后端完成的调用数，以及所有后端都失败的调用数
+        self.fallback_successes = 0
+        self.exhausted = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有本类没有的属性才会走到这里（model / backend / infer_api_schema ...）
+        if name in ASYNC_METHODS:
+            # 本层只包装了同步接口，异步调用透传会绕过它
+            raise AttributeError(name)
+        return getattr(self.backends[0].client, name)
+
+    # ===========================
+    # LLMClient 接口
+    # ===========================
+    def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt).text
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
+        errors: List[LLMError] = []
+        for index, backend in enumerate(self.backends):
+            for attempt in range(self.max_attempts):
+                if not self._admit(backend, attempt):
+                    break
+                try:
+                    if hasattr(backend.client, "complete_with_usage"):
+                        response = backend.client.complete_with_usage(prompt)
+                    else:
+                        response = LLMResponse(backend.client.complete(prompt))
+                except Exception as e:
+                    error = self._record_failure(backend, e)
+                    errors.append(error)
+                    if not error.retryable:
+                        break
+                    continue
+                self._record_success(backend, index)
+                response.fallback = response.fallback or index > 0
+                return response
+        raise self._exhausted(errors)
+
+    def stream_complete(self, prompt: str, json_schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        stream = _FallbackAwareStream()
+        stream.chunks = self._stream(prompt, json_schema, stream)
+        return stream
+
+    def _stream(self, prompt: str, json_schema: Optional[Dict[str, Any]],
+                state: "_FallbackAwareStream") -> Iterator[str]:
+        errors: List[LLMError] = []
+        for index, backend in enumerate(self.backends):
+            for attempt in range(self.max_attempts):
+                if not self._admit(backend, attempt):
+                    break
+                started = False
+                state.fallback = index > 0
+                try:
+                    if hasattr(backend.client, "stream_complete"):
+                        stream = backend.client.stream_complete(prompt, json_schema=json_schema)
+                    else:
+                        stream = iter([backend.client.complete(prompt)])
+                    try:
+                        for chunk in stream:
+                            started = True
+                            yield chunk
+                    finally:
+                        close = getattr(stream, "close", None)
+                        if close is not None:
+                            close()
+                except GeneratorExit:
+                    # 调用方读够了提前关闭：这次请求是成功的
+                    self._record_success(backend, index)
+                    raise
+                except Exception as e:
+                    error = self._record_failure(backend, e)
+                    if started:
+                        # 已经交出部分文本，无法透明地重来
+                        raise error from e
+                    errors.append(error)
+                    if not error.retryable:
+                        break
+                    continue
+                self._record_success(backend, index)
+                return
+        raise self._exhausted(errors)
+
+    def set_timeout(self, timeout: float) -> None:
+        """把 HTTP 请求超时下传给回退链上的每个后端（__getattr__ 只会转给主后端）。"""
+        for backend in self.backends:
+            setter = getattr(backend.client, "set_timeout", None)
+            if setter is not None:
+                setter(timeout)
+
+    # ===========================
+    # 统计
+    # ===========================
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backends": [backend.stats() for backend in self.backends],
+                "fallback_successes": self.fallback_successes,
+                "exhausted": self.exhausted,
+            }
+
+    # ===========================
+    # 内部
+    # ===========================
+    def _admit(self, backend: _Backend, attempt: int) -> bool:
+        """熔断中返回 False；重试前按抖动退避等待。"""
+        if not backend.breaker.allow():
+            if attempt == 0:
+                with self._lock:
+                    backend.short_circuited += 1
+            return False
+        if attempt:
+            with self._lock:
+                backend.retries += 1
+            self._sleep(self._backoff(attempt))
+        with self._lock:
+            backend.calls += 1
+        return True
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _record_failure(self, backend: _Backend, exc: BaseException) -> LLMError:
+        error = llm_error_from(exc, backend.name)
+        backend.breaker.record_failure()
+        with self._lock:
+            backend.failures += 1
+        self.logger.warning(f"LLM request to {backend.name} failed "
+                            f"({'retryable' if error.retryable else 'not retryable'}): {error}")
+        return error
+
+    def _record_success(self, backend: _Backend, index: int) -> None:
+        backend.breaker.record_success()
+        if index:
+            with self._lock:
+                self.fallback_successes += 1
+
+    def _exhausted(self, errors: List[LLMError]) -> LLMError:
+        with self._lock:
+            self.exhausted += 1
+        if not errors:
+            return LLMError("All LLM backends are unavailable (circuit open)", retryable=False)
+        return LLMError(f"All LLM backends failed, last error from {errors[-1].endpoint}: {errors[-1]}",
+                        retryable=False, endpoint=errors[-1].endpoint)
+
+
+class _FallbackAwareStream:
+    """stream_complete 的返回值：fallback 表示产出的文本来自非首选后端。"""
+
+    def __init__(self) -> None:
+        self.fallback = False
+        self.chunks: Iterator[str] = iter(())
+
+    def __iter__(self) -> "_FallbackAwareStream":
+        return self
+
+    def __next__(self) -> str:
+        return next(self.chunks)
+
+    def close(self) -> None:
+        close = getattr(self.chunks, "close", None)
+        if close is not None:
+            close()
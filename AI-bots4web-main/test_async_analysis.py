@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from utils.llm.base import LLMResponse
+from utils.llm.cached_client import CachedLLMClient
+from utils.llm.pooled_client import PooledLLMClient
+from utils.llm.resilient_client import ResilientLLMClient
+
+
+def _issues_for(prompt: str) -> str:
+    return json.dumps({"issues": [{"owasp_category": "A03", "evidence": prompt.count("shop.test")}]})
+
+
+class AsyncLLM:
+    """模拟 AsyncLLMClient：每个请求 await delay 秒，记录最大并发数。"""
+
+    def __init__(self, delay: float = 0.1) -> None:
+        self.model = "llama3"
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.sync_calls = 0
+
+    async def acomplete_with_usage(self, prompt: str) -> LLMResponse:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if "/slow" in prompt:
+            await asyncio.sleep(10)
+        return LLMResponse(_issues_for(prompt), prompt_tokens=100, completion_tokens=20)
+
+    async def acomplete(self, prompt: str) -> str:
+        return (await self.acomplete_with_usage(prompt)).text
+
+    def complete(self, prompt: str) -> str:
+        self.sync_calls += 1
+        return _issues_for(prompt)
+
+
+def _triaged(*names: str):
+    pages = [{"url": f"http://shop.test/{name}", "title": name, "inputs": []} for name in names]
+    return {"interactive": pages, "standalone_apis": [], "site_layout": []}
+
+
+def test_aanalyze_runs_requests_concurrently_in_order():
+    client = AsyncLLM(delay=0.01)
+    analyzer = OwaspTop10LLMAnalyzer(client, max_in_flight=4, stream_output=False)
+    names = [f"p{i}" for i in range(8)]
+
+    result = asyncio.run(analyzer.aanalyze(_triaged(*names)))
+
+    assert [i.location for i in result.issues] == [f"http://shop.test/{name}" for name in names]
+    # 同一事件循环上恰好 4 个请求同时在途（串行执行时 peak 为 1）
+    assert client.peak == 4 and client.sync_calls == 0
+    assert analyzer.tokens_used == 8 * 120
+
+
+def test_astream_stops_early_and_closes_stream():
+    closed = []
+
+    class StreamingLLM(AsyncLLM):
+        async def astream(self, prompt, json_schema=None):
+            try:
+                for chunk in ['{"issues": [{"owasp_category": "A01"},', '{"owasp_category": "A02"},',
+                              '{"owasp_category": "A03"}]}']:
+                    await asyncio.sleep(0)
+                    yield chunk
+            finally:
+                closed.append(prompt)
+
+    seen = []
+    analyzer = OwaspTop10LLMAnalyzer(StreamingLLM(), max_issues_per_item=2, on_issue=seen.append)
+    result = asyncio.run(analyzer.aanalyze(_triaged("a")))
+    assert [i.owasp_category for i in result.issues] == ["A01", "A02"]
+    assert [i.owasp_category for i in seen] == ["A01", "A02"]
+    assert len(closed) == 1
+
+
+def test_timeout_recorded_as_failed():
+    analyzer = OwaspTop10LLMAnalyzer(AsyncLLM(delay=0), max_in_flight=2, request_timeout=0.2,
+                                     stream_output=False)
+    result = asyncio.run(analyzer.aanalyze(_triaged("ok", "slow")))
+    assert [i.location for i in result.issues] == ["http://shop.test/ok"]
+    assert result.failed == ["http://shop.test/slow"]
+    assert analyzer.timeouts == 1
+
+
+def test_sync_wrappers_fall_back_to_threads():
+    inner = AsyncLLM()
+    cache_path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite")
+    for wrapper in (ResilientLLMClient([inner]),
+                    PooledLLMClient([inner], probe_interval=None),
+                    CachedLLMClient(inner, cache_path)):
+        # 包装层不透传异步接口，否则异步调用会绕过重试 / 负载均衡 / 缓存
+        assert not hasattr(wrapper, "acomplete") and not hasattr(wrapper, "astream")
+        assert wrapper.model == "llama3"
+
+    client = ResilientLLMClient([inner])
+    result = asyncio.run(OwaspTop10LLMAnalyzer(client, stream_output=False).aanalyze(_triaged("a", "b")))
+    assert len(result.issues) == 2 and inner.sync_calls == 2
+
+
+if __name__ == "__main__":
+    test_aanalyze_runs_requests_concurrently_in_order()
+    test_astream_stops_early_and_closes_stream()
+    test_timeout_recorded_as_failed()
+    test_sync_wrappers_fall_back_to_threads()
+    print("Async analysis checks passed")
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+
+# agent 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from agent.phase_cache import BODY_STORE_DIR, PhaseCache, sweep_bodies
+from scanner.body_store import ResponseBodyStore, site_body_digests
+from scanner.page_asset import ApiCall, PageAsset, SiteAsset
+
+
+def _site(*bodies: bytes, store: ResponseBodyStore) -> SiteAsset:
+    apis = [ApiCall(id=i, url=f"http://shop.test/api/{i}", method="GET", resource_type="fetch",
+                    response_body_hash=store.put(body)) for i, body in enumerate(bodies)]
+    page = PageAsset(url="http://shop.test/", title="Home", api_calls=apis[:1])
+    return SiteAsset(base_url="http://shop.test", pages={page.url: page}, discovered_apis=apis[1:])
+
+
+def test_dedup_compression_and_preview():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResponseBodyStore(tmp, codec="gzip")
+        body = b'{"items": [' + b'{"id": 1, "name": "shoe"},' * 500 + b']}'
+        digest = store.put(body)
+        assert store.put(body) == digest
+        assert store.get(digest) == body and store.refcount(digest) == 2
+        stats = store.stats()
+        assert stats["dedup_hits"] == 1 and stats["compression_ratio"] > 5
+
+        preview = ResponseBodyStore.preview("é".encode() * 3000)
+        assert preview.endswith("<!-- preview truncated -->") and "�" not in preview
+        assert ResponseBodyStore.preview(b"short") == "short"
+
+
+def test_release_keeps_pinned_bodies():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResponseBodyStore(tmp, codec="gzip")
+        kept, dropped = store.put(b"kept"), store.put(b"dropped")
+        store.pin("scan.pkl", [kept])
+        store.release(kept)
+        store.release(dropped)
+        assert store.get(kept) == b"kept" and store.get(dropped) is None
+
+
+def test_sweep_reclaims_bodies_of_replaced_and_invalidated_scans():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PhaseCache(tmp, base_url="http://shop.test")
+        # 上一次运行的扫描
+        previous = ResponseBodyStore(os.path.join(tmp, BODY_STORE_DIR), codec="gzip")
+        old = _site(b"shared", b"old-only", store=previous)
+        cache.save("scan_result", "k1", old)
+        previous.pin(cache.entry_name("scan_result", "k1"), site_body_digests(old))
+        assert len(site_body_digests(old)) == 2
+
+        # 本次运行重新扫描得到新的缓存条目，旧条目被删除：只有旧扫描独有的响应体被回收
+        store = ResponseBodyStore(os.path.join(tmp, BODY_STORE_DIR), codec="gzip")
+        new = _site(b"shared", b"new-only", store=store)
+        cache.invalidate(phase="scan_result")
+        cache.save("scan_result", "k2", new)
+        store.pin(cache.entry_name("scan_result", "k2"), site_body_digests(new))
+        assert sweep_bodies(cache, store) == 1
+        assert store.get_text(new.pages["http://shop.test/"].api_calls[0].response_body_hash) == "shared"
+
+        # 新进程（CLI）里失效缓存后，剩下的响应体全部回收
+        cache.invalidate(phase="scan_result")
+        assert sweep_bodies(cache) == 2
+        assert ResponseBodyStore(os.path.join(tmp, BODY_STORE_DIR))._stored_digests() == []
+
+
+if __name__ == "__main__":
+    test_dedup_compression_and_preview()
+    test_release_keeps_pinned_bodies()
+    test_sweep_reclaims_bodies_of_replaced_and_invalidated_scans()
+    print("Body store checks passed")
@@ -0,0 +1,45 @@
+import glob
+import os
+
+import pytest
+
+# 没装 playwright 或没有下载浏览器时跳过，不影响其余测试
+sync_playwright = pytest.importorskip("playwright.sync_api").sync_playwright
+
+from test_html_cleaner import _canonical
+from script.scanner.browser_distiller import distill_in_browser
+from script.scanner.dom_distiller import InteractionDomDistiller
+from script.scanner.utils.html_cleaner import clean_html_for_llm
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_corpus", "html")
+
+
+def test_in_browser_matches_python_pipeline():
+    with sync_playwright() as p:
+        try:
+            browser = p.chromium.launch(headless=True)
+        except Exception as e:
+            pytest.skip(f"Chromium unavailable: {e}")
+        page = browser.new_page()
+        # 语料里的外链脚本 / 图片一律不加载，只比较 DOM 处理结果
+        page.route("**/*", lambda route: route.abort())
+        try:
+            for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+                with open(path, encoding="utf-8") as f:
+                    page.set_content(f.read(), wait_until="domcontentloaded")
+                live_html = page.content()
+                result = distill_in_browser(page)
+
+                name = os.path.basename(path)
+                assert result["distilled_dsl"] == InteractionDomDistiller().distill_html(live_html), name
+                assert _canonical(result["cleaned_html"]) == _canonical(
+                    clean_html_for_llm(live_html, backend="html.parser")), name
+                # 活动页面不能被清洗过程改动
+                assert page.content() == live_html, name
+        finally:
+            browser.close()
+
+
+if __name__ == "__main__":
+    test_in_browser_matches_python_pipeline()
+    print("In-browser distillation matches the Python pipeline")
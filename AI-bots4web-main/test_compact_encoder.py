@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.compact_encoder import encode_context, prune
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from utils.llm.base import LLMResponse
+
+
+def _page():
+    return {
+        "url": "http://shop.test/search",
+        "title": "Search",
+        "priority": 0.83,
+        "structure_snapshot": "<form><input name='q'></form>",
+        "inputs": [{"internal_id": 1, "page_url": "http://shop.test/search", "tag": "input", "name": "q",
+                    "input_type": "text", "dom_id": None, "placeholder": None, "meta": {}, "required": False}],
+        "observed_traffic": [],
+        "layout_refs": [],
+    }
+
+
+def test_prune_and_abbreviate():
+    assert prune({"a": None, "b": "", "c": [], "d": {}, "e": 0, "f": False, "priority": 1, "g": {"h": None}}) == {
+        "e": 0, "f": False}
+
+    text, legend = encode_context(_page())
+    data = json.loads(text)
+    assert "priority" not in data and "traffic" not in data and "layouts" not in data
+    assert data["snap"] == "<form><input name='q'></form>"
+    assert data["inputs"][0] == {"iid": 1, "page": "http://shop.test/search", "tag": "input", "name": "q",
+                                 "itype": "text", "required": False}
+    assert legend == "Abbreviated keys: snap=structure_snapshot, iid=internal_id, itype=input_type, page=page_url"
+    assert " " not in text.replace("<input name='q'>", "")
+
+    plain, no_legend = encode_context(_page(), short_keys=False)
+    assert "structure_snapshot" in json.loads(plain) and no_legend == ""
+
+
+class UsageLLM:
+    def __init__(self, cached=False) -> None:
+        self.cached = cached
+
+    def complete(self, prompt: str) -> str:
+        raise AssertionError("complete_with_usage should be preferred")
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
+        if self.cached:
+            return LLMResponse('{"issues": []}', cached=True)
+        return LLMResponse('{"issues": [{"owasp_category": "A03: Injection"}]}', prompt_tokens=321, completion_tokens=12)
+
+
+class PlainLLM:
+    def __init__(self) -> None:
+        self.prompts = []
+
+    def complete(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return '{"issues": []}'
+
+
+def test_usage_accounting():
+    triaged = {"interactive": [_page()], "standalone_apis": [], "site_layout": []}
+
+    analyzer = OwaspTop10LLMAnalyzer(UsageLLM())
+    result = analyzer.analyze(triaged)
+    assert len(result.issues) == 1
+    assert result.usage["calls"] == 1 and result.usage["prompt_tokens"] == 321
+    assert result.usage["completion_tokens"] == 12 and result.usage["estimated_calls"] == 0
+    assert analyzer.usage[0].label == "http://shop.test/search"
+    assert analyzer.tokens_used == 333
+
+    # 缓存命中记一次调用，但不计入预算
+    cached = OwaspTop10LLMAnalyzer(UsageLLM(cached=True))
+    assert cached.analyze(triaged).usage["cached_calls"] == 1
+    assert cached.tokens_used == 0
+
+    # 客户端没有 complete_with_usage：本地估算
+    estimated = OwaspTop10LLMAnalyzer(PlainLLM())
+    usage = estimated.analyze(triaged).to_dict()["usage"]
+    assert usage["estimated_calls"] == 1 and usage["prompt_tokens"] > 0
+    assert estimated.tokens_used == usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+def test_compact_prompt_is_smaller():
+    triaged = {"interactive": [_page()], "standalone_apis": [], "site_layout": []}
+    compact, verbose = PlainLLM(), PlainLLM()
+    OwaspTop10LLMAnalyzer(compact).analyze(triaged)
+    OwaspTop10LLMAnalyzer(verbose, compact_context=False).analyze(triaged)
+    assert "Abbreviated keys:" in compact.prompts[0] and '"priority"' not in compact.prompts[0]
+    assert '"structure_snapshot": ' in verbose.prompts[0]
+    assert len(compact.prompts[0]) < len(verbose.prompts[0])
+
+
+if __name__ == "__main__":
+    test_prune_and_abbreviate()
+    test_usage_accounting()
+    test_compact_prompt_is_smaller()
+    print("Compact encoder checks passed")
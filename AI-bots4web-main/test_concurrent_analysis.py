@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from analysis.streaming_pipeline import StreamingAnalysisPipeline
+from scanner.page_asset import SiteAsset, PageAsset, InputField
+
+
+def _triaged(n: int):
+    pages = [{"url": f"http://shop.test/p/{i}", "title": "P", "category": "interactive", "inputs": []}
+             for i in range(n)]
+    apis = [{"type": "standalone_api_endpoint", "url": f"http://shop.test/api/{i}", "method": "GET"}
+            for i in range(2)]
+    return {"interactive": pages, "standalone_apis": apis, "site_layout": [], "near_duplicates": []}
+
+
+class GatedLLM:
+    """
+    调用在 gate 打开前阻塞（blocked 中的 URL 等待各自的 Event），之后按 URL 的延迟返回；
+    记录当前 / 最大并发数。
+    """
+
+    def __init__(self, delays=None, blocked=()) -> None:
+        self.delays = delays or {}
+        self.gate = threading.Event()
+        self.blocked = {url: threading.Event() for url in blocked}
+        self.active = 0
+        self.max_active = 0
+        self._cond = threading.Condition()
+
+    def complete(self, prompt: str) -> str:
+        url = re.search(r'"url":\s*"([^"]+)"', prompt).group(1)
+        with self._cond:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self._cond.notify_all()
+        assert self.gate.wait(10), "gate was never opened"
+        if url in self.blocked:
+            assert self.blocked[url].wait(10), f"{url} was never released"
+        time.sleep(self.delays.get(url, 0))
+        with self._cond:
+            self.active -= 1
+        return json.dumps({"issues": [{"url": url, "owasp_category": "A01: Broken Access Control"}]})
+
+    def wait_active(self, n: int, timeout: float = 10) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.active >= n, timeout)
+
+    def release(self) -> None:
+        self.gate.set()
+        for event in self.blocked.values():
+            event.set()
+
+
+def _wait_until(predicate, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _in_thread(fn):
+    out = {}
+    thread = threading.Thread(target=lambda: out.setdefault("result", fn()))
+    thread.start()
+    return thread, out
+
+
+def test_bounded_concurrency_keeps_order():
+    triaged = _triaged(6)
+    # 越靠前的条目越慢，完成顺序与提交顺序相反
+    delays = {f"http://shop.test/p/{i}": 0.012 - 0.002 * i for i in range(6)}
+
+    serial_llm = GatedLLM(delays)
+    serial_llm.release()
+    serial = OwaspTop10LLMAnalyzer(serial_llm).analyze(triaged)
+
+    llm = GatedLLM(delays)
+    thread, out = _in_thread(lambda: OwaspTop10LLMAnalyzer(llm, max_in_flight=3).analyze(triaged))
+    # gate 关着时恰好有 3 个请求同时在途
+    assert llm.wait_active(3)
+    llm.release()
+    thread.join(10)
+    result = out["result"]
+
+    assert llm.max_active == 3
+    assert [(i.location, i.url) for i in result.issues] == [(i.location, i.url) for i in serial.issues]
+    assert [i.url for i in result.issues][-2:] == ["http://shop.test/api/0", "http://shop.test/api/1"]
+
+
+def test_request_timeout_keeps_slot_until_abandoned_call_ends():
+    triaged = _triaged(4)
+    llm = GatedLLM(blocked=["http://shop.test/p/1"])
+    llm.gate.set()
+    analyzer = OwaspTop10LLMAnalyzer(llm, max_in_flight=2, request_timeout=0.3)
+
+    # p/1 在 analyze 返回之后才放行：能返回说明超时生效、其余条目没有等它
+    result = analyzer.analyze(triaged)
+    llm.release()
+
+    assert analyzer.timeouts == 1
+    # 被放弃的 p/1 仍在服务端运行，其余条目只能用剩下的一个名额
+    assert llm.max_active == 2
+    assert [i.location for i in result.issues][:3] == [
+        "http://shop.test/p/0", "http://shop.test/p/2", "http://shop.test/p/3"]
+    assert len(result.issues) == 5
+
+
+def test_pipeline_workers_respect_request_timeout():
+    llm = GatedLLM(blocked=["http://shop.test/item/0"])
+    llm.gate.set()
+    analyzer = OwaspTop10LLMAnalyzer(llm, request_timeout=0.2)
+    pipeline = StreamingAnalysisPipeline(analyzer, workers=1, layout_warmup_pages=1,
+                                         dedupe_layout=False, dedupe_similar=False)
+    site = SiteAsset(base_url="http://shop.test")
+    for i in range(3):
+        url = f"http://shop.test/item/{i}"
+        pipeline.feed(PageAsset(url=url, cleaned_html=f"<input name='q{i}'>",
+                                inputs=[InputField(internal_id=i, page_url=url, tag="input", name="q")]), site)
+    thread, out = _in_thread(lambda: pipeline.finish(site))
+
+    # item/0 超时后立即记为失败，但工作线程等它真正结束才取下一条
+    assert _wait_until(lambda: pipeline.items_failed == 1 and analyzer.timeouts == 1)
+    assert llm.active == 1
+    llm.release()
+    thread.join(10)
+    _, result = out["result"]
+
+    assert llm.max_active == 1
+    assert [i.location for i in result.issues] == ["http://shop.test/item/1", "http://shop.test/item/2"]
+
+
+if __name__ == "__main__":
+    test_bounded_concurrency_keeps_order()
+    test_request_timeout_keeps_slot_until_abandoned_call_ends()
+    test_pipeline_workers_respect_request_timeout()
+    print("Concurrent analysis checks passed")
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.asset_triager import AssetTriager
+from analysis.compact_encoder import encode_context
+from analysis.context_compressor import ContextCompressor, estimate_tokens
+from scanner.page_asset import SiteAsset, PageAsset, InputField, ApiCall
+
+
+def _big_page_html(filler_blocks: int = 400) -> str:
+    filler = "".join(f"<div><p>Paragraph {i} with some marketing copy about products.</p></div>"
+                     for i in range(filler_blocks))
+    return (
+        "<html><head><title>Shop</title></head><body>"
+        f"{filler}"
+        "<!-- TODO: remove debug api key before release -->"
+        '<form action="/login" method="POST"><input name="username"><input type="password" name="password">'
+        '<button type="submit">Login</button></form>'
+        f"{filler}"
+        '<a href="/cart" onclick="track(1)">Cart</a>'
+        "</body></html>"
+    )
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("中文") == 2
+
+
+def test_small_snapshot_kept_verbatim():
+    html = "<form><input name='q'></form>"
+    text, fmt = ContextCompressor().compress(html, 1000)
+    assert (text, fmt) == (html, ContextCompressor.SNAPSHOT_FULL)
+
+
+def test_large_snapshot_keeps_security_regions():
+    html = _big_page_html()
+    budget = 600
+    text, fmt = ContextCompressor().compress(html, budget)
+    assert fmt == ContextCompressor.SNAPSHOT_REGIONS
+    assert estimate_tokens(text) <= budget + 32
+    assert 'name="password"' in text
+    assert "TODO: remove debug api key" in text
+    assert 'onclick="track(1)"' in text
+    # 区域按文档顺序输出：注释在表单之前，表单在链接之前
+    assert text.index("TODO") < text.index("<form") < text.index("onclick")
+    assert "Paragraph 1 " not in text
+
+
+def test_dsl_fallback_when_no_region_fits():
+    html = "<div>" + "<p><a href='/x'>link</a></p>" * 2000 + "</div>"
+    text, fmt = ContextCompressor().compress(html, 300, distilled_dsl="LINK /x\n" * 500)
+    assert fmt == ContextCompressor.SNAPSHOT_DSL
+    assert text.endswith("[TRUNCATED_DSL]")
+    assert estimate_tokens(text) <= 300 + 8
+
+
+def test_triager_payload_fits_budget():
+    url = "http://example.com/login"
+    page = PageAsset(
+        url=url,
+        title="Login",
+        cleaned_html=_big_page_html(),
+        inputs=[InputField(internal_id=1, page_url=url, tag="input", name="username")],
+        api_calls=[ApiCall(id=i, url=f"http://example.com/api/{i}", method="POST", resource_type="xhr",
+                           request_body="x" * 500) for i in range(3)],
+    )
+    site = SiteAsset(base_url="http://example.com", pages={url: page})
+    budget = 1500
+
+    payload = AssetTriager(site, page_token_budget=budget).triage()["interactive"][0]
+    # 按 Prompt 里实际的序列化方式计量（紧凑编码 + 图例）
+    text, legend = encode_context(payload)
+    assert estimate_tokens(text + legend) <= budget
+    assert payload["snapshot_format"] == ContextCompressor.SNAPSHOT_REGIONS
+    assert 'name="password"' in payload["structure_snapshot"]
+    assert list(payload)[:5] == ["url", "title", "category", "is_login_page", "structure_snapshot"]
+
+    unbounded = AssetTriager(site, page_token_budget=0).triage()["interactive"][0]
+    assert unbounded["structure_snapshot"] == page.cleaned_html
+    assert "snapshot_format" not in unbounded
+
+
+def test_triager_measures_with_prompt_serializer_and_warns_over_budget():
+    url = "http://example.com/form"
+    inputs = [InputField(internal_id=i, page_url=url, tag="input", name=f"field_{i}",
+                         placeholder="Please enter the value for this field") for i in range(40)]
+    page = PageAsset(url=url, title="Form", cleaned_html=_big_page_html(), inputs=inputs)
+    site = SiteAsset(base_url="http://example.com", pages={url: page})
+
+    # 缩进 JSON 的 Prompt 同样落在预算内
+    verbose = AssetTriager(site, page_token_budget=6000, compact_context=False).triage()["interactive"][0]
+    assert estimate_tokens(json.dumps(verbose, indent=2, ensure_ascii=False)) <= 6000
+    assert verbose["snapshot_format"] == ContextCompressor.SNAPSHOT_REGIONS
+
+    # 输入框本身就超出预算：省略快照并记录，而不是把快照抬到 min_snapshot_tokens
+    triager = AssetTriager(site, page_token_budget=300)
+    tight = triager.triage()["interactive"][0]
+    assert tight["structure_snapshot"] == "" and tight["snapshot_format"] == ContextCompressor.SNAPSHOT_OMITTED
+    assert len(tight["inputs"]) == 40 and triager.over_budget_pages == [url]
+
+
+if __name__ == "__main__":
+    test_estimate_tokens()
+    test_small_snapshot_kept_verbatim()
+    test_large_snapshot_keeps_security_regions()
+    test_dsl_fallback_when_no_region_fits()
+    test_triager_payload_fits_budget()
+    test_triager_measures_with_prompt_serializer_and_warns_over_budget()
+    print("Context compressor checks passed")
@@ -0,0 +1,34 @@
+import glob
+import os
+
+from bench_dom_distiller import LegacyRecursiveDistiller, deep_tree, wide_tree
+from script.scanner.dom_distiller import InteractionDomDistiller
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_corpus", "html")
+
+
+def _cases():
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            yield os.path.basename(path), f.read()
+    yield "deep", deep_tree(sections=3, depth=50)
+    yield "wide", wide_tree(rows=300)
+    yield "dropped_subtree", "<div><svg><a href='/x'>x</a></svg><p data-token='t'><b>y</b></p></div>"
+    yield "keyword_attrs", "<div aria-label='API KEY'><span title='Secret'></span><i class='authx'></i></div>"
+
+
+def test_iterative_matches_recursive_reference():
+    for name, raw in _cases():
+        expected = LegacyRecursiveDistiller().distill_html(raw)
+        assert InteractionDomDistiller().distill_html(raw) == expected, name
+
+
+def test_very_deep_dom_does_not_hit_recursion_limit():
+    dsl = InteractionDomDistiller().distill_html(deep_tree(sections=1, depth=5000))
+    assert dsl.strip() == 'button#b id="b" onclick="go()" text="Go"'
+
+
+if __name__ == "__main__":
+    test_iterative_matches_recursive_reference()
+    test_very_deep_dom_does_not_hit_recursion_limit()
+    print("DOM distiller checks passed")
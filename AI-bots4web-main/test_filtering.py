@@ -14,6 +14,11 @@ def test_filtering():
         ("custom-script.js", True),
         ("react.production.min.js", False),
         ("chunk-vendors.js", False),
+        ("/static/js/vendors~main.3f2a.chunk.js", False),
+        # 业务脚本只是包含库名子串，不应被跳过
+        ("reactions.js", True),
+        ("revue-widget.js", True),
+        ("/js/moments-feed.js", True),
         # Cross-origin tests (base_url is example.com)
         ("http://example.com/js/myscript.js", True),
         ("https://cdnjs.cloudflare.com/ajax/libs/cookieconsent/3.1.0/cookieconsent.min.js", False),
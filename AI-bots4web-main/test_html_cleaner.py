@@ -0,0 +1,109 @@
+import glob
+import os
+import re
+
+import lxml.html
+from lxml import etree
+
+from bench_html_cleaner import legacy_multipass_clean, synthetic_page, deep_page
+from script.scanner.utils.html_cleaner import clean_html_for_llm
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_corpus", "html")
+
+
+def _canonical(html: str):
+    """
+    把清洗结果重新解析成 (事件, 内容) 序列，忽略两种序列化方式的格式差异：
+    属性顺序 / 引号风格 / 自闭合写法 / 布尔属性写法 (selected vs selected="") / 纯空白文本。
+    """
+    root = lxml.html.document_fromstring(html, parser=lxml.html.HTMLParser(huge_tree=True))
+    events = []
+
+    def text(value):
+        value = re.sub(r"\s+", " ", value or "").strip()
+        if value:
+            events.append(("text", value))
+
+    def walk(el):
+        if el.tag is etree.Comment:
+            events.append(("comment", (el.text or "").strip()))
+        elif isinstance(el.tag, str):
+            attrs = tuple(sorted((k, "" if v == k else v) for k, v in el.attrib.items()))
+            events.append(("start", el.tag, attrs))
+            text(el.text)
+            for child in el:
+                walk(child)
+            events.append(("end", el.tag))
+        text(el.tail)
+
+    walk(root)
+    return events
+
+
+def _corpus():
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            yield os.path.basename(path), f.read()
+
+
+def test_lxml_backend_matches_html_parser():
+    for name, raw in _corpus():
+        expected = _canonical(clean_html_for_llm(raw, backend="html.parser"))
+        actual = _canonical(clean_html_for_llm(raw, backend="lxml"))
+        assert actual == expected, f"{name}: lxml output differs from html.parser output"
+
+
+def test_single_pass_matches_multipass_reference():
+    nested = "<div><div class='a'><div class='b'></div></div><span> </span><section><!-- --></section></div>"
+    cases = list(_corpus()) + [("nested_empty", nested), ("deep", deep_page(sections=3, depth=40))]
+    for name, raw in cases:
+        assert clean_html_for_llm(raw, backend="html.parser") == legacy_multipass_clean(raw), name
+
+
+def test_large_synthetic_page_equivalence():
+    raw = synthetic_page(64 * 1024)
+    assert _canonical(clean_html_for_llm(raw, backend="lxml")) == _canonical(
+        clean_html_for_llm(raw, backend="html.parser"))
+
+
+def test_deep_dom_equivalence():
+    raw = deep_page(sections=2, depth=300)
+    assert _canonical(clean_html_for_llm(raw, backend="lxml")) == _canonical(
+        clean_html_for_llm(raw, backend="html.parser"))
+
+
+def test_lxml_falls_back_beyond_libxml2_depth_limit():
+    raw = deep_page(sections=1, depth=2100)
+    assert "text" in clean_html_for_llm(raw, backend="lxml")
+
+
+def test_cleaning_rules_applied():
+    _, raw = next((n, r) for n, r in _corpus() if n == "images_and_handlers.html")
+    for backend in ("html.parser", "lxml"):
+        cleaned = clean_html_for_llm(raw, backend=backend)
+        assert "[BASE64_IMAGE_REMOVED]" in cleaned
+        assert 'onerror="alert(document.domain)"' in cleaned
+        assert 'data-token="eyJhbGciOi"' in cleaned
+        assert "class=" not in cleaned and "style=" not in cleaned
+        assert "<font" not in cleaned and "<noscript" not in cleaned
+        assert "trailing text" in cleaned
+        assert "internal note: admin at /admin" in cleaned
+
+
+def test_fragment_input():
+    raw = '<div class="a"><input name="q" class="x"><div class="empty"></div></div>'
+    expected = _canonical('<div><input name="q"></div>')
+    for backend in ("html.parser", "lxml"):
+        cleaned = clean_html_for_llm(raw, backend=backend)
+        assert "<html" not in cleaned
+        assert _canonical(cleaned) == expected
+
+
+if __name__ == "__main__":
+    for name, raw in _corpus():
+        same = _canonical(clean_html_for_llm(raw, backend="html.parser")) == _canonical(
+            clean_html_for_llm(raw, backend="lxml"))
+        print(f"[{'PASS' if same else 'FAIL'}] {name}")
+    test_cleaning_rules_applied()
+    test_fragment_input()
+    print("Rule checks passed")
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import tempfile
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.issue_stream import IssueStreamParser, parse_issues
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from utils.llm.cached_client import CachedLLMClient
+
+
+def _issue(i: int) -> dict:
+    return {"location": f"input {i}", "owasp_category": "A03: Injection",
+            "risk_reason": 'echoes "q" inside <div>{}</div> \\ [raw]', "confidence": "High"}
+
+
+RESPONSE = "```json\n" + json.dumps({"issues": [_issue(1), _issue(2), _issue(3)]}, indent=2) + \
+    "\n```\nThe page reflects the search term without encoding, so ..." * 3
+
+
+def test_parser_emits_each_issue_as_it_closes():
+    parser = IssueStreamParser()
+    emitted_at = []
+    for pos, ch in enumerate(RESPONSE):
+        for issue in parser.feed(ch):
+            emitted_at.append((pos, issue))
+        if parser.done:
+            break
+    assert [issue for _, issue in emitted_at] == [_issue(1), _issue(2), _issue(3)]
+    # 第一个 issue 在整个 JSON 结束之前就已产出，解析在顶层对象闭合处停止
+    closing = RESPONSE.index("\n```", 10)
+    assert emitted_at[0][0] < emitted_at[-1][0] < closing
+    assert parser.done and len(parser.text) == closing
+
+    capped = IssueStreamParser(max_issues=2)
+    capped.feed(RESPONSE)
+    assert capped.done and len(capped.issues) == 2
+
+
+def test_parser_salvages_broken_and_truncated_output():
+    broken = '{"issues": [{"location": "a"}, {"location": "b" "confidence": "Low"}, {"location": "c"}]}'
+    parser = parse_issues(broken)
+    assert [i["location"] for i in parser.issues] == ["a", "c"] and parser.errors == 1 and parser.done
+
+    truncated = json.dumps({"issues": [_issue(1), _issue(2)]})[:-30]
+    parser = parse_issues(truncated)
+    assert parser.issues == [_issue(1)] and not parser.done
+
+    # 非流式路径：整体解析失败时同样抢救已闭合的 issue
+    analyzer = OwaspTop10LLMAnalyzer(object())
+    assert [i.location for i in analyzer._parse_llm_json(broken)] == ["a", "c"]
+    assert analyzer.parse_errors == 1
+
+
+class StreamingLLM:
+    """按 10 个字符一块流式输出，记录被读取的块数以及是否被提前关闭。"""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.chunks_read = 0
+        self.closed = False
+        self.schemas = []
+
+    def complete(self, prompt: str) -> str:
+        raise AssertionError("stream_complete should be preferred")
+
+    def stream_complete(self, prompt: str, json_schema=None):
+        self.schemas.append(json_schema)
+        try:
+            for start in range(0, len(self.text), 10):
+                self.chunks_read += 1
+                yield self.text[start:start + 10]
+        finally:
+            self.closed = True
+
+
+def test_analyzer_streams_and_stops_early():
+    page = {"url": "http://shop.test/search", "title": "Search", "inputs": []}
+    triaged = {"interactive": [page], "standalone_apis": [], "site_layout": []}
+    total_chunks = (len(RESPONSE) + 9) // 10
+
+    seen = []
+    llm = StreamingLLM(RESPONSE)
+    result = OwaspTop10LLMAnalyzer(llm, on_issue=seen.append).analyze(triaged)
+    assert [i.location for i in seen] == ["http://shop.test/search"] * 3
+    assert result.issues == seen
+    assert llm.closed and llm.chunks_read < total_chunks
+    assert llm.schemas == [OwaspTop10LLMAnalyzer.ISSUES_JSON_SCHEMA]
+    assert result.usage["estimated_calls"] == 1
+
+    capped = StreamingLLM(RESPONSE)
+    result = OwaspTop10LLMAnalyzer(capped, max_issues_per_item=1).analyze(triaged)
+    assert len(result.issues) == 1 and capped.chunks_read < llm.chunks_read
+
+
+def test_cached_stream_replays_early_closed_response():
+    page = {"url": "http://shop.test/search", "title": "Search", "inputs": []}
+    triaged = {"interactive": [page], "standalone_apis": [], "site_layout": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        llm = StreamingLLM(RESPONSE)
+        cache = CachedLLMClient(llm, os.path.join(tmp, "cache.sqlite3"))
+        first = OwaspTop10LLMAnalyzer(cache).analyze(triaged)
+        assert llm.closed and cache.stats()["entries"] == 1
+
+        again = OwaspTop10LLMAnalyzer(cache)
+        second = again.analyze(triaged)
+        assert [i.location for i in second.issues] == [i.location for i in first.issues]
+        assert second.usage["cached_calls"] == 1 and again.tokens_used == 0
+        assert cache.stats()["hits"] == 1 and llm.schemas == [OwaspTop10LLMAnalyzer.ISSUES_JSON_SCHEMA]
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_parser_emits_each_issue_as_it_closes()
+    test_parser_salvages_broken_and_truncated_output()
+    test_analyzer_streams_and_stops_early()
+    test_cached_stream_replays_early_closed_response()
+    print("Issue stream checks passed")
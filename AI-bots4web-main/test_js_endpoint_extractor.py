@@ -0,0 +1,85 @@
+from script.scanner.js_endpoint_extractor import JsEndpointExtractor, JsTokenizer
+
+
+BASE_URL = "https://shop.example.com/app/"
+
+BUNDLE = r'''
+!function(){
+fetch("/api/v1/login", {method: "POST", headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({username: u, password: p})});
+fetch(`/api/users/${user.id}?expand=1&lang=${lang}`);
+axios.post(this.baseUrl + '/orders', {itemId, qty: 2}, {params: {coupon: c}});
+axios({method: 'put', url: '/api/profile', data: {email: e}});
+var x = new XMLHttpRequest(); x.open('post', "/legacy/submit.php?token=" + t);
+$http({method: "DELETE", url: "/ng/items/" + id});
+this.http.get<User[]>(`${environment.api}/users`, {params: new HttpParams().set('q', q).append('limit', '10')});
+// 以下都不是请求调用点
+model.fetch({success: cb}); prefetch("/no"); myhttp.get("/no"); window.open("GET"); var s = "/not/a/call";
+}();
+'''
+
+
+def _by_url(endpoints):
+    return {(ep.method, ep.url): ep for ep in endpoints}
+
+
+def test_call_sites_yield_method_and_keys():
+    found = _by_url(JsEndpointExtractor.extract(BUNDLE, BASE_URL))
+    assert set(found) == {
+        ("POST", "https://shop.example.com/api/v1/login"),
+        ("GET", "https://shop.example.com/api/users/{id}"),
+        ("POST", "https://shop.example.com/orders"),
+        ("PUT", "https://shop.example.com/api/profile"),
+        ("POST", "https://shop.example.com/legacy/submit.php"),
+        ("DELETE", "https://shop.example.com/ng/items/{id}"),
+        ("GET", "https://shop.example.com/users"),
+    }
+    assert found[("POST", "https://shop.example.com/api/v1/login")].body_keys == ["username", "password"]
+    assert found[("GET", "https://shop.example.com/api/users/{id}")].param_keys == ["expand", "lang"]
+    orders = found[("POST", "https://shop.example.com/orders")]
+    assert (orders.source, orders.param_keys, orders.body_keys) == ("axios", ["coupon"], ["itemId", "qty"])
+    assert found[("POST", "https://shop.example.com/legacy/submit.php")].source == "xhr"
+    assert found[("GET", "https://shop.example.com/users")].param_keys == ["q", "limit"]
+
+
+def test_unbalanced_call_is_ignored():
+    assert JsEndpointExtractor.extract('fetch("/api/a", {method: "POST"', BASE_URL) == []
+
+
+def test_tokenizer_strings_templates_and_comments():
+    tokens = list(JsTokenizer(r'''a /* c */ ("x\"y", `p/${ encodeURIComponent(obj.id) }/{x}`) // tail'''))
+    assert tokens == [("ident", "a"), ("punct", "("), ("str", 'x"y'), ("punct", ","),
+                      ("tpl", "p/{id}/{x}"), ("punct", ")")]
+
+
+def test_call_sites_in_comments_strings_and_regexes_are_ignored():
+    js = r'''
+// fetch('/commented')
+/* axios.post('/old') */
+var help = "call fetch('/in-string') to load";
+var tpl = `axios.get('/in-template')`;
+var re = /['"]/g, url = s.replace(/^https?:\/\//, ""); fetch('/real', {method: "POST"});
+'''
+    found = _by_url(JsEndpointExtractor.extract(js))
+    assert set(found) == {("POST", "/real")}
+
+
+def test_unknown_method_and_conditional_urls_are_dropped():
+    js = r'''
+fetch('/a', {method: m});
+axios({url: '/b', method: isEdit ? 'put' : 'post'});
+fetch("/c" + (x ? "/d" : "/e"));
+fetch("/f/" + (id || "new"));
+fetch("/g/" + encodeURIComponent(user.id) + "/h");
+'''
+    found = _by_url(JsEndpointExtractor.extract(js))
+    assert set(found) == {("GET", "/g/{id}/h")}
+
+
+if __name__ == "__main__":
+    test_call_sites_yield_method_and_keys()
+    test_unbalanced_call_is_ignored()
+    test_tokenizer_strings_templates_and_comments()
+    test_call_sites_in_comments_strings_and_regexes_are_ignored()
+    test_unknown_method_and_conditional_urls_are_dropped()
+    print("JS endpoint extractor checks passed")
@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.asset_triager import AssetTriager
+from analysis.context_compressor import estimate_tokens
+from analysis.layout_dedup import LayoutDeduplicator
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from scanner.page_asset import SiteAsset, PageAsset, InputField
+
+NAV = ('<nav><a href="/">Home</a><a href="/products">Products</a><a href="/admin">Admin</a>'
+       '<form action="/search"><input name="q" placeholder="Search the shop"></form></nav>')
+FOOTER = '<footer><p>Copyright 2024 Example Shop. All rights reserved.</p><a href="/privacy">Privacy</a></footer>'
+
+
+def _page(body: str) -> str:
+    return f"<html><head><title>Shop</title></head><body>{NAV}<main>{body}</main>{FOOTER}</body></html>"
+
+
+PAGES = {
+    "http://shop.test/": _page("<h1>Welcome</h1>"),
+    "http://shop.test/login": _page('<form action="/login" method="POST"><input name="user"><input name="pass" type="password"></form>'),
+    "http://shop.test/item/1": _page('<h1>Item 1</h1><button onclick="addToCart(1)">Add</button>'),
+}
+
+
+def test_common_layout_factored_out():
+    dedup = LayoutDeduplicator().fit(PAGES)
+    assert [b.block_id for b in dedup.blocks] == ["L1", "L2"]
+    assert dedup.blocks[0].html.startswith("<nav>") and dedup.blocks[0].page_count == 3
+    assert dedup.blocks[1].html.startswith("<footer>")
+
+    login = dedup.page_specific_html("http://shop.test/login")
+    assert "Products" not in login and "Copyright" not in login
+    assert "<!-- layout:L1 -->" in login and "<!-- layout:L2 -->" in login
+    assert 'name="pass"' in login
+    assert dedup.page_block_ids("http://shop.test/login") == ["L1", "L2"]
+    assert dedup.stats()["chars_saved"] > 0
+
+
+def test_no_layout_for_single_page_or_unique_pages():
+    one = {"http://shop.test/": PAGES["http://shop.test/"]}
+    assert LayoutDeduplicator().fit(one).blocks == []
+    assert LayoutDeduplicator().fit(one).page_specific_html("http://shop.test/") == one["http://shop.test/"]
+
+    unique = {f"http://shop.test/{i}": f"<html><body><p>Completely different content number {i} " + "x" * 100 + "</p></body></html>"
+              for i in range(3)}
+    assert LayoutDeduplicator().fit(unique).blocks == []
+
+
+def test_triager_emits_site_layout_once():
+    pages = {}
+    for url, html in PAGES.items():
+        pages[url] = PageAsset(url=url, title="Shop", cleaned_html=html,
+                               inputs=[InputField(internal_id=1, page_url=url, tag="input", name="q")])
+    site = SiteAsset(base_url="http://shop.test", pages=pages)
+
+    triaged = AssetTriager(site).triage()
+    assert len(triaged["site_layout"]) == 2
+    total = json.dumps(triaged["interactive"])
+    assert "Copyright 2024" not in total and "Search the shop" not in total
+    assert all(p["layout_refs"] == ["L1", "L2"] for p in triaged["interactive"])
+
+    plain = AssetTriager(site, dedupe_layout=False).triage()
+    assert plain["site_layout"] == []
+    assert plain["interactive"][0]["structure_snapshot"] == PAGES["http://shop.test/"]
+
+
+def _site_with_layout_inputs() -> SiteAsset:
+    pages = {}
+    for n, (url, html) in enumerate(PAGES.items()):
+        inputs = [InputField(internal_id=10 * n + 1, page_url=url, tag="input", name="q")]
+        if url.endswith("/login"):
+            inputs += [InputField(internal_id=10 * n + 2, page_url=url, tag="input", name="user"),
+                       InputField(internal_id=10 * n + 3, page_url=url, tag="input", name="pass")]
+        pages[url] = PageAsset(url=url, title="Shop", cleaned_html=html, inputs=inputs)
+    return SiteAsset(base_url="http://shop.test", pages=pages)
+
+
+def test_layout_inputs_move_to_layout_blocks():
+    triaged = AssetTriager(_site_with_layout_inputs()).triage()
+    # 全局搜索框只随布局块出现一次，页面 payload 中只剩页面自己的输入框
+    assert {p["url"]: [i["name"] for i in p["inputs"]] for p in triaged["interactive"]}["http://shop.test/login"] \
+        == ["user", "pass"]
+    nav = triaged["site_layout"][0]
+    assert [(i["internal_id"], i["page_url"]) for i in nav["inputs"]] == [(1, "http://shop.test/")]
+    assert triaged["site_layout"][1]["inputs"] == []
+
+
+def test_page_input_named_like_layout_input_is_kept():
+    # /search 自己的表单里也有 name="q"：只有导航栏里那个随布局块分析
+    search = "http://shop.test/search"
+    site = _site_with_layout_inputs()
+    site.pages = {search: PageAsset(
+        url=search, title="Shop",
+        cleaned_html=_page('<form action="/search"><input name="q"><button>Go</button></form>'),
+        inputs=[InputField(internal_id=41, page_url=search, tag="input", name="q"),
+                InputField(internal_id=42, page_url=search, tag="input", name="q")]), **site.pages}
+
+    triaged = AssetTriager(site, dedupe_similar=False).triage()
+    page = {p["url"]: p for p in triaged["interactive"]}[search]
+    assert [i["internal_id"] for i in page["inputs"]] == [42]
+    assert "<!-- layout:L1 -->" in page["structure_snapshot"] and 'name="q"' in page["structure_snapshot"]
+    # search 是布局块的首个样本页：块里只有导航栏的搜索框
+    assert [i["internal_id"] for i in triaged["site_layout"][0]["inputs"]] == [41]
+
+
+def test_layout_blocks_split_by_page_budget():
+    class LayoutLLM:
+        def __init__(self):
+            self.layout_prompts = 0
+
+        def complete(self, prompt):
+            if "SHARED LAYOUT BLOCKS" not in prompt:
+                return '{"issues": []}'
+            self.layout_prompts += 1
+            if "Search the shop" not in prompt:
+                return '{"issues": []}'
+            return json.dumps({"issues": [
+                {"owasp_category": "A03: Cross-Site Scripting (XSS)", "related_input_id": 1},
+                {"owasp_category": "A03: Cross-Site Scripting (XSS)", "related_input_id": 999}]})
+
+    triager = AssetTriager(_site_with_layout_inputs(), dedupe_similar=False)
+    nav_cost = estimate_tokens(json.dumps(triager.triage()["site_layout"][0], ensure_ascii=False))
+    budget = nav_cost + 10
+
+    triaged = AssetTriager(_site_with_layout_inputs(), page_token_budget=budget, dedupe_similar=False).triage()
+    batches = triaged["site_layout_batches"]
+    assert [[b["block_id"] for b in batch] for batch in batches] == [["L1"], ["L2"]]
+    assert all(estimate_tokens(json.dumps(b, ensure_ascii=False)) <= budget for batch in batches for b in batch)
+
+    llm = LayoutLLM()
+    result = OwaspTop10LLMAnalyzer(llm, stream_output=False).analyze(triaged)
+    assert llm.layout_prompts == 2
+    # 引用了布局输入框的 issue 落到该输入框所在页面，无效 ID 被清空
+    layout_issues = [i for i in result.issues if i.location == "Site Layout (shared by multiple pages)"]
+    assert [(i.related_input_id, i.url) for i in layout_issues] == [(1, "http://shop.test/"), (None, "Unknown")]
+
+
+if __name__ == "__main__":
+    test_common_layout_factored_out()
+    test_no_layout_for_single_page_or_unique_pages()
+    test_triager_emits_site_layout_once()
+    test_layout_inputs_move_to_layout_blocks()
+    test_page_input_named_like_layout_input_is_kept()
+    test_layout_blocks_split_by_page_budget()
+    print("Layout dedup checks passed")
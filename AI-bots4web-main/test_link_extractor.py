@@ -0,0 +1,44 @@
+from bench_link_extractor import LegacyJsLinkExtractor, synthetic_bundle
+from script.scanner.link_extractor import JsLinkExtractor
+
+
+BASE_URL = "https://shop.example.com/account/"
+
+
+def test_matches_legacy_output():
+    content = synthetic_bundle(modules=300)
+    expected = LegacyJsLinkExtractor.extract_links(content, BASE_URL)
+    JsLinkExtractor.clear_cache()
+    assert JsLinkExtractor.extract_links(content, BASE_URL) == expected
+    assert "https://shop.example.com/api/v1/login" in expected
+    assert not any(link.endswith(".png") or "/text/plain" in link for link in expected)
+
+
+def test_chunk_boundaries_do_not_change_result():
+    content = synthetic_bundle(modules=200) + "'/api/tail'" + "x" * 5000 + 'fetch("https://api.example.com/v1")'
+    expected = LegacyJsLinkExtractor.extract_links(content, BASE_URL)
+
+    original = JsLinkExtractor.CHUNK_SIZE
+    try:
+        for size in (1, 7, 64, 1000):
+            JsLinkExtractor.CHUNK_SIZE = size
+            JsLinkExtractor.clear_cache()
+            assert JsLinkExtractor.extract_links(content, BASE_URL) == expected
+    finally:
+        JsLinkExtractor.CHUNK_SIZE = original
+        JsLinkExtractor.clear_cache()
+
+
+def test_cached_raw_result_is_rebased_per_page():
+    script = 'api.get("/api/profile");location="/logout"'
+    first = JsLinkExtractor.extract_links(script, "http://a.example.com/x")
+    second = JsLinkExtractor.extract_links(script, "http://b.example.com/y")
+    assert first == {"http://a.example.com/api/profile", "http://a.example.com/logout"}
+    assert second == {"http://b.example.com/api/profile", "http://b.example.com/logout"}
+
+
+if __name__ == "__main__":
+    test_matches_legacy_output()
+    test_chunk_boundaries_do_not_change_result()
+    test_cached_raw_result_is_rebased_per_page()
+    print("Link extractor checks passed")
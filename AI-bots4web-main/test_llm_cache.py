@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from utils.llm.cached_client import CachedLLMClient
+
+
+class EchoClient:
+    def __init__(self, model: str = "m1", temperature: float = 0.1, fail: bool = False) -> None:
+        self.backend = "ollama"
+        self.model = model
+        self.temperature = temperature
+        self.system_prompt = "sys"
+        self.fail = fail
+        self.calls = 0
+
+    def complete(self, prompt: str) -> str:
+        self.calls += 1
+        if self.fail:
+            return "Error: Could not connect to ollama"
+        return f"{self.model}:{prompt}"
+
+    def infer_api_schema(self, code_slice: str):
+        return {"code": code_slice}
+
+
+def test_hits_persist_across_instances():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm.sqlite3")
+        inner = EchoClient()
+        cached = CachedLLMClient(inner, path)
+        assert cached.complete("a") == "m1:a"
+        assert cached.complete("a") == "m1:a"
+        assert cached.complete("b") == "m1:b"
+        assert inner.calls == 2
+        assert cached.stats()["hits"] == 1 and cached.stats()["misses"] == 2
+        # 其他属性 / 方法透传
+        assert cached.model == "m1" and cached.infer_api_schema("x") == {"code": "x"}
+        cached.close()
+
+        # 新进程（新实例）直接命中
+        inner = EchoClient()
+        cached = CachedLLMClient(inner, path)
+        assert cached.complete("a") == "m1:a" and inner.calls == 0
+        cached.close()
+
+
+def test_key_covers_model_config():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm.sqlite3")
+        keys = {
+            CachedLLMClient(EchoClient(), path).cache_key("p"),
+            CachedLLMClient(EchoClient(model="m2"), path).cache_key("p"),
+            CachedLLMClient(EchoClient(temperature=0.7), path).cache_key("p"),
+            CachedLLMClient(EchoClient(), path).cache_key("q"),
+        }
+        assert len(keys) == 4
+
+
+def test_errors_not_cached_and_size_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        failing = EchoClient(fail=True)
+        cached = CachedLLMClient(failing, os.path.join(tmp, "err.sqlite3"))
+        cached.complete("a")
+        cached.complete("a")
+        assert failing.calls == 2 and cached.stats()["entries"] == 0
+
+        inner = EchoClient()
+        cached = CachedLLMClient(inner, os.path.join(tmp, "small.sqlite3"), max_bytes=1000)
+        for i in range(10):
+            cached.complete(f"{i}" + "x" * 200)
+        stats = cached.stats()
+        assert stats["bytes"] <= 1000 and stats["evictions"] >= 5
+        # 最近写入的仍在，最早的被淘汰
+        calls = inner.calls
+        cached.complete("9" + "x" * 200)
+        assert inner.calls == calls
+        cached.complete("0" + "x" * 200)
+        assert inner.calls == calls + 1
+
+
+if __name__ == "__main__":
+    test_hits_persist_across_instances()
+    test_key_covers_model_config()
+    test_errors_not_cached_and_size_bounded()
+    print("LLM cache checks passed")
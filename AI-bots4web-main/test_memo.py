@@ -0,0 +1,105 @@
+import os
+import random
+import sys
+import tempfile
+
+from script.scanner.dom_distiller import InteractionDomDistiller, DistillConfig
+from script.scanner.utils import memo as memo_module
+from script.scanner.utils.html_cleaner import clean_html_for_llm
+from script.scanner.utils.memo import ContentMemo, get_memo
+
+SHELL = '<html><body><div class="app" id="root"><input name="q"><button onclick="go()">Go</button></div></body></html>'
+
+
+def test_lru_bounds_and_stats():
+    memo = ContentMemo("t", max_entries=2, max_chars=10)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert memo.get_or_compute("a", lambda: compute("aaaa")) == "aaaa"
+    assert memo.get_or_compute("a", lambda: compute("xxxx")) == "aaaa"
+    memo.get_or_compute("b", lambda: compute("bbbb"))
+    memo.get_or_compute("c", lambda: compute("cccc"))   # 超出 max_chars，淘汰最久未用的 a
+    memo.get_or_compute("a", lambda: compute("aaaa"))
+    assert calls == ["aaaa", "bbbb", "cccc", "aaaa"]
+    stats = memo.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 4 and stats["chars"] <= 10
+    assert ContentMemo.make_key("ab", "c") != ContentMemo.make_key("a", "bc")
+
+
+def test_persistent_layer_survives_new_instance():
+    with tempfile.TemporaryDirectory() as tmp:
+        ContentMemo("p", persist_dir=tmp).get_or_compute("k", lambda: "cleaned ✓")
+        fresh = ContentMemo("p", persist_dir=tmp)
+        assert fresh.get_or_compute("k", lambda: "recomputed") == "cleaned ✓"
+        assert fresh.stats()["disk_hits"] == 1
+
+
+def test_clean_html_memoized_per_backend():
+    memo = get_memo("clean_html_for_llm")
+    memo.clear()
+    first = clean_html_for_llm(SHELL, backend="html.parser")
+    assert clean_html_for_llm(SHELL, backend="html.parser") is first
+    clean_html_for_llm(SHELL, backend="lxml")
+    assert memo.stats()["hits"] == 1 and memo.stats()["misses"] == 2
+    assert clean_html_for_llm(SHELL, backend="html.parser", use_memo=False) == first
+
+
+def test_distill_memo_keyed_by_config():
+    memo = get_memo("distill_html")
+    memo.clear()
+    short = InteractionDomDistiller(DistillConfig(max_event_code_len=3))
+    default = InteractionDomDistiller()
+    assert default.distill_html(SHELL) == default.distill_html(SHELL)
+    assert short.distill_html(SHELL) != default.distill_html(SHELL)
+    assert memo.stats()["misses"] == 2
+    assert "distill_html" in memo_module.format_memo_stats()
+
+
+def test_disk_layer_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(0)
+        # 随机内容几乎压缩不了，每个条目的磁盘大小接近
+        values = {key: "".join(rng.choice("0123456789abcdef") for _ in range(4000)) for key in "abcd"}
+        memo = ContentMemo("d", persist_dir=tmp)
+        for i, key in enumerate("abc"):
+            memo.get_or_compute(key, lambda: values[key])
+            os.utime(memo._path(key), (i + 1, i + 1))
+        size = max(os.path.getsize(memo._path(key)) for key in "abc")
+        memo.max_disk_bytes = int(size * 3.5)
+
+        # 读 a 刷新它的使用时间；再写 d 超出上限，最久没用过的 b 被淘汰
+        assert ContentMemo("d", persist_dir=tmp).get("a") == values["a"]
+        memo.get_or_compute("d", lambda: values["d"])
+        assert [os.path.exists(memo._path(key)) for key in "abcd"] == [True, False, True, True]
+        assert memo.stats()["disk_evictions"] == 1 and memo.stats()["disk_bytes"] <= memo.max_disk_bytes
+
+
+def test_registry_shared_across_import_paths():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+    from scanner.utils import memo as canonical
+
+    # scanner.utils.memo 和 script.scanner.utils.memo 各加载一次，但共用一套注册表
+    assert canonical.get_memo("clean_html_for_llm") is get_memo("clean_html_for_llm")
+    with tempfile.TemporaryDirectory() as tmp:
+        canonical.configure_memos(persist_dir=tmp)
+        try:
+            assert get_memo("clean_html_for_llm").persist_dir == os.path.join(tmp, "clean_html_for_llm")
+            assert memo_module.get_memo("late_memo") is canonical.get_memo("late_memo")
+            assert memo_module.get_memo("late_memo").persist_dir == os.path.join(tmp, "late_memo")
+        finally:
+            memo_module.configure_memos(persist_dir=None)
+        assert canonical.get_memo("clean_html_for_llm").persist_dir is None
+
+
+if __name__ == "__main__":
+    test_lru_bounds_and_stats()
+    test_persistent_layer_survives_new_instance()
+    test_clean_html_memoized_per_backend()
+    test_distill_memo_keyed_by_config()
+    test_disk_layer_evicts_least_recently_used()
+    test_registry_shared_across_import_paths()
+    print("Memo checks passed")
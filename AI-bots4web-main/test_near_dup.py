@@ -0,0 +1,154 @@
+import json
+import os
+import random
+import sys
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis import near_dup
+from analysis.asset_triager import AssetTriager
+from analysis.near_dup import NearDuplicateClusterer
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from analysis.streaming_pipeline import StreamingAnalysisPipeline
+from scanner.page_asset import SiteAsset, PageAsset, InputField
+
+WORDS = ("red blue cotton shirt soft premium durable stylish fit summer winter "
+         "classic modern lightweight warm cozy elegant casual").split()
+
+
+def _product(i: int, rng: random.Random) -> str:
+    desc = " ".join(rng.choice(WORDS) for _ in range(25))
+    reviews = " ".join(rng.choice(WORDS) for _ in range(10))
+    return (f"<main><h1>Product {i} {rng.choice(WORDS)}</h1><img src='/img/{i}.jpg' alt='p'>"
+            f"<p class='price'>${i}.99</p><p>{desc}</p>"
+            f"<form action='/cart/add/{i}' method='post'><input name='qty' type='number'>"
+            f"<input type='hidden' name='csrf' value='x{i}'><button>Add</button></form>"
+            f"<section class='reviews'><h2>Reviews</h2><p>{reviews}</p></section></main>")
+
+
+LOGIN = ("<main><h1>Sign in</h1><form action='/login' method='post'><input name='user'>"
+         "<input name='pass' type='password'><button>Login</button></form></main>")
+SEARCH = ("<main><h1>Search</h1><form action='/search'><input name='q'><button>Go</button></form><ul>"
+          + "".join(f"<li><a href='/p/{i}'>Product {i}</a></li>" for i in range(10)) + "</ul></main>")
+PROFILE = ("<main><h1>Profile</h1><form action='/profile' method='post'><input name='name'>"
+           "<input name='email' type='email'><textarea name='bio'></textarea><button>Save</button></form></main>")
+
+
+def _site_pages():
+    rng = random.Random(7)
+    pages = {f"http://shop.test/item/{i}": _product(i, rng) for i in range(20)}
+    pages["http://shop.test/login"] = LOGIN
+    pages["http://shop.test/search"] = SEARCH
+    pages["http://shop.test/profile"] = PROFILE
+    return pages
+
+
+def test_template_pages_cluster_and_distinct_pages_do_not():
+    clusterer = NearDuplicateClusterer(use_numpy=False).fit(_site_pages())
+
+    assert [c.representative for c in clusterer.clusters] == [
+        "http://shop.test/item/0", "http://shop.test/login", "http://shop.test/search", "http://shop.test/profile"]
+    products = clusterer.clusters[0]
+    assert len(products.members) == 19
+    assert max(products.distances.values()) <= clusterer.max_distance
+    assert clusterer.stats() == {"pages": 23, "clusters": 4, "suppressed": 19}
+    # 不同模板的页面远超阈值
+    sigs = {url: clusterer.signature(html) for url, html in _site_pages().items()}
+    assert clusterer.distance(sigs["http://shop.test/login"], sigs["http://shop.test/profile"]) > 12
+
+
+def test_lsh_matches_brute_force():
+    rng = random.Random(3)
+    clusterer = NearDuplicateClusterer(max_distance=6, use_numpy=False)
+    reps = []
+    for _ in range(300):
+        sig = rng.getrandbits(64)
+        # 以一定概率生成已有代表页的近邻
+        if reps and rng.random() < 0.5:
+            sig = rng.choice(reps)
+            for bit in rng.sample(range(64), rng.randint(0, 9)):
+                sig ^= 1 << bit
+        expected = [(i, NearDuplicateClusterer.distance(sig, r)) for i, r in enumerate(reps)]
+        expected = [m for m in expected if m[1] <= 6]
+        match = clusterer._nearest_representative(sig)
+        if expected:
+            assert match is not None and match[1] == min(d for _, d in expected)
+        else:
+            assert match is None
+            clusterer._add_representative(near_dup.PageCluster(f"C{len(reps) + 1}", f"u{len(reps)}"), sig)
+            reps.append(sig)
+
+
+def test_numpy_path_agrees_with_lsh():
+    if near_dup.np is None:
+        return
+    pages = _site_pages()
+    lsh = NearDuplicateClusterer(use_numpy=False).fit(pages)
+    vec = NearDuplicateClusterer(use_numpy=True).fit(pages)
+    assert [c.to_dict() for c in vec.clusters] == [c.to_dict() for c in lsh.clusters]
+
+
+def _product_page(i: int) -> PageAsset:
+    url = f"http://shop.test/item/{i}"
+    html = _product(i, random.Random(i))
+    return PageAsset(url=url, title="Shop", cleaned_html=html, inputs=[
+        InputField(internal_id=100 * i + 1, page_url=url, tag="input", name="qty", input_type="number"),
+        InputField(internal_id=100 * i + 2, page_url=url, tag="input", name="csrf", input_type="hidden"),
+    ])
+
+
+class QtyLLM:
+    """每个页面返回一个关联 qty 输入框（代表页上 ID 为 1）的 issue。"""
+
+    def __init__(self) -> None:
+        self.prompts = 0
+
+    def complete(self, prompt: str) -> str:
+        self.prompts += 1
+        return json.dumps({"issues": [{"url": "u", "owasp_category": "A03: Injection", "related_input_id": 1}]})
+
+
+def test_findings_propagate_to_duplicates():
+    pages = [_product_page(i) for i in range(4)]
+    site = SiteAsset(base_url="http://shop.test", pages={p.url: p for p in pages})
+    triaged = AssetTriager(site, dedupe_layout=False).triage()
+
+    assert [p["url"] for p in triaged["interactive"]] == ["http://shop.test/item/0"]
+    assert [d["url"] for d in triaged["near_duplicates"]] == [f"http://shop.test/item/{i}" for i in (1, 2, 3)]
+    assert triaged["near_duplicates"][0]["input_map"] == {1: 101, 2: 102}
+
+    llm = QtyLLM()
+    result = OwaspTop10LLMAnalyzer(llm).analyze(triaged)
+    assert llm.prompts == 1
+    assert [(i.location, i.related_input_id, i.propagated_from) for i in result.issues] == [
+        ("http://shop.test/item/0", 1, None),
+        ("http://shop.test/item/1", 101, "http://shop.test/item/0"),
+        ("http://shop.test/item/2", 201, "http://shop.test/item/0"),
+        ("http://shop.test/item/3", 301, "http://shop.test/item/0"),
+    ]
+
+
+def test_streaming_pipeline_suppresses_duplicates():
+    llm = QtyLLM()
+    pipeline = StreamingAnalysisPipeline(OwaspTop10LLMAnalyzer(llm), workers=2, layout_warmup_pages=1,
+                                         dedupe_layout=False)
+    site = SiteAsset(base_url="http://shop.test")
+    for i in range(5):
+        page = _product_page(i)
+        site.pages[page.url] = page
+        pipeline.feed(page, site)
+    triaged, result = pipeline.finish(site)
+
+    assert llm.prompts == 1
+    assert len(triaged["interactive"]) == 1 and len(triaged["near_duplicates"]) == 4
+    assert [i.related_input_id for i in result.issues] == [1, 101, 201, 301, 401]
+
+
+if __name__ == "__main__":
+    test_template_pages_cluster_and_distinct_pages_do_not()
+    test_lsh_matches_brute_force()
+    test_numpy_path_agrees_with_lsh()
+    test_findings_propagate_to_duplicates()
+    test_streaming_pipeline_suppresses_duplicates()
+    print("Near-duplicate checks passed")
@@ -0,0 +1,166 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+# agent 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径；
+# agent.pt_agent 以 `script.scanner...` 形式导入扫描器，仓库根目录也要在搜索路径里
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_ROOT, "script"))
+sys.path.insert(0, _ROOT)
+
+from agent import pt_agent
+from agent.phase_cache import PhaseCache, hash_parts, main
+from scanner.utils.memo import configure_memos
+
+TARGET = "http://shop.test"
+
+
+class StubScanner:
+    """代替 SiteScanner：构造时不启动浏览器。"""
+
+    def __init__(self, base_url, max_depth, same_origin_only=True, in_browser_distill=False, **kwargs):
+        self.base_url = base_url
+        self.max_depth = max_depth
+        self.same_origin_only = same_origin_only
+        self.in_browser_distill = in_browser_distill
+
+
+class StubLLM:
+    def __init__(self, model: str = "llama3") -> None:
+        self.model = model
+
+    def complete(self, prompt: str) -> str:
+        return '{"issues": []}'
+
+
+@contextlib.contextmanager
+def _agents(fingerprint: str = "etag-1"):
+    """产出 make(**kwargs) -> PTAgent；目标探测被替换为记录调用、返回 fingerprint。"""
+    probes = []
+    saved = pt_agent.SiteScanner, pt_agent.probe_target_fingerprint
+    pt_agent.SiteScanner = StubScanner
+    pt_agent.probe_target_fingerprint = lambda url, timeout=5.0: probes.append(url) or fingerprint
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            def make(llm=None, **kwargs):
+                return pt_agent.PTAgent(TARGET, llm or StubLLM(), cache_dir=tmp, **kwargs)
+            make.probes = probes
+            yield make
+    finally:
+        pt_agent.SiteScanner, pt_agent.probe_target_fingerprint = saved
+        configure_memos(persist_dir=None)
+
+
+def test_target_probe_runs_lazily_once():
+    with _agents() as make:
+        agent = make()
+        # 构造 PTAgent 不发网络请求
+        assert make.probes == []
+        assert agent._load_cache("auth_creds") is None
+        agent._load_cache("scan_result")
+        assert make.probes == [TARGET]
+
+
+def test_cache_keys_follow_their_inputs():
+    def keys(fingerprint="etag-1", **kwargs):
+        with _agents(fingerprint) as make:
+            agent = make(**kwargs)
+            return {step: agent._cache_key(step) for step in ("auth_creds", "scan_result", "analysis_result")}
+
+    base = keys()
+    assert base == keys()
+
+    other_model = keys(llm=StubLLM("qwen2"))
+    assert other_model["scan_result"] == base["scan_result"]
+    assert other_model["analysis_result"] != base["analysis_result"]
+
+    # 目标重新部署（指纹变化）：扫描和下游分析都失效，凭证不受影响
+    redeployed = keys("etag-2")
+    assert redeployed["auth_creds"] == base["auth_creds"]
+    assert redeployed["scan_result"] != base["scan_result"]
+    assert redeployed["analysis_result"] != base["analysis_result"]
+
+    assert keys(max_depth=3)["scan_result"] != base["scan_result"]
+    assert keys(page_token_budget=500)["scan_result"] == base["scan_result"]
+    assert keys(page_token_budget=500)["analysis_result"] != base["analysis_result"]
+    assert hash_parts("a", {"x": 1, "y": 2}) == hash_parts("a", {"y": 2, "x": 1})
+
+
+def test_ttl_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PhaseCache(tmp, base_url=TARGET, ttls={"scan_result": 60, "analysis_result": None})
+        cache.save("scan_result", "s" * 64, {"pages": 3})
+        cache.save("analysis_result", "a" * 64, {"issues": []})
+        assert cache.load("scan_result", "s" * 64) == {"pages": 3}
+
+        old = time.time() - 3600
+        for entry in cache.entries():
+            os.utime(entry.path, (old, old))
+        assert cache.load("scan_result", "s" * 64) is None
+        assert [e.phase for e in cache.entries()] == ["analysis_result"]
+        # TTL 为 None 的阶段不过期
+        assert cache.load("analysis_result", "a" * 64) == {"issues": []}
+
+
+def test_cascade_invalidation():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PhaseCache(tmp, base_url=TARGET)
+        other = PhaseCache(tmp, base_url="http://other.test")
+        for c in (cache, other):
+            c.save("auth_creds", "c" * 64, {"cookies": []})
+            c.save("analysis_result", "a" * 64, {"issues": []})
+
+        # 重新保存上游阶段：本目标的下游缓存被清除，其他目标不受影响
+        cache.save("scan_result", "s" * 64, {"pages": 1})
+        assert cache.load("analysis_result", "a" * 64) is None
+        assert other.load("analysis_result", "a" * 64) == {"issues": []}
+
+        cache.save("analysis_result", "a" * 64, {"issues": []})
+        assert cache.invalidate(phase="scan_result", target=TARGET, cascade=False) == 1
+        assert cache.load("analysis_result", "a" * 64) == {"issues": []}
+        cache.save("scan_result", "s" * 64, {"pages": 1})
+        cache.save("analysis_result", "a" * 64, {"issues": []})
+        assert cache.invalidate(phase="scan_result", target=TARGET) == 2
+        assert sorted(e.phase for e in cache.entries(target=TARGET)) == ["auth_creds"]
+
+
+def _cli(*argv: str) -> str:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        main(list(argv))
+    return out.getvalue()
+
+
+def test_cli_list_invalidate_prune():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PhaseCache(tmp, base_url=TARGET)
+        other = PhaseCache(tmp, base_url="http://other.test")
+        cache.save("auth_creds", "c" * 64, {"cookies": []})
+        cache.save("scan_result", "s" * 64, {"pages": 1})
+        other.save("scan_result", "s" * 64, {"pages": 2})
+        stale = os.path.join(tmp, cache.entry_name("auth_creds", "c" * 64))
+        old = time.time() - 2 * 24 * 3600
+        os.utime(stale, (old, old))
+
+        listing = _cli("--cache-dir", tmp, "list")
+        assert "[*] 3 cache entries." in listing and listing.count("[EXPIRED]") == 1
+        assert "1 cache entries" in _cli("--cache-dir", tmp, "list", "--target", TARGET, "--phase", "scan_result")
+
+        assert "Removed 1 expired cache files" in _cli("--cache-dir", tmp, "prune")
+        assert not os.path.exists(stale)
+
+        assert "Removed 1 cache files" in _cli("--cache-dir", tmp, "invalidate", "--phase", "scan_result",
+                                               "--target", "http://other.test")
+        assert [(e.target_hash, e.phase) for e in cache.entries()] == [(cache.target_hash(TARGET), "scan_result")]
+
+
+if __name__ == "__main__":
+    test_target_probe_runs_lazily_once()
+    test_cache_keys_follow_their_inputs()
+    test_ttl_expiry()
+    test_cascade_invalidation()
+    test_cli_list_invalidate_prune()
+    print("Phase cache checks passed")
@@ -0,0 +1,136 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from utils.llm.base import LLMError, LLMResponse
+from utils.llm.pooled_client import PooledLLMClient
+from utils.llm.resilient_client import ResilientLLMClient
+
+
+class ServerLLM:
+    """模拟一台一次只能处理一个请求的推理服务。"""
+
+    def __init__(self, name: str, delay: float = 0.01, gate: threading.Event = None) -> None:
+        self.endpoint = name
+        self.model = "llama3"
+        self.delay = delay
+        self.gate = gate
+        self.down = False
+        self.busy = False
+        self.served = 0
+        self._busy = threading.Lock()
+
+    def complete_with_usage(self, prompt: str) -> LLMResponse:
+        if self.down:
+            raise LLMError(f"{self.endpoint} refused connection")
+        with self._busy:
+            self.busy = True
+            if self.gate is not None:
+                assert self.gate.wait(10), "gate was never opened"
+            time.sleep(self.delay)
+            self.served += 1
+            self.busy = False
+        return LLMResponse(json.dumps({"issues": [{"owasp_category": self.endpoint}]}), completion_tokens=20)
+
+    def complete(self, prompt: str) -> str:
+        return self.complete_with_usage(prompt).text
+
+    def health_check(self) -> bool:
+        return not self.down
+
+
+def _triaged(n: int):
+    pages = [{"url": f"http://shop.test/p/{i}", "title": "P", "inputs": []} for i in range(n)]
+    return {"interactive": pages, "standalone_apis": [], "site_layout": []}
+
+
+def _wait_until(predicate, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_least_outstanding_spreads_load_and_scales():
+    gate = threading.Event()
+    servers = [ServerLLM("gpu1", gate=gate), ServerLLM("gpu2", gate=gate)]
+    pool = PooledLLMClient(servers, probe_interval=None)
+
+    out = {}
+    analysis = threading.Thread(target=lambda: out.setdefault(
+        "result", OwaspTop10LLMAnalyzer(pool, max_in_flight=4).analyze(_triaged(4))))
+    analysis.start()
+    # gate 关着时两台服务同时在处理请求，各自还排着一个
+    assert _wait_until(lambda: all(s.busy for s in servers))
+    assert _wait_until(lambda: [s["in_flight"] for s in pool.stats()] == [2, 2])
+    gate.set()
+    analysis.join(10)
+    result = out["result"]
+
+    assert len(result.issues) == 4
+    assert [s.served for s in servers] == [2, 2]
+
+    stats = pool.stats()
+    assert [s["requests"] for s in stats] == [2, 2] and all(s["in_flight"] == 0 for s in stats)
+    assert all(s["tokens_per_second"] and s["ewma_seconds"] for s in stats)
+    assert pool.model == "llama3" and pool.endpoint == "pool[gpu1, gpu2]"
+
+
+def test_unhealthy_endpoint_is_skipped_and_probed_back():
+    gpu1, gpu2 = ServerLLM("gpu1", delay=0), ServerLLM("gpu2", delay=0)
+    pool = PooledLLMClient([gpu1, gpu2], probe_interval=None)
+    gpu1.down = True
+
+    # 外层重试时池会换到健康的端点
+    client = ResilientLLMClient([pool], sleep=lambda s: None)
+    for _ in range(4):
+        client.complete("p")
+    assert gpu2.served == 4
+    assert [s["healthy"] for s in pool.stats()] == [False, True]
+    assert pool.stats()[0]["failures"] == 1
+
+    gpu1.down = False
+    assert pool.probe() == 2
+    pool.complete("p")
+    pool.complete("p")
+    assert gpu1.served >= 1
+
+    gpu1.down = gpu2.down = True
+    for _ in range(2):
+        try:
+            pool.complete("p")
+        except LLMError:
+            pass
+    try:
+        pool.complete("p")
+        raise AssertionError("expected LLMError")
+    except LLMError as e:
+        assert "No healthy LLM endpoint" in str(e)
+
+
+def test_stream_releases_slot_on_early_close():
+    class StreamingServer(ServerLLM):
+        def stream_complete(self, prompt, json_schema=None):
+            yield from ['{"issues": [', ']}', "trailing prose"]
+
+    pool = PooledLLMClient([StreamingServer("gpu1", delay=0)], probe_interval=None)
+    stream = pool.stream_complete("p")
+    assert next(stream) == '{"issues": ['
+    assert pool.stats()[0]["in_flight"] == 1
+    stream.close()
+    assert pool.stats()[0]["in_flight"] == 0 and pool.stats()[0]["requests"] == 1
+
+
+if __name__ == "__main__":
+    test_least_outstanding_spreads_load_and_scales()
+    test_unhealthy_endpoint_is_skipped_and_probed_back()
+    test_stream_releases_slot_on_early_close()
+    print("Pooled client checks passed")
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import sys
+import tempfile
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.asset_triager import AssetTriager
+from analysis.owasp_llm_analyzer import OwaspAnalysisResult, OwaspTop10LLMAnalyzer
+from analysis.priority_model import (FEATURE_NAMES, PriorityModel, append_samples, page_features,
+                                     read_samples)
+from scanner.page_asset import SiteAsset, PageAsset, InputField, ApiCall
+
+
+def _login() -> PageAsset:
+    url = "http://shop.test/login"
+    return PageAsset(url=url, title="Login", cleaned_html="<form><input name='user'><input name='pass' type='password'></form>",
+                     inputs=[InputField(internal_id=1, page_url=url, tag="input", name="user"),
+                             InputField(internal_id=2, page_url=url, tag="input", name="pass", input_type="password")],
+                     api_calls=[ApiCall(id=1, url="http://shop.test/api/login", method="POST", resource_type="fetch")])
+
+
+def _search() -> PageAsset:
+    url = "http://shop.test/search?q=shoes"
+    html = "<form><input name='q' value='shoes'></form><p>Results for shoes</p>"
+    return PageAsset(url=url, title="Search", html=html, cleaned_html=html,
+                     inputs=[InputField(internal_id=3, page_url=url, tag="input", name="q", input_type="search")])
+
+
+def _newsletter() -> PageAsset:
+    url = "http://shop.test/about"
+    return PageAsset(url=url, title="About", cleaned_html="<p>About us</p><button>Subscribe</button>",
+                     inputs=[InputField(internal_id=4, page_url=url, tag="input", input_type="hidden", name="t")])
+
+
+def test_features_and_default_ranking():
+    site = SiteAsset(base_url="http://shop.test", auth_required_urls={"http://shop.test/login"})
+    features = page_features(_search(), site)
+    assert set(features) == set(FEATURE_NAMES)
+    assert features["reflected_params"] > 0 and features["url_params"] > 0
+    assert page_features(_login(), site)["auth_required"] == 1.0
+
+    model = PriorityModel()
+    scores = {p.url: model.score_page(p, site) for p in (_login(), _search(), _newsletter())}
+    assert scores["http://shop.test/login"] > scores["http://shop.test/about"]
+    assert scores["http://shop.test/search?q=shoes"] > scores["http://shop.test/about"]
+
+
+def test_refit_from_samples_and_persist():
+    with tempfile.TemporaryDirectory() as tmp:
+        samples_path = os.path.join(tmp, "samples.jsonl")
+        # 过往运行：上传页总被确认，其他页面从未被确认
+        rows = []
+        for i in range(20):
+            upload = {name: 0.0 for name in FEATURE_NAMES}
+            upload.update(file_inputs=1.0, inputs=0.7)
+            plain = {name: 0.0 for name in FEATURE_NAMES}
+            plain.update(inputs=0.7, password_inputs=1.0)
+            rows += [(f"u{i}", upload, 1), (f"p{i}", plain, 0)]
+        assert append_samples(samples_path, rows) == 40
+        with open(samples_path, "a") as f:
+            f.write('{"url": "x", "features"')  # 中断写入的残行
+        samples = read_samples(samples_path)
+        assert len(samples) == 40
+
+        model = PriorityModel()
+        before = model.score(rows[0][1]), model.score(rows[1][1])
+        model.fit(samples)
+        after = model.score(rows[0][1]), model.score(rows[1][1])
+        assert after[0] > before[0] and after[1] < before[1] and after[0] > after[1]
+
+        model_path = os.path.join(tmp, "model.json")
+        model.save(model_path)
+        loaded = PriorityModel.load(model_path)
+        assert loaded.trained_on == 40
+        assert abs(loaded.score(rows[0][1]) - after[0]) < 1e-4
+        assert PriorityModel.load(os.path.join(tmp, "missing.json")).to_dict() == PriorityModel().to_dict()
+
+
+class CountingLLM:
+    def __init__(self) -> None:
+        self.urls = []
+
+    def complete(self, prompt: str) -> str:
+        self.urls.append(re.search(r'"url":\s*"([^"]+)"', prompt).group(1))
+        return json.dumps({"issues": [{"owasp_category": "A03: SQL Injection"}]}) + " " * 400
+
+
+def test_analyzer_spends_budget_in_priority_order():
+    pages = [_newsletter(), _search(), _login()]
+    site = SiteAsset(base_url="http://shop.test", pages={p.url: p for p in pages})
+    triaged = AssetTriager(site, dedupe_layout=False).triage()
+    assert [p["url"] for p in triaged["interactive"]] == [p.url for p in pages]
+
+    llm = CountingLLM()
+    analyzer = OwaspTop10LLMAnalyzer(llm)
+    # 第一次调用之后预算就已用完
+    result = analyzer.analyze(triaged, token_budget=100)
+    ranked = sorted(triaged["interactive"], key=lambda p: -p["priority"])
+    assert llm.urls == [ranked[0]["url"]]
+    assert result.skipped == [p["url"] for p in ranked[1:]]
+    assert analyzer.tokens_used > 100
+
+    unlimited = OwaspTop10LLMAnalyzer(CountingLLM()).analyze(triaged)
+    assert len(unlimited.issues) == 3 and unlimited.skipped == []
+
+
+def test_unanalyzed_pages_are_not_learned_as_negatives():
+    # agent.pt_agent 以 `script.scanner...` 形式导入扫描器，仓库根目录也要在搜索路径里
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from agent.pt_agent import PTAgent
+
+    pages = [_newsletter(), _search(), _login()]
+    site = SiteAsset(base_url="http://shop.test", pages={p.url: p for p in pages})
+    triaged = AssetTriager(site, dedupe_layout=False).triage()
+    result = OwaspAnalysisResult(issues=[], skipped=["http://shop.test/about"],
+                                 failed=["http://shop.test/search?q=shoes"])
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = PTAgent.__new__(PTAgent)
+        agent.priority_model = PriorityModel()
+        agent._priority_model_path = os.path.join(tmp, "model.json")
+        agent._priority_samples_path = os.path.join(tmp, "samples.jsonl")
+        agent._update_priority_model(site, triaged, result, confirmed_urls=set())
+        with open(agent._priority_samples_path) as f:
+            assert [json.loads(line)["url"] for line in f] == ["http://shop.test/login"]
+
+
+if __name__ == "__main__":
+    test_features_and_default_ranking()
+    test_refit_from_samples_and_persist()
+    test_analyzer_spends_budget_in_priority_order()
+    test_unanalyzed_pages_are_not_learned_as_negatives()
+    print("Priority model checks passed")
@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import sys
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from analysis.prompt_packer import PromptPacker
+
+
+def _api(i: int):
+    return {"type": "standalone_api_endpoint", "url": f"http://shop.test/api/{i}", "method": "GET"}
+
+
+def _page(i: int, size: int = 10):
+    return {"url": f"http://shop.test/p/{i}", "title": "P", "category": "interactive",
+            "structure_snapshot": "<input name='q'>" * size, "inputs": [{"internal_id": i, "name": "q"}]}
+
+
+def test_group_respects_budget_and_positions():
+    packer = PromptPacker(token_budget=160, max_items=3, small_page_tokens=300)
+    items = ([("interactive", _page(0)), ("interactive", _page(1, size=200)), ("interactive", _page(2))]
+             + [("site_layout", [{"block_id": "L1"}])]
+             + [("standalone_apis", _api(i)) for i in range(7)])
+    units = packer.group(items)
+
+    assert [c for c, _ in units] == ["packed", "interactive", "site_layout", "packed", "packed", "standalone_apis"]
+    assert [i.payload["url"] for i in units[0][1]] == ["http://shop.test/p/0", "http://shop.test/p/2"]
+    assert units[1][1]["url"] == "http://shop.test/p/1"  # 大页面单独分析
+    assert [[i.item_id for i in box] for _, box in units[3:5]] == [["I1", "I2", "I3"], ["I1", "I2", "I3"]]
+    assert units[5][1]["url"] == "http://shop.test/api/6"  # 只剩一个条目的箱还原
+    assert all(sum(i.tokens for i in box) <= 160 for c, box in units if c == "packed")
+
+
+def test_split_response_formats():
+    ids = ["I1", "I2"]
+    keyed = {"results": {"I1": {"issues": [{"owasp_category": "A"}]}, "I2": {"issues": []}}}
+    assert PromptPacker.split_response(json.dumps(keyed), ids) == {"I1": [{"owasp_category": "A"}], "I2": []}
+    fenced = "```json\n" + json.dumps({"I2": [{"owasp_category": "B"}]}) + "\n```"
+    assert PromptPacker.split_response(fenced, ids) == {"I2": [{"owasp_category": "B"}]}
+    listed = {"results": [{"id": "I1", "issues": []}]}
+    assert PromptPacker.split_response(json.dumps(listed), ids) == {"I1": []}
+    assert PromptPacker.split_response('{"results": {"I1": ', ids) == {}
+
+
+class PackAwareLLM:
+    """打包 Prompt 按编号回答（可以故意漏掉一些编号），单条 Prompt 返回普通格式。"""
+
+    def __init__(self, drop=()) -> None:
+        self.drop = set(drop)
+        self.prompts = []
+
+    def complete(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if "### ITEMS (JSON)" not in prompt:
+            url = re.search(r'"url":\s*"([^"]+)"', prompt).group(1)
+            return json.dumps({"issues": [{"url": url, "owasp_category": "single"}]})
+        section = prompt.split("### ITEMS (JSON)", 1)[1].split("### TASK", 1)[0]
+        # 紧凑 JSON 占一行，后面可能跟着缩写图例
+        items = json.loads(section.strip().splitlines()[0])
+        results = {item["id"]: {"issues": [{"url": item["url"], "owasp_category": "packed"}]}
+                   for item in items if item["url"] not in self.drop}
+        return json.dumps({"results": results})
+
+
+def test_analyzer_packs_and_falls_back():
+    triaged = {"interactive": [_page(0), _page(1)], "standalone_apis": [_api(i) for i in range(4)],
+               "site_layout": [], "near_duplicates": []}
+
+    llm = PackAwareLLM()
+    result = OwaspTop10LLMAnalyzer(llm, packer=PromptPacker()).analyze(triaged)
+    assert len(llm.prompts) == 2
+    assert [(i.url, i.owasp_category) for i in result.issues] == (
+        [(f"http://shop.test/p/{i}", "packed") for i in range(2)]
+        + [(f"http://shop.test/api/{i}", "packed") for i in range(4)])
+    assert [i.location for i in result.issues][:2] == ["http://shop.test/p/0", "http://shop.test/p/1"]
+
+    # 打包结果缺少 api/2：只有它回退到单条 Prompt
+    llm = PackAwareLLM(drop={"http://shop.test/api/2"})
+    analyzer = OwaspTop10LLMAnalyzer(llm, packer=PromptPacker())
+    result = analyzer.analyze(triaged)
+    assert len(llm.prompts) == 3 and analyzer.pack_fallbacks == 1
+    assert [i.owasp_category for i in result.issues] == ["packed"] * 4 + ["single", "packed"]
+    assert re.search(r'"url":\s*"http://shop.test/api/2"', llm.prompts[-1])
+
+
+if __name__ == "__main__":
+    test_group_respects_budget_and_positions()
+    test_split_response_formats()
+    test_analyzer_packs_and_falls_back()
+    print("Prompt packer checks passed")
@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import tempfile
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from utils.llm.base import LLMError, llm_error_from
+from utils.llm.cached_client import CachedLLMClient
+from utils.llm.pooled_client import PooledLLMClient
+from utils.llm.resilient_client import CircuitBreaker, ResilientLLMClient
+
+
+class FlakyLLM:
+    """按顺序取出预设结果：异常则抛出，字符串则返回。"""
+
+    def __init__(self, name: str, outcomes) -> None:
+        self.endpoint = name
+        self.model = name
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else '{"issues": []}'
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def complete(self, prompt: str) -> str:
+        return self._next()
+
+    def stream_complete(self, prompt: str, json_schema=None):
+        text = self._next()
+        for part in text.split("|"):
+            if part == "BOOM":
+                raise LLMError("connection reset")
+            yield part
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_error_classification():
+    assert llm_error_from(StatusError(503)).retryable
+    assert llm_error_from(StatusError(429)).retryable
+    assert not llm_error_from(StatusError(404)).retryable
+    assert llm_error_from(ConnectionResetError("reset")).retryable
+    assert not llm_error_from(ValueError("bad request")).retryable
+
+
+def test_retry_with_jittered_backoff_then_fallback():
+    sleeps = []
+    primary = FlakyLLM("primary", [LLMError("timeout"), LLMError("timeout"), "ok-1"])
+    client = ResilientLLMClient([primary], max_attempts=3, backoff_base=0.5, sleep=sleeps.append)
+    assert client.complete("p") == "ok-1" and primary.calls == 3
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+
+    # 不可重试的错误直接换下一个后端
+    primary = FlakyLLM("primary", [LLMError("model not found", retryable=False)])
+    backup = FlakyLLM("backup", ["ok-2"])
+    client = ResilientLLMClient([primary, backup], sleep=sleeps.append)
+    assert client.complete("p") == "ok-2" and primary.calls == 1
+    stats = client.stats()
+    assert stats["fallback_successes"] == 1
+    assert [(b["endpoint"], b["calls"], b["failures"]) for b in stats["backends"]] == [
+        ("primary", 1, 1), ("backup", 1, 0)]
+    assert client.model == "primary"
+
+    failing = ResilientLLMClient([FlakyLLM("a", [LLMError("x")] * 3), FlakyLLM("b", [StatusError(500)] * 3)],
+                                 sleep=lambda s: None)
+    try:
+        failing.complete("p")
+        raise AssertionError("expected LLMError")
+    except LLMError as e:
+        assert e.endpoint == "b"
+    assert failing.stats()["exhausted"] == 1
+
+
+def test_circuit_breaker_opens_and_probes():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    now[0] = 10.0
+    assert breaker.allow() and not breaker.allow()     # 半开：只放行一个探测请求
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    primary = FlakyLLM("primary", [LLMError("down")] * 2)
+    backup = FlakyLLM("backup", [])
+    client = ResilientLLMClient([primary, backup], max_attempts=2, failure_threshold=2,
+                                reset_timeout=60, sleep=lambda s: None, clock=lambda: now[0])
+    client.complete("p")
+    client.complete("p")
+    assert primary.calls == 2 and backup.calls == 2
+    assert client.stats()["backends"][0]["circuit"] == "open"
+    assert client.stats()["backends"][0]["short_circuited"] == 1
+
+
+def test_stream_retries_only_before_first_chunk():
+    client = ResilientLLMClient([FlakyLLM("a", [LLMError("refused"), '{"issues"|: []}'])], sleep=lambda s: None)
+    assert "".join(client.stream_complete("p")) == '{"issues": []}'
+
+    client = ResilientLLMClient([FlakyLLM("a", ['{"issues"|BOOM'])], sleep=lambda s: None)
+    stream = client.stream_complete("p")
+    assert next(stream) == '{"issues"'
+    try:
+        next(stream)
+        raise AssertionError("expected LLMError")
+    except LLMError:
+        pass
+    assert client.stats()["backends"][0]["calls"] == 1
+
+
+def test_analyzer_surfaces_failed_items():
+    class PageLLM:
+        def complete(self, prompt: str) -> str:
+            if "/broken" in prompt:
+                raise LLMError("server error 500")
+            return json.dumps({"issues": [{"owasp_category": "A01"}]})
+
+    pages = [{"url": f"http://shop.test/{name}", "title": name, "inputs": []} for name in ("ok", "broken")]
+    triaged = {"interactive": pages, "standalone_apis": [], "site_layout": []}
+    client = ResilientLLMClient([PageLLM()], max_attempts=2, sleep=lambda s: None)
+    analyzer = OwaspTop10LLMAnalyzer(client, max_in_flight=2)
+    result = analyzer.analyze(triaged)
+    assert [i.location for i in result.issues] == ["http://shop.test/ok"]
+    assert result.failed == ["http://shop.test/broken"]
+    assert result.to_dict()["failed"] == ["http://shop.test/broken"]
+    assert client.stats()["backends"][0]["retries"] == 1
+
+
+def test_fallback_answers_are_not_cached_under_primary_key():
+    path = os.path.join(tempfile.mkdtemp(), "llm.sqlite3")
+    primary = FlakyLLM("big-70b", [LLMError("down", retryable=False)] * 2)
+    backup = FlakyLLM("tiny-1b", ["tiny-answer", "tiny|-stream"])
+    cache = CachedLLMClient(ResilientLLMClient([primary, backup], sleep=lambda s: None), path)
+    response = cache.complete_with_usage("p")
+    assert response.text == "tiny-answer" and response.fallback
+    assert "".join(cache.stream_complete("q")) == "tiny-stream"
+    assert cache.stats()["entries"] == 0
+
+    # 主模型恢复后不会拿到备用模型的回答
+    primary = FlakyLLM("big-70b", ["big-answer", "big|-stream"])
+    cache = CachedLLMClient(ResilientLLMClient([primary, backup], sleep=lambda s: None), path)
+    assert cache.complete("p") == "big-answer"
+    assert "".join(cache.stream_complete("q")) == "big-stream"
+    assert cache.stats()["entries"] == 2 and cache.stats()["hits"] == 0
+
+
+def test_set_timeout_reaches_every_backend():
+    class TimedLLM(FlakyLLM):
+        timeout = None
+
+        def set_timeout(self, timeout):
+            self.timeout = timeout
+
+    primary, pooled_a, pooled_b = TimedLLM("p", []), TimedLLM("a", []), TimedLLM("b", [])
+    plain = FlakyLLM("plain", [])
+    client = ResilientLLMClient([primary, PooledLLMClient([pooled_a, pooled_b], probe_interval=None), plain])
+    client.set_timeout(30)
+    assert (primary.timeout, pooled_a.timeout, pooled_b.timeout) == (30, 30, 30)
+    assert not hasattr(plain, "timeout")
+
+
+if __name__ == "__main__":
+    test_error_classification()
+    test_retry_with_jittered_backoff_then_fallback()
+    test_circuit_breaker_opens_and_probes()
+    test_stream_retries_only_before_first_chunk()
+    test_analyzer_surfaces_failed_items()
+    test_fallback_answers_are_not_cached_under_primary_key()
+    test_set_timeout_reaches_every_backend()
+    print("Resilient client checks passed")
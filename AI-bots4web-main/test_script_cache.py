@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+
+from script.scanner.script_cache import ScriptAnalysisCache, analyze_script
+
+
+BUNDLE = 'fetch("/api/login", {method: "POST", body: JSON.stringify({user: u})});var a="/dashboard";'
+
+
+def test_analysis_reused_across_runs_by_content_hash():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = ScriptAnalysisCache(tmp)
+        analysis = first.analyze(BUNDLE)
+        assert first.stats()["misses"] == 1
+
+        second = ScriptAnalysisCache(tmp)
+        cached = second.analyze(BUNDLE)
+        assert second.stats()["hits"] == 1
+        assert cached.links("http://a.example.com/") == analysis.links("http://a.example.com/") == {
+            "http://a.example.com/api/login", "http://a.example.com/dashboard"}
+        assert [ep.to_dict() for ep in cached.endpoints_for("http://a.example.com/")] == [
+            {"url": "http://a.example.com/api/login", "method": "POST", "source": "fetch",
+             "param_keys": [], "body_keys": ["user"]}]
+
+
+def test_conditional_fetch_by_url_and_etag():
+    url = "http://a.example.com/static/main.js"
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScriptAnalysisCache(tmp)
+        assert cache.conditional_headers(url) == {}
+        analysis = cache.analyze(BUNDLE)
+        cache.remember_url(url, {"ETag": '"abc"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"}, analysis)
+        cache.flush()
+
+        rerun = ScriptAnalysisCache(tmp)
+        assert rerun.conditional_headers(url) == {
+            "If-None-Match": '"abc"', "If-Modified-Since": "Mon, 05 Oct 2026 10:00:00 GMT"}
+        assert rerun.analysis_for_url(url).content_hash == analysis.content_hash
+        assert rerun.stats()["not_modified"] == 1
+
+
+def test_stale_extractor_version_is_recomputed():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScriptAnalysisCache(tmp)
+        digest = cache.analyze(BUNDLE).content_hash
+        path = os.path.join(tmp, "analysis", digest[:2], digest + ".json")
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["extractor"] = "old"
+        data["paths"] = ["/stale"]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        rerun = ScriptAnalysisCache(tmp)
+        assert rerun.analyze(BUNDLE).paths == analyze_script(BUNDLE).paths
+        assert rerun.stats()["misses"] == 1
+
+
+def test_single_use_inline_scripts_are_not_persisted():
+    token_script = 'window.csrf = "9f8e7d6c5b4a"; fetch("/api/me");'
+    shared_script = 'fetch("/api/cart", {method: "POST"});'
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScriptAnalysisCache(tmp)
+        cache.analyze(token_script, inline=True)
+        cache.analyze(shared_script, inline=True)
+        cache.analyze(shared_script, inline=True)
+
+        rerun = ScriptAnalysisCache(tmp)
+        rerun.analyze(token_script, inline=True)
+        rerun.analyze(shared_script, inline=True)
+        assert rerun.stats()["hits"] == 1 and rerun.stats()["misses"] == 1
+
+
+def test_size_cap_evicts_least_recently_used_and_prunes_index():
+    bundles = [f'fetch("/api/{i}/' + "x" * 2000 + '");' for i in range(4)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScriptAnalysisCache(tmp)
+        analyses = [cache.analyze(bundle) for bundle in bundles[:3]]
+        paths = [cache._path(a.content_hash) for a in analyses]
+        for i, path in enumerate(paths):
+            os.utime(path, (i + 1, i + 1))
+            cache.remember_url(f"http://a.example.com/{i}.js", {"ETag": f'"{i}"'}, analyses[i])
+            cache._index[f"http://a.example.com/{i}.js"]["last_used"] = i
+        cache.max_bytes = int(max(os.path.getsize(p) for p in paths) * 3.5)
+
+        # 读第 0 个刷新使用时间；写第 4 个超出上限，最久没用的第 1 个被删，索引里的对应 URL 随之去掉
+        assert ScriptAnalysisCache(tmp).analyze(bundles[0]).content_hash == analyses[0].content_hash
+        cache.analyze(bundles[3])
+        assert [os.path.exists(p) for p in paths] == [True, False, True]
+        assert cache.stats()["evictions"] == 1
+
+        cache.max_urls = 1
+        cache.flush()
+        assert list(ScriptAnalysisCache(tmp)._index) == ["http://a.example.com/2.js"]
+
+
+if __name__ == "__main__":
+    test_analysis_reused_across_runs_by_content_hash()
+    test_conditional_fetch_by_url_and_etag()
+    test_stale_extractor_version_is_recomputed()
+    test_single_use_inline_scripts_are_not_persisted()
+    test_size_cap_evicts_least_recently_used_and_prunes_index()
+    print("Script cache checks passed")
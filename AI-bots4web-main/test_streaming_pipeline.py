@@ -0,0 +1,136 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# analysis 包内部使用 `from scanner...` 形式导入，需要把 script/ 放进搜索路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from analysis.asset_triager import AssetTriager, StreamingTriager
+from analysis.owasp_llm_analyzer import OwaspTop10LLMAnalyzer
+from analysis.streaming_pipeline import StreamingAnalysisPipeline
+from scanner.page_asset import SiteAsset, PageAsset, InputField, ApiCall
+
+NAV = ('<nav><a href="/">Home</a><a href="/products">Products</a><a href="/admin">Admin</a>'
+       '<form action="/search"><input name="q" placeholder="Search the shop"></form></nav>')
+FOOTER = '<footer><p>Copyright 2024 Example Shop. All rights reserved.</p><a href="/privacy">Privacy</a></footer>'
+
+
+# 这些页面彼此近似重复；这里测的是流水线本身，关闭近似重复聚类
+def _page(i: int) -> PageAsset:
+    url = f"http://shop.test/item/{i}"
+    html = f"<html><body>{NAV}<main><h1>Item {i}</h1><input name='qty'></main>{FOOTER}</body></html>"
+    return PageAsset(url=url, title="Shop", cleaned_html=html,
+                     inputs=[InputField(internal_id=i, page_url=url, tag="input", name="qty")])
+
+
+class GatedLLM:
+    """调用在 gate 打开前阻塞，返回一个带 url 的 issue；记录当前 / 最大并发数。"""
+
+    def __init__(self) -> None:
+        self.gate = threading.Event()
+        self.active = 0
+        self.max_active = 0
+        self._cond = threading.Condition()
+
+    def complete(self, prompt: str) -> str:
+        with self._cond:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self._cond.notify_all()
+        assert self.gate.wait(10), "gate was never opened"
+        with self._cond:
+            self.active -= 1
+        return json.dumps({"issues": [{"url": "u", "owasp_category": "A01: Broken Access Control"}]})
+
+    def wait_active(self, n: int, timeout: float = 10) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.active >= n, timeout)
+
+
+def _wait_until(predicate, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_streaming_triager_matches_batch_triage():
+    pages = [_page(i) for i in range(6)]
+    site = SiteAsset(base_url="http://shop.test", pages={p.url: p for p in pages})
+    site.discovered_apis.append(ApiCall(id=1, url="http://shop.test/api/cart", method="GET",
+                                        resource_type="fetch", page_url="crawler_discovery"))
+    batch = AssetTriager(site, dedupe_similar=False).triage()
+
+    streaming = StreamingTriager(SiteAsset(base_url="http://shop.test"), layout_warmup_pages=3,
+                                 dedupe_similar=False)
+    streaming.site_asset.discovered_apis.extend(site.discovered_apis)
+    items = []
+    for page in pages:
+        items.extend(streaming.add_page(page))
+    items.extend(streaming.finish())
+
+    # 预热结束时一次放出 site_layout 和前 3 个页面，之后逐页放出
+    assert [c for c, _ in items] == ["site_layout"] + ["interactive"] * 6 + ["standalone_apis"]
+    assert streaming.buckets["interactive"] == batch["interactive"]
+    assert streaming.buckets["standalone_apis"] == batch["standalone_apis"]
+    assert [b["page_count"] for b in streaming.buckets["site_layout"]] == [6, 6]
+
+
+def test_pipeline_overlaps_crawl_and_analysis():
+    llm = GatedLLM()
+    pipeline = StreamingAnalysisPipeline(OwaspTop10LLMAnalyzer(llm), workers=2, queue_size=4,
+                                         layout_warmup_pages=1, dedupe_similar=False)
+    site = SiteAsset(base_url="http://shop.test")
+
+    def crawl(pages):
+        for i in pages:
+            page = _page(i)
+            site.pages[page.url] = page
+            pipeline.feed(page, site)
+
+    crawl(range(3))
+    # 爬取还没结束（finish 之前），两个工作线程已经在分析前几页
+    assert llm.wait_active(2)
+    crawl(range(3, 5))                  # LLM 卡住时爬虫照样前进（队列未满）
+    assert pipeline.blocked_seconds == 0
+    llm.gate.set()
+    crawl(range(5, 10))
+    triaged, result = pipeline.finish(site)
+
+    assert len(triaged["interactive"]) == 10
+    assert [i.location for i in result.issues] == [f"http://shop.test/item/{i}" for i in range(10)]
+    assert llm.max_active == 2
+
+
+def test_pipeline_backpressure_blocks_crawler():
+    llm = GatedLLM()
+    pipeline = StreamingAnalysisPipeline(OwaspTop10LLMAnalyzer(llm), workers=1, queue_size=1,
+                                         layout_warmup_pages=1, dedupe_layout=False,
+                                         dedupe_similar=False)
+    site = SiteAsset(base_url="http://shop.test")
+    crawler = threading.Thread(target=lambda: [pipeline.feed(_page(i), site) for i in range(6)])
+    crawler.start()
+
+    # 工作线程卡在第 1 条、队列里有第 2 条：第 3 条入队时爬虫被阻塞
+    assert llm.wait_active(1)
+    assert _wait_until(lambda: pipeline.items_queued == 3)
+    crawler.join(0.1)
+    assert crawler.is_alive() and pipeline.items_queued == 3
+    llm.gate.set()
+    crawler.join(10)
+    _, result = pipeline.finish(site)
+
+    assert pipeline.blocked_seconds > 0
+    assert pipeline.items_queued == 6 and len(result.issues) == 6
+    assert llm.max_active == 1
+
+
+if __name__ == "__main__":
+    test_streaming_triager_matches_batch_triage()
+    test_pipeline_overlaps_crawl_and_analysis()
+    test_pipeline_backpressure_blocks_crawler()
+    print("Streaming pipeline checks passed")
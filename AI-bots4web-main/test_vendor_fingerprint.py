@@ -0,0 +1,52 @@
+from script.scanner.vendor_fingerprint import HEAD_BYTES, KNOWN_HEAD_HASHES, identify_vendor, register_vendor_sample
+
+
+# 站点自己的配置脚本：提到了库名 / 官网，但不是库本身
+FIRST_PARTY_CONFIG = """window.addEventListener("load", function () {
+  // 日期格式见 https://momentjs.com/docs/#/displaying/format/
+  moment.locale("de");
+  window.cookieconsent.initialise({palette: {popup: {background: "#000"}}, content: {href: "/privacy"}});
+  fetch("/api/consent", {method: "POST", body: JSON.stringify({cookieconsent_status: "allow"})});
+});"""
+
+FIRST_PARTY = 'fetch("/api/login",{method:"POST"});var reactions=[],vue_mode="x";' * 40
+
+
+def test_banner_signatures():
+    assert identify_vendor(b"/*! jQuery v3.7.1 | (c) OpenJS Foundation | jquery.org/license */\n!function(e,t){}") == "jquery"
+    assert identify_vendor("/**\n * @license React\n * react-dom.production.min.js\n */\n'use strict';") == "react"
+    assert identify_vendor("/*!\n * Vue.js v2.7.14\n * (c) 2014-2022 Evan You\n */") == "vue"
+    assert identify_vendor("//! moment.js\n//! version : 2.29.4\n//! license : MIT\n//! momentjs.com\n") == "moment"
+    assert identify_vendor("/*!\n * CookieConsent v3.0.1\n * https://github.com/orestbida/cookieconsent\n */") \
+        == "cookieconsent"
+    assert identify_vendor("/*! For license information please see 736.vendors.4f1c2a.js.LICENSE.txt */\n(self.webpackChunk=[])") \
+        == "webpack-vendor-chunk"
+
+
+def test_first_party_code_is_not_flagged():
+    assert identify_vendor(FIRST_PARTY) is None
+    assert identify_vendor(FIRST_PARTY_CONFIG) is None
+    assert identify_vendor("/*! For license information please see main.4f1c2a.js.LICENSE.txt */") is None
+
+
+def test_only_head_is_inspected():
+    late_banner = "var a=1;" * (HEAD_BYTES // 8 + 1) + "/*! jQuery v3.7.1 */"
+    assert identify_vendor(late_banner) is None
+
+
+def test_head_hash_database():
+    renamed_bundle = "!function(n){var t={};" + "x" * 2000
+    assert identify_vendor(renamed_bundle) is None
+    digest = register_vendor_sample(renamed_bundle, "acme-ui")
+    try:
+        assert identify_vendor(renamed_bundle.encode("utf-8")[:HEAD_BYTES]) == "acme-ui"
+    finally:
+        KNOWN_HEAD_HASHES.pop(digest, None)
+
+
+if __name__ == "__main__":
+    test_banner_signatures()
+    test_first_party_code_is_not_flagged()
+    test_only_head_is_inspected()
+    test_head_hash_database()
+    print("Vendor fingerprint checks passed")